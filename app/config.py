@@ -13,6 +13,38 @@ class Config:
     jwt_audience: str = ""
     s3_bucket_name: str = ""
     email_queue_url: str = ""
+    notification_queue_size: int = 1000
+    notification_flush_interval: float = 0.5
+    password_hash_workers: int = 0
+    password_hash_queue_size: int = 32
+    bcrypt_cost: int = 0
+    bcrypt_time_budget_ms: int = 250
+    login_rate_limit_per_email: int = 10
+    login_rate_limit_per_ip: int = 30
+    login_rate_limit_window: int = 60
+    login_rate_limit_keys: int = 50_000
+    token_revocation_refresh_interval: float = 5.0
+    user_profile_cache_size: int = 10_000
+    user_profile_cache_ttl: float = 60.0
+    image_max_upload_bytes: int = 20 * 1024 * 1024
+    s3_multipart_chunk_size: int = 8 * 1024 * 1024
+    s3_max_concurrency: int = 4
+    image_upload_url_expiry: int = 300
+    image_download_url_expiry: int = 300
+    image_cache_size: int = 10_000
+    image_derivative_workers: int = 2
+    image_derivative_queue_size: int = 32
+    image_metadata_legacy_reads: bool = True
+    image_upload_max_files: int = 10
+    image_upload_concurrency: int = 4
+    server_timing_sample_rate: float = 0.01
+    consumed_capacity_header: bool = False
+    tracing_exporter: str = ""
+    tracing_file: str = "traces.jsonl"
+    tracing_otlp_endpoint: str = "http://localhost:4318"
+    tracing_sample_rate: float = 0.01
+    slow_query_threshold_ms: int = 200
+    metrics_token: str = ""
 
 
 _config: Config | None = None
@@ -31,5 +63,61 @@ def load_config() -> Config:
             jwt_audience=os.getenv("JWT_AUDIENCE") or "https://api.watchexpense.mohits.me",
             s3_bucket_name=os.getenv("S3_BUCKET_NAME") or "watch-expense-py-bucket",
             email_queue_url=os.getenv("EMAIL_QUEUE_URL") or "https://sqs.ap-south-1.amazonaws.com/873335417993/watch-expense-email-queue",
+            notification_queue_size=int(os.getenv("NOTIFICATION_QUEUE_SIZE") or 1000),
+            notification_flush_interval=float(os.getenv("NOTIFICATION_FLUSH_INTERVAL") or 0.5),
+            # 0 -> one worker per CPU core
+            password_hash_workers=int(os.getenv("PASSWORD_HASH_WORKERS") or 0),
+            password_hash_queue_size=int(os.getenv("PASSWORD_HASH_QUEUE_SIZE") or 32),
+            # 0 -> calibrate on startup to fit BCRYPT_TIME_BUDGET_MS; set it per
+            # deployment to give every worker the same cost, hashes of any
+            # other cost are then rehashed to it on login, lowering included
+            bcrypt_cost=int(os.getenv("BCRYPT_COST") or 0),
+            bcrypt_time_budget_ms=int(os.getenv("BCRYPT_TIME_BUDGET_MS") or 250),
+            login_rate_limit_per_email=int(os.getenv("LOGIN_RATE_LIMIT_PER_EMAIL") or 10),
+            login_rate_limit_per_ip=int(os.getenv("LOGIN_RATE_LIMIT_PER_IP") or 30),
+            login_rate_limit_window=int(os.getenv("LOGIN_RATE_LIMIT_WINDOW") or 60),
+            # distinct emails/IPs per window the limiter can tell apart
+            login_rate_limit_keys=int(os.getenv("LOGIN_RATE_LIMIT_KEYS") or 50_000),
+            token_revocation_refresh_interval=float(
+                os.getenv("TOKEN_REVOCATION_REFRESH_INTERVAL") or 5.0),
+            user_profile_cache_size=int(os.getenv("USER_PROFILE_CACHE_SIZE") or 10_000),
+            # bounds how stale a profile changed through another worker can be
+            user_profile_cache_ttl=float(os.getenv("USER_PROFILE_CACHE_TTL") or 60.0),
+            image_max_upload_bytes=int(
+                os.getenv("IMAGE_MAX_UPLOAD_BYTES") or 20 * 1024 * 1024),
+            # S3 requires parts of at least 5MB (except the last one)
+            s3_multipart_chunk_size=max(5 * 1024 * 1024, int(
+                os.getenv("S3_MULTIPART_CHUNK_SIZE") or 8 * 1024 * 1024)),
+            s3_max_concurrency=int(os.getenv("S3_MAX_CONCURRENCY") or 4),
+            image_upload_url_expiry=int(os.getenv("IMAGE_UPLOAD_URL_EXPIRY") or 300),
+            image_download_url_expiry=int(os.getenv("IMAGE_DOWNLOAD_URL_EXPIRY") or 300),
+            image_cache_size=int(os.getenv("IMAGE_CACHE_SIZE") or 10_000),
+            # 0 -> no thumbnails/previews, downloads always serve the original
+            image_derivative_workers=int(os.getenv("IMAGE_DERIVATIVE_WORKERS") or 2),
+            image_derivative_queue_size=int(os.getenv("IMAGE_DERIVATIVE_QUEUE_SIZE") or 32),
+            # turn off once migrate_image_shards.py reports nothing skipped
+            image_metadata_legacy_reads=(
+                os.getenv("IMAGE_METADATA_LEGACY_READS") or "true").lower() == "true",
+            # metadata of one request is saved in one transaction of at most
+            # 100 items, a deduplicated image takes two
+            image_upload_max_files=min(50, int(os.getenv("IMAGE_UPLOAD_MAX_FILES") or 10)),
+            # uploads of one multi-file request streaming to S3 at once
+            image_upload_concurrency=int(os.getenv("IMAGE_UPLOAD_CONCURRENCY") or 4),
+            # share of responses carrying a Server-Timing header, 0 turns it off
+            server_timing_sample_rate=float(os.getenv("SERVER_TIMING_SAMPLE_RATE") or 0.01),
+            # send each request's DynamoDB capacity back in X-DynamoDB-Capacity
+            consumed_capacity_header=(
+                os.getenv("CONSUMED_CAPACITY_HEADER") or "false").lower() == "true",
+            # "file" (OTLP/JSON lines in TRACING_FILE), "otlp" (OTLP/HTTP
+            # collector at TRACING_OTLP_ENDPOINT) or empty to turn tracing off
+            tracing_exporter=(os.getenv("TRACING_EXPORTER") or "").lower(),
+            tracing_file=os.getenv("TRACING_FILE") or "traces.jsonl",
+            tracing_otlp_endpoint=os.getenv("TRACING_OTLP_ENDPOINT") or "http://localhost:4318",
+            # requests with a sampled traceparent header are always traced
+            tracing_sample_rate=float(os.getenv("TRACING_SAMPLE_RATE") or 0.01),
+            # paginated DynamoDB queries taking longer are logged with their shape
+            slow_query_threshold_ms=int(os.getenv("SLOW_QUERY_THRESHOLD_MS") or 200),
+            # bearer token scrapers send for /metrics; empty -> not served
+            metrics_token=os.getenv("METRICS_TOKEN") or "",
         )
     return _config
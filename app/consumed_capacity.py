@@ -0,0 +1,91 @@
+"""
+DynamoDB consumed capacity and scan efficiency, accounted per request
+
+instrument_client() makes a DynamoDB client ask for ReturnConsumedCapacity
+on every call that supports it, transactions, batches and each page of a
+query included, and adds what the response reports to the RequestCapacity
+of the current request. RequestMetricsMiddleware starts one for every
+request and records it per route once the request is done.
+
+Like app.timing, the context variable is copied into asyncio.to_thread()
+workers and new tasks, so gathered calls add to the request that made them.
+"""
+import contextvars
+import threading
+from typing import Any
+
+# operations whose capacity units are read units, the rest consume writes
+READ_OPERATIONS = frozenset({
+    "GetItem", "BatchGetItem", "Query", "Scan", "TransactGetItems",
+})
+
+
+class RequestCapacity:
+    def __init__(self):
+        # added to from worker threads too
+        self._lock = threading.Lock()
+        self.read_units = 0.0
+        self.write_units = 0.0
+        # items DynamoDB read for queries and scans, before FilterExpression
+        self.scanned_count = 0
+        # items those queries and scans returned
+        self.count = 0
+
+    def add(self, operation: str, response: dict) -> None:
+        read_units, write_units = _capacity_units(operation, response.get("ConsumedCapacity"))
+        with self._lock:
+            self.read_units += read_units
+            self.write_units += write_units
+            if "ScannedCount" in response:
+                self.scanned_count += response["ScannedCount"]
+                self.count += response.get("Count", 0)
+
+    def header_value(self) -> str:
+        return (f"read={self.read_units:g}, write={self.write_units:g}, "
+                f"scanned={self.scanned_count}, returned={self.count}")
+
+
+def _capacity_units(operation: str, consumed: dict | list | None) -> tuple[float, float]:
+    """:returns (read, write) units of a ConsumedCapacity, one entry per table for batches"""
+    if consumed is None:
+        return 0.0, 0.0
+    entries = consumed if isinstance(consumed, list) else [consumed]
+    total = float(sum(entry.get("CapacityUnits", 0) for entry in entries))
+    if operation in READ_OPERATIONS:
+        return total, 0.0
+    return 0.0, total
+
+
+_current: contextvars.ContextVar[RequestCapacity | None] = contextvars.ContextVar(
+    "request_capacity", default=None)
+
+
+def start() -> contextvars.Token:
+    return _current.set(RequestCapacity())
+
+
+def stop(token: contextvars.Token) -> None:
+    _current.reset(token)
+
+
+def current() -> RequestCapacity | None:
+    return _current.get()
+
+
+def _request_capacity(params: dict, model: Any, **_: Any) -> None:
+    if "ReturnConsumedCapacity" in model.input_shape.members:
+        params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+
+def _record_capacity(parsed: dict, model: Any, **_: Any) -> None:
+    capacity = _current.get()
+    if capacity is not None:
+        capacity.add(model.name, parsed)
+
+
+def instrument_client(client: Any) -> None:
+    """Accounts the capacity consumed by every call of a DynamoDB client"""
+    # first: boto3 resources replace the params with a copy in a handler of
+    # this event, and whatever is set after the copy is never sent
+    client.meta.events.register_first("provide-client-params.dynamodb", _request_capacity)
+    client.meta.events.register("after-call.dynamodb", _record_capacity)
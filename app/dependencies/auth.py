@@ -1,6 +1,6 @@
 from typing import Annotated, Optional
 
-from fastapi import Depends, HTTPException, Header, status
+from fastapi import Depends, HTTPException, Header, Request, status
 
 from app.dependencies.token_provider import TokenProviderInstance
 from app.errors.app_exception import AppException
@@ -9,6 +9,7 @@ from app.models.user import UserClaims, UserRole
 
 
 def auth_token(
+    request: Request,
     token_provider: TokenProviderInstance,
     authorization: Annotated[Optional[str],
                              Header(alias="Authorization")] = None,
@@ -22,6 +23,8 @@ def auth_token(
         claims = token_provider.validate_token(token)
         if not claims:
             raise AppException(AppErr.UNAUTHORIZED)
+        # validated once per request; authenticated_user reuses these claims
+        request.state.user_claims = claims
         return token
     except Exception:
         raise HTTPException(
@@ -32,10 +35,9 @@ def auth_token(
 AuthTokenHeader = Annotated[str, Depends(auth_token)]
 
 
-def authenticated_user(
-    token: AuthTokenHeader, token_provider: TokenProviderInstance
-) -> UserClaims:
-    return token_provider.validate_token(token)
+def authenticated_user(request: Request, token: AuthTokenHeader) -> UserClaims:
+    # auth_token validated the token and recorded its claims
+    return request.state.user_claims
 
 
 AuthenticatedUser = Annotated[UserClaims, Depends(authenticated_user)]
@@ -0,0 +1,26 @@
+import hmac
+from typing import Annotated, Optional
+
+from fastapi import Header, HTTPException, status
+
+from app.config import load_config
+
+
+def metrics_scrape_token(
+    authorization: Annotated[Optional[str],
+                             Header(alias="Authorization")] = None,
+) -> None:
+    """
+    Lets only scrapers sending METRICS_TOKEN as a bearer token read the
+    metrics; without a token configured they are not served at all
+    """
+    token = load_config().metrics_token
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Not Found"
+        )
+    if not authorization or not hmac.compare_digest(
+            authorization.encode("utf-8"), f"Bearer {token}".encode("utf-8")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized"
+        )
@@ -0,0 +1,27 @@
+from typing import Annotated
+
+from fastapi import Depends, Request
+
+from app.dtos.auth import LoginRequest
+from app.errors.app_exception import AppException
+from app.errors.codes import AppErr
+from app.infra.rate_limiter import LoginRateLimiter
+
+
+def get_login_rate_limiter(request: Request) -> LoginRateLimiter:
+    return request.app.state.login_rate_limiter
+
+
+LoginRateLimiterInstance = Annotated[LoginRateLimiter, Depends(get_login_rate_limiter)]
+
+
+def login_rate_limit(
+    request: Request,
+    login_request: LoginRequest,
+    rate_limiter: LoginRateLimiterInstance,
+) -> None:
+    # request.client holds the caller IP resolved by APIGatewayProxyMiddleware
+    client_ip = request.client.host if request.client else None
+    if not rate_limiter.allow(login_request.email, client_ip):
+        raise AppException(AppErr.THROTTLE,
+                           "Too many login attempts, please try again later")
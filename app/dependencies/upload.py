@@ -0,0 +1,250 @@
+import asyncio
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Annotated, AsyncIterator
+
+from fastapi import Depends, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from app.errors.app_exception import AppException
+from app.errors.codes import AppErr
+
+
+def _request_boundary(request: Request) -> bytes:
+    media_type, params = parse_options_header(
+        request.headers.get("content-type"))
+    if media_type != b"multipart/form-data" or b"boundary" not in params:
+        raise AppException(AppErr.VALIDATION, "File is required")
+    return params[b"boundary"]
+
+
+class _MultipartReader(ABC):
+    """
+    Feeds a multipart/form-data body to the parser chunk by chunk and hands
+    the data of file parts named field_name to the _file_* hooks
+    """
+
+    def __init__(self, body: AsyncIterator[bytes], boundary: bytes, field_name: str):
+        self._body = body
+        self._field_name = field_name.encode("latin-1")
+        self._headers: dict[bytes, bytes] = {}
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+        self._in_file = False
+        self._parser = MultipartParser(boundary, callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    async def _feed(self) -> bool:
+        try:
+            chunk = await anext(self._body)
+        except StopAsyncIteration:
+            return False
+        if chunk:
+            self._parser.write(chunk)
+        return True
+
+    @abstractmethod
+    def _file_begin(self, filename: str, content_type: str) -> bool:
+        """:returns whether the data of this file part should be read"""
+
+    @abstractmethod
+    def _file_data(self, data: bytes) -> None: ...
+
+    @abstractmethod
+    def _file_end(self) -> None: ...
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[bytes(self._header_field).lower()] = bytes(self._header_value)
+        self._header_field.clear()
+        self._header_value.clear()
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(
+            self._headers.get(b"content-disposition"))
+        if options.get(b"name") != self._field_name or b"filename" not in options:
+            return
+        self._in_file = self._file_begin(
+            options[b"filename"].decode("utf-8", "replace"),
+            self._headers.get(
+                b"content-type", b"application/octet-stream").decode("latin-1").strip())
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file and end > start:
+            self._file_data(bytes(data[start:end]))
+
+    def _on_part_end(self) -> None:
+        if self._in_file:
+            self._in_file = False
+            self._file_end()
+
+
+class MultipartFileStream(_MultipartReader):
+    """
+    Streams one file field out of a multipart/form-data request body as the
+    bytes arrive, instead of spooling the whole body to a temp file first
+
+    open() reads only as far as the file part's headers, so the file name
+    and declared content type are known before any file data is consumed.
+    """
+
+    def __init__(self,
+                 body: AsyncIterator[bytes],
+                 boundary: bytes,
+                 field_name: str,
+                 content_length: int | None = None):
+        super().__init__(body, boundary, field_name)
+        self.content_length = content_length
+        self.filename: str | None = None
+        self.content_type = ""
+        self._pending: deque[bytes] = deque()
+        self._file_done = False
+
+    @classmethod
+    async def open(cls, request: Request, field_name: str = "file") -> "MultipartFileStream":
+        boundary = _request_boundary(request)
+        content_length = request.headers.get("content-length")
+        stream = cls(request.stream(), boundary, field_name,
+                     int(content_length) if content_length else None)
+        await stream._read_file_headers()
+        return stream
+
+    async def _read_file_headers(self) -> None:
+        while self.filename is None:
+            if not await self._feed():
+                raise AppException(AppErr.VALIDATION, "File is required")
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        while True:
+            while self._pending:
+                yield self._pending.popleft()
+            if self._file_done:
+                return
+            if not await self._feed():
+                raise AppException(AppErr.VALIDATION, "Incomplete file upload")
+
+    def _file_begin(self, filename: str, content_type: str) -> bool:
+        if self.filename is not None:
+            return False
+        self.filename = filename
+        self.content_type = content_type
+        return True
+
+    def _file_data(self, data: bytes) -> None:
+        self._pending.append(data)
+
+    def _file_end(self) -> None:
+        self._file_done = True
+
+
+class MultipartFile:
+    """
+    One file of a MultipartFilesStream. Consuming chunks() reads the request
+    body as far as this file's data goes, so files can be consumed one
+    after another or concurrently with reading the next ones.
+    """
+
+    def __init__(self, stream: "MultipartFilesStream", filename: str, content_type: str):
+        self.filename = filename
+        self.content_type = content_type
+        self._stream = stream
+        self._pending: deque[bytes] = deque()
+        self._done = asyncio.Event()
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        while True:
+            while self._pending:
+                yield self._pending.popleft()
+            if self._done.is_set():
+                return
+            if not await self._stream._read_more():
+                raise AppException(AppErr.VALIDATION, "Incomplete file upload")
+
+
+class MultipartFilesStream(_MultipartReader):
+    """
+    Streams every file of a repeated file field out of a multipart/form-data
+    request body, so each file can be consumed while later ones still arrive
+
+    files() yields each file once its headers are read, but only reads on
+    past a file after all of that file's data has been read; the body is
+    read on demand by whichever side needs more, one chunk at a time.
+    """
+
+    def __init__(self, body: AsyncIterator[bytes], boundary: bytes, field_name: str):
+        super().__init__(body, boundary, field_name)
+        self._read_lock = asyncio.Lock()
+        self._body_done = False
+        self._current: MultipartFile | None = None
+        self._new_files: deque[MultipartFile] = deque()
+
+    @classmethod
+    def open(cls, request: Request, field_name: str = "files") -> "MultipartFilesStream":
+        return cls(request.stream(), _request_boundary(request), field_name)
+
+    async def _read_more(self) -> bool:
+        """:returns False once the body is exhausted"""
+        async with self._read_lock:
+            if not self._body_done:
+                self._body_done = not await self._feed()
+            return not self._body_done
+
+    async def files(self) -> AsyncIterator[MultipartFile]:
+        received = 0
+        while True:
+            while self._new_files:
+                received += 1
+                yield self._new_files.popleft()
+            current = self._current
+            if current is not None and not current._done.is_set():
+                # the file's consumer reads its data, don't buffer it here
+                await current._done.wait()
+                continue
+            if not await self._read_more():
+                break
+        if not received:
+            raise AppException(AppErr.VALIDATION, "File is required")
+
+    def _file_begin(self, filename: str, content_type: str) -> bool:
+        self._current = MultipartFile(self, filename, content_type)
+        self._new_files.append(self._current)
+        return True
+
+    def _file_data(self, data: bytes) -> None:
+        self._file()._pending.append(data)
+
+    def _file_end(self) -> None:
+        self._file()._done.set()
+
+    def _file(self) -> MultipartFile:
+        if self._current is None:
+            # only reachable if the parser reports data outside a file part
+            raise AppException(AppErr.VALIDATION, "Malformed file upload")
+        return self._current
+
+
+async def file_upload_stream(request: Request) -> MultipartFileStream:
+    return await MultipartFileStream.open(request)
+
+
+def files_upload_stream(request: Request) -> MultipartFilesStream:
+    return MultipartFilesStream.open(request)
+
+
+FileUploadStream = Annotated[MultipartFileStream, Depends(file_upload_stream)]
+FilesUploadStream = Annotated[MultipartFilesStream, Depends(files_upload_stream)]
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app.dtos.response import BaseResponse
+from app.models.image import ImageSize
 
 
 class ImageUploadResponse(BaseResponse):
@@ -9,11 +10,66 @@ class ImageUploadResponse(BaseResponse):
     data: Data
 
 
+class ImagesUploadResponse(BaseResponse):
+    class Data(BaseModel):
+        image_urls: list[str]
+    data: Data
+
+
 class DeleteImageRequest(BaseModel):
     image_url: str
 
 
+class DeleteImagesRequest(BaseModel):
+    image_urls: list[str] = Field(min_length=1, max_length=100)
+
+
+class DeleteImagesResponse(BaseResponse):
+    class Item(BaseModel):
+        image_url: str
+        error: str | None = None
+
+    class Data(BaseModel):
+        results: list["DeleteImagesResponse.Item"]
+    data: Data
+
+
 class ImageDownloadURLResponse(BaseResponse):
     class Data(BaseModel):
         download_url: str
     data: Data
+
+
+class ImageUploadURLRequest(BaseModel):
+    file_name: str = Field(min_length=1, max_length=200)
+    content_type: str
+    size: int = Field(gt=0)
+
+
+class ImageUploadURLResponse(BaseResponse):
+    class Data(BaseModel):
+        url: str
+        fields: dict[str, str]
+        image_url: str
+        expires_in: int
+    data: Data
+
+
+class CompleteImageUploadRequest(BaseModel):
+    image_url: str
+
+
+class ImageDownloadURLsRequest(BaseModel):
+    image_urls: list[str] = Field(min_length=1, max_length=100)
+    size: ImageSize = ImageSize.Original
+
+
+class ImageDownloadURLsResponse(BaseResponse):
+    class Item(BaseModel):
+        image_url: str
+        download_url: str | None = None
+        error: str | None = None
+
+    class Data(BaseModel):
+        urls: list["ImageDownloadURLsResponse.Item"]
+    data: Data
@@ -12,6 +12,7 @@ class AppErr(enum.IntEnum):
     TOO_LARGE = 1008
     THROTTLE = 1009
     VALIDATION = 1010
+    UNAVAILABLE = 1011
 
     # Auth errors
     INVALID_USER_CREDENTIALS = 2001
@@ -39,6 +40,9 @@ class AppErr(enum.IntEnum):
     FAILED_TO_GET_DOWNLOAD_URL = 8005
     IMAGE_NOT_FOUND = 8006
     UNAUTHORIZED_IMAGE_ACCESS = 8007
+    IMAGE_TOO_LARGE = 8008
+    IMAGE_TYPE_NOT_ALLOWED = 8009
+    IMAGE_CONTENT_ALREADY_EXIST = 8010
     # bcrypt
     PASSWORD_TOO_LONG = 9001
     EMPTY_PASSWORD = 9002
@@ -48,5 +52,6 @@ class AppErr(enum.IntEnum):
     TOKEN_INVALID_AUDIENCE = 10003
     TOKEN_INVALID_ISSUER = 10004
     TOKEN_DECODE_ERROR = 10005
+    TOKEN_REVOKED = 10006
     # SQS errors
     SQS_SEND_MESSAGE_FAILED = 11001
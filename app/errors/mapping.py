@@ -10,6 +10,7 @@ ERROR_MAP: dict[AppErr, tuple[int, str]] = {
     AppErr.INTERNAL: (500, "Internal server error"),
     AppErr.THROTTLE: (429, "Too many requests"),
     AppErr.VALIDATION: (422, "Vaildation Error"),
+    AppErr.UNAVAILABLE: (503, "Service temporarily unavailable"),
 
     AppErr.INVALID_USER_CREDENTIALS: (401, "Invalid credentials"),
     AppErr.ADMIN_ONLY: (403, "Admin access only"),
@@ -36,6 +37,9 @@ ERROR_MAP: dict[AppErr, tuple[int, str]] = {
     AppErr.FAILED_TO_GET_DOWNLOAD_URL: (500, "Failed to get image download URL"),
     AppErr.IMAGE_NOT_FOUND: (404, "Image not found"),
     AppErr.UNAUTHORIZED_IMAGE_ACCESS: (401, "Unauthorized image access"),
+    AppErr.IMAGE_TOO_LARGE: (413, "Image is too large"),
+    AppErr.IMAGE_TYPE_NOT_ALLOWED: (415, "Unsupported image type"),
+    AppErr.IMAGE_CONTENT_ALREADY_EXIST: (409, "Image content already exists"),
 
     AppErr.PASSWORD_TOO_LONG: (400, "Password is too long, must be less than 72 characters."),
     AppErr.EMPTY_PASSWORD: (400, "Empty passwords not allowed"),
@@ -45,6 +49,7 @@ ERROR_MAP: dict[AppErr, tuple[int, str]] = {
     AppErr.TOKEN_INVALID_AUDIENCE: (401, "Invalid token audience"),
     AppErr.TOKEN_INVALID_ISSUER: (401, "Invalid token issuer"),
     AppErr.TOKEN_DECODE_ERROR: (401, "Invalid Token"),
+    AppErr.TOKEN_REVOKED: (401, "Token has been revoked"),
 
     AppErr.SQS_SEND_MESSAGE_FAILED: (500, "Failed to send message to SQS"),
 }
@@ -1,15 +1,61 @@
+import time
 import bcrypt
+from app import tracing
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
+from app.infra.bounded_executor import BoundedExecutor
 
+MIN_COST = 10
+MAX_COST = 16
+_CALIBRATION_COST = 8
 
+
+def calibrate_cost(time_budget: float,
+                   min_cost: int = MIN_COST,
+                   max_cost: int = MAX_COST) -> int:
+    """
+    Picks the highest bcrypt cost whose hash fits in time_budget seconds on
+    this CPU, never going below min_cost
+    """
+    salt = bcrypt.gensalt(_CALIBRATION_COST)
+    elapsed = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", salt)
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    cost = _CALIBRATION_COST
+    # each extra cost round doubles the work
+    while cost < max_cost and elapsed * 2 <= time_budget:
+        cost += 1
+        elapsed *= 2
+    return max(min_cost, cost)
+
+
+@tracing.traced
 class BcryptPasswordHasher:
-    def __init__(self, cost: int = 12):
+    """
+    bcrypt hashing runs on a dedicated executor so a login never blocks the
+    event loop for the ~250ms a cost-12 hash takes
+
+    A pinned cost is the deployment's choice: hashes of any other cost,
+    higher ones included, are rehashed to it. A calibrated cost only
+    upgrades lower ones.
+    """
+
+    def __init__(self,
+                 cost: int = 12,
+                 executor: BoundedExecutor | None = None,
+                 pinned: bool = False):
         self._cost = cost
+        self._executor = executor or BoundedExecutor("bcrypt")
+        self._pinned = pinned
 
-    def hash_password(self, password: str) -> str:
-        if not password or password == "":
-            raise AppException(AppErr.EMPTY_PASSWORD)
+    @property
+    def cost(self) -> int:
+        return self._cost
+
+    def _hash(self, password: str) -> str:
         try:
             return bcrypt.hashpw(
                 password.encode('utf-8'),
@@ -17,7 +63,28 @@ class BcryptPasswordHasher:
         except ValueError as err:
             raise AppException(AppErr.PASSWORD_TOO_LONG, cause=err)
 
-    def verify_password(self, password_hash: str, password: str) -> bool:
+    @staticmethod
+    def _verify(password_hash: str, password: str) -> bool:
         return bcrypt.checkpw(
             password.encode('utf-8'),
             password_hash.encode('utf-8'))
+
+    async def hash_password(self, password: str) -> str:
+        if not password or password == "":
+            raise AppException(AppErr.EMPTY_PASSWORD)
+        return await self._executor.run(self._hash, password)
+
+    async def verify_password(self, password_hash: str, password: str) -> bool:
+        return await self._executor.run(self._verify, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        # bcrypt hashes look like $2b$<cost>$<salt+hash>
+        try:
+            cost = int(password_hash.split("$")[2])
+        except (IndexError, ValueError):
+            return False
+        if self._pinned:
+            return cost != self._cost
+        # only upgrades: workers that calibrated a cost apart must not flip
+        # a user's hash back and forth on alternate logins
+        return cost < self._cost
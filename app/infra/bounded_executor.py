@@ -0,0 +1,95 @@
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, TypeVar
+from app import metrics, timing
+from app.errors.app_exception import AppException
+from app.errors.codes import AppErr
+
+T = TypeVar("T")
+
+_pending = metrics.REGISTRY.gauge(
+    "executor_pending_tasks",
+    "Tasks running or waiting on a dedicated executor",
+    ("executor",))
+_rejected = metrics.REGISTRY.counter(
+    "executor_rejected_total",
+    "Tasks rejected because the executor wait queue was full",
+    ("executor",))
+_queue_wait = metrics.REGISTRY.histogram(
+    "executor_queue_wait_seconds",
+    "Time tasks spent waiting for a free executor worker",
+    ("executor",))
+
+
+def _timed_call(fn: Callable[..., T], args: tuple) -> tuple[float, T]:
+    # module level so process pools can pickle it; wall clock time is
+    # comparable across processes, perf_counter isn't
+    return time.time(), fn(*args)
+
+
+class BoundedExecutor:
+    """
+    Dedicated thread pool for blocking or CPU heavy calls with admission control
+
+    At most max_workers calls run at once and at most max_queue_size more may
+    wait for a worker; anything beyond that fails fast with AppErr.UNAVAILABLE
+    instead of queueing without bound.
+
+    A process pool can be passed as executor for CPU heavy calls that would
+    hold the GIL; max_workers must then match its size, and fn and args
+    must be picklable.
+    """
+
+    def __init__(self,
+                 name: str,
+                 max_workers: int | None = None,
+                 max_queue_size: int = 32,
+                 executor: Executor | None = None):
+        self._name = name
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._capacity = self._max_workers + max_queue_size
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=self._max_workers, thread_name_prefix=name)
+        # only read/written from the event loop thread
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if self._pending >= self._capacity:
+            _rejected.inc(executor=self._name)
+            raise AppException(AppErr.UNAVAILABLE,
+                               "Server is busy, please try again later")
+
+        submitted_at = time.time()
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(_timed_call, fn, args)
+        self._pending += 1
+        _pending.set(self._pending, executor=self._name)
+        # released when the call itself is done, not when the caller stops
+        # waiting: a cancelled request doesn't stop a call that is running
+        future.add_done_callback(
+            lambda _: self._call_soon_threadsafe(loop, self._release))
+        with timing.measure(self._name):
+            started_at, result = await asyncio.wrap_future(future, loop=loop)
+        _queue_wait.observe(max(0.0, started_at - submitted_at), executor=self._name)
+        return result
+
+    @staticmethod
+    def _call_soon_threadsafe(loop: asyncio.AbstractEventLoop, callback: Callable[[], None]) -> None:
+        try:
+            loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            # the loop is closed, nobody is left to admit
+            pass
+
+    def _release(self) -> None:
+        self._pending -= 1
+        _pending.set(self._pending, executor=self._name)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,20 +1,166 @@
-from botocore.exceptions import ClientError
+import asyncio
+import logging
+import time
+from botocore.exceptions import BotoCoreError, ClientError
+from app import metrics, tracing
 from app.errors.codes import AppErr
 from app.models.notification import Notification
 from mypy_boto3_sqs import SQSClient
 from app.errors.app_exception import AppException
 
+logger = logging.getLogger(__name__)
 
+# SendMessageBatch accepts at most 10 entries per call
+SQS_MAX_BATCH_SIZE = 10
+
+_queue_depth = metrics.REGISTRY.gauge(
+    "notification_queue_depth",
+    "Notifications waiting to be published to SQS")
+_publish_latency = metrics.REGISTRY.histogram(
+    "notification_publish_seconds",
+    "Latency of SQS SendMessageBatch calls")
+_notifications = metrics.REGISTRY.counter(
+    "notifications_total",
+    "Notifications by publish result",
+    ("result",))
+
+
+@tracing.traced
 class EmailNotificationService:
-    def __init__(self, client: SQSClient, email_queue_url: str):
+    """
+    Publishes notifications to the email SQS queue from a background task
+
+    send_notification only puts the message on a bounded in-memory queue.
+    The sender task drains it with SendMessageBatch, flushing as soon as a
+    full batch is ready or flush_interval has passed since the first queued
+    message, and retries entries SQS failed on its side.
+    """
+
+    def __init__(self,
+                 client: SQSClient,
+                 email_queue_url: str,
+                 *,
+                 max_queue_size: int = 1000,
+                 batch_size: int = SQS_MAX_BATCH_SIZE,
+                 flush_interval: float = 0.5,
+                 max_attempts: int = 3,
+                 retry_backoff: float = 0.2):
         self._client = client
         self._email_queue_url = email_queue_url
+        self._batch_size = max(1, min(batch_size, SQS_MAX_BATCH_SIZE))
+        self._flush_interval = flush_interval
+        self._max_attempts = max_attempts
+        self._retry_backoff = retry_backoff
+        self._queue: asyncio.Queue[str] = asyncio.Queue(maxsize=max_queue_size)
+        self._sender: asyncio.Task | None = None
+        self._closing = False
+
+    def start(self) -> None:
+        if self._sender is None or self._sender.done():
+            self._sender = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """
+        Stops accepting notifications and waits (up to timeout seconds)
+        for the queued ones to be published
+        """
+        self._closing = True
+        if self._sender is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except TimeoutError:
+            logger.warning("dropping %d unsent notifications on shutdown",
+                           self._queue.qsize())
+        self._sender.cancel()
+        try:
+            await self._sender
+        except asyncio.CancelledError:
+            pass
+        self._sender = None
 
     async def send_notification(self, notification: Notification) -> None:
+        if self._closing:
+            raise AppException(AppErr.SQS_SEND_MESSAGE_FAILED,
+                               "Notification service is shutting down")
+        self.start()
         try:
-            self._client.send_message(
-                QueueUrl=self._email_queue_url,
-                MessageBody=notification.model_dump_json(exclude_none=True),
-            )
-        except ClientError as e:
-            raise AppException(AppErr.SQS_SEND_MESSAGE_FAILED, cause=e)
+            self._queue.put_nowait(
+                notification.model_dump_json(exclude_none=True))
+        except asyncio.QueueFull as err:
+            _notifications.inc(result="dropped")
+            raise AppException(AppErr.SQS_SEND_MESSAGE_FAILED,
+                               "Notification queue is full", cause=err)
+        _queue_depth.set(self._queue.qsize())
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect_batch()
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+                _queue_depth.set(self._queue.qsize())
+
+    async def _collect_batch(self) -> list[str]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self._flush_interval
+        while len(batch) < self._batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if self._closing or remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except TimeoutError:
+                break
+        return batch
+
+    async def _flush(self, bodies: list[str]) -> None:
+        pending = {str(idx): body for idx, body in enumerate(bodies)}
+        for attempt in range(1, self._max_attempts + 1):
+            pending = await self._send_batch(pending)
+            if not pending:
+                return
+            if attempt < self._max_attempts:
+                await asyncio.sleep(self._retry_backoff * 2 ** (attempt - 1))
+        logger.error("failed to publish %d notifications after %d attempts",
+                     len(pending), self._max_attempts)
+        _notifications.inc(len(pending), result="failed")
+
+    async def _send_batch(self, entries: dict[str, str]) -> dict[str, str]:
+        """
+        Sends one SendMessageBatch call
+        :returns entries which should be retried
+        """
+        start = time.perf_counter()
+        try:
+            response = await asyncio.to_thread(
+                lambda: self._client.send_message_batch(
+                    QueueUrl=self._email_queue_url,
+                    Entries=[
+                        {"Id": entry_id, "MessageBody": body}
+                        for entry_id, body in entries.items()
+                    ],
+                ))
+        except (ClientError, BotoCoreError) as err:
+            logger.warning("SendMessageBatch failed: %s", err)
+            return entries
+        finally:
+            _publish_latency.observe(time.perf_counter() - start)
+
+        _notifications.inc(len(response.get("Successful", [])), result="sent")
+        retry: dict[str, str] = {}
+        for failed in response.get("Failed", []):
+            if failed.get("SenderFault"):
+                # malformed entry, sending it again won't help
+                logger.error("SQS rejected notification: %s %s",
+                             failed.get("Code"), failed.get("Message", ""))
+                _notifications.inc(result="failed")
+            elif failed["Id"] in entries:
+                retry[failed["Id"]] = entries[failed["Id"]]
+        return retry
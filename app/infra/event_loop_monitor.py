@@ -0,0 +1,58 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from app import metrics
+
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_loop_lag = metrics.REGISTRY.histogram(
+    "event_loop_lag_seconds",
+    "Delay between when a loop callback was due and when it actually ran",
+    buckets=LAG_BUCKETS)
+_default_executor_queue = metrics.REGISTRY.gauge(
+    "default_executor_queued_tasks",
+    "asyncio.to_thread calls waiting for a free worker thread")
+
+
+def install_default_executor(max_workers: int | None = None) -> ThreadPoolExecutor:
+    """
+    Gives the running loop an explicit default executor, the pool behind
+    asyncio.to_thread and so behind every AWS call, and exports its backlog
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asyncio")
+    asyncio.get_running_loop().set_default_executor(executor)
+    # read at scrape time, SimpleQueue.qsize() takes no lock
+    _default_executor_queue.set_function(executor._work_queue.qsize)
+    return executor
+
+
+class EventLoopLagMonitor:
+    """
+    Periodically sleeps for interval seconds and records how late it woke up;
+    any lag means something blocked the event loop
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self._interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self._interval)
+            lag = loop.time() - started - self._interval
+            _loop_lag.observe(max(0.0, lag))
@@ -1,20 +1,40 @@
+import hashlib
 import time
+from typing import NamedTuple
+from uuid import uuid4
 import jwt
+from app import tracing
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
+from app.infra.token_revocation_list import TokenRevocationList
+from app.infra.ttl_cache import TTLCache
+from app.models.token import RevokedToken
 from app.models.user import UserClaims
 
 
+class _VerifiedToken(NamedTuple):
+    claims: UserClaims
+    token_id: str
+    expires_at: int
+
+
+@tracing.traced
 class JWTTokenProvider:
     def __init__(self,
                  jwt_secret: str,
                  issuer="https://api.watchexpense.com",
                  audience="https://api.watchexpense.com",
-                 algorithm="HS256"):
+                 algorithm="HS256",
+                 cache_size: int = 10_000,
+                 revocation_list: TokenRevocationList | None = None):
         self._jwt_secret = jwt_secret
         self._algorithm = algorithm
         self._issuer = issuer
         self._audience = audience
+        # verified claims keyed by token digest, each expiring with its token
+        self._verified = TTLCache[_VerifiedToken]("verified_tokens",
+                                                  max_size=cache_size)
+        self._revocation_list = revocation_list
 
     def generate_token(self, user_claims: UserClaims) -> str:
         claims = {
@@ -23,21 +43,53 @@ class JWTTokenProvider:
             "iat":     int(time.time()),
             "exp":     int(time.time()) + 86400,  # 24 hours
             "sub":     user_claims.user_id,
+            "jti":     uuid4().hex,
             **user_claims.model_dump(),
         }
         return jwt.encode(claims,
                           self._jwt_secret, algorithm=self._algorithm)
 
     def validate_token(self, token: str) -> UserClaims:
+        verified = self._verify(token)
+        if (verified.token_id and self._revocation_list is not None
+                and self._revocation_list.is_revoked(verified.token_id)):
+            raise AppException(AppErr.TOKEN_REVOKED)
+        return verified.claims
+
+    def revoke_token(self, token: str) -> RevokedToken | None:
+        verified = self._verify(token)
+        if not verified.token_id:
+            # issued before tokens carried a jti, it can only expire
+            return None
+        revoked_token = RevokedToken(
+            token_id=verified.token_id,
+            expires_at=verified.expires_at,
+            revoked_at=int(time.time() * 1000),
+        )
+        if self._revocation_list is not None:
+            self._revocation_list.add(revoked_token)
+        return revoked_token
+
+    def _verify(self, token: str) -> _VerifiedToken:
+        cache_key = hashlib.sha256(token.encode("utf-8")).digest()
+        cached = self._verified.get(cache_key)
+        if cached is not None:
+            return cached
         try:
             claims = jwt.decode(
                 token, self._jwt_secret,
                 algorithms=[self._algorithm],
                 audience=self._audience,
                 issuer=self._issuer,
+                options={"require": ["exp"]},
+            )
+            verified = _VerifiedToken(
+                UserClaims.model_validate(claims, extra="ignore"),
+                claims.get("jti", ""),
+                claims["exp"],
             )
-            user_claims = UserClaims.model_validate(claims, extra="ignore")
-            return user_claims
+            self._verified.set(cache_key, verified, expires_at=verified.expires_at)
+            return verified
         except jwt.ExpiredSignatureError as err:
             raise AppException(AppErr.TOKEN_EXPIRED, cause=err)
         except jwt.InvalidSignatureError as err:
@@ -0,0 +1,86 @@
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from app import metrics
+from app.errors.app_exception import AppException
+from app.errors.codes import AppErr
+from app.infra.bounded_executor import BoundedExecutor
+from app.models.image import DERIVATIVE_WIDTHS
+
+_rendered = metrics.REGISTRY.counter(
+    "image_derivatives_total",
+    "Image derivative renders by result",
+    ("result",))
+
+
+def render_derivatives(image: bytes, widths: dict[str, int], quality: int) -> dict[str, bytes]:
+    """
+    Decodes image once and encodes a WebP no wider than each of widths,
+    smaller renders are resized from the larger ones
+    :raises ValueError if image can't be decoded
+    """
+    # runs in the worker processes, the api process never loads PIL
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(io.BytesIO(image)) as source:
+            largest = max(widths.values())
+            # JPEG only: decode straight at a reduced scale
+            source.draft("RGB", (largest, largest * source.height // max(source.width, 1)))
+            img = ImageOps.exif_transpose(source)
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    except (OSError, Image.DecompressionBombError) as err:
+        raise ValueError(f"undecodable image: {err}") from err
+
+    renders: dict[str, bytes] = {}
+    for size, width in sorted(widths.items(), key=lambda item: -item[1]):
+        if img.width > width:
+            img = img.resize((width, max(1, img.height * width // img.width)),
+                             Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, format="WEBP", quality=quality, method=4)
+        renders[size] = out.getvalue()
+    return renders
+
+
+class PillowDerivativeGenerator:
+    """
+    Renders thumbnails and previews on a process pool, so decoding and
+    resizing large photos neither blocks the event loop nor competes for
+    the GIL with request handling
+
+    At most max_workers renders run at once and at most max_queue_size more
+    may wait; anything beyond that fails fast with AppErr.UNAVAILABLE.
+    """
+
+    def __init__(self,
+                 widths: dict[str, int] | None = None,
+                 quality: int = 80,
+                 max_workers: int | None = None,
+                 max_queue_size: int = 32):
+        self._widths = widths or {size.value: width for size, width in DERIVATIVE_WIDTHS.items()}
+        self._quality = quality
+        max_workers = max_workers or os.cpu_count() or 1
+        self._executor = BoundedExecutor(
+            "image_derivatives", max_workers, max_queue_size,
+            executor=ProcessPoolExecutor(
+                max_workers=max_workers,
+                # forking a process that already runs threads is unsafe
+                mp_context=multiprocessing.get_context("spawn")))
+
+    async def generate(self, image: bytes) -> dict[str, bytes]:
+        try:
+            renders = await self._executor.run(
+                render_derivatives, image, self._widths, self._quality)
+        except AppException:
+            _rendered.inc(result="rejected")
+            raise
+        except ValueError as err:
+            _rendered.inc(result="failed")
+            raise AppException(AppErr.IMAGE_TYPE_NOT_ALLOWED, str(err), cause=err)
+        _rendered.inc(result="ok")
+        return renders
+
+    def shutdown(self) -> None:
+        self._executor.shutdown()
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import time
+from array import array
+from typing import Callable
+from app import metrics
+
+_throttled = metrics.REGISTRY.counter(
+    "login_throttled_total",
+    "Login attempts rejected by the rate limiter",
+    ("reason",))
+
+
+class SlidingWindowCounter:
+    """
+    Approximate per-key hit counts over a sliding window in fixed memory
+
+    Counts live in a count-min sketch (depth rows of width counters) for the
+    current and the previous window; the previous window is weighted by how
+    much of it still overlaps the sliding window. Hash collisions can only
+    over-count, so a key is never allowed more than the limit. Size width to
+    at least the distinct keys expected per window: past that, keys share
+    counters and innocent keys start to look busy.
+    """
+
+    def __init__(self,
+                 window: float,
+                 width: int = 4096,
+                 depth: int = 4,
+                 clock: Callable[[], float] = time.monotonic):
+        self._window = window
+        self._width = width
+        self._depth = depth
+        self._clock = clock
+        # random per-process key so colliding keys can't be precomputed
+        self._hash_key = os.urandom(16)
+        self._current = array("I", bytes(4 * width * depth))
+        self._previous = array("I", bytes(4 * width * depth))
+        self._window_start = clock()
+
+    def _rotate(self, now: float) -> None:
+        elapsed_windows = int((now - self._window_start) // self._window)
+        if elapsed_windows <= 0:
+            return
+        if elapsed_windows == 1:
+            self._previous, self._current = self._current, self._previous
+        else:
+            self._previous = array("I", bytes(4 * self._width * self._depth))
+        self._current = array("I", bytes(4 * self._width * self._depth))
+        self._window_start += elapsed_windows * self._window
+
+    def _slots(self, key: str) -> list[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"),
+                                 digest_size=4 * self._depth,
+                                 key=self._hash_key).digest()
+        return [
+            row * self._width
+            + int.from_bytes(digest[4 * row:4 * row + 4], "little") % self._width
+            for row in range(self._depth)
+        ]
+
+    def hit(self, key: str, limit: float = float("inf")) -> float:
+        """
+        Records one hit for key, unless that takes it over limit
+        :returns estimated hits for key in the last window, including this one
+        """
+        now = self._clock()
+        self._rotate(now)
+        prev_weight = 1 - (now - self._window_start) / self._window
+        slots = self._slots(key)
+        estimate = 1 + min(self._current[slot] + self._previous[slot] * prev_weight
+                           for slot in slots)
+        if estimate > limit:
+            # rejected hits aren't recorded, a flood of them would push the
+            # counters the key shares with others over the limit as well
+            return estimate
+        # conservative update: raise the counters only as far as this key's
+        # own count, so colliding keys don't add up on every row
+        count = 1 + min(self._current[slot] for slot in slots)
+        for slot in slots:
+            if self._current[slot] < count:
+                self._current[slot] = count
+        return estimate
+
+
+class LoginRateLimiter:
+    """
+    Throttles login attempts per email and per client IP before any
+    password hashing or database work is done
+
+    expected_keys is the number of distinct emails (and IPs) to tell apart
+    per window, credential stuffing sprays included; every counter takes up
+    to 64 bytes per expected key.
+    """
+
+    def __init__(self,
+                 per_email_limit: int = 10,
+                 per_ip_limit: int = 30,
+                 window: float = 60.0,
+                 expected_keys: int = 50_000,
+                 clock: Callable[[], float] = time.monotonic):
+        self._per_email_limit = per_email_limit
+        self._per_ip_limit = per_ip_limit
+        width = 1 << (max(expected_keys, 2) - 1).bit_length()
+        self._by_email = SlidingWindowCounter(window, width=width, clock=clock)
+        self._by_ip = SlidingWindowCounter(window, width=width, clock=clock)
+
+    def allow(self, email: str, client_ip: str | None) -> bool:
+        email_hits = self._by_email.hit(email.strip().lower(), self._per_email_limit)
+        ip_hits = self._by_ip.hit(client_ip, self._per_ip_limit) if client_ip else 0
+        if email_hits > self._per_email_limit:
+            _throttled.inc(reason="email")
+            return False
+        if ip_hits > self._per_ip_limit:
+            _throttled.inc(reason="ip")
+            return False
+        return True
@@ -1,20 +1,117 @@
+import base64
+import functools
+import hashlib
 import uuid
 import asyncio
-from typing import IO
+from typing import AsyncIterator, Awaitable, Callable
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from mypy_boto3_s3 import S3Client
+from app import tracing
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
+from app.models.image import SNIFF_LENGTH, PresignedUpload, StoredImageInfo
 
+MB = 1024 * 1024
 
+DELETE_OBJECTS_LIMIT = 1000
+
+# hex SHA-256 of an upload -> url of an identical stored image, if any
+FindDuplicate = Callable[[str], Awaitable[str | None]]
+
+# receipts are mostly well under the multipart threshold; larger PDFs go up
+# in 8MB parts, a few at a time
+DEFAULT_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * MB,
+    multipart_chunksize=8 * MB,
+    max_concurrency=4,
+    use_threads=True,
+)
+
+
+def _sha256_b64(data: bytes) -> str:
+    return base64.b64encode(hashlib.sha256(data).digest()).decode("ascii")
+
+
+async def _split_parts(chunks: AsyncIterator[bytes],
+                       buffer: bytearray,
+                       content_hash: "hashlib._Hash",
+                       part_size: int) -> AsyncIterator[bytes]:
+    """
+    Cuts buffer and the chunks still to come into parts of part_size, the
+    last one possibly shorter, hashing the chunks as they are read
+    """
+    while True:
+        while len(buffer) >= part_size:
+            part = bytes(buffer[:part_size])
+            del buffer[:part_size]
+            yield part
+        chunk = await anext(chunks, None)
+        if chunk is None:
+            break
+        content_hash.update(chunk)
+        buffer += chunk
+    if buffer:
+        yield bytes(buffer)
+
+
+class _PartUploader:
+    """
+    Uploads multipart parts on worker threads, at most max_in_flight at a
+    time; submit() waits for a free slot, which stops reading the request
+    while enough parts are in flight
+    """
+
+    def __init__(self, upload_part: Callable[[int, bytes], dict], max_in_flight: int):
+        self._upload_part = upload_part
+        self._max_in_flight = max_in_flight
+        self._in_flight: set[asyncio.Task] = set()
+        self._parts: list[dict] = []
+
+    async def _wait(self, max_pending: int) -> None:
+        while len(self._in_flight) > max_pending:
+            done, _ = await asyncio.wait(
+                self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                self._in_flight.discard(task)
+                self._parts.append(task.result())
+
+    async def submit(self, data: bytes) -> None:
+        await self._wait(self._max_in_flight - 1)
+        part_number = len(self._parts) + len(self._in_flight) + 1
+        self._in_flight.add(asyncio.create_task(asyncio.to_thread(
+            self._upload_part, part_number, data)))
+
+    async def finish(self) -> list[dict]:
+        """:returns the uploaded parts in order"""
+        await self._wait(0)
+        return sorted(self._parts, key=lambda part: part["PartNumber"])
+
+    def cancel(self) -> None:
+        for task in self._in_flight:
+            task.cancel()
+
+
+@tracing.traced
 class S3ImageStore:
-    def __init__(self, bucket_name: str, client: S3Client):
+    def __init__(self,
+                 bucket_name: str,
+                 client: S3Client,
+                 transfer_config: TransferConfig = DEFAULT_TRANSFER_CONFIG,
+                 upload_url_expiry: int = 300,
+                 download_url_expiry: int = 300):
         self._bucket_name = bucket_name
         self._client = client
+        self._transfer_config = transfer_config
+        self._upload_url_expiry = upload_url_expiry
+        self._download_url_expiry = download_url_expiry
 
     def _build_obj_url(self, obj_key: str) -> str:
         return f"https://{self._bucket_name}.s3.amazonaws.com/{obj_key}"
 
+    def get_object_key(self, image_url: str) -> str:
+        return self._get_obj_key_from_url(image_url)
+
     def _get_obj_key_from_url(self, image_url: str) -> str:
         prefix = f"https://{self._bucket_name}.s3.amazonaws.com/"
         key = image_url[len(prefix):]
@@ -22,17 +119,137 @@ class S3ImageStore:
             raise AppException(AppErr.IMAGE_URL_INVALID)
         return key
 
-    async def upload_image(self, name: str, image: IO) -> str:
+    async def upload_image_stream(self,
+                                  name: str,
+                                  content_type: str,
+                                  chunks: AsyncIterator[bytes],
+                                  find_duplicate: FindDuplicate | None = None) -> str:
+        """
+        Uploads chunks as they arrive: small files with a single PutObject,
+        larger ones as multipart parts of transfer_config.multipart_chunksize,
+        at most max_concurrency parts in flight. Every put carries a SHA-256
+        checksum that S3 verifies. A failed upload is aborted.
+
+        find_duplicate is called with the hex SHA-256 of the whole content
+        before the object is committed; when it returns an image url nothing
+        is stored (small files are never sent, multipart uploads are
+        aborted) and that url is returned instead.
+        """
+        obj_key = f"{uuid.uuid4().hex}_{name}"
+        content_hash = hashlib.sha256()
+        part_size = self._transfer_config.multipart_chunksize
+        buffer = bytearray()
+        chunks = aiter(chunks)
+        async for chunk in chunks:
+            content_hash.update(chunk)
+            buffer += chunk
+            if len(buffer) >= part_size:
+                return await self._upload_multipart(
+                    obj_key, content_type, chunks, buffer, content_hash, find_duplicate)
+        return await self._put_object(
+            obj_key, content_type, bytes(buffer), content_hash, find_duplicate)
+
+    async def _put_object(self,
+                          obj_key: str,
+                          content_type: str,
+                          body: bytes,
+                          content_hash: "hashlib._Hash",
+                          find_duplicate: FindDuplicate | None) -> str:
+        if find_duplicate is not None:
+            duplicate_url = await find_duplicate(content_hash.hexdigest())
+            if duplicate_url is not None:
+                return duplicate_url
         try:
-            obj_key = f"{uuid.uuid4().hex}_{name}"
-            await asyncio.to_thread(lambda: self._client.upload_fileobj(
-                Fileobj=image,
+            await asyncio.to_thread(lambda: self._client.put_object(
                 Bucket=self._bucket_name,
                 Key=obj_key,
+                Body=body,
+                ContentType=content_type,
+                ChecksumSHA256=base64.b64encode(content_hash.digest()).decode("ascii"),
             ))
-            return self._build_obj_url(obj_key)
         except ClientError as e:
             raise AppException(AppErr.IMAGE_UPLOAD_FAILED, cause=e)
+        return self._build_obj_url(obj_key)
+
+    async def _upload_multipart(self,
+                                obj_key: str,
+                                content_type: str,
+                                chunks: AsyncIterator[bytes],
+                                buffer: bytearray,
+                                content_hash: "hashlib._Hash",
+                                find_duplicate: FindDuplicate | None) -> str:
+        """
+        Continues an upload whose buffered first bytes already fill a part;
+        every part is hashed into content_hash as it is read
+        """
+        try:
+            upload_id = await self._create_multipart_upload(obj_key, content_type)
+        except ClientError as e:
+            raise AppException(AppErr.IMAGE_UPLOAD_FAILED, cause=e)
+        uploader = _PartUploader(
+            functools.partial(self._upload_part, obj_key, upload_id),
+            self._transfer_config.max_concurrency)
+        try:
+            async for part in _split_parts(
+                    chunks, buffer, content_hash, self._transfer_config.multipart_chunksize):
+                await uploader.submit(part)
+            parts = await uploader.finish()
+            if find_duplicate is not None:
+                duplicate_url = await find_duplicate(content_hash.hexdigest())
+                if duplicate_url is not None:
+                    await self._abort_multipart_upload(obj_key, upload_id)
+                    return duplicate_url
+            await asyncio.to_thread(lambda: self._client.complete_multipart_upload(
+                Bucket=self._bucket_name,
+                Key=obj_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            ))
+            return self._build_obj_url(obj_key)
+        except BaseException as e:
+            uploader.cancel()
+            await self._abort_multipart_upload(obj_key, upload_id)
+            if isinstance(e, ClientError):
+                raise AppException(AppErr.IMAGE_UPLOAD_FAILED, cause=e)
+            raise
+
+    async def _create_multipart_upload(self, obj_key: str, content_type: str) -> str:
+        response = await asyncio.to_thread(lambda: self._client.create_multipart_upload(
+            Bucket=self._bucket_name,
+            Key=obj_key,
+            ContentType=content_type,
+            ChecksumAlgorithm="SHA256",
+        ))
+        return response["UploadId"]
+
+    def _upload_part(self, obj_key: str, upload_id: str, part_number: int, data: bytes) -> dict:
+        # runs on a worker thread, so hashing doesn't hold up the event loop
+        checksum = _sha256_b64(data)
+        response = self._client.upload_part(
+            Bucket=self._bucket_name,
+            Key=obj_key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=data,
+            ChecksumAlgorithm="SHA256",
+            ChecksumSHA256=checksum,
+        )
+        return {
+            "PartNumber": part_number,
+            "ETag": response["ETag"],
+            "ChecksumSHA256": checksum,
+        }
+
+    async def _abort_multipart_upload(self, obj_key: str, upload_id: str) -> None:
+        try:
+            await asyncio.to_thread(lambda: self._client.abort_multipart_upload(
+                Bucket=self._bucket_name,
+                Key=obj_key,
+                UploadId=upload_id,
+            ))
+        except ClientError:
+            # parts left behind are cleaned up by the bucket lifecycle rule
+            pass
 
     async def delete_image(self, image_url: str) -> None:
         try:
@@ -49,16 +266,158 @@ class S3ImageStore:
     async def get_image_download_url(self, image_url: str) -> str:
         try:
             obj_key = self._get_obj_key_from_url(image_url)
-            presigned_url = await asyncio.to_thread(lambda: self._client.generate_presigned_url(
+            # presigning is a local HMAC, cheaper than a thread hop
+            presigned_url = self._client.generate_presigned_url(
                 ClientMethod='get_object',
                 Params={
                     'Bucket': self._bucket_name,
                     'Key': obj_key,
                 },
-                ExpiresIn=60,  # URL valid for 1 minute
-            ))
+                ExpiresIn=self._download_url_expiry,
+            )
             return presigned_url
         except self._client.exceptions.NoSuchKey:
             raise AppException(AppErr.IMAGE_NOT_FOUND)
         except ClientError as e:
             raise AppException(AppErr.FAILED_TO_GET_DOWNLOAD_URL, cause=e)
+
+    async def create_presigned_upload(self,
+                                      key_prefix: str,
+                                      name: str,
+                                      content_type: str,
+                                      max_size: int) -> PresignedUpload:
+        """
+        Presigns a browser POST straight to S3 for one object under
+        key_prefix; S3 itself enforces the key, content type and size
+        """
+        obj_key = f"{key_prefix}{uuid.uuid4().hex}_{name}"
+        try:
+            # signing is local CPU work, no request is made
+            presigned = self._client.generate_presigned_post(
+                Bucket=self._bucket_name,
+                Key=obj_key,
+                Fields={"Content-Type": content_type},
+                Conditions=[
+                    {"Content-Type": content_type},
+                    ["starts-with", "$key", key_prefix],
+                    ["content-length-range", 1, max_size],
+                ],
+                ExpiresIn=self._upload_url_expiry,
+            )
+        except ClientError as e:
+            raise AppException(AppErr.IMAGE_UPLOAD_FAILED, cause=e)
+        return PresignedUpload(
+            url=presigned["url"],
+            fields=presigned["fields"],
+            image_url=self._build_obj_url(obj_key),
+            expires_in=self._upload_url_expiry,
+        )
+
+    async def get_image_info(self, image_url: str) -> StoredImageInfo:
+        obj_key = self._get_obj_key_from_url(image_url)
+        try:
+            head = await asyncio.to_thread(lambda: self._client.head_object(
+                Bucket=self._bucket_name,
+                Key=obj_key,
+            ))
+            leading_bytes = b""
+            if head["ContentLength"] > 0:
+                response = await asyncio.to_thread(lambda: self._client.get_object(
+                    Bucket=self._bucket_name,
+                    Key=obj_key,
+                    Range=f"bytes=0-{SNIFF_LENGTH - 1}",
+                ))
+                leading_bytes = response["Body"].read()
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code", "")
+            if code in ("404", "NoSuchKey", "NotFound"):
+                raise AppException(AppErr.IMAGE_NOT_FOUND, cause=e)
+            raise AppException(AppErr.INTERNAL, "Failed to read image", cause=e)
+        last_modified = head.get("LastModified")
+        return StoredImageInfo(
+            size=head["ContentLength"],
+            content_type=head.get("ContentType", ""),
+            leading_bytes=leading_bytes,
+            last_modified=int(last_modified.timestamp() * 1000) if last_modified else 0,
+        )
+
+    async def delete_images(self, image_urls: list[str], max_concurrency: int = 4) -> list[str]:
+        """
+        Deletes objects with DeleteObjects, 1000 keys per call and at most
+        max_concurrency calls in flight; missing objects count as deleted
+        :returns urls that could not be deleted
+        """
+        obj_keys = [self._get_obj_key_from_url(url) for url in image_urls]
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def delete_chunk(chunk: list[str]) -> list[str]:
+            async with semaphore:
+                try:
+                    response = await asyncio.to_thread(lambda: self._client.delete_objects(
+                        Bucket=self._bucket_name,
+                        Delete={"Objects": [{"Key": key} for key in chunk], "Quiet": True},
+                    ))
+                except ClientError:
+                    return chunk
+                return [error["Key"] for error in response.get("Errors", [])]
+
+        failed = await asyncio.gather(*(
+            delete_chunk(obj_keys[start:start + DELETE_OBJECTS_LIMIT])
+            for start in range(0, len(obj_keys), DELETE_OBJECTS_LIMIT)
+        ))
+        return [self._build_obj_url(key) for chunk in failed for key in chunk]
+
+    async def list_images(self, prefix: str) -> AsyncIterator[tuple[str, int]]:
+        """
+        Lists stored objects under a key prefix, a page of up to 1000 at a time
+        :returns (url, last modified as epoch ms) pairs
+        """
+        list_input: dict = {"Bucket": self._bucket_name, "Prefix": prefix}
+        while True:
+            try:
+                response = await asyncio.to_thread(
+                    lambda: self._client.list_objects_v2(**list_input))
+            except ClientError as e:
+                raise AppException(AppErr.INTERNAL, "Failed to list images", cause=e)
+            for obj in response.get("Contents", []):
+                yield (self._build_obj_url(obj["Key"]),
+                       int(obj["LastModified"].timestamp() * 1000))
+            if not response.get("IsTruncated"):
+                return
+            list_input["ContinuationToken"] = response["NextContinuationToken"]
+
+    async def download_image(self, image_url: str) -> bytes:
+        obj_key = self._get_obj_key_from_url(image_url)
+        try:
+            response = await asyncio.to_thread(lambda: self._client.get_object(
+                Bucket=self._bucket_name,
+                Key=obj_key,
+            ))
+            return await asyncio.to_thread(response["Body"].read)
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code", "")
+            if code in ("404", "NoSuchKey", "NotFound"):
+                raise AppException(AppErr.IMAGE_NOT_FOUND, cause=e)
+            raise AppException(AppErr.INTERNAL, "Failed to read image", cause=e)
+
+    async def upload_derivative(self,
+                                image_url: str,
+                                size: str,
+                                content_type: str,
+                                data: bytes) -> str:
+        """
+        Stores a resized copy next to the original object
+        :returns image url of the derivative
+        """
+        obj_key = f"{self._get_obj_key_from_url(image_url)}.{size}"
+        try:
+            await asyncio.to_thread(lambda: self._client.put_object(
+                Bucket=self._bucket_name,
+                Key=obj_key,
+                Body=data,
+                ContentType=content_type,
+                ChecksumSHA256=_sha256_b64(data),
+            ))
+        except ClientError as e:
+            raise AppException(AppErr.IMAGE_UPLOAD_FAILED, cause=e)
+        return self._build_obj_url(obj_key)
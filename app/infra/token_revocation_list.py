@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from typing import Callable
+from app import metrics
+from app.errors.app_exception import AppException
+from app.interfaces.revoked_token_repository import RevokedTokenRepository
+from app.models.token import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+_revoked_tokens = metrics.REGISTRY.gauge(
+    "revoked_tokens",
+    "Unexpired revoked token ids held in memory")
+
+
+class BloomFilter:
+    """
+    Fixed size bloom filter over string keys, sized for capacity keys at
+    the given false positive rate
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float = 0.01):
+        self._capacity = capacity
+        bits = math.ceil(-capacity * math.log(false_positive_rate)
+                         / math.log(2) ** 2)
+        self._num_bits = max(8, bits)
+        self._num_hashes = max(1, round(self._num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self._num_bits + 7) // 8)
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def _positions(self, key: str) -> list[int]:
+        # double hashing: h1 + i*h2 gives k independent enough positions
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self._num_bits for i in range(self._num_hashes)]
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7))
+                   for pos in self._positions(key))
+
+
+class TokenRevocationList:
+    """
+    Per worker, in memory view of revoked token ids
+
+    Lookups never do I/O: a bloom filter answers the common "not revoked"
+    case and an exact map of token id -> expiry confirms the rest. A
+    background task pulls revocations made by any worker since the last
+    refresh and drops ids whose tokens have expired anyway.
+    """
+
+    def __init__(self,
+                 repository: RevokedTokenRepository,
+                 refresh_interval: float = 5.0,
+                 capacity: int = 10_000,
+                 clock: Callable[[], float] = time.time):
+        self._repository = repository
+        self._refresh_interval = refresh_interval
+        self._clock = clock
+        self._revoked: dict[str, int] = {}
+        self._filter = BloomFilter(capacity)
+        self._last_refresh_ms = 0
+        self._task: asyncio.Task | None = None
+
+    def is_revoked(self, token_id: str) -> bool:
+        return token_id in self._filter and token_id in self._revoked
+
+    def add(self, revoked_token: RevokedToken) -> None:
+        if revoked_token.expires_at <= self._clock():
+            return
+        if revoked_token.token_id not in self._revoked:
+            self._revoked[revoked_token.token_id] = revoked_token.expires_at
+            if len(self._revoked) > self._filter.capacity:
+                self._rebuild_filter()
+            else:
+                self._filter.add(revoked_token.token_id)
+        _revoked_tokens.set(len(self._revoked))
+
+    def _rebuild_filter(self) -> None:
+        capacity = self._filter.capacity
+        while capacity < len(self._revoked) * 2:
+            capacity *= 2
+        bloom = BloomFilter(capacity)
+        for token_id in self._revoked:
+            bloom.add(token_id)
+        self._filter = bloom
+
+    def _prune_expired(self) -> None:
+        now = self._clock()
+        expired = [tid for tid, exp in self._revoked.items() if exp <= now]
+        if not expired:
+            return
+        for token_id in expired:
+            del self._revoked[token_id]
+        # bloom filters can't delete, start a fresh one without the expired ids
+        self._rebuild_filter()
+        _revoked_tokens.set(len(self._revoked))
+
+    async def refresh(self) -> None:
+        started_ms = int(self._clock() * 1000)
+        # overlap the previous window so revocations written by other workers
+        # with slightly skewed clocks, or still in flight, are not missed
+        since = max(0, self._last_refresh_ms
+                    - int(self._refresh_interval * 1000) - 30_000)
+        revoked_tokens = await self._repository.get_revoked_since(since)
+        for revoked_token in revoked_tokens:
+            self.add(revoked_token)
+        self._prune_expired()
+        self._last_refresh_ms = started_ms
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._refresh_interval)
+            try:
+                await self.refresh()
+            except AppException as err:
+                logger.warning("token revocation refresh failed: %s",
+                               err.err_code.name)
+            except Exception:
+                # the loop must outlive any failure, or this worker stops
+                # seeing logouts from the others until it restarts
+                logger.exception("token revocation refresh failed")
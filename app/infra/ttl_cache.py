@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, TypeVar
+from app import metrics
+
+V = TypeVar("V")
+
+_cache_requests = metrics.REGISTRY.counter(
+    "cache_requests_total",
+    "In-memory cache lookups by cache and result",
+    ("cache", "result"))
+_cache_hit_ratio = metrics.REGISTRY.gauge(
+    "cache_hit_ratio",
+    "Share of in-memory cache lookups that were hits since startup",
+    ("cache",))
+_cache_entries = metrics.REGISTRY.gauge(
+    "cache_entries",
+    "Entries held by an in-memory cache",
+    ("cache",))
+
+
+class TTLCache(Generic[V]):
+    """
+    Bounded in-memory LRU cache whose entries expire individually
+
+    Entries expire either ttl seconds after they are set or at an absolute
+    expires_at timestamp (same clock), whichever is given. When full, the
+    least recently used entry is evicted.
+    """
+
+    def __init__(self,
+                 name: str,
+                 max_size: int = 10_000,
+                 ttl: float | None = None,
+                 clock: Callable[[], float] = time.time):
+        self._name = name
+        self._max_size = max_size
+        self._ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, tuple[V, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        _cache_hit_ratio.set_function(self._hit_ratio, cache=name)
+        _cache_entries.set_function(self.__len__, cache=name)
+
+    def _hit_ratio(self) -> float:
+        hits = _cache_requests.value(cache=self._name, result="hit")
+        misses = _cache_requests.value(cache=self._name, result="miss")
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= self._clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                _cache_requests.inc(cache=self._name, result="miss")
+                return None
+            self._entries.move_to_end(key)
+        _cache_requests.inc(cache=self._name, result="hit")
+        return entry[0]
+
+    def set(self,
+            key: Hashable,
+            value: V,
+            *,
+            ttl: float | None = None,
+            expires_at: float | None = None) -> None:
+        if expires_at is None:
+            ttl = ttl if ttl is not None else self._ttl
+            expires_at = self._clock() + ttl if ttl is not None else float("inf")
+        if expires_at <= self._clock():
+            return
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
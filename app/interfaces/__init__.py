@@ -10,5 +10,8 @@ from .expense_repository import ExpenseRepository
 from .project_repository import ProjectRepository
 from .user_repository import UserRepository
 from .image_metadata_repository import ImageMetadataRepository
+from .revoked_token_repository import RevokedTokenRepository
 from .image_store import ImageStore
+from .image_derivative_generator import ImageDerivativeGenerator
 from .notification_service import NotificationService
+from .cache import Cache
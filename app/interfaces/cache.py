@@ -0,0 +1,23 @@
+from typing import Hashable, Protocol, TypeVar
+
+V = TypeVar("V")
+
+
+class Cache(Protocol[V]):
+    """
+    Cache interface/protocol for in-process caches
+    """
+
+    def get(self, key: Hashable) -> V | None:
+        """
+        :returns cached value or None on a miss or expired entry
+        """
+        ...
+
+    def set(self, key: Hashable, value: V, *, ttl: float | None = None) -> None:
+        """
+        :param ttl: seconds this entry lives instead of the cache's default
+        """
+        ...
+
+    def delete(self, key: Hashable) -> None: ...
@@ -7,6 +7,7 @@ class ExpenseRepository(Protocol):
     async def save(self, expense: Expense) -> None: ...
     async def get(self, expense_id: str) -> Expense | None: ...
     async def update(self, expense: Expense): ...
+    async def get_attachment_urls(self) -> set[str]: ...
 
     async def get_all(
         self, filterOptions: ExpensesFilterOptions
@@ -0,0 +1,16 @@
+from typing import Protocol
+
+
+class ImageDerivativeGenerator(Protocol):
+    """
+    ImageDerivativeGenerator interface/protocol
+    """
+
+    async def generate(self, image: bytes) -> dict[str, bytes]:
+        """
+        Renders the resized derivatives of an image
+        :returns encoded derivative by ImageSize value
+        :raises AppException(UNAVAILABLE) when rendering capacity is exhausted
+        :raises AppException(IMAGE_TYPE_NOT_ALLOWED) when image can't be decoded
+        """
+        ...
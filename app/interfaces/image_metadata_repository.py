@@ -1,4 +1,4 @@
-from typing import Protocol
+from typing import AsyncIterator, Protocol
 
 from app.models.image import ImageMetadata
 
@@ -6,7 +6,31 @@ from app.models.image import ImageMetadata
 class ImageMetadataRepository(Protocol):
     async def save(
         self, image_url: str, metadata: ImageMetadata) -> None: ...
+
+    async def save_many(
+        self, images: dict[str, ImageMetadata]) -> None: ...
+
     async def get(
         self, image_url: str) -> ImageMetadata | None: ...
 
+    async def get_many(
+        self, image_urls: list[str]) -> dict[str, ImageMetadata]: ...
+
+    async def set_derivatives(
+        self, image_url: str, derivatives: dict[str, str]) -> None: ...
+
+    async def add_content_reference(
+        self, user_id: str, content_hash: str) -> str | None: ...
+
+    async def remove_reference(
+        self, image_url: str, metadata: ImageMetadata) -> bool: ...
+
+    async def remove_references(
+        self, images: dict[str, ImageMetadata]) -> list[str]: ...
+
     async def delete(self, image_url: str) -> None: ...
+
+    def iter_all(self) -> AsyncIterator[tuple[str, ImageMetadata]]: ...
+
+    async def delete_many(
+        self, images: dict[str, ImageMetadata]) -> None: ...
@@ -1,7 +1,39 @@
-from typing import IO, Protocol
+from typing import AsyncIterator, Awaitable, Callable, Protocol
+
+from app.models.image import PresignedUpload, StoredImageInfo
 
 
 class ImageStore(Protocol):
-    async def upload_image(self, name: str, image: IO) -> str: ...
+    async def upload_image_stream(
+        self,
+        name: str,
+        content_type: str,
+        chunks: AsyncIterator[bytes],
+        find_duplicate: Callable[[str], Awaitable[str | None]] | None = None) -> str: ...
+
     async def delete_image(self, image_url: str) -> None: ...
     async def get_image_download_url(self, image_url: str) -> str: ...
+
+    def get_object_key(self, image_url: str) -> str: ...
+
+    async def create_presigned_upload(
+        self,
+        key_prefix: str,
+        name: str,
+        content_type: str,
+        max_size: int) -> PresignedUpload: ...
+
+    async def get_image_info(self, image_url: str) -> StoredImageInfo: ...
+
+    async def delete_images(self, image_urls: list[str]) -> list[str]: ...
+
+    def list_images(self, prefix: str) -> AsyncIterator[tuple[str, int]]: ...
+
+    async def download_image(self, image_url: str) -> bytes: ...
+
+    async def upload_derivative(
+        self,
+        image_url: str,
+        size: str,
+        content_type: str,
+        data: bytes) -> str: ...
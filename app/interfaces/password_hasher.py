@@ -6,16 +6,26 @@ class PasswordHasher(Protocol):
     PasswordHasher interface/protocol
     """
 
-    def hash_password(self, password: str) -> str:
+    async def hash_password(self, password: str) -> str:
         """
         Hashes a input password string
         :returns password hash string
+        :raises AppException(UNAVAILABLE) when hashing capacity is exhausted
         """
         ...
 
-    def verify_password(self, password_hash: str, password: str) -> bool:
+    async def verify_password(self, password_hash: str, password: str) -> bool:
         """
         Verifies the input password to the provided password_hash
         :returns password hash string
+        :raises AppException(UNAVAILABLE) when hashing capacity is exhausted
+        """
+        ...
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """
+        Checks whether password_hash was made with different parameters
+        (e.g. bcrypt cost) than new hashes would use
+        :returns True if the password should be hashed again
         """
         ...
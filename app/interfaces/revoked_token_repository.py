@@ -0,0 +1,10 @@
+from typing import Protocol
+
+from app.models.token import RevokedToken
+
+
+class RevokedTokenRepository(Protocol):
+    async def save(self, revoked_token: RevokedToken) -> None: ...
+
+    async def get_revoked_since(
+        self, revoked_at: int) -> list[RevokedToken]: ...
@@ -1,5 +1,6 @@
 from typing import Protocol
 
+from app.models.token import RevokedToken
 from app.models.user import UserClaims
 
 
@@ -19,5 +20,13 @@ class TokenProvider(Protocol):
         """
         Validates token string and parses the token claims
         :returns token claims
+        :raises AppException(TOKEN_REVOKED) if the token was logged out
+        """
+        ...
+
+    def revoke_token(self, token: str) -> RevokedToken | None:
+        """
+        Validates token string and revokes it on this process
+        :returns revocation record to persist, None if the token can't be revoked
         """
         ...
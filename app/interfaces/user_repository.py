@@ -10,3 +10,4 @@ class UserRepository(Protocol):
     async def get_all(self) -> list[User]: ...
     async def delete(self, user_id: str) -> None: ...
     async def update(self, user: User) -> None: ...
+    async def update_password_hash(self, user: User, password_hash: str) -> None: ...
@@ -1,11 +1,18 @@
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 import boto3
+from boto3.s3.transfer import TransferConfig
 from mypy_boto3_dynamodb.service_resource import DynamoDBServiceResource
 from mypy_boto3_s3 import S3Client
 from mypy_boto3_sqs import SQSClient
 
+from app import consumed_capacity, timing, tracing
 from app.config import load_config
+from app.errors.app_exception import AppException
+from app.models.image import ImageMetadata
+from app.models.user import User
 
 from app.repository.department_repository import DepartmentRepository
 from app.repository.expense_repository import ExpenseRepository
@@ -13,6 +20,8 @@ from app.repository.advance_repository import AdvanceRepository
 from app.repository.user_repository import UserRepository
 from app.repository.project_repository import ProjectRepository
 from app.repository.image_metadata_repository import ImageMetadataRepository
+from app.repository.revoked_token_repository import RevokedTokenRepository
+from app.repository.utils import log_slow_call, set_slow_query_threshold
 
 from app.services.auth import AuthService
 from app.services.image import ImageService
@@ -22,16 +31,39 @@ from app.services.department import DepartmentService
 from app.services.expense import ExpenseService
 from app.services.advance import AdvanceService
 
-from app.infra.bcrypt_password_hasher import BcryptPasswordHasher
+from app.infra.bcrypt_password_hasher import BcryptPasswordHasher, calibrate_cost
+from app.infra.bounded_executor import BoundedExecutor
+from app.infra.event_loop_monitor import EventLoopLagMonitor, install_default_executor
 from app.infra.jwt_token_provider import JWTTokenProvider
+from app.infra.pillow_derivative_generator import PillowDerivativeGenerator
+from app.infra.rate_limiter import LoginRateLimiter
 from app.infra.s3_image_store import S3ImageStore
+from app.infra.token_revocation_list import TokenRevocationList
+from app.infra.ttl_cache import TTLCache
 from app.infra.email_notification_service import EmailNotificationService
 
+logger = logging.getLogger(__name__)
+
+# service.name of exported spans
+SERVICE_NAME = "watch-expense-py"
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # project config from env
     config = load_config()
+    install_default_executor()
+
+    # tracing
+    span_processor = None
+    if config.tracing_exporter:
+        span_exporter = (
+            tracing.OTLPSpanExporter(config.tracing_otlp_endpoint, SERVICE_NAME)
+            if config.tracing_exporter == "otlp"
+            else tracing.FileSpanExporter(config.tracing_file, SERVICE_NAME))
+        span_processor = tracing.SpanProcessor(span_exporter)
+        span_processor.start()
+        tracing.configure(span_processor, config.tracing_sample_rate)
 
     # boto3 session
     session = boto3.Session(region_name=config.aws_region)
@@ -40,6 +72,7 @@ async def lifespan(app: FastAPI):
     dynamodb_resource: DynamoDBServiceResource = session.resource("dynamodb")
     table_name = config.dynamodb_table
     ddb_table = dynamodb_resource.Table(table_name)
+    set_slow_query_threshold(config.slow_query_threshold_ms / 1000)
 
     # s3
     bucket_name = config.s3_bucket_name
@@ -49,40 +82,119 @@ async def lifespan(app: FastAPI):
     queue_url = config.email_queue_url
     sqs_client: SQSClient = session.client("sqs")
 
+    timing.instrument_client(dynamodb_resource.meta.client, on_call=log_slow_call)
+    for client in (s3_client, sqs_client):
+        timing.instrument_client(client)
+    consumed_capacity.instrument_client(dynamodb_resource.meta.client)
+
     # repos
     user_repo = UserRepository(ddb_table, table_name)
     project_repo = ProjectRepository(ddb_table, table_name)
     department_repo = DepartmentRepository(ddb_table, table_name)
     expense_repo = ExpenseRepository(ddb_table, table_name)
     advance_repo = AdvanceRepository(ddb_table, table_name)
-    image_metadata_repo = ImageMetadataRepository(ddb_table, table_name)
+    image_metadata_repo = ImageMetadataRepository(
+        ddb_table, table_name, legacy_reads=config.image_metadata_legacy_reads)
+    revoked_token_repo = RevokedTokenRepository(ddb_table, table_name)
 
     # infra
+    token_revocation_list = TokenRevocationList(
+        revoked_token_repo,
+        refresh_interval=config.token_revocation_refresh_interval,
+    )
+    try:
+        await token_revocation_list.refresh()
+    except AppException as err:
+        logger.warning("initial token revocation load failed: %s",
+                       err.err_code.name)
+    except Exception:
+        # the refresh loop retries, don't fail startup over it
+        logger.exception("initial token revocation load failed")
     token_provider = JWTTokenProvider(
         jwt_secret=config.jwt_secret,
         issuer=config.jwt_issuer,
         audience=config.jwt_audience,
+        revocation_list=token_revocation_list,
+    )
+    password_hash_executor = BoundedExecutor(
+        "bcrypt",
+        max_workers=config.password_hash_workers or None,
+        max_queue_size=config.password_hash_queue_size,
+    )
+    bcrypt_cost = config.bcrypt_cost
+    if not bcrypt_cost:
+        bcrypt_cost = await asyncio.to_thread(
+            calibrate_cost, config.bcrypt_time_budget_ms / 1000)
+        logger.info("calibrated bcrypt cost: %d", bcrypt_cost)
+    password_hasher = BcryptPasswordHasher(
+        bcrypt_cost, executor=password_hash_executor, pinned=bool(config.bcrypt_cost))
+    image_store = S3ImageStore(bucket_name, s3_client, TransferConfig(
+        multipart_threshold=config.s3_multipart_chunk_size,
+        multipart_chunksize=config.s3_multipart_chunk_size,
+        max_concurrency=config.s3_max_concurrency,
+        use_threads=True,
+    ), upload_url_expiry=config.image_upload_url_expiry,
+        download_url_expiry=config.image_download_url_expiry)
+    login_rate_limiter = LoginRateLimiter(
+        per_email_limit=config.login_rate_limit_per_email,
+        per_ip_limit=config.login_rate_limit_per_ip,
+        window=config.login_rate_limit_window,
+        expected_keys=config.login_rate_limit_keys,
     )
-    password_hasher = BcryptPasswordHasher()
-    image_store = S3ImageStore(bucket_name, s3_client)
     email_notification_service = EmailNotificationService(
-        sqs_client, queue_url
+        sqs_client, queue_url,
+        max_queue_size=config.notification_queue_size,
+        flush_interval=config.notification_flush_interval,
+    )
+    email_notification_service.start()
+    user_profile_cache = TTLCache[User](
+        "user_profiles",
+        max_size=config.user_profile_cache_size,
+        ttl=config.user_profile_cache_ttl,
     )
 
     # services
     auth_service = AuthService(
-        user_repo, token_provider, password_hasher)
+        user_repo, token_provider, password_hasher, revoked_token_repo,
+        user_profile_cache)
     user_service = UserService(
-        password_hasher, user_repo, project_repo, email_notification_service)
+        password_hasher, user_repo, project_repo, email_notification_service,
+        user_profile_cache)
     project_service = ProjectService(project_repo)
     department_service = DepartmentService(department_repo)
     expense_service = ExpenseService(
         expense_repo, advance_repo, user_repo, email_notification_service)
     advance_service = AdvanceService(advance_repo, user_repo, email_notification_service)
-    image_service = ImageService(image_metadata_repo, image_store)
+    image_metadata_cache = TTLCache[ImageMetadata](
+        "image_metadata",
+        max_size=config.image_cache_size,
+        # bounds staleness after deletes made through other workers; entries
+        # still waiting for derivatives expire much sooner
+        ttl=3600,
+    )
+    # hand out cached urls only while they still have a fifth of their life left
+    image_download_url_cache = TTLCache[str](
+        "image_download_urls",
+        max_size=config.image_cache_size,
+        ttl=config.image_download_url_expiry * 0.8,
+    )
+    derivative_generator = None
+    if config.image_derivative_workers:
+        derivative_generator = PillowDerivativeGenerator(
+            max_workers=config.image_derivative_workers,
+            max_queue_size=config.image_derivative_queue_size,
+        )
+    image_service = ImageService(
+        image_metadata_repo, image_store,
+        image_metadata_cache, image_download_url_cache,
+        max_upload_size=config.image_max_upload_bytes,
+        derivative_generator=derivative_generator,
+        max_upload_files=config.image_upload_max_files,
+        upload_concurrency=config.image_upload_concurrency)
 
     # add to fastapi state
     app.state.token_provider = token_provider
+    app.state.login_rate_limiter = login_rate_limiter
     app.state.auth_service = auth_service
     app.state.user_service = user_service
     app.state.project_service = project_service
@@ -90,8 +202,22 @@ async def lifespan(app: FastAPI):
     app.state.expense_service = expense_service
     app.state.advance_service = advance_service
     app.state.image_service = image_service
+
+    loop_lag_monitor = EventLoopLagMonitor()
+    loop_lag_monitor.start()
+    token_revocation_list.start()
     try:
         yield
     finally:
+        await loop_lag_monitor.close()
+        await token_revocation_list.close()
+        await email_notification_service.close()
+        password_hash_executor.shutdown()
+        if derivative_generator is not None:
+            derivative_generator.shutdown()
         dynamodb_resource.meta.client.close()
         s3_client.close()
+        sqs_client.close()
+        if span_processor is not None:
+            tracing.configure(None)
+            await span_processor.close()
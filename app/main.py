@@ -1,7 +1,10 @@
 import uvicorn
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
+from fastapi.responses import PlainTextResponse
+from app import metrics
+from app.dependencies.metrics import metrics_scrape_token
 from app.lifespan import lifespan
-from app.middleware import register_middlewares
+from app.middleware import TimedJSONResponse, register_middlewares
 from app.routers.auth import auth_router
 from app.routers.user import user_router
 from app.routers.project import project_router
@@ -12,7 +15,7 @@ from app.routers.image import image_router
 from app.exception import register_exception_handlers
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=TimedJSONResponse)
 register_middlewares(app)
 register_exception_handlers(app)
 app.include_router(auth_router, prefix="/api")
@@ -29,5 +32,11 @@ async def health_check():
     return "OK"
 
 
+@app.get('/metrics', response_class=PlainTextResponse,
+         dependencies=[Depends(metrics_scrape_token)])
+async def metrics_export():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     uvicorn.run(app)
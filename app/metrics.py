@@ -0,0 +1,251 @@
+"""
+In-process metrics primitives (counters, gauges and histograms)
+
+Metrics are registered once at import time on the module level REGISTRY and
+updated from infra/services code. Every metric keeps its own small lock, held
+only long enough to bump a number, so recording stays cheap on the hot path.
+Registry.render() exposes them in the Prometheus text format; it copies each
+metric's samples under that lock and formats them after releasing it.
+"""
+import bisect
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable
+
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+LabelValues = tuple[str, ...]
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> list[tuple[LabelValues, Any]]: ...
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._label_values(labels), 0.0)
+
+    def samples(self) -> list[tuple[LabelValues, float]]:
+        with self._lock:
+            return list(self._values.items())
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+        self._functions: dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels: str) -> None:
+        """
+        Samples fn() at collection time instead of storing a value
+        """
+        key = self._label_values(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def value(self, **labels: str) -> float:
+        key = self._label_values(labels)
+        fn = self._functions.get(key)
+        if fn is not None:
+            return float(fn())
+        return self._values.get(key, 0.0)
+
+    def samples(self) -> list[tuple[LabelValues, float]]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            values[key] = float(fn())
+        return list(values.items())
+
+
+class _HistogramState:
+    __slots__ = ("buckets", "count", "sum")
+
+    def __init__(self, size: int):
+        self.buckets = [0] * size
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bucket_bounds = tuple(sorted(buckets))
+        self._states: dict[LabelValues, _HistogramState] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        # index of the first bucket whose upper bound is >= value
+        idx = bisect.bisect_left(self.bucket_bounds, value)
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = _HistogramState(len(self.bucket_bounds) + 1)
+                self._states[key] = state
+            state.buckets[idx] += 1
+            state.count += 1
+            state.sum += value
+
+    def count(self, **labels: str) -> int:
+        state = self._states.get(self._label_values(labels))
+        return state.count if state else 0
+
+    def sum(self, **labels: str) -> float:
+        state = self._states.get(self._label_values(labels))
+        return state.sum if state else 0.0
+
+    def samples(self) -> list[tuple[LabelValues, tuple[list[int], int, float]]]:
+        """
+        :returns per label set: (non-cumulative bucket counts, count, sum)
+        """
+        with self._lock:
+            return [
+                (key, (list(state.buckets), state.count, state.sum))
+                for key, state in self._states.items()
+            ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str,
+                labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str,
+              labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str,
+                  labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(
+            Histogram, name, documentation, labelnames, buckets)
+
+    def metrics(self) -> list[_Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self) -> str:
+        """:returns every metric in the Prometheus text exposition format"""
+        lines: list[str] = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if isinstance(metric, Histogram):
+                lines.extend(_histogram_lines(metric))
+                continue
+            for values, value in metric.samples():
+                lines.append(
+                    f"{metric.name}{_labels(metric.labelnames, values)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# content type of Registry.render() output
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _histogram_lines(metric: Histogram) -> list[str]:
+    lines = []
+    bounds = [_number(bound) for bound in metric.bucket_bounds] + ["+Inf"]
+    for values, (buckets, count, total) in metric.samples():
+        cumulative = 0
+        for bound, bucket in zip(bounds, buckets):
+            cumulative += bucket
+            labels = _labels((*metric.labelnames, "le"), (*values, bound))
+            lines.append(f"{metric.name}_bucket{labels} {cumulative}")
+        labels = _labels(metric.labelnames, values)
+        lines.append(f"{metric.name}_sum{labels} {_number(total)}")
+        lines.append(f"{metric.name}_count{labels} {count}")
+    return lines
+
+
+def _labels(names: tuple[str, ...], values: LabelValues) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value: str) -> str:
+    return _escape_help(value).replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    return repr(float(value))
+
+
+REGISTRY = Registry()
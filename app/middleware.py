@@ -1,6 +1,15 @@
+import random
+import time
+from typing import Any, Callable
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.types import ASGIApp
+from fastapi.responses import JSONResponse
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app import consumed_capacity, metrics, timing, tracing
+from app.config import load_config
 
 
 class APIGatewayProxyMiddleware:
@@ -47,7 +56,165 @@ class APIGatewayProxyMiddleware:
         return await self.app(scope, receive, send)
 
 
+_request_latency = metrics.REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "Time to handle a request until its response body was sent",
+    ("method", "route", "status"))
+_capacity_units = metrics.REGISTRY.counter(
+    "dynamodb_consumed_capacity_units_total",
+    "DynamoDB capacity units consumed by requests, by route and read/write",
+    ("route", "kind"))
+_scanned_items = metrics.REGISTRY.counter(
+    "dynamodb_scanned_items_total",
+    "Items DynamoDB queries and scans read for requests, before filtering",
+    ("route",))
+_returned_items = metrics.REGISTRY.counter(
+    "dynamodb_returned_items_total",
+    "Items DynamoDB queries and scans returned for requests, after filtering",
+    ("route",))
+
+
+class RequestMetricsMiddleware:
+    """
+    Records request latency and the DynamoDB capacity each request consumed
+    by route template (/api/expenses/{expense_id}) rather than by path, so
+    the label stays bounded; with capacity_header the capacity is also sent
+    back in an X-DynamoDB-Capacity header
+    """
+
+    def __init__(self, app: ASGIApp, capacity_header: bool = False):
+        self.app = app
+        self.capacity_header = capacity_header
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = "500"
+        token = consumed_capacity.start()
+        capacity = consumed_capacity.current()
+        assert capacity is not None
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+                if self.capacity_header:
+                    MutableHeaders(scope=message).append(
+                        "X-DynamoDB-Capacity", capacity.header_value())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            consumed_capacity.stop(token)
+            # set by the router once a route matched
+            route = getattr(scope.get("route"), "path", "unmatched")
+            _request_latency.observe(
+                time.perf_counter() - started,
+                method=scope["method"], route=route, status=status)
+            self._record_capacity(route, capacity)
+
+    @staticmethod
+    def _record_capacity(route: str, capacity: consumed_capacity.RequestCapacity) -> None:
+        if capacity.read_units:
+            _capacity_units.inc(capacity.read_units, route=route, kind="read")
+        if capacity.write_units:
+            _capacity_units.inc(capacity.write_units, route=route, kind="write")
+        if capacity.scanned_count:
+            _scanned_items.inc(capacity.scanned_count, route=route)
+            _returned_items.inc(capacity.count, route=route)
+
+
+class TracingMiddleware:
+    """
+    Records each traced request as a root span named after its route
+    template, see app.tracing
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        traceparent = dict(scope["headers"]).get(b"traceparent")
+        with tracing.start_trace(
+                f"{scope['method']} {scope['path']}",
+                traceparent.decode("latin-1") if traceparent else None) as span:
+            if span is None:
+                return await self.app(scope, receive, send)
+
+            async def send_with_status(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    span.attributes["http.response.status_code"] = message["status"]
+                await send(message)
+
+            span.attributes["http.request.method"] = scope["method"]
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    span.name = f"{scope['method']} {route.path}"
+                    span.attributes["http.route"] = route.path
+
+
+class ServerTimingMiddleware:
+    """
+    Adds a Server-Timing header to a sample of the responses, breaking the
+    request time down into time spent per dependency (dynamodb, s3, ...)
+    and on JSON serialization, see app.timing
+    """
+
+    def __init__(self,
+                 app: ASGIApp,
+                 sample_rate: float = 0.0,
+                 sample: Callable[[], float] = random.random):
+        self.app = app
+        self.sample_rate = sample_rate
+        self._sample = sample
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or self._sample() >= self.sample_rate:
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        token = timing.start()
+        timings = timing.current()
+        assert timings is not None
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing",
+                               timings.header_value(time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            timing.stop(token)
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse recording its encoding time as serialize on sampled requests"""
+
+    def render(self, content: Any) -> bytes:
+        with timing.measure("serialize"):
+            return super().render(content)
+
+
 def register_middlewares(app: FastAPI):
+    app.add_middleware(
+        RequestMetricsMiddleware,
+        capacity_header=load_config().consumed_capacity_header)
+    app.add_middleware(TracingMiddleware)
+    app.add_middleware(
+        ServerTimingMiddleware,
+        sample_rate=load_config().server_timing_sample_rate)
     app.add_middleware(APIGatewayProxyMiddleware)
     app.add_middleware(
         CORSMiddleware,
@@ -1,8 +1,71 @@
-from pydantic import BaseModel, ConfigDict, Field
+from enum import Enum
+from typing import Annotated
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+
+# receipt formats accepted for upload
+IMAGE_CONTENT_TYPES = frozenset({
+    "image/jpeg",
+    "image/png",
+    "image/webp",
+    "image/gif",
+    "application/pdf",
+})
+
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"%PDF-", "application/pdf"),
+)
+
+# formats that get resized derivatives, pdfs are served as is
+RASTER_CONTENT_TYPES = IMAGE_CONTENT_TYPES - {"application/pdf"}
+
+
+class ImageSize(str, Enum):
+    Original = "original"
+    Preview = "preview"
+    Thumbnail = "thumbnail"
+
+
+# direct browser uploads go under <prefix><user id>/
+DIRECT_UPLOAD_PREFIX = "receipts/"
+
+# max width of each derivative, rendered as WebP
+DERIVATIVE_WIDTHS = {
+    ImageSize.Thumbnail: 256,
+    ImageSize.Preview: 1024,
+}
+
+# bytes needed by sniff_content_type
+SNIFF_LENGTH = 12
+
+
+def sniff_content_type(head: bytes) -> str | None:
+    """
+    Detects the file type from its leading magic bytes
+    :returns content type or None if it is not a supported format
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
 
 
 class ImageMetadata(BaseModel):
     user_id: str = Field(alias="UserID")
+    # image url of each generated derivative, by ImageSize value
+    derivatives: dict[str, str] = Field(default_factory=dict, alias="Derivatives")
+    # hex SHA-256 of the content, set on images shared through deduplication
+    content_hash: str | None = Field(default=None, alias="ContentHash")
+    # missing on images uploaded before it was recorded
+    content_type: str | None = Field(default=None, alias="ContentType")
+    # epoch ms, missing on images uploaded before it was recorded
+    created_at: Annotated[int | None, BeforeValidator(
+        lambda x: None if x is None else int(x))] = Field(default=None, alias="CreatedAt")
 
     model_config = ConfigDict(
         validate_by_name=True,
@@ -10,3 +73,39 @@ class ImageMetadata(BaseModel):
         serialize_by_alias=False,
         use_enum_values=True
     )
+
+
+class PresignedUpload(BaseModel):
+    url: str
+    fields: dict[str, str]
+    image_url: str
+    expires_in: int
+
+
+class StoredImageInfo(BaseModel):
+    size: int
+    content_type: str
+    # first SNIFF_LENGTH bytes of the object
+    leading_bytes: bytes
+    # epoch ms
+    last_modified: int = 0
+
+
+class ImageDownloadURL(BaseModel):
+    image_url: str
+    download_url: str | None = None
+    # AppErr name when no url could be issued
+    error: str | None = None
+
+
+class ImageDeleteResult(BaseModel):
+    image_url: str
+    # AppErr name when the image could not be deleted
+    error: str | None = None
+
+
+class ImageGCReport(BaseModel):
+    scanned: int = 0
+    orphaned: int = 0
+    deleted: int = 0
+    failed: int = 0
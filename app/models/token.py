@@ -0,0 +1,17 @@
+from typing import Annotated
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+
+
+class RevokedToken(BaseModel):
+    token_id: str = Field(alias="TokenID")
+    expires_at: Annotated[int, BeforeValidator(
+        lambda x: int(x))] = Field(alias="ExpiresAt")
+    revoked_at: Annotated[int, BeforeValidator(
+        lambda x: int(x))] = Field(alias="RevokedAt", default=0)
+
+    model_config = ConfigDict(
+        validate_by_name=True,
+        validate_by_alias=True,
+        serialize_by_alias=False,
+        use_enum_values=True
+    )
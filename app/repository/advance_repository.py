@@ -10,6 +10,7 @@ from mypy_boto3_dynamodb.type_defs import (
     QueryInputTableQueryTypeDef,
     TransactWriteItemTypeDef
 )
+from app import tracing
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
 from app.models.advance import Advance, AdvancesFilterOptions, RequestStatus
@@ -17,6 +18,7 @@ from boto3.dynamodb.conditions import Attr, Key
 from app.repository import utils
 
 
+@tracing.traced
 class AdvanceRepository:
     def __init__(self, ddb_table: Table, table_name: str):
         self._table = ddb_table
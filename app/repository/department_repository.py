@@ -6,6 +6,7 @@ from botocore.exceptions import ClientError
 from mypy_boto3_dynamodb.type_defs import QueryInputTableQueryTypeDef, TransactWriteItemTypeDef
 from pydantic import ValidationError
 from mypy_boto3_dynamodb.service_resource import Table
+from app import tracing
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
 from app.models.department import Department
@@ -13,6 +14,7 @@ from app.repository import utils
 from boto3.dynamodb.conditions import Key
 
 
+@tracing.traced
 class DepartmentRepository:
     def __init__(self, ddb_table: Table, table_name: str):
         self._table = ddb_table
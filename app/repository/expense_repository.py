@@ -10,6 +10,7 @@ from mypy_boto3_dynamodb.type_defs import (
     QueryInputTableQueryTypeDef,
     TransactWriteItemTypeDef
 )
+from app import tracing
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
 from app.models.expense import Expense, ExpensesFilterOptions, RequestStatus
@@ -17,6 +18,7 @@ from boto3.dynamodb.conditions import Attr, Key
 from app.repository import utils
 
 
+@tracing.traced
 class ExpenseRepository:
     def __init__(self, ddb_table: Table, table_name: str):
         self._table = ddb_table
@@ -181,6 +183,27 @@ class ExpenseRepository:
         except ClientError as err:
             raise utils.handle_dynamo_error(err, "Failed to fetch expenses")
 
+    async def get_attachment_urls(self) -> set[str]:
+        """
+        Collects the attachment url of every bill of every expense
+        """
+        primary_key = self._get_primary_key()
+        query_input: QueryInputTableQueryTypeDef = {
+            "KeyConditionExpression": Key("PK").eq(primary_key["PK"])
+            & Key("SK").begins_with(primary_key["SK"]),
+            "ProjectionExpression": "Bills",
+        }
+        try:
+            items = await utils.query_items(self._table, query_input)
+        except ClientError as err:
+            raise utils.handle_dynamo_error(err, "Failed to fetch expenses")
+        return {
+            bill["AttachmentURL"]
+            for item in items
+            for bill in item.get("Bills", [])
+            if bill.get("AttachmentURL")
+        }
+
     async def update(self, expense: Expense):
         existing_expense = await self.get(expense.id)
         if not existing_expense:
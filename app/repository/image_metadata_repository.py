@@ -1,56 +1,531 @@
 import asyncio
+import zlib
+from typing import AsyncIterator
+from boto3.dynamodb.conditions import Key
 from mypy_boto3_dynamodb.service_resource import Table
 from botocore.exceptions import ClientError
+from app import tracing
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
 from app.models.image import ImageMetadata
 from app.repository import utils
 
+# changing this remaps every image, it needs a migration like the one from
+# the unsharded partitions
+IMAGE_SHARD_COUNT = 16
+# tries to move a legacy item that keeps changing under the migration
+MOVE_ATTEMPTS = 3
+# items per TransactWriteItems call
+TRANSACT_WRITE_LIMIT = 100
 
+
+def image_shard(value: str, shard_count: int = IMAGE_SHARD_COUNT) -> int:
+    # crc32 is stable across processes, unlike hash()
+    return zlib.crc32(value.encode("utf-8")) % shard_count
+
+
+@tracing.traced
 class ImageMetadataRepository:
-    def __init__(self, ddb_table: Table, table_name: str):
+    """
+    Image metadata is spread over IMAGE_SHARD_COUNT partitions by a hash of
+    the image url (content items by a hash of the owner), so uploads,
+    downloads and deletes across the company don't all hit one partition
+
+    With legacy_reads, items still under the old unsharded IMAGE and
+    IMAGE_CONTENT partitions are found too; turn it off once
+    migrate_legacy_items() has moved them all.
+    """
+
+    def __init__(self,
+                 ddb_table: Table,
+                 table_name: str,
+                 legacy_reads: bool = False):
         self._table_name = table_name
         self._table = ddb_table
         self._pk = "IMAGE"
         self._sk_prefix = "IMAGE#"
+        self._content_pk = "IMAGE_CONTENT"
+        self._legacy_reads = legacy_reads
 
     def _get_primary_key(self, image_url: str) -> dict:
+        return {
+            "PK": f"{self._pk}#{image_shard(image_url):02d}",
+            "SK": f"{self._sk_prefix}{image_url}"
+        }
+
+    def _get_legacy_key(self, image_url: str) -> dict:
         return {
             "PK": self._pk,
             "SK": f"{self._sk_prefix}{image_url}"
         }
 
+    def _get_content_key(self, user_id: str, content_hash: str) -> dict:
+        return {
+            "PK": f"{self._content_pk}#{image_shard(user_id):02d}",
+            "SK": f"{user_id}#{content_hash}"
+        }
+
+    def _get_legacy_content_key(self, user_id: str, content_hash: str) -> dict:
+        return {
+            "PK": self._content_pk,
+            "SK": f"{user_id}#{content_hash}"
+        }
+
+    def _content_keys(self, user_id: str, content_hash: str) -> list[dict]:
+        keys = [self._get_content_key(user_id, content_hash)]
+        if self._legacy_reads:
+            keys.append(self._get_legacy_content_key(user_id, content_hash))
+        return keys
+
+    def _metadata_keys(self, image_url: str) -> list[dict]:
+        keys = [self._get_primary_key(image_url)]
+        if self._legacy_reads:
+            keys.append(self._get_legacy_key(image_url))
+        return keys
+
     async def save(self, image_url: str, metadata: ImageMetadata) -> None:
+        """
+        Saves metadata of a new image; with a content_hash the image also
+        becomes the deduplication target for that content, holding one
+        reference
+        :raises AppException(IMAGE_URL_ALREADY_EXIST)
+        :raises AppException(IMAGE_CONTENT_ALREADY_EXIST) if the same user
+            already has an image with this content
+        """
+        await self.save_many({image_url: metadata})
+
+    async def save_many(self, images: dict[str, ImageMetadata]) -> None:
+        """
+        Saves metadata of new images like save, all of them in one
+        transaction: either every image is saved or none is. Content hashes
+        must be distinct and the transaction holds at most 100 items, an
+        image with a content_hash takes two.
+        :raises AppException(IMAGE_URL_ALREADY_EXIST)
+        :raises AppException(IMAGE_CONTENT_ALREADY_EXIST)
+        """
+        items, content_item_indexes = self._new_image_items(images)
+        if not items:
+            return
+        if len(items) > TRANSACT_WRITE_LIMIT:
+            raise AppException(
+                AppErr.VALIDATION,
+                f"Too many images to save at once ({len(items)} items, at most {TRANSACT_WRITE_LIMIT})")
+        condition = "attribute_not_exists(PK) AND attribute_not_exists(SK)"
+        if len(items) == 1:
+            try:
+                await asyncio.to_thread(lambda: self._table.put_item(
+                    Item=items[0], ConditionExpression=condition))
+            except ClientError as err:
+                if utils.is_conditional_check_failure(err):
+                    raise AppException(AppErr.IMAGE_URL_ALREADY_EXIST, cause=err)
+                raise utils.handle_dynamo_error(err)
+            return
+
+        transact_items = [
+            {
+                "Put": {
+                    "TableName": self._table_name,
+                    "Item": item,
+                    "ConditionExpression": condition,
+                }
+            }
+            for item in items
+        ]
         try:
-            primary_key = self._get_primary_key(image_url)
-            await asyncio.to_thread(lambda: self._table.put_item(
-                Item={
-                    **primary_key,
-                    **metadata.model_dump(by_alias=True)
-                },
-                ConditionExpression="attribute_not_exists(PK) AND attribute_not_exists(SK)",
-            ))
+            await asyncio.to_thread(lambda: self._table.meta.client.transact_write_items(
+                TransactItems=transact_items))
+        except ClientError as err:
+            if not utils.is_conditional_check_failure(err):
+                raise utils.handle_dynamo_error(err)
+            reasons = err.response.get("CancellationReasons", [])
+            if any(reasons[index].get("Code") == "ConditionalCheckFailed"
+                   for index in content_item_indexes if index < len(reasons)):
+                raise AppException(AppErr.IMAGE_CONTENT_ALREADY_EXIST, cause=err)
+            raise AppException(AppErr.IMAGE_URL_ALREADY_EXIST, cause=err)
+
+    def _new_image_items(self, images: dict[str, ImageMetadata]) -> tuple[list[dict], list[int]]:
+        """:returns the metadata and content items of new images, and which of them are content items"""
+        items: list[dict] = []
+        content_item_indexes: list[int] = []
+        for image_url, metadata in images.items():
+            items.append({
+                **self._get_primary_key(image_url),
+                **metadata.model_dump(by_alias=True, exclude_none=True)
+            })
+            if metadata.content_hash is not None:
+                content_item_indexes.append(len(items))
+                items.append({
+                    **self._get_content_key(metadata.user_id, metadata.content_hash),
+                    "ImageURL": image_url,
+                    "RefCount": 1,
+                })
+        return items, content_item_indexes
+
+    async def add_content_reference(self, user_id: str, content_hash: str) -> str | None:
+        """
+        Adds a reference to the user's image with this content, if any
+        :returns its image url, None if there's no such image
+        """
+        for content_key in self._content_keys(user_id, content_hash):
+            try:
+                response = await asyncio.to_thread(lambda: self._table.update_item(
+                    Key=content_key,
+                    UpdateExpression="ADD RefCount :one",
+                    # an image whose last reference is being removed can't be revived
+                    ConditionExpression="RefCount > :zero",
+                    ExpressionAttributeValues={":one": 1, ":zero": 0},
+                    ReturnValues="ALL_NEW",
+                ))
+                return response["Attributes"]["ImageURL"]
+            except ClientError as err:
+                if not utils.is_conditional_check_failure(err):
+                    raise utils.handle_dynamo_error(err)
+        return None
+
+    async def remove_reference(self, image_url: str, metadata: ImageMetadata) -> bool:
+        """
+        Drops one reference to the image, deleting its metadata with the last one
+        :returns True if that was the last reference and the image can go
+        """
+        if metadata.content_hash is None:
+            await self.delete(image_url)
+            return True
+        content_keys = self._content_keys(metadata.user_id, metadata.content_hash)
+        for content_key in content_keys:
+            try:
+                response = await asyncio.to_thread(lambda: self._table.update_item(
+                    Key=content_key,
+                    UpdateExpression="ADD RefCount :minus_one",
+                    ConditionExpression="RefCount > :zero",
+                    ExpressionAttributeValues={":minus_one": -1, ":zero": 0},
+                    ReturnValues="UPDATED_NEW",
+                ))
+                if response["Attributes"]["RefCount"] > 0:
+                    return False
+                break
+            except ClientError as err:
+                if not utils.is_conditional_check_failure(err):
+                    raise utils.handle_dynamo_error(err)
+
+        transact_items = [
+            {"Delete": {"TableName": self._table_name, "Key": key}}
+            for key in [*content_keys, *self._metadata_keys(image_url)]
+        ]
+        try:
+            await asyncio.to_thread(lambda: self._table.meta.client.transact_write_items(
+                TransactItems=transact_items))
+        except ClientError as err:
+            raise utils.handle_dynamo_error(err)
+        return True
+
+    async def remove_references(self, images: dict[str, ImageMetadata]) -> list[str]:
+        """
+        Bulk remove_reference: the content items are read in one batch and
+        images losing their last reference are deleted in transactions of up
+        to 100 items, each content item on condition it still holds only the
+        reference being removed. Shared images, and images of a transaction
+        that lost that race, go through remove_reference one by one.
+        :returns urls of the images whose last reference was removed
+        """
+        content_items = await self._find_content_items(images)
+        removed: list[str] = []
+        one_by_one: list[str] = []
+        batches: list[tuple[list[str], list[dict]]] = [([], [])]
+        for image_url, metadata in images.items():
+            image_deletes = self._last_reference_deletes(
+                image_url, metadata, content_items.get(image_url))
+            if image_deletes is None:
+                one_by_one.append(image_url)
+                continue
+            urls, transact_items = batches[-1]
+            if len(transact_items) + len(image_deletes) > TRANSACT_WRITE_LIMIT:
+                urls, transact_items = [], []
+                batches.append((urls, transact_items))
+            urls.append(image_url)
+            transact_items.extend(image_deletes)
+
+        for urls, transact_items in batches:
+            if not transact_items:
+                continue
+            try:
+                await asyncio.to_thread(lambda: self._table.meta.client.transact_write_items(
+                    TransactItems=transact_items))
+            except ClientError as err:
+                if not utils.is_conditional_check_failure(err):
+                    raise utils.handle_dynamo_error(err)
+                one_by_one.extend(urls)
+                continue
+            removed.extend(urls)
+
+        results = await asyncio.gather(*(
+            self.remove_reference(image_url, images[image_url]) for image_url in one_by_one))
+        removed.extend(url for url, last in zip(one_by_one, results) if last)
+        return removed
+
+    async def _find_content_items(self, images: dict[str, ImageMetadata]) -> dict[str, dict]:
+        """:returns the content item of each image with a content_hash, by image url"""
+        keys_by_url = {
+            image_url: self._content_keys(metadata.user_id, metadata.content_hash)
+            for image_url, metadata in images.items() if metadata.content_hash
+        }
+        unique_keys = {(key["PK"], key["SK"]): key
+                       for keys in keys_by_url.values() for key in keys}
+        if not unique_keys:
+            return {}
+        try:
+            items = await utils.batch_get_items(
+                self._table, self._table_name, list(unique_keys.values()))
         except ClientError as err:
-            if utils.is_conditional_check_failure(err):
-                raise AppException(AppErr.IMAGE_URL_ALREADY_EXIST, cause=err)
             raise utils.handle_dynamo_error(err)
+        found = {(item["PK"], item["SK"]): item for item in items}
+        content_items: dict[str, dict] = {}
+        for image_url, keys in keys_by_url.items():
+            image_items = [found[(key["PK"], key["SK"])]
+                           for key in keys if (key["PK"], key["SK"]) in found]
+            if image_items:
+                content_items[image_url] = image_items[0]
+        return content_items
+
+    def _last_reference_deletes(self,
+                                image_url: str,
+                                metadata: ImageMetadata,
+                                content_item: dict | None) -> list[dict] | None:
+        """
+        :returns the transaction items deleting an image holding a single
+            reference, None if it is shared (or not the content's image)
+        """
+        deletes = [
+            {"Delete": {"TableName": self._table_name, "Key": key}}
+            for key in self._metadata_keys(image_url)
+        ]
+        if not metadata.content_hash:
+            return deletes
+        if content_item is not None and (
+                content_item.get("ImageURL") != image_url or content_item.get("RefCount") != 1):
+            return None
+        for key in self._content_keys(metadata.user_id, metadata.content_hash):
+            delete: dict = {"TableName": self._table_name, "Key": key}
+            if content_item is not None and key == {"PK": content_item["PK"], "SK": content_item["SK"]}:
+                # a reference added since the read keeps the image
+                delete["ConditionExpression"] = "RefCount = :one"
+                delete["ExpressionAttributeValues"] = {":one": 1}
+            deletes.append({"Delete": delete})
+        return deletes
 
     async def get(self, image_url: str) -> ImageMetadata | None:
+        try:
+            for primary_key in self._metadata_keys(image_url):
+                response = await asyncio.to_thread(
+                    lambda: self._table.get_item(Key={**primary_key}))
+                item = response.get("Item")
+                if item:
+                    return ImageMetadata.model_validate(item, by_alias=True)
+            return None
+        except ClientError as err:
+            raise utils.handle_dynamo_error(err)
+
+    async def get_many(self, image_urls: list[str]) -> dict[str, ImageMetadata]:
+        """
+        Batch reads metadata for image_urls
+        :returns metadata by image url, urls without metadata are left out
+        """
+        unique_urls = list(dict.fromkeys(image_urls))
+        prefix_len = len(self._sk_prefix)
+        found: dict[str, ImageMetadata] = {}
+        key_builders = [self._get_primary_key]
+        if self._legacy_reads:
+            key_builders.append(self._get_legacy_key)
+        try:
+            for key_builder in key_builders:
+                missing = [url for url in unique_urls if url not in found]
+                if not missing:
+                    break
+                items = await utils.batch_get_items(
+                    self._table, self._table_name,
+                    [key_builder(url) for url in missing])
+                for item in items:
+                    found[item["SK"][prefix_len:]] = ImageMetadata.model_validate(
+                        item, by_alias=True)
+        except ClientError as err:
+            raise utils.handle_dynamo_error(err)
+        return found
+
+    async def set_derivatives(self, image_url: str, derivatives: dict[str, str]) -> None:
         try:
             primary_key = self._get_primary_key(image_url)
-            response = await asyncio.to_thread(
-                lambda: self._table.get_item(Key={**primary_key}))
-            item = response.get("Item")
-            if not item:
-                return None
-            return ImageMetadata.model_validate(item, by_alias=True)
+            await asyncio.to_thread(lambda: self._table.update_item(
+                Key={**primary_key},
+                UpdateExpression="SET #derivatives = :derivatives",
+                ExpressionAttributeNames={"#derivatives": "Derivatives"},
+                ExpressionAttributeValues={":derivatives": derivatives},
+                ConditionExpression="attribute_exists(PK) AND attribute_exists(SK)",
+            ))
         except ClientError as err:
+            if utils.is_conditional_check_failure(err):
+                raise AppException(AppErr.IMAGE_NOT_FOUND, cause=err)
             raise utils.handle_dynamo_error(err)
 
     async def delete(self, image_url: str) -> None:
+        """
+        Deletes the image metadata regardless of references, e.g. once the
+        stored object is gone
+        """
         try:
-            primary_key = self._get_primary_key(image_url)
-            await asyncio.to_thread(
-                lambda: self._table.delete_item(Key={**primary_key}))
+            for primary_key in self._metadata_keys(image_url):
+                response = await asyncio.to_thread(
+                    lambda: self._table.delete_item(Key={**primary_key}, ReturnValues="ALL_OLD"))
+                old_item = response.get("Attributes") or {}
+                if old_item:
+                    break
+            if old_item.get("ContentHash"):
+                for content_key in self._content_keys(old_item["UserID"], old_item["ContentHash"]):
+                    await asyncio.to_thread(
+                        lambda: self._table.delete_item(Key=content_key))
+        except ClientError as err:
+            raise utils.handle_dynamo_error(err)
+
+    async def iter_all(self, page_size: int = 500) -> AsyncIterator[tuple[str, ImageMetadata]]:
+        """
+        Streams (image url, metadata) of every image, one shard at a time
+        """
+        partitions = [f"{self._pk}#{shard:02d}" for shard in range(IMAGE_SHARD_COUNT)]
+        if self._legacy_reads:
+            partitions.append(self._pk)
+        prefix_len = len(self._sk_prefix)
+        for partition in partitions:
+            query_input: dict = {
+                "KeyConditionExpression": Key("PK").eq(partition)
+                & Key("SK").begins_with(self._sk_prefix),
+                "Limit": page_size,
+            }
+            while True:
+                try:
+                    response = await asyncio.to_thread(
+                        lambda: self._table.query(**query_input))
+                except ClientError as err:
+                    raise utils.handle_dynamo_error(err)
+                for item in response.get("Items", []):
+                    yield item["SK"][prefix_len:], ImageMetadata.model_validate(item, by_alias=True)
+                if not response.get("LastEvaluatedKey"):
+                    break
+                query_input["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    async def delete_many(self, images: dict[str, ImageMetadata]) -> None:
+        """
+        Deletes the metadata and content items of images with batched writes,
+        regardless of references
+        """
+        keys: dict[tuple[str, str], dict] = {}
+        for image_url, metadata in images.items():
+            image_keys = self._metadata_keys(image_url)
+            if metadata.content_hash:
+                image_keys += self._content_keys(metadata.user_id, metadata.content_hash)
+            for key in image_keys:
+                keys[(key["PK"], key["SK"])] = key
+        try:
+            await utils.batch_write_items(
+                self._table, self._table_name,
+                [{"DeleteRequest": {"Key": key}} for key in keys.values()])
         except ClientError as err:
             raise utils.handle_dynamo_error(err)
+
+    async def migrate_legacy_items(self, page_size: int = 100) -> tuple[int, int]:
+        """
+        Moves every item from the unsharded IMAGE and IMAGE_CONTENT
+        partitions to its shard, each with a transactional put and a delete
+        conditional on the item being unchanged since it was read; safe to
+        re-run and to run while the app serves traffic
+        :returns (migrated, skipped) counts, items whose sharded key is
+            already taken are skipped and left in place
+        """
+        migrated = skipped = 0
+        legacy_partitions = (
+            (self._pk, lambda item: self._get_primary_key(item["SK"][len(self._sk_prefix):])),
+            (self._content_pk, lambda item: self._get_content_key(*item["SK"].split("#", 1))),
+        )
+        for legacy_pk, sharded_key in legacy_partitions:
+            query_input: dict = {
+                "KeyConditionExpression": Key("PK").eq(legacy_pk),
+                "Limit": page_size,
+            }
+            while True:
+                try:
+                    response = await asyncio.to_thread(
+                        lambda: self._table.query(**query_input))
+                except ClientError as err:
+                    raise utils.handle_dynamo_error(err)
+                results = await asyncio.gather(*(
+                    self._move_item(item, sharded_key(item))
+                    for item in response.get("Items", [])
+                ))
+                migrated += sum(results)
+                skipped += len(results) - sum(results)
+                if not response.get("LastEvaluatedKey"):
+                    break
+                query_input["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        return migrated, skipped
+
+    async def _move_item(self, item: dict, new_key: dict) -> bool:
+        """
+        Moves item to new_key, re-reading and retrying it when the legacy
+        item changed since it was read
+        :returns whether it was moved, False if the key is taken or the item
+            kept changing (left in place for the next run)
+        """
+        for _ in range(MOVE_ATTEMPTS):
+            moved = await self._try_move_item(item, new_key)
+            if moved is not None:
+                return moved
+            try:
+                response = await asyncio.to_thread(lambda: self._table.get_item(
+                    Key={"PK": item["PK"], "SK": item["SK"]}, ConsistentRead=True))
+            except ClientError as err:
+                raise utils.handle_dynamo_error(err)
+            if "Item" not in response:
+                # deleted in the meantime, nothing left to move
+                return False
+            item = response["Item"]
+        return False
+
+    @staticmethod
+    def _unchanged_condition(item: dict) -> tuple[str, dict]:
+        # the attributes updated in place: reference counts of content items
+        # and the derivatives recorded on metadata
+        if "RefCount" in item:
+            return "RefCount = :ref_count", {":ref_count": item["RefCount"]}
+        if "Derivatives" in item:
+            return "Derivatives = :derivatives", {":derivatives": item["Derivatives"]}
+        return "attribute_not_exists(Derivatives)", {}
+
+    async def _try_move_item(self, item: dict, new_key: dict) -> bool | None:
+        """:returns None if the legacy item changed since it was read"""
+        unchanged, values = self._unchanged_condition(item)
+        delete: dict = {
+            "TableName": self._table_name,
+            "Key": {"PK": item["PK"], "SK": item["SK"]},
+            # an update landing between the read and this move would be lost
+            "ConditionExpression": f"attribute_exists(PK) AND {unchanged}",
+        }
+        if values:
+            delete["ExpressionAttributeValues"] = values
+        transact_items = [
+            {
+                "Put": {
+                    "TableName": self._table_name,
+                    "Item": {**item, **new_key},
+                    "ConditionExpression": "attribute_not_exists(PK) AND attribute_not_exists(SK)",
+                }
+            },
+            {"Delete": delete},
+        ]
+        try:
+            await asyncio.to_thread(lambda: self._table.meta.client.transact_write_items(
+                TransactItems=transact_items))
+        except ClientError as err:
+            if not utils.is_conditional_check_failure(err):
+                raise utils.handle_dynamo_error(err)
+            reasons = err.response.get("CancellationReasons", [])
+            if len(reasons) > 1 and reasons[1].get("Code") == "ConditionalCheckFailed":
+                return None
+            return False
+        return True
@@ -6,6 +6,7 @@ from botocore.utils import ClientError
 from pydantic import ValidationError
 from mypy_boto3_dynamodb.service_resource import Table
 from mypy_boto3_dynamodb.type_defs import QueryInputTableQueryTypeDef, TransactWriteItemTypeDef
+from app import tracing
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
 from app.models.project import Project
@@ -13,6 +14,7 @@ from boto3.dynamodb.conditions import Key
 from app.repository import utils
 
 
+@tracing.traced
 class ProjectRepository:
     def __init__(self,
                  ddb_table: Table,
@@ -0,0 +1,58 @@
+import asyncio
+import time
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+from mypy_boto3_dynamodb.service_resource import Table
+from mypy_boto3_dynamodb.type_defs import QueryInputTableQueryTypeDef
+from app import tracing
+from app.models.token import RevokedToken
+from app.repository import utils
+
+
+@tracing.traced
+class RevokedTokenRepository:
+    """
+    Revoked (logged out) token ids, kept in one partition ordered by
+    revocation time so workers can fetch only what changed since their last
+    refresh. Items carry ExpiresAt for the table's TTL, once a token has
+    expired its revocation no longer matters.
+    """
+
+    def __init__(self, ddb_table: Table, table_name: str):
+        self._table = ddb_table
+        self._table_name = table_name
+        self._pk = "REVOKED_TOKEN"
+
+    def _get_sort_key(self, revoked_at: int, token_id: str = "") -> str:
+        # zero padded so string order matches time order
+        return f"{revoked_at:015d}#{token_id}"
+
+    async def save(self, revoked_token: RevokedToken) -> None:
+        try:
+            await asyncio.to_thread(lambda: self._table.put_item(
+                Item={
+                    "PK": self._pk,
+                    "SK": self._get_sort_key(revoked_token.revoked_at,
+                                             revoked_token.token_id),
+                    **revoked_token.model_dump(by_alias=True),
+                },
+            ))
+        except ClientError as err:
+            raise utils.handle_dynamo_error(err, "Failed to revoke token")
+
+    async def get_revoked_since(self, revoked_at: int) -> list[RevokedToken]:
+        """
+        Fetches tokens revoked at or after revoked_at (ms) that have not expired
+        """
+        query_input: QueryInputTableQueryTypeDef = {
+            "KeyConditionExpression": Key("PK").eq(self._pk)
+            & Key("SK").gte(self._get_sort_key(revoked_at)),
+            # TTL deletion lags, skip items that already expired
+            "FilterExpression": Attr("ExpiresAt").gt(int(time.time())),
+        }
+        try:
+            items = await utils.query_items(self._table, query_input)
+            return [RevokedToken.model_validate(item, by_alias=True)
+                    for item in items]
+        except ClientError as err:
+            raise utils.handle_dynamo_error(err)
@@ -6,6 +6,7 @@ from botocore.exceptions import ClientError
 from pydantic import ValidationError
 from mypy_boto3_dynamodb.service_resource import Table
 from mypy_boto3_dynamodb.type_defs import QueryInputTableQueryTypeDef, TransactWriteItemTypeDef
+from app import tracing
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
 from app.models.user import User
@@ -13,6 +14,7 @@ from boto3.dynamodb.conditions import Key
 from app.repository import utils
 
 
+@tracing.traced
 class UserRepository:
     def __init__(self, ddb_table: Table, table_name: str):
         self._table = ddb_table
@@ -251,3 +253,43 @@ class UserRepository:
                     "User not found",
                     cause=err)
             raise utils.handle_dynamo_error(err, "Failed to update user")
+
+    async def update_password_hash(self, user: User, password_hash: str) -> None:
+        """
+        Replaces only the stored password hash, provided it still equals
+        user.password (a concurrent password change wins)
+        """
+        keys = [
+            self._get_primary_key(user_id=user.id),
+            self._get_primary_key(email=user.email),
+            self._get_fetch_all_primary_key(
+                user_id=user.id, created_at=user.created_at),
+        ]
+        transact_items: list[TransactWriteItemTypeDef] = [
+            {
+                "Update": {
+                    "TableName": self._table_name,
+                    "Key": key,
+                    "UpdateExpression": "SET #password=:new_hash",
+                    "ConditionExpression": "#password = :old_hash",
+                    "ExpressionAttributeNames": {"#password": "PasswordHash"},
+                    "ExpressionAttributeValues": {
+                        ":new_hash": password_hash,
+                        ":old_hash": user.password,
+                    },
+                }
+            }
+            for key in keys
+        ]
+        try:
+            await asyncio.to_thread(
+                lambda: self._table.meta.client.transact_write_items(
+                    TransactItems=transact_items)
+            )
+        except ClientError as err:
+            if utils.is_conditional_check_failure(err):
+                raise AppException(
+                    AppErr.CONFLICT,
+                    "Password was changed concurrently",
+                    cause=err)
+            raise utils.handle_dynamo_error(err, "Failed to update password")
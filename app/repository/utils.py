@@ -1,4 +1,9 @@
 import asyncio
+import json
+import logging
+import sys
+import time
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
 from botocore.exceptions import ClientError
 from mypy_boto3_dynamodb.service_resource import Table
 from mypy_boto3_dynamodb.type_defs import QueryInputTableQueryTypeDef
@@ -6,6 +11,17 @@ from mypy_boto3_dynamodb.type_defs import QueryInputTableQueryTypeDef
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
 
+logger = logging.getLogger(__name__)
+
+# DynamoDB calls, and query_items/offset_query runs over all their pages,
+# taking longer are logged, see set_slow_query_threshold
+_slow_query_threshold = 0.2
+
+
+def set_slow_query_threshold(seconds: float) -> None:
+    global _slow_query_threshold
+    _slow_query_threshold = seconds
+
 
 def build_update_expression(updates: dict) -> tuple[str, dict, dict]:
     """
@@ -51,16 +67,20 @@ async def offset_query(
     last_evaluated_key = None
 
     query_input["Limit"] = limit
+    stats = _QueryStats("offset_query", query_input)
     while offset > 0:
         if last_evaluated_key is not None:
             query_input["ExclusiveStartKey"] = last_evaluated_key
         result = await asyncio.to_thread(lambda: table.query(**query_input))
+        stats.add_page(result)
         if "LastEvaluatedKey" not in result or "Items" not in result:
+            stats.finish()
             return None
         last_evaluated_key = result["LastEvaluatedKey"]
         offset -= len(result["Items"])
         if last_evaluated_key is None:
             break
+    stats.finish()
 
     if last_evaluated_key is None:
         return None
@@ -82,29 +102,227 @@ async def query_items(ddb_table: Table,
                       query_input: QueryInputTableQueryTypeDef,
                       limit: int | None = None) -> list[dict]:
     items: list[dict] = []
-    while True:
+    stats = _QueryStats("query_items", query_input)
+    while limit is None or len(items) < limit:
         if limit is not None:
-            remaining = limit - len(items)
-            if remaining <= 0:
-                break
-            query_input["Limit"] = remaining
+            query_input["Limit"] = limit - len(items)
         response = await asyncio.to_thread(
             lambda: ddb_table.query(**query_input)
         )
         if not response or "Items" not in response:
             break
-        response_items = response["Items"]
-        items.extend(response_items)
-        if "LastEvaluatedKey" not in response or response["LastEvaluatedKey"] is None:
+        stats.add_page(response)
+        items.extend(response["Items"])
+        if not response.get("LastEvaluatedKey"):
             break
         query_input["ExclusiveStartKey"] = response["LastEvaluatedKey"]
-        if limit is not None:
-            if len(items) >= limit:
-                items = items[:limit]
+    stats.finish()
+    return items if limit is None else items[:limit]
+
+
+class _QueryStats:
+    """
+    Tracks the pages of one paginated query and logs its shape and read
+    amplification when it took longer than the slow query threshold
+    """
+
+    def __init__(self, operation: str, query_input: QueryInputTableQueryTypeDef):
+        self._operation = operation
+        self._query_input = query_input
+        self._started = time.perf_counter()
+        self.pages = 0
+        self.scanned = 0
+        self.returned = 0
+        self.capacity_units = 0.0
+
+    def add_page(self, response: dict) -> None:
+        self.pages += 1
+        self.returned += response.get("Count", len(response.get("Items", [])))
+        self.scanned += response.get("ScannedCount", response.get("Count", 0))
+        self.capacity_units += float(
+            (response.get("ConsumedCapacity") or {}).get("CapacityUnits", 0))
+
+    def finish(self) -> None:
+        elapsed = time.perf_counter() - self._started
+        if elapsed < _slow_query_threshold:
+            return
+        repository, caller = _callers()
+        logger.warning("slow dynamodb query: %s", json.dumps({
+            "operation": self._operation,
+            "duration_ms": round(elapsed * 1000, 1),
+            "index": self._query_input.get("IndexName"),
+            "key_condition": _expression_shape(
+                self._query_input.get("KeyConditionExpression"), is_key_condition=True),
+            "filter": _expression_shape(self._query_input.get("FilterExpression")),
+            "pages": self.pages,
+            "scanned": self.scanned,
+            "returned": self.returned,
+            "consumed_capacity": self.capacity_units,
+            "repository": repository,
+            "caller": caller,
+        }))
+
+
+def log_slow_call(operation: str, seconds: float, request: dict, response: dict | None) -> None:
+    """
+    Logs the shape of a DynamoDB call that took longer than the slow query
+    threshold; timing.instrument_client calls it for every call of the client
+    """
+    if seconds < _slow_query_threshold:
+        return
+    params = json.loads(request.get("body") or "{}")
+    names = params.get("ExpressionAttributeNames", {})
+    response = response or {}
+    record = {
+        "operation": operation,
+        "duration_ms": round(seconds * 1000, 1),
+        "tables": _tables(params),
+        "index": params.get("IndexName"),
+        "key_condition": _fill_names(params.get("KeyConditionExpression"), names),
+        "filter": _fill_names(params.get("FilterExpression"), names),
+        "condition": _fill_names(params.get("ConditionExpression"), names),
+        "items": _request_items(params),
+        "consumed_capacity": _capacity_units(response.get("ConsumedCapacity")),
+    }
+    if operation in ("Query", "Scan"):
+        record["scanned"] = response.get("ScannedCount")
+        record["returned"] = response.get("Count")
+    record["repository"], record["caller"] = _callers()
+    logger.warning("slow dynamodb call: %s", json.dumps(record))
+
+
+def _tables(params: dict) -> list[str]:
+    if "TableName" in params:
+        return [params["TableName"]]
+    if "RequestItems" in params:
+        return sorted(params["RequestItems"])
+    return sorted({
+        action["TableName"]
+        for item in params.get("TransactItems", [])
+        for action in item.values()
+    })
+
+
+def _request_items(params: dict) -> int | None:
+    """:returns the keys or actions of a batch or transaction call"""
+    if "TransactItems" in params:
+        return len(params["TransactItems"])
+    if "RequestItems" in params:
+        return sum(len(request["Keys"]) if isinstance(request, dict) else len(request)
+                   for request in params["RequestItems"].values())
+    return None
+
+
+def _capacity_units(consumed: dict | list | None) -> float:
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return sum((float(entry.get("CapacityUnits", 0)) for entry in consumed or []), 0.0)
+
+
+def _fill_names(expression: str | None, names: dict[str, str]) -> str | None:
+    if expression is None:
+        return None
+    # longest first, #n1 must not replace the start of #n10
+    for placeholder in sorted(names, key=len, reverse=True):
+        expression = expression.replace(placeholder, names[placeholder])
+    return expression
+
+
+def _expression_shape(expression: ConditionBase | str | None,
+                      is_key_condition: bool = False) -> str | None:
+    """:returns the expression with attribute names filled in, values left as placeholders"""
+    if not isinstance(expression, ConditionBase):
+        return expression
+    built = ConditionExpressionBuilder().build_expression(
+        expression, is_key_condition=is_key_condition)
+    return _fill_names(built.condition_expression, built.attribute_name_placeholders)
+
+
+def _callers() -> tuple[str | None, str | None]:
+    """
+    :returns the repository and service methods the running query was
+        called from, found by walking the awaiting coroutines' frames. In
+        the worker threads of asyncio.to_thread only the repository method
+        whose lambda made the call is on the stack.
+    """
+    repository = caller = None
+    frame = sys._getframe(1)
+    while frame is not None and caller is None:
+        module = frame.f_globals.get("__name__", "")
+        if repository is None and module.startswith("app.repository.") and module != __name__:
+            repository = frame.f_code.co_qualname.split(".<locals>", 1)[0]
+        elif module.startswith("app.services."):
+            caller = frame.f_code.co_qualname
+        frame = frame.f_back
+    return repository, caller
+
+
+BATCH_GET_LIMIT = 100
+BATCH_MAX_ATTEMPTS = 5
+
+
+async def batch_get_items(ddb_table: Table,
+                          table_name: str,
+                          keys: list[dict],
+                          projection: str | None = None) -> list[dict]:
+    """
+    Fetches items by primary key with BatchGetItem, 100 keys per call,
+    retrying unprocessed keys with exponential backoff. Missing keys are
+    simply absent from the result; keys must be unique.
+    """
+    items: list[dict] = []
+    for start in range(0, len(keys), BATCH_GET_LIMIT):
+        request: dict = {"Keys": keys[start:start + BATCH_GET_LIMIT]}
+        if projection:
+            request["ProjectionExpression"] = projection
+        request_items = {table_name: request}
+        for attempt in range(BATCH_MAX_ATTEMPTS):
+            response = await asyncio.to_thread(
+                lambda: ddb_table.meta.client.batch_get_item(
+                    RequestItems=request_items))
+            items.extend(response.get("Responses", {}).get(table_name, []))
+            request_items = response.get("UnprocessedKeys") or {}
+            if not request_items:
                 break
+            await asyncio.sleep(0.05 * 2 ** attempt)
+        else:
+            raise AppException(AppErr.THROTTLE)
     return items
 
 
+BATCH_WRITE_LIMIT = 25
+
+
+async def batch_write_items(ddb_table: Table,
+                            table_name: str,
+                            requests: list[dict],
+                            max_concurrency: int = 4) -> None:
+    """
+    Runs PutRequest/DeleteRequest items with BatchWriteItem, 25 per call and
+    at most max_concurrency calls in flight, retrying unprocessed items with
+    exponential backoff. Keys must be unique.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def write_chunk(chunk: list[dict]) -> None:
+        async with semaphore:
+            request_items = {table_name: chunk}
+            for attempt in range(BATCH_MAX_ATTEMPTS):
+                response = await asyncio.to_thread(
+                    lambda: ddb_table.meta.client.batch_write_item(
+                        RequestItems=request_items))
+                request_items = response.get("UnprocessedItems") or {}
+                if not request_items:
+                    return
+                await asyncio.sleep(0.05 * 2 ** attempt)
+            raise AppException(AppErr.THROTTLE)
+
+    await asyncio.gather(*(
+        write_chunk(requests[start:start + BATCH_WRITE_LIMIT])
+        for start in range(0, len(requests), BATCH_WRITE_LIMIT)
+    ))
+
+
 def handle_dynamo_error(err: ClientError, msg: str = "Operation failed") -> AppException:
     code = err.response.get("Error", {}).get("Code", "")
     if code == "ProvisionedThroughputExceededException":
@@ -1,14 +1,18 @@
-from fastapi import APIRouter, status
+from fastapi import APIRouter, Depends, Request, Response, status
 from app.dependencies.services import AuthServiceInstance
-from app.dependencies.auth import AuthTokenHeader
+from app.dependencies.auth import AuthTokenHeader, AuthenticatedUser
+from app.dependencies.rate_limit import login_rate_limit
 from app.dtos.auth import LoginRequest, LoginResponse
+from app.dtos.response import BaseResponse
 from app.dtos.user import UserDTO
 
 
 auth_router = APIRouter(prefix="/auth", tags=["Auth"])
 
 
-@auth_router.post('/login', response_model=LoginResponse)
+@auth_router.post('/login',
+                  response_model=LoginResponse,
+                  dependencies=[Depends(login_rate_limit)])
 async def handle_login(login_request: LoginRequest, auth_service: AuthServiceInstance):
     token = await auth_service.login(**login_request.model_dump())
     return LoginResponse(
@@ -18,6 +22,38 @@ async def handle_login(login_request: LoginRequest, auth_service: AuthServiceIns
     )
 
 
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # weak comparison, W/ prefixes are ignored
+    candidates = (tag.strip().removeprefix("W/")
+                  for tag in if_none_match.split(","))
+    return etag in candidates
+
+
 @auth_router.get('/me', response_model=UserDTO)
-async def handle_auth_me(token: AuthTokenHeader, auth_service: AuthServiceInstance):
-    return await auth_service.get_current_user(token)
+async def handle_auth_me(
+    request: Request,
+    response: Response,
+    curr_user: AuthenticatedUser,
+    auth_service: AuthServiceInstance,
+):
+    user = await auth_service.get_current_user(curr_user)
+    etag = f'"{user.id}-{user.updated_at}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return user
+
+
+@auth_router.post('/logout', response_model=BaseResponse)
+async def handle_logout(token: AuthTokenHeader, auth_service: AuthServiceInstance):
+    await auth_service.logout(token)
+    return BaseResponse(
+        status=status.HTTP_200_OK,
+        message="Logged Out Successfully",
+        data=None
+    )
@@ -1,5 +1,4 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, File, UploadFile, status
+from fastapi import APIRouter, Depends, status
 
 from app.dependencies.auth import (
     AuthenticatedUser,
@@ -7,11 +6,21 @@ from app.dependencies.auth import (
     required_roles,
 )
 from app.dependencies.services import ImageServiceInstance
+from app.dependencies.upload import FilesUploadStream, FileUploadStream
 from app.dtos.image_upload import (
+    CompleteImageUploadRequest,
     DeleteImageRequest,
+    DeleteImagesRequest,
+    DeleteImagesResponse,
     ImageDownloadURLResponse,
+    ImageDownloadURLsRequest,
+    ImageDownloadURLsResponse,
     ImageUploadResponse,
+    ImageUploadURLRequest,
+    ImageUploadURLResponse,
+    ImagesUploadResponse,
 )
+from app.models.image import ImageSize
 from app.models.user import UserRole
 
 
@@ -23,15 +32,95 @@ image_router = APIRouter(
     "/",
     status_code=201,
     response_model=ImageUploadResponse,
-    dependencies=[Depends(required_roles([UserRole.Employee]))]
+    dependencies=[Depends(required_roles([UserRole.Employee]))],
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}},
+        }},
+    }}},
 )
-async def handle_upload_image(file: Annotated[UploadFile, File()],
+async def handle_upload_image(file: FileUploadStream,
                               curr_user: AuthenticatedUser,
                               image_service: ImageServiceInstance):
-    if not file.filename:
-        file.filename = "Untitled"
     image_url = await image_service.upload_image(
-        curr_user, file.file, file.filename)
+        curr_user,
+        file.filename or "Untitled",
+        file.content_type,
+        file.chunks(),
+        size_hint=file.content_length)
+    return ImageUploadResponse(
+        status=status.HTTP_201_CREATED,
+        message="Image uploaded successfully",
+        data=ImageUploadResponse.Data(image_url=image_url)
+    )
+
+
+@image_router.post(
+    "/batch",
+    status_code=201,
+    response_model=ImagesUploadResponse,
+    dependencies=[Depends(required_roles([UserRole.Employee]))],
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["files"],
+            "properties": {"files": {
+                "type": "array",
+                "items": {"type": "string", "format": "binary"},
+            }},
+        }},
+    }}},
+)
+async def handle_upload_images(files: FilesUploadStream,
+                               curr_user: AuthenticatedUser,
+                               image_service: ImageServiceInstance):
+    image_urls = await image_service.upload_images(curr_user, (
+        (file.filename or "Untitled", file.content_type, file.chunks())
+        async for file in files.files()
+    ))
+    return ImagesUploadResponse(
+        status=status.HTTP_201_CREATED,
+        message="Images uploaded successfully",
+        data=ImagesUploadResponse.Data(image_urls=image_urls)
+    )
+
+
+@image_router.post(
+    "/upload-url",
+    response_model=ImageUploadURLResponse,
+    dependencies=[Depends(required_roles([UserRole.Employee]))]
+)
+async def handle_create_upload_url(
+        upload_url_request: ImageUploadURLRequest,
+        curr_user: AuthenticatedUser,
+        image_service: ImageServiceInstance):
+    presigned_upload = await image_service.create_upload_url(
+        curr_user,
+        upload_url_request.file_name,
+        upload_url_request.content_type,
+        upload_url_request.size,
+    )
+    return ImageUploadURLResponse(
+        status=status.HTTP_200_OK,
+        message="Upload URL created",
+        data=ImageUploadURLResponse.Data(**presigned_upload.model_dump())
+    )
+
+
+@image_router.post(
+    "/complete",
+    status_code=201,
+    response_model=ImageUploadResponse,
+    dependencies=[Depends(required_roles([UserRole.Employee]))]
+)
+async def handle_complete_upload(
+        complete_request: CompleteImageUploadRequest,
+        curr_user: AuthenticatedUser,
+        image_service: ImageServiceInstance):
+    image_url = await image_service.complete_upload(
+        curr_user, complete_request.image_url)
     return ImageUploadResponse(
         status=status.HTTP_201_CREATED,
         message="Image uploaded successfully",
@@ -53,6 +142,27 @@ async def handle_delete_image(
         image_delete_request.image_url)
 
 
+@image_router.delete(
+    "/batch",
+    response_model=DeleteImagesResponse,
+    dependencies=[Depends(required_roles([UserRole.Employee]))]
+)
+async def handle_delete_images(
+        delete_images_request: DeleteImagesRequest,
+        curr_user: AuthenticatedUser,
+        image_service: ImageServiceInstance):
+    results = await image_service.delete_images(
+        curr_user, delete_images_request.image_urls)
+    return DeleteImagesResponse(
+        status=status.HTTP_200_OK,
+        message="Success",
+        data=DeleteImagesResponse.Data(results=[
+            DeleteImagesResponse.Item(**result.model_dump())
+            for result in results
+        ])
+    )
+
+
 @image_router.get(
     "/download-url",
     response_model=ImageDownloadURLResponse
@@ -60,13 +170,35 @@ async def handle_delete_image(
 async def handle_get_download_url(
         url: str,
         curr_user: AuthenticatedUser,
-        image_service: ImageServiceInstance):
+        image_service: ImageServiceInstance,
+        size: ImageSize = ImageSize.Original):
     download_url = await image_service.get_image_download_url(
         curr_user,
-        image_url=url
+        image_url=url,
+        size=size
     )
     return ImageDownloadURLResponse(
         status=status.HTTP_200_OK,
         message="Success",
         data=ImageDownloadURLResponse.Data(download_url=download_url)
     )
+
+
+@image_router.post(
+    "/download-urls",
+    response_model=ImageDownloadURLsResponse
+)
+async def handle_get_download_urls(
+        download_urls_request: ImageDownloadURLsRequest,
+        curr_user: AuthenticatedUser,
+        image_service: ImageServiceInstance):
+    results = await image_service.get_image_download_urls(
+        curr_user, download_urls_request.image_urls, download_urls_request.size)
+    return ImageDownloadURLsResponse(
+        status=status.HTTP_200_OK,
+        message="Success",
+        data=ImageDownloadURLsResponse.Data(urls=[
+            ImageDownloadURLsResponse.Item(**result.model_dump())
+            for result in results
+        ])
+    )
@@ -2,6 +2,7 @@ from decimal import Decimal
 import time
 import asyncio
 from uuid import uuid4
+from app import tracing
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
 from app.interfaces import AdvanceRepository, UserRepository, NotificationService
@@ -11,6 +12,7 @@ from app.models.notification import EventType, Notification
 from app.models.user import UserClaims, UserRole
 
 
+@tracing.traced
 class AdvanceService:
     def __init__(self,
                  advance_repo: AdvanceRepository,
@@ -1,19 +1,36 @@
+import asyncio
+import logging
+from app import tracing
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
-from app.interfaces import PasswordHasher, TokenProvider, UserRepository
+from app.interfaces import (
+    Cache,
+    PasswordHasher,
+    RevokedTokenRepository,
+    TokenProvider,
+    UserRepository,
+)
 from app.models.user import User, UserClaims
 
+logger = logging.getLogger(__name__)
 
+
+@tracing.traced
 class AuthService:
     def __init__(
         self,
         user_repo: UserRepository,
         token_provider: TokenProvider,
         password_hasher: PasswordHasher,
+        revoked_token_repo: RevokedTokenRepository,
+        profile_cache: Cache[User],
     ):
         self._user_repo = user_repo
         self._token_provider = token_provider
         self._password_hasher = password_hasher
+        self._revoked_token_repo = revoked_token_repo
+        self._profile_cache = profile_cache
+        self._background_tasks: set[asyncio.Task] = set()
 
     async def login(self, email: str, password: str) -> str:
         """
@@ -24,22 +41,55 @@ class AuthService:
         if (
             user is None
             or not user.password
-            or not self._password_hasher.verify_password(user.password, password)
+            or not await self._password_hasher.verify_password(user.password, password)
         ):
             raise AppException(AppErr.INVALID_USER_CREDENTIALS)
 
+        if self._password_hasher.needs_rehash(user.password):
+            self._run_in_background(self._rehash_password(user, password))
+
         token = self._token_provider.generate_token(
             UserClaims.model_validate(user.model_dump(), extra="ignore")
         )
         return token
 
-    async def get_current_user(self, token: str) -> User:
-        user_claims = self._token_provider.validate_token(token)
+    def _run_in_background(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _rehash_password(self, user: User, password: str) -> None:
+        """
+        Best effort upgrade of a hash made with outdated hasher parameters
+        """
+        try:
+            password_hash = await self._password_hasher.hash_password(password)
+            await self._user_repo.update_password_hash(user, password_hash)
+        except AppException as err:
+            logger.warning("skipped password rehash for user %s: %s",
+                           user.id, err.err_code.name)
+
+    async def get_current_user(self, user_claims: UserClaims) -> User:
+        """
+        fetches the user for already validated token claims, served from the
+        profile cache when possible
+        :returns user without the password hash, shared with the cache
+        """
+        user = self._profile_cache.get(user_claims.user_id)
+        if user is not None:
+            return user
         user = await self._user_repo.get(user_claims.user_id)
         if user is None:
             raise AppException(AppErr.INVALID, "Invalid user token")
         user.password = ''
+        self._profile_cache.set(user.id, user)
         return user
 
-    def logout(self, token: str) -> None:
-        return
+    async def logout(self, token: str) -> None:
+        """
+        revokes the token right away on this worker and records it so the
+        other workers pick it up on their next revocation refresh
+        """
+        revoked_token = self._token_provider.revoke_token(token)
+        if revoked_token is not None:
+            await self._revoked_token_repo.save(revoked_token)
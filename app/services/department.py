@@ -1,10 +1,12 @@
 from uuid import uuid4
+from app import tracing
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
 from app.interfaces import DepartmentRepository
 from app.models.department import Department
 
 
+@tracing.traced
 class DepartmentService:
     def __init__(self, department_repo: DepartmentRepository):
         self.department_repo = department_repo
@@ -1,47 +1,586 @@
 import asyncio
-from typing import IO
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from typing import AsyncIterator
+from app import tracing
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
 from app.models.user import UserClaims, UserRole
-from app.models.image import ImageMetadata
-from app.interfaces import ImageStore, ImageMetadataRepository
+from app.models.image import (
+    DIRECT_UPLOAD_PREFIX,
+    IMAGE_CONTENT_TYPES,
+    RASTER_CONTENT_TYPES,
+    SNIFF_LENGTH,
+    ImageDeleteResult,
+    ImageDownloadURL,
+    ImageMetadata,
+    ImageSize,
+    PresignedUpload,
+    sniff_content_type,
+)
+from app.interfaces import (
+    Cache,
+    ImageDerivativeGenerator,
+    ImageMetadataRepository,
+    ImageStore,
+)
 
+logger = logging.getLogger(__name__)
 
+# seconds metadata without derivatives stays cached
+UNRENDERED_METADATA_TTL = 30.0
+
+
+@dataclass
+class _StoredUpload:
+    image_url: str
+    content_type: str
+    # None: a duplicate, image_url is the user's existing image
+    metadata: ImageMetadata | None
+
+
+@tracing.traced
 class ImageService:
     def __init__(self,
                  image_metadata_repo: ImageMetadataRepository,
-                 image_store: ImageStore):
+                 image_store: ImageStore,
+                 metadata_cache: Cache[ImageMetadata],
+                 download_url_cache: Cache[str],
+                 max_upload_size: int = 20 * 1024 * 1024,
+                 derivative_generator: ImageDerivativeGenerator | None = None,
+                 max_upload_files: int = 10,
+                 upload_concurrency: int = 4):
         self._metadata_repo = image_metadata_repo
         self._image_store = image_store
+        # metadata only changes when derivatives are recorded or on delete,
+        # both invalidate it
+        self._metadata_cache = metadata_cache
+        # keyed by (image url, caller), must expire well before the urls do
+        self._download_url_cache = download_url_cache
+        self._max_upload_size = max_upload_size
+        # None disables thumbnails/previews, downloads then always get the original
+        self._derivative_generator = derivative_generator
+        self._max_upload_files = max_upload_files
+        self._upload_concurrency = upload_concurrency
+        self._background_tasks: set[asyncio.Task] = set()
+
+    async def _get_metadata(self, image_url: str) -> ImageMetadata | None:
+        metadata = self._metadata_cache.get(image_url)
+        if metadata is None:
+            metadata = await self._metadata_repo.get(image_url)
+            if metadata is not None:
+                self._cache_metadata(image_url, metadata)
+        return metadata
+
+    def _cache_metadata(self, image_url: str, metadata: ImageMetadata) -> None:
+        if (self._derivative_generator is not None
+                and metadata.content_type in RASTER_CONTENT_TYPES
+                and not metadata.derivatives):
+            # derivatives may still be rendering and get recorded through
+            # another worker, whose invalidation never reaches this cache;
+            # pdfs never get any, nor do images older than ContentType
+            self._metadata_cache.set(image_url, metadata, ttl=UNRENDERED_METADATA_TTL)
+        else:
+            self._metadata_cache.set(image_url, metadata)
+
+    async def _forget_image(self, image_url: str) -> None:
+        self._metadata_cache.delete(image_url)
+        await self._metadata_repo.delete(image_url)
+
+    async def upload_image(self,
+                           curr_user: UserClaims,
+                           image_name: str,
+                           content_type: str,
+                           chunks: AsyncIterator[bytes],
+                           size_hint: int | None = None) -> str:
+        """
+        Streams an upload to the image store, rejecting unsupported types and
+        oversized files before or while the bytes arrive. Re-uploading content
+        the user already has stores nothing and returns the existing image,
+        which then counts one more reference.
+        :returns image url
+        """
+        upload = await self._store_upload(
+            curr_user, image_name, content_type, chunks, size_hint)
+        if upload.metadata is None:
+            return upload.image_url
+        return await self._save_upload(upload)
+
+    async def upload_images(self,
+                            curr_user: UserClaims,
+                            files: AsyncIterator[tuple[str, str, AsyncIterator[bytes]]]) -> list[str]:
+        """
+        upload_image for several files of one request: (name, content type,
+        chunks) files are streamed to the image store concurrently, at most
+        upload_concurrency at once, and their metadata is saved with a single
+        write. Either every image is stored or none is.
+        :returns image urls in upload order
+        """
+        stored = await self._store_uploads(curr_user, files)
+        new, copies = self._split_copies(stored)
+        saved_urls = await self._save_uploads(curr_user, stored, new)
+        for upload in copies:
+            saved_urls[upload.image_url] = await self._save_copy(curr_user, upload, saved_urls)
+        return [saved_urls.get(upload.image_url, upload.image_url) for upload in stored]
+
+    async def _store_uploads(self,
+                             curr_user: UserClaims,
+                             files: AsyncIterator[tuple[str, str, AsyncIterator[bytes]]]) -> list[_StoredUpload]:
+        """
+        Runs _store_upload for every file, at most upload_concurrency at once;
+        when one fails the others are cancelled and the finished ones discarded
+        """
+        uploads: list[asyncio.Task[_StoredUpload]] = []
+        slots = asyncio.Semaphore(self._upload_concurrency)
+
+        async def store(image_name: str,
+                        content_type: str,
+                        chunks: AsyncIterator[bytes]) -> _StoredUpload:
+            try:
+                return await self._store_upload(curr_user, image_name, content_type, chunks)
+            finally:
+                slots.release()
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                async for image_name, content_type, chunks in files:
+                    if len(uploads) == self._max_upload_files:
+                        raise AppException(
+                            AppErr.VALIDATION,
+                            f"At most {self._max_upload_files} files can be uploaded at once")
+                    # reading the next file waits for a free slot
+                    await slots.acquire()
+                    uploads.append(group.create_task(
+                        store(image_name, content_type, chunks)))
+        except BaseExceptionGroup as errors:
+            await self._discard_uploads(curr_user, [
+                task.result() for task in uploads
+                if task.done() and not task.cancelled() and task.exception() is None
+            ])
+            app_errors = [err for err in errors.exceptions if isinstance(err, AppException)]
+            if app_errors:
+                raise app_errors[0]
+            raise
+        return [task.result() for task in uploads]
+
+    @staticmethod
+    def _split_copies(stored: list[_StoredUpload]) -> tuple[list[_StoredUpload], list[_StoredUpload]]:
+        """
+        :returns the new uploads to save and the copies of content uploaded
+            earlier in the same request, which are stored only once
+        """
+        new: list[_StoredUpload] = []
+        copies: list[_StoredUpload] = []
+        seen_hashes: set[str] = set()
+        for upload in stored:
+            if upload.metadata is None:
+                continue
+            content_hash = upload.metadata.content_hash
+            if content_hash is None:
+                new.append(upload)
+            elif content_hash in seen_hashes:
+                copies.append(upload)
+            else:
+                seen_hashes.add(content_hash)
+                new.append(upload)
+        return new, copies
+
+    async def _save_uploads(self,
+                            curr_user: UserClaims,
+                            stored: list[_StoredUpload],
+                            new: list[_StoredUpload]) -> dict[str, str]:
+        """
+        Saves the metadata of new uploads in one write
+        :returns the image url each upload ended up as
+        """
+        saved_urls = {upload.image_url: upload.image_url for upload in new}
+        try:
+            await self._metadata_repo.save_many(
+                {upload.image_url: upload.metadata for upload in new if upload.metadata})
+        except AppException as err:
+            if err.err_code not in (AppErr.IMAGE_CONTENT_ALREADY_EXIST,
+                                    AppErr.IMAGE_URL_ALREADY_EXIST):
+                await self._discard_uploads(curr_user, stored)
+                raise
+            # an identical upload elsewhere finished first, nothing was saved:
+            # resolve the conflicts one image at a time
+            for upload in new:
+                saved_urls[upload.image_url] = await self._save_upload(upload)
+            return saved_urls
+        for upload in new:
+            self._create_derivatives_later(upload.image_url, upload.content_type)
+        return saved_urls
+
+    async def _save_copy(self,
+                         curr_user: UserClaims,
+                         upload: _StoredUpload,
+                         saved_urls: dict[str, str]) -> str:
+        """
+        Makes a copy of content saved earlier in the request one more
+        reference to that image and drops the copy's object
+        :returns image url the copy ended up as
+        """
+        assert upload.metadata is not None and upload.metadata.content_hash is not None
+        existing_url = await self._metadata_repo.add_content_reference(
+            curr_user.user_id, upload.metadata.content_hash)
+        if existing_url is None:
+            # the shared copy lost its content item, keep this one unshared
+            upload.metadata.content_hash = None
+            return await self._save_upload(upload)
+        await self._image_store.delete_image(upload.image_url)
+        return saved_urls.get(existing_url, existing_url)
+
+    async def _discard_uploads(self, curr_user: UserClaims, uploads: list[_StoredUpload]) -> None:
+        """Undoes uploads of a failed request: new objects are deleted, deduplicated
+        ones drop the reference they added"""
+        results = await asyncio.gather(*(
+            self._image_store.delete_image(upload.image_url)
+            if upload.metadata is not None
+            else self.delete_image(curr_user, upload.image_url)
+            for upload in uploads
+        ), return_exceptions=True)
+        for upload, result in zip(uploads, results):
+            if isinstance(result, BaseException):
+                logger.warning("failed to discard upload %s: %s", upload.image_url, result)
+
+    async def _store_upload(self,
+                            curr_user: UserClaims,
+                            image_name: str,
+                            content_type: str,
+                            chunks: AsyncIterator[bytes],
+                            size_hint: int | None = None) -> _StoredUpload:
+        """
+        Streams an upload to the image store without saving its metadata;
+        a duplicate of the user's content comes back without metadata, its
+        existing image already holding one more reference
+        """
+        if content_type not in IMAGE_CONTENT_TYPES:
+            raise AppException(AppErr.IMAGE_TYPE_NOT_ALLOWED)
+        if size_hint is not None and size_hint > self._max_upload_size:
+            raise AppException(AppErr.IMAGE_TOO_LARGE)
+        content_hash: str | None = None
+        duplicate_url: str | None = None
+
+        async def find_duplicate(sha256: str) -> str | None:
+            nonlocal content_hash, duplicate_url
+            content_hash = sha256
+            duplicate_url = await self._metadata_repo.add_content_reference(
+                curr_user.user_id, sha256)
+            return duplicate_url
+
+        image_url = await self._image_store.upload_image_stream(
+            image_name, content_type, self._checked_chunks(content_type, chunks),
+            find_duplicate)
+        if duplicate_url is not None:
+            return _StoredUpload(duplicate_url, content_type, None)
+        return _StoredUpload(image_url, content_type, ImageMetadata(
+            UserID=curr_user.user_id,
+            ContentHash=content_hash,
+            ContentType=content_type,
+            CreatedAt=int(time.time() * 1000)))
+
+    async def _save_upload(self, upload: _StoredUpload) -> str:
+        """
+        Saves metadata of a stored upload, resolving a race with an identical
+        upload by the same user
+        :returns image url, the other upload's if that one won
+        """
+        image_url, metadata = upload.image_url, upload.metadata
+        assert metadata is not None
+        try:
+            await self._metadata_repo.save(image_url, metadata)
+        except AppException as err:
+            if err.err_code != AppErr.IMAGE_CONTENT_ALREADY_EXIST or metadata.content_hash is None:
+                raise
+            # an identical upload by the same user finished first
+            existing_url = await self._metadata_repo.add_content_reference(
+                metadata.user_id, metadata.content_hash)
+            if existing_url is not None:
+                await self._image_store.delete_image(image_url)
+                return existing_url
+            # ...and is being deleted, keep this copy without sharing it
+            metadata.content_hash = None
+            await self._metadata_repo.save(image_url, metadata)
+        self._create_derivatives_later(image_url, upload.content_type)
+        return image_url
 
-    async def upload_image(self, curr_user: UserClaims, image_data: IO, image_name: str):
-        metadata = ImageMetadata(UserID=curr_user.user_id)
-        image_url = await self._image_store.upload_image(image_name, image_data)
-        await self._metadata_repo.save(image_url, metadata)
+    async def create_upload_url(self,
+                                curr_user: UserClaims,
+                                image_name: str,
+                                content_type: str,
+                                size: int) -> PresignedUpload:
+        """
+        Presigns a direct browser to S3 upload under the caller's own key
+        prefix; complete_upload must be called once the upload finished
+        """
+        if content_type not in IMAGE_CONTENT_TYPES:
+            raise AppException(AppErr.IMAGE_TYPE_NOT_ALLOWED)
+        if size > self._max_upload_size:
+            raise AppException(AppErr.IMAGE_TOO_LARGE)
+        image_name = PurePosixPath(image_name).name or "Untitled"
+        return await self._image_store.create_presigned_upload(
+            self._upload_prefix(curr_user.user_id),
+            image_name,
+            content_type,
+            self._max_upload_size,
+        )
+
+    async def complete_upload(self, curr_user: UserClaims, image_url: str) -> str:
+        """
+        Verifies a directly uploaded object and records its metadata;
+        objects failing verification are deleted
+        :returns image url
+        """
+        obj_key = self._image_store.get_object_key(image_url)
+        if not obj_key.startswith(self._upload_prefix(curr_user.user_id)):
+            raise AppException(AppErr.UNAUTHORIZED_IMAGE_ACCESS)
+
+        info = await self._image_store.get_image_info(image_url)
+        if (info.size > self._max_upload_size
+                or info.content_type not in IMAGE_CONTENT_TYPES
+                or sniff_content_type(info.leading_bytes) != info.content_type):
+            await self._image_store.delete_image(image_url)
+            raise AppException(AppErr.IMAGE_TYPE_NOT_ALLOWED,
+                               "Uploaded file is not a supported image")
+
+        metadata = ImageMetadata(UserID=curr_user.user_id,
+                                 ContentType=info.content_type,
+                                 CreatedAt=int(time.time() * 1000))
+        try:
+            await self._metadata_repo.save(image_url, metadata)
+        except AppException as err:
+            # completing twice is fine, the owner check above already passed
+            if err.err_code != AppErr.IMAGE_URL_ALREADY_EXIST:
+                raise
+            return image_url
+        self._create_derivatives_later(image_url, info.content_type)
         return image_url
 
+    def _run_in_background(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def _create_derivatives_later(self, image_url: str, content_type: str) -> None:
+        if self._derivative_generator is not None and content_type in RASTER_CONTENT_TYPES:
+            self._run_in_background(self._create_derivatives(image_url))
+
+    async def _create_derivatives(self, image_url: str) -> None:
+        """
+        Renders the thumbnail and preview of a new upload, stores them next to
+        the original and records them in its metadata; on failure downloads
+        keep serving the original
+        """
+        assert self._derivative_generator is not None
+        try:
+            image = await self._image_store.download_image(image_url)
+            renders = await self._derivative_generator.generate(image)
+            derivative_urls = await asyncio.gather(*(
+                self._image_store.upload_derivative(image_url, size, "image/webp", data)
+                for size, data in renders.items()
+            ))
+            try:
+                await self._metadata_repo.set_derivatives(
+                    image_url, dict(zip(renders, derivative_urls)))
+            except AppException:
+                # the image was deleted while rendering
+                await asyncio.gather(*(
+                    self._image_store.delete_image(url) for url in derivative_urls
+                ), return_exceptions=True)
+                raise
+            self._metadata_cache.delete(image_url)
+        except AppException as err:
+            logger.warning("skipped derivatives for image %s: %s",
+                           image_url, err.err_code.name)
+
+    @staticmethod
+    def _upload_prefix(user_id: str) -> str:
+        return f"{DIRECT_UPLOAD_PREFIX}{user_id}/"
+
+    async def _checked_chunks(self,
+                              content_type: str,
+                              chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """
+        Passes chunks through, enforcing the size limit and checking the
+        leading bytes really are the declared content type
+        """
+        head = b""
+        size = 0
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > self._max_upload_size:
+                raise AppException(AppErr.IMAGE_TOO_LARGE)
+            if head is not None:
+                head += chunk
+                if len(head) < SNIFF_LENGTH:
+                    continue
+                self._check_content_type(head, content_type)
+                chunk, head = head, None
+            yield chunk
+        if head is not None:
+            self._check_content_type(head, content_type)
+            yield head
+
+    @staticmethod
+    def _check_content_type(head: bytes, content_type: str) -> None:
+        if sniff_content_type(head) != content_type:
+            raise AppException(AppErr.IMAGE_TYPE_NOT_ALLOWED,
+                               "File content does not match its content type")
+
     async def delete_image(self, curr_user: UserClaims, image_url: str):
-        metadata = await self._metadata_repo.get(image_url)
+        metadata = await self._get_metadata(image_url)
         if not metadata:
             raise AppException(AppErr.IMAGE_NOT_FOUND)
         if metadata.user_id != curr_user.user_id:
             raise AppException(AppErr.UNAUTHORIZED_IMAGE_ACCESS)
+        if not await self._metadata_repo.remove_reference(image_url, metadata):
+            # the same content is still attached elsewhere
+            return
+        self._metadata_cache.delete(image_url)
+        derivative_urls = list(metadata.derivatives.values())
+        for url in [image_url, *derivative_urls]:
+            self._download_url_cache.delete((url, curr_user.user_id))
         await asyncio.gather(
             self._image_store.delete_image(image_url),
-            self._metadata_repo.delete(image_url),
+            *(self._delete_derivative(url) for url in derivative_urls),
         )
 
-    async def get_image_download_url(self, curr_user: UserClaims, image_url: str):
-        metadata = await self._metadata_repo.get(image_url)
+    async def delete_images(self,
+                            curr_user: UserClaims,
+                            image_urls: list[str]) -> list[ImageDeleteResult]:
+        """
+        Bulk delete_image: one batched metadata read for the ownership
+        checks, batched reference removal and one DeleteObjects call for the
+        objects and derivatives, with per url results instead of failing
+        the whole batch
+        :returns one result per unique url, in request order
+        """
+        unique_urls = list(dict.fromkeys(image_urls))
+        metadata_by_url = await self._get_metadata_many(unique_urls)
+        errors: dict[str, AppErr] = {}
+        owned: dict[str, ImageMetadata] = {}
+        for image_url in unique_urls:
+            metadata = metadata_by_url.get(image_url)
+            if not metadata:
+                errors[image_url] = AppErr.IMAGE_NOT_FOUND
+            elif metadata.user_id != curr_user.user_id:
+                errors[image_url] = AppErr.UNAUTHORIZED_IMAGE_ACCESS
+            else:
+                owned[image_url] = metadata
+        if owned:
+            removed = await self._metadata_repo.remove_references(owned)
+            for image_url in await self._delete_objects(curr_user, {
+                    url: owned[url] for url in removed}):
+                errors[image_url] = AppErr.IMAGE_DELETE_FAILED
+        return [
+            ImageDeleteResult(
+                image_url=image_url,
+                error=errors[image_url].name if image_url in errors else None)
+            for image_url in unique_urls
+        ]
+
+    async def _delete_objects(self,
+                              curr_user: UserClaims,
+                              images: dict[str, ImageMetadata]) -> list[str]:
+        """
+        Deletes the stored objects of images whose metadata is gone
+        :returns urls of the images whose objects could not all be deleted
+        """
+        if not images:
+            return []
+        object_urls: dict[str, str] = {}
+        for image_url, metadata in images.items():
+            self._metadata_cache.delete(image_url)
+            for url in [image_url, *metadata.derivatives.values()]:
+                self._download_url_cache.delete((url, curr_user.user_id))
+                object_urls[url] = image_url
+        failed = await self._image_store.delete_images(list(object_urls))
+        if failed:
+            # the metadata is gone already, the objects are left behind
+            logger.warning("failed to delete %d stored objects: %s", len(failed), failed)
+        return list(dict.fromkeys(object_urls[url] for url in failed if url in object_urls))
+
+    async def _delete_derivative(self, derivative_url: str) -> None:
+        try:
+            await self._image_store.delete_image(derivative_url)
+        except AppException as err:
+            if err.err_code != AppErr.IMAGE_NOT_FOUND:
+                raise
+
+    @staticmethod
+    def _sized_url(image_url: str, metadata: ImageMetadata, size: ImageSize) -> str:
+        # derivatives not rendered (yet) fall back to the original
+        return metadata.derivatives.get(size.value, image_url)
+
+    async def get_image_download_url(self,
+                                     curr_user: UserClaims,
+                                     image_url: str,
+                                     size: ImageSize = ImageSize.Original):
+        metadata = await self._get_metadata(image_url)
+        return await self._download_url_for(curr_user, image_url, metadata, size)
+
+    async def get_image_download_urls(self,
+                                      curr_user: UserClaims,
+                                      image_urls: list[str],
+                                      size: ImageSize = ImageSize.Original) -> list[ImageDownloadURL]:
+        """
+        Bulk get_image_download_url: one batched metadata read for every url
+        not already cached, with per url results instead of failing the
+        whole batch
+        :returns one result per unique url, in request order
+        """
+        unique_urls = list(dict.fromkeys(image_urls))
+        metadata_by_url = await self._get_metadata_many(unique_urls)
+        results: list[ImageDownloadURL] = []
+        for image_url in unique_urls:
+            try:
+                download_url = await self._download_url_for(
+                    curr_user, image_url, metadata_by_url.get(image_url), size)
+            except AppException as e:
+                results.append(ImageDownloadURL(image_url=image_url, error=e.err_code.name))
+                continue
+            results.append(ImageDownloadURL(image_url=image_url, download_url=download_url))
+        return results
+
+    async def _get_metadata_many(self, image_urls: list[str]) -> dict[str, ImageMetadata]:
+        metadata_by_url: dict[str, ImageMetadata] = {}
+        for image_url in image_urls:
+            metadata = self._metadata_cache.get(image_url)
+            if metadata is not None:
+                metadata_by_url[image_url] = metadata
+        missing = [url for url in image_urls if url not in metadata_by_url]
+        if missing:
+            fetched = await self._metadata_repo.get_many(missing)
+            for image_url, metadata in fetched.items():
+                self._cache_metadata(image_url, metadata)
+            metadata_by_url.update(fetched)
+        return metadata_by_url
+
+    async def _download_url_for(self,
+                                curr_user: UserClaims,
+                                image_url: str,
+                                metadata: ImageMetadata | None,
+                                size: ImageSize) -> str:
+        """Checks the caller may read the image and presigns it at size"""
         if not metadata:
             raise AppException(AppErr.IMAGE_NOT_FOUND)
         if metadata.user_id != curr_user.user_id and curr_user.role != UserRole.Admin:
             raise AppException(AppErr.UNAUTHORIZED_IMAGE_ACCESS)
+        target_url = self._sized_url(image_url, metadata, size)
         try:
-            download_url = await self._image_store.get_image_download_url(image_url)
-            return download_url
+            return await self._presign_download(curr_user, target_url)
         except AppException as e:
-            if e.err_code == AppErr.IMAGE_NOT_FOUND:
+            if e.err_code == AppErr.IMAGE_NOT_FOUND and target_url == image_url:
                 # If image not found in store, delete metadata as well
-                await self._metadata_repo.delete(image_url)
+                await self._forget_image(image_url)
             raise e
+
+    async def _presign_download(self, curr_user: UserClaims, image_url: str) -> str:
+        cache_key = (image_url, curr_user.user_id)
+        download_url = self._download_url_cache.get(cache_key)
+        if download_url is None:
+            download_url = await self._image_store.get_image_download_url(image_url)
+            self._download_url_cache.set(cache_key, download_url)
+        return download_url
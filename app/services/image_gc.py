@@ -0,0 +1,145 @@
+import logging
+import time
+from typing import Callable
+from app.errors.app_exception import AppException
+from app.errors.codes import AppErr
+from app.interfaces import ExpenseRepository, ImageMetadataRepository, ImageStore
+from app.models.image import (
+    DERIVATIVE_WIDTHS,
+    DIRECT_UPLOAD_PREFIX,
+    ImageGCReport,
+    ImageMetadata,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ImageGarbageCollector:
+    """
+    Deletes uploaded images no expense bill refers to, once they are older
+    than a grace period that leaves time to attach fresh uploads to a draft
+
+    An image older than the grace period that gets attached while a run is
+    in progress can still be collected; keep the period well above the
+    time a draft stays open.
+    """
+
+    def __init__(self,
+                 image_metadata_repo: ImageMetadataRepository,
+                 expense_repo: ExpenseRepository,
+                 image_store: ImageStore,
+                 batch_size: int = 1000,
+                 clock: Callable[[], float] = time.time):
+        self._metadata_repo = image_metadata_repo
+        self._expense_repo = expense_repo
+        self._image_store = image_store
+        self._batch_size = batch_size
+        self._clock = clock
+
+    async def collect(self, grace_period: float, dry_run: bool = False) -> ImageGCReport:
+        """
+        Streams all image metadata and deletes the unreferenced images older
+        than grace_period seconds, batch_size at a time
+        """
+        referenced = await self._expense_repo.get_attachment_urls()
+        cutoff = int((self._clock() - grace_period) * 1000)
+        report = ImageGCReport()
+        orphans: dict[str, ImageMetadata] = {}
+        async for image_url, metadata in self._metadata_repo.iter_all():
+            report.scanned += 1
+            if image_url in referenced:
+                continue
+            if not await self._created_before(image_url, metadata, cutoff):
+                continue
+            report.orphaned += 1
+            orphans[image_url] = metadata
+            if len(orphans) >= self._batch_size:
+                await self._delete(orphans, report, dry_run)
+                orphans = {}
+        if orphans:
+            await self._delete(orphans, report, dry_run)
+        return report
+
+    async def collect_uncompleted_uploads(self,
+                                          grace_period: float,
+                                          dry_run: bool = False) -> ImageGCReport:
+        """
+        Deletes direct uploads older than grace_period seconds that were
+        never completed: objects under the direct upload prefix without
+        metadata, along with derivatives whose original has no metadata
+        """
+        cutoff = int((self._clock() - grace_period) * 1000)
+        report = ImageGCReport()
+        batch: list[str] = []
+        async for object_url, last_modified in self._image_store.list_images(DIRECT_UPLOAD_PREFIX):
+            report.scanned += 1
+            if last_modified >= cutoff:
+                continue
+            batch.append(object_url)
+            if len(batch) >= self._batch_size:
+                await self._delete_unrecorded(batch, report, dry_run)
+                batch = []
+        if batch:
+            await self._delete_unrecorded(batch, report, dry_run)
+        return report
+
+    @staticmethod
+    def _original_url(object_url: str) -> str:
+        # derivatives are stored as <original key>.<size>
+        for size in DERIVATIVE_WIDTHS:
+            if object_url.endswith(f".{size.value}"):
+                return object_url[:-len(size.value) - 1]
+        return object_url
+
+    async def _delete_unrecorded(self,
+                                 object_urls: list[str],
+                                 report: ImageGCReport,
+                                 dry_run: bool) -> None:
+        recorded = await self._metadata_repo.get_many(
+            list({self._original_url(url) for url in object_urls}))
+        unrecorded = [url for url in object_urls if self._original_url(url) not in recorded]
+        report.orphaned += len(unrecorded)
+        if dry_run or not unrecorded:
+            return
+        failed = await self._image_store.delete_images(unrecorded)
+        report.deleted += len(unrecorded) - len(failed)
+        report.failed += len(failed)
+        if failed:
+            logger.warning("failed to delete %d uncompleted upload objects", len(failed))
+
+    async def _created_before(self, image_url: str, metadata: ImageMetadata, cutoff: int) -> bool:
+        if metadata.created_at is not None:
+            return metadata.created_at < cutoff
+        # uploaded before upload times were recorded, ask the store
+        try:
+            info = await self._image_store.get_image_info(image_url)
+        except AppException as err:
+            if err.err_code == AppErr.IMAGE_NOT_FOUND:
+                # metadata of an object that is already gone
+                return True
+            raise
+        return info.last_modified < cutoff
+
+    async def _delete(self,
+                      orphans: dict[str, ImageMetadata],
+                      report: ImageGCReport,
+                      dry_run: bool) -> None:
+        if dry_run:
+            return
+        object_urls = [
+            url
+            for image_url, metadata in orphans.items()
+            for url in [image_url, *metadata.derivatives.values()]
+        ]
+        failed = set(await self._image_store.delete_images(object_urls))
+        # metadata of objects that are still there is kept for the next run
+        deletable = {
+            image_url: metadata
+            for image_url, metadata in orphans.items()
+            if image_url not in failed
+        }
+        await self._metadata_repo.delete_many(deletable)
+        report.deleted += len(deletable)
+        report.failed += len(orphans) - len(deletable)
+        if failed:
+            logger.warning("failed to delete %d orphaned image objects", len(failed))
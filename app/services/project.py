@@ -1,10 +1,12 @@
 from uuid import uuid4
+from app import tracing
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
 from app.interfaces import ProjectRepository
 from app.models.project import Project
 
 
+@tracing.traced
 class ProjectService:
     def __init__(self, project_repo: ProjectRepository):
         self.project_repo = project_repo
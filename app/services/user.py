@@ -1,8 +1,10 @@
 import uuid
 
+from app import tracing
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
 from app.interfaces import (
+    Cache,
     PasswordHasher,
     UserRepository,
     ProjectRepository,
@@ -12,6 +14,7 @@ from app.models.notification import EventType, Notification
 from app.models.user import User
 
 
+@tracing.traced
 class UserService:
     def __init__(
         self,
@@ -19,17 +22,19 @@ class UserService:
         user_repo: UserRepository,
         project_repo: ProjectRepository,
         notification_service: NotificationService,
+        profile_cache: Cache[User],
     ):
         self.password_hasher = password_hasher
         self.user_repo = user_repo
         self.project_repo = project_repo
         self.notification_service = notification_service
+        self.profile_cache = profile_cache
 
     async def create_user(self, user: User) -> str:
         if not user.password:
             raise AppException(AppErr.CREATE_USER_PASSWORD_REQUIRED)
 
-        hashed_password = self.password_hasher.hash_password(user.password)
+        hashed_password = await self.password_hasher.hash_password(user.password)
         user.password = hashed_password
         user.id = uuid.uuid4().hex
 
@@ -47,9 +52,10 @@ class UserService:
 
     async def update_user(self, user: User) -> None:
         if user.password != "":
-            hashed_password = self.password_hasher.hash_password(user.password)
+            hashed_password = await self.password_hasher.hash_password(user.password)
             user.password = hashed_password
         await self.user_repo.update(user)
+        self.profile_cache.delete(user.id)
 
     async def get_user_by_id(self, user_id: str) -> User:
         user = await self.user_repo.get(user_id)
@@ -64,6 +70,7 @@ class UserService:
         if curr_user_id == user_id:
             raise AppException(AppErr.CANNOT_DELETE_SELF)
         await self.user_repo.delete(user_id)
+        self.profile_cache.delete(user_id)
 
     async def get_user_budget(self, user_id: str) -> float:
         user = await self.user_repo.get(user_id)
@@ -0,0 +1,1346 @@
+"""
+In-memory stand-in for DynamoDB, for repository tests and offline benchmarks
+
+InMemoryDynamoDB answers the requests of real boto3 clients from botocore's
+before-send hook, so request serialization, boto3 condition objects, the
+resource's type conversion, error parsing and every client event handler
+(timing, consumed capacity) run exactly as they do against DynamoDB. Only
+the HTTP round trip is replaced, by an optional fixed latency.
+
+It follows the DynamoDB behavior repositories depend on: queries and scans
+read at most 1 MB per page and Limit counts items read, not items returned;
+filters run after the read and don't lower its cost; LastEvaluatedKey is
+returned whenever a page stops early, even at the last item; transactions
+check every condition before writing anything and report per item
+cancellation reasons; consumed capacity is computed from item sizes.
+
+Not emulated: secondary indexes, TTL expiry, streams, throttling and the
+reserved word check on attribute names.
+"""
+import base64
+import copy
+import json
+import math
+import re
+import threading
+import time
+import zlib
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Callable, Iterator
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.awsrequest import AWSResponse
+
+ENDPOINT = "http://dynamodb.in-memory"
+
+PAGE_SIZE_LIMIT = 1024 * 1024
+ITEM_SIZE_LIMIT = 400 * 1024
+BATCH_GET_SIZE_LIMIT = 16 * 1024 * 1024
+BATCH_GET_KEYS_LIMIT = 100
+BATCH_WRITE_ITEMS_LIMIT = 25
+TRANSACTION_ITEMS_LIMIT = 100
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+class DynamoDBError(Exception):
+    def __init__(self, code: str, message: str, **fields: Any):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.fields = fields
+
+    def body(self) -> dict:
+        return {"__type": f"com.amazonaws.dynamodb.v20120810#{self.code}",
+                "message": self.message, **self.fields}
+
+
+def _validation_error(message: str) -> DynamoDBError:
+    return DynamoDBError("ValidationException", message)
+
+
+def _conditional_check_failed(item: dict | None, request: dict) -> DynamoDBError:
+    fields = {}
+    if item and request.get("ReturnValuesOnConditionCheckFailure") == "ALL_OLD":
+        fields["Item"] = item
+    return DynamoDBError("ConditionalCheckFailedException",
+                         "The conditional request failed", **fields)
+
+
+# -- attribute values --------------------------------------------------------
+
+def _number(value: str) -> Decimal:
+    return Decimal(value)
+
+
+def _format_number(value: Decimal) -> str:
+    return format(value.normalize(), "f")
+
+
+def _comparable(value: dict) -> tuple:
+    """:returns a hashable (type, value) pair, equal for equal attribute values"""
+    kind, raw = next(iter(value.items()))
+    if kind == "N":
+        return kind, _number(raw)
+    if kind == "B":
+        return kind, base64.b64decode(raw)
+    if kind == "NS":
+        return kind, frozenset(_number(number) for number in raw)
+    if kind == "SS":
+        return kind, frozenset(raw)
+    if kind == "BS":
+        return kind, frozenset(base64.b64decode(binary) for binary in raw)
+    if kind == "L":
+        return kind, tuple(_comparable(element) for element in raw)
+    if kind == "M":
+        return kind, frozenset((name, _comparable(element)) for name, element in raw.items())
+    return kind, raw
+
+
+def _number_size(value: str) -> int:
+    digits = value.lstrip("-").replace(".", "").strip("0") or "0"
+    return math.ceil(len(digits) / 2) + 1
+
+
+def _value_size(value: dict) -> int:
+    kind, raw = next(iter(value.items()))
+    if kind == "S":
+        return len(raw.encode())
+    if kind == "N":
+        return _number_size(raw)
+    if kind == "B":
+        return len(base64.b64decode(raw))
+    if kind in ("BOOL", "NULL"):
+        return 1
+    if kind == "SS":
+        return sum(len(element.encode()) for element in raw)
+    if kind == "NS":
+        return sum(_number_size(element) for element in raw)
+    if kind == "BS":
+        return sum(len(base64.b64decode(element)) for element in raw)
+    if kind == "L":
+        return 3 + sum(1 + _value_size(element) for element in raw)
+    if kind == "M":
+        return 3 + sum(1 + len(name.encode()) + _value_size(element)
+                       for name, element in raw.items())
+    raise _validation_error(f"Unsupported attribute value type: {kind}")
+
+
+def item_size(item: dict) -> int:
+    """:returns the size DynamoDB bills an item for, names included"""
+    return sum(len(name.encode()) + _value_size(value) for name, value in item.items())
+
+
+def _read_units(size: int, consistent: bool) -> float:
+    units = max(1, math.ceil(size / 4096))
+    return float(units) if consistent else units / 2
+
+
+def _write_units(size: int) -> float:
+    return float(max(1, math.ceil(size / 1024)))
+
+
+# -- expressions -------------------------------------------------------------
+
+_TOKEN = re.compile(r"""\s*(?:
+      (?P<value>:[A-Za-z0-9_]+)
+    | (?P<name>\#[A-Za-z0-9_]+)
+    | (?P<index>\d+)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<symbol><>|<=|>=|[=<>(),.\[\]+\-])
+    )""", re.VERBOSE)
+
+_COMPARATORS = {"=", "<>", "<", "<=", ">", ">="}
+_FUNCTIONS = {"attribute_exists", "attribute_not_exists", "attribute_type",
+              "begins_with", "contains"}
+_UPDATE_CLAUSES = {"SET", "REMOVE", "ADD", "DELETE"}
+
+
+class _Parser:
+    """
+    Recursive descent parser of condition, key condition, projection and
+    update expressions; paths come out with attribute name placeholders
+    already replaced
+    """
+
+    def __init__(self, expression: str, names: dict[str, str]):
+        self._expression = expression
+        self._names = names
+        self._tokens = self._tokenize(expression)
+        self._pos = 0
+
+    def _tokenize(self, expression: str) -> list[tuple[str, str]]:
+        tokens = []
+        pos = 0
+        expression = expression.rstrip()
+        while pos < len(expression):
+            match = _TOKEN.match(expression, pos)
+            if match is None or match.end() == pos:
+                raise _validation_error(
+                    f"Invalid expression: syntax error near {expression[pos:pos + 10]!r}")
+            kind = match.lastgroup
+            assert kind is not None
+            tokens.append((kind, match.group(kind)))
+            pos = match.end()
+        return tokens
+
+    def _peek(self, offset: int = 0) -> tuple[str, str] | None:
+        pos = self._pos + offset
+        return self._tokens[pos] if pos < len(self._tokens) else None
+
+    def _peek_word(self) -> str | None:
+        token = self._peek()
+        return token[1].upper() if token and token[0] == "word" else None
+
+    def _next(self) -> tuple[str, str]:
+        token = self._peek()
+        if token is None:
+            raise _validation_error(
+                f"Invalid expression: unexpected end of {self._expression!r}")
+        self._pos += 1
+        return token
+
+    def _expect(self, symbol: str) -> None:
+        kind, text = self._next()
+        if kind != "symbol" or text != symbol:
+            raise _validation_error(
+                f"Invalid expression: expected {symbol!r}, found {text!r} in {self._expression!r}")
+
+    def _accept(self, symbol: str) -> bool:
+        token = self._peek()
+        if token == ("symbol", symbol):
+            self._pos += 1
+            return True
+        return False
+
+    def _end(self) -> None:
+        token = self._peek()
+        if token is not None:
+            raise _validation_error(
+                f"Invalid expression: unexpected {token[1]!r} in {self._expression!r}")
+
+    def path(self) -> tuple:
+        elements: list[str | int] = [self._attribute_name()]
+        while True:
+            if self._accept("."):
+                elements.append(self._attribute_name())
+            elif self._accept("["):
+                kind, text = self._next()
+                if kind != "index":
+                    raise _validation_error(f"Invalid list index {text!r}")
+                elements.append(int(text))
+                self._expect("]")
+            else:
+                return tuple(elements)
+
+    def _attribute_name(self) -> str:
+        kind, text = self._next()
+        if kind == "word":
+            return text
+        if kind == "name":
+            if text not in self._names:
+                raise _validation_error(
+                    "An expression attribute name used in the document path "
+                    f"is not defined; attribute name: {text}")
+            return self._names[text]
+        raise _validation_error(f"Invalid expression: expected an attribute, found {text!r}")
+
+    def operand(self) -> tuple:
+        token = self._peek()
+        if token is not None and token[0] == "value":
+            self._pos += 1
+            return ("value", token[1])
+        if self._peek_word() == "SIZE" and self._peek(1) == ("symbol", "("):
+            self._pos += 2
+            path = self.path()
+            self._expect(")")
+            return ("size", path)
+        return ("path", self.path())
+
+    def condition(self) -> tuple:
+        left = self._and_condition()
+        while self._peek_word() == "OR":
+            self._pos += 1
+            left = ("or", left, self._and_condition())
+        return left
+
+    def _and_condition(self) -> tuple:
+        left = self._not_condition()
+        while self._peek_word() == "AND":
+            self._pos += 1
+            left = ("and", left, self._not_condition())
+        return left
+
+    def _not_condition(self) -> tuple:
+        if self._peek_word() == "NOT":
+            self._pos += 1
+            return ("not", self._not_condition())
+        if self._accept("("):
+            inner = self.condition()
+            self._expect(")")
+            return inner
+        token = self._peek()
+        if token is not None and token[0] == "word" and token[1] in _FUNCTIONS \
+                and self._peek(1) == ("symbol", "("):
+            self._pos += 2
+            args = [self.operand()]
+            while self._accept(","):
+                args.append(self.operand())
+            self._expect(")")
+            return ("function", token[1], tuple(args))
+        return self._comparison(self.operand())
+
+    def _comparison(self, left: tuple) -> tuple:
+        word = self._peek_word()
+        if word == "BETWEEN":
+            self._pos += 1
+            low = self.operand()
+            if self._peek_word() != "AND":
+                raise _validation_error("Invalid expression: BETWEEN needs AND")
+            self._pos += 1
+            return ("between", left, low, self.operand())
+        if word == "IN":
+            self._pos += 1
+            self._expect("(")
+            options = [self.operand()]
+            while self._accept(","):
+                options.append(self.operand())
+            self._expect(")")
+            return ("in", left, tuple(options))
+        kind, text = self._next()
+        if kind != "symbol" or text not in _COMPARATORS:
+            raise _validation_error(
+                f"Invalid expression: expected a comparison, found {text!r} in {self._expression!r}")
+        return ("compare", text, left, self.operand())
+
+    def projection(self) -> tuple:
+        paths = [self.path()]
+        while self._accept(","):
+            paths.append(self.path())
+        return tuple(paths)
+
+    def update(self) -> tuple:
+        actions = []
+        seen = set()
+        while self._peek() is not None:
+            clause = self._peek_word()
+            if clause not in _UPDATE_CLAUSES or clause in seen:
+                raise _validation_error(
+                    f"Invalid UpdateExpression: unexpected {self._peek()[1]!r}")
+            seen.add(clause)
+            self._pos += 1
+            while True:
+                actions.append(self._update_action(clause))
+                if not self._accept(","):
+                    break
+        if not actions:
+            raise _validation_error("Invalid UpdateExpression: empty expression")
+        return tuple(actions)
+
+    def _update_action(self, clause: str) -> tuple:
+        path = self.path()
+        if clause == "REMOVE":
+            return ("remove", path)
+        if clause == "SET":
+            self._expect("=")
+            return ("set", path, self._set_value())
+        return (clause.lower(), path, self.operand())
+
+    def _set_value(self) -> tuple:
+        left = self._set_operand()
+        if self._accept("+"):
+            return ("plus", left, self._set_operand())
+        if self._accept("-"):
+            return ("minus", left, self._set_operand())
+        return left
+
+    def _set_operand(self) -> tuple:
+        word = self._peek_word()
+        if word in ("IF_NOT_EXISTS", "LIST_APPEND") and self._peek(1) == ("symbol", "("):
+            self._pos += 2
+            first = self.path() if word == "IF_NOT_EXISTS" else self._set_value()
+            self._expect(",")
+            second = self._set_value()
+            self._expect(")")
+            return (word.lower(), first, second)
+        return self.operand()
+
+
+def _names_key(names: dict | None) -> tuple:
+    return tuple(sorted((names or {}).items()))
+
+
+@lru_cache(maxsize=1024)
+def _parse(kind: str, expression: str, names: tuple) -> tuple:
+    parser = _Parser(expression, dict(names))
+    if kind == "condition":
+        parsed = parser.condition()
+    elif kind == "projection":
+        parsed = parser.projection()
+    else:
+        parsed = parser.update()
+    parser._end()
+    return parsed
+
+
+def _resolve(item: dict, path: tuple) -> dict | None:
+    value = item.get(path[0])
+    for element in path[1:]:
+        if value is None:
+            return None
+        if isinstance(element, int):
+            elements = value.get("L")
+            value = elements[element] if elements is not None and element < len(elements) else None
+        else:
+            value = (value.get("M") or {}).get(element) if "M" in value else None
+    return value
+
+
+class _Evaluator:
+    def __init__(self, values: dict | None):
+        self._values = values or {}
+
+    def value(self, placeholder: str) -> dict:
+        if placeholder not in self._values:
+            raise _validation_error(
+                "An expression attribute value used in expression is not defined; "
+                f"attribute value: {placeholder}")
+        return self._values[placeholder]
+
+    def operand(self, item: dict, operand: tuple) -> dict | None:
+        kind = operand[0]
+        if kind == "value":
+            return self.value(operand[1])
+        if kind == "path":
+            return _resolve(item, operand[1])
+        value = _resolve(item, operand[1])
+        if value is None:
+            return None
+        value_kind, raw = next(iter(value.items()))
+        if value_kind in ("S", "B"):
+            size = len(raw) if value_kind == "S" else len(base64.b64decode(raw))
+        elif value_kind in ("SS", "NS", "BS", "L", "M"):
+            size = len(raw)
+        else:
+            raise _validation_error(f"Invalid operand type for size(): {value_kind}")
+        return {"N": str(size)}
+
+    def condition(self, item: dict, node: tuple) -> bool:
+        kind = node[0]
+        if kind == "and":
+            return self.condition(item, node[1]) and self.condition(item, node[2])
+        if kind == "or":
+            return self.condition(item, node[1]) or self.condition(item, node[2])
+        if kind == "not":
+            return not self.condition(item, node[1])
+        if kind == "compare":
+            return _compare(node[1], self.operand(item, node[2]), self.operand(item, node[3]))
+        if kind == "between":
+            value = self.operand(item, node[1])
+            return _compare(">=", value, self.operand(item, node[2])) \
+                and _compare("<=", value, self.operand(item, node[3]))
+        if kind == "in":
+            value = self.operand(item, node[1])
+            return any(_compare("=", value, self.operand(item, option)) for option in node[2])
+        return self._function(item, node[1], node[2])
+
+    def _function(self, item: dict, name: str, args: tuple) -> bool:
+        if args[0][0] != "path":
+            raise _validation_error(f"Invalid first operand of {name}, expected a path")
+        value = self.operand(item, args[0])
+        if name == "attribute_exists":
+            return value is not None
+        if name == "attribute_not_exists":
+            return value is None
+        argument = self.operand(item, args[1]) if len(args) > 1 else None
+        if value is None or argument is None:
+            return False
+        if name == "attribute_type":
+            return next(iter(value)) == argument.get("S")
+        if name == "begins_with":
+            return _begins_with(value, argument)
+        return _contains(value, argument)
+
+
+def _begins_with(value: dict, prefix: dict) -> bool:
+    (kind, raw), = value.items()
+    (prefix_kind, prefix_raw), = prefix.items()
+    if kind != prefix_kind or kind not in ("S", "B"):
+        return False
+    if kind == "B":
+        return base64.b64decode(raw).startswith(base64.b64decode(prefix_raw))
+    return raw.startswith(prefix_raw)
+
+
+def _contains(value: dict, element: dict) -> bool:
+    (kind, raw), = value.items()
+    (element_kind, element_raw), = element.items()
+    if kind == "S":
+        return element_kind == "S" and element_raw in raw
+    if kind in ("SS", "NS", "BS"):
+        return element_kind == kind[0] and _comparable(element)[1] in _comparable(value)[1]
+    if kind == "L":
+        return any(_comparable(entry) == _comparable(element) for entry in raw)
+    return False
+
+
+def _compare(operator: str, left: dict | None, right: dict | None) -> bool:
+    if left is None or right is None:
+        return operator == "<>"
+    left_kind, left_value = _comparable(left)
+    right_kind, right_value = _comparable(right)
+    if operator == "=":
+        return (left_kind, left_value) == (right_kind, right_value)
+    if operator == "<>":
+        return (left_kind, left_value) != (right_kind, right_value)
+    if left_kind != right_kind or left_kind not in ("S", "N", "B"):
+        return False
+    if operator == "<":
+        return left_value < right_value
+    if operator == "<=":
+        return left_value <= right_value
+    if operator == ">":
+        return left_value > right_value
+    return left_value >= right_value
+
+
+def _project(item: dict, paths: tuple) -> dict:
+    projected: dict = {}
+    for path in paths:
+        value = _resolve(item, path)
+        if value is not None:
+            _insert(projected, path, value)
+    return projected
+
+
+def _insert(target: dict, path: tuple, value: dict) -> None:
+    """Adds value at path to a projection, creating the maps and lists above it"""
+    name, rest = path[0], path[1:]
+    if not rest:
+        target[name] = copy.deepcopy(value)
+        return
+    if isinstance(rest[0], str):
+        _insert(target.setdefault(name, {"M": {}})["M"], rest, value)
+        return
+    # projected list elements are compacted, in the order they were asked for
+    elements = target.setdefault(name, {"L": []})["L"]
+    if len(rest) == 1:
+        elements.append(copy.deepcopy(value))
+        return
+    if isinstance(rest[1], int):
+        raise _validation_error("Projections of nested lists are not supported by the stand-in")
+    element: dict = {}
+    elements.append({"M": element})
+    _insert(element, rest[1:], value)
+
+
+# -- updates -----------------------------------------------------------------
+
+class _Updater:
+    def __init__(self, evaluator: _Evaluator, key_names: tuple[str, ...]):
+        self._evaluator = evaluator
+        self._key_names = key_names
+
+    def apply(self, item: dict, actions: tuple) -> set[str]:
+        """Updates the item in place; :returns the top level attributes touched"""
+        touched = set()
+        for action in actions:
+            path = action[1]
+            if path[0] in self._key_names:
+                raise _validation_error(
+                    "One or more parameter values were invalid: Cannot update attribute "
+                    f"{path[0]}. This attribute is part of the key")
+            touched.add(path[0])
+            kind = action[0]
+            if kind == "set":
+                self._set(item, path, self._value(item, action[2]))
+            elif kind == "remove":
+                self._remove(item, path)
+            elif kind == "add":
+                self._add(item, path, self._evaluator.operand(item, action[2]))
+            else:
+                self._delete(item, path, self._evaluator.operand(item, action[2]))
+        return touched
+
+    def _value(self, item: dict, node: tuple) -> dict:
+        kind = node[0]
+        if kind in ("plus", "minus"):
+            left, right = self._value(item, node[1]), self._value(item, node[2])
+            if "N" not in left or "N" not in right:
+                raise _validation_error(
+                    "An operand in the update expression has an incorrect data type")
+            result = _number(left["N"]) + _number(right["N"]) if kind == "plus" \
+                else _number(left["N"]) - _number(right["N"])
+            return {"N": _format_number(result)}
+        if kind == "if_not_exists":
+            existing = _resolve(item, node[1])
+            return existing if existing is not None else self._value(item, node[2])
+        if kind == "list_append":
+            left, right = self._value(item, node[1]), self._value(item, node[2])
+            if "L" not in left or "L" not in right:
+                raise _validation_error(
+                    "An operand in the update expression has an incorrect data type")
+            return {"L": left["L"] + right["L"]}
+        value = self._evaluator.operand(item, node)
+        if value is None:
+            raise _validation_error(
+                "The provided expression refers to an attribute that does not exist in the item")
+        return value
+
+    def _parent(self, item: dict, path: tuple) -> dict | list:
+        if len(path) == 1:
+            return item
+        parent = _resolve(item, path[:-1])
+        if parent is None or ("M" not in parent and "L" not in parent):
+            raise _validation_error(
+                "The document path provided in the update expression is invalid for update")
+        return parent.get("M", parent.get("L"))
+
+    def _set(self, item: dict, path: tuple, value: dict) -> None:
+        parent = self._parent(item, path)
+        last = path[-1]
+        if isinstance(parent, list):
+            if not isinstance(last, int):
+                raise _validation_error(
+                    "The document path provided in the update expression is invalid for update")
+            if last < len(parent):
+                parent[last] = copy.deepcopy(value)
+            else:
+                parent.append(copy.deepcopy(value))
+        else:
+            parent[last] = copy.deepcopy(value)
+
+    def _remove(self, item: dict, path: tuple) -> None:
+        try:
+            parent = self._parent(item, path)
+        except DynamoDBError:
+            return
+        last = path[-1]
+        if isinstance(parent, list):
+            if isinstance(last, int) and last < len(parent):
+                del parent[last]
+        else:
+            parent.pop(last, None)
+
+    def _add(self, item: dict, path: tuple, value: dict | None) -> None:
+        assert value is not None
+        existing = _resolve(item, path)
+        kind = next(iter(value))
+        if existing is None:
+            self._set(item, path, value)
+        elif kind == "N" and "N" in existing:
+            total = _number(existing["N"]) + _number(value["N"])
+            self._set(item, path, {"N": _format_number(total)})
+        elif kind in ("SS", "NS", "BS") and kind in existing:
+            merged = existing[kind] + [element for element in value[kind]
+                                       if element not in existing[kind]]
+            self._set(item, path, {kind: merged})
+        else:
+            raise _validation_error(
+                "An operand in the update expression has an incorrect data type")
+
+    def _delete(self, item: dict, path: tuple, value: dict | None) -> None:
+        assert value is not None
+        existing = _resolve(item, path)
+        kind = next(iter(value))
+        if kind not in ("SS", "NS", "BS"):
+            raise _validation_error(
+                "An operand in the update expression has an incorrect data type")
+        if existing is None:
+            return
+        if kind not in existing:
+            raise _validation_error(
+                "An operand in the update expression has an incorrect data type")
+        remaining = [element for element in existing[kind] if element not in value[kind]]
+        if remaining:
+            self._set(item, path, {kind: remaining})
+        else:
+            self._remove(item, path)
+
+
+# -- tables ------------------------------------------------------------------
+
+# partition() from the first item
+_START = object()
+
+
+class _Table:
+    def __init__(self, name: str, hash_key: str, range_key: str | None):
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.key_names = (hash_key, range_key) if range_key else (hash_key,)
+        # hash key -> sorted range keys, and range key -> (item, size)
+        self._range_keys: dict[tuple, list] = {}
+        self._items: dict[tuple, dict[Any, tuple[dict, int]]] = {}
+        self.created_at = time.time()
+
+    def key_of(self, key: dict) -> tuple[tuple, Any]:
+        """Validates a Key against the schema; :returns (hash, range) lookup values"""
+        if set(key) != set(self.key_names):
+            raise _validation_error("The provided key element does not match the schema")
+        hash_value = _comparable(key[self.hash_key])
+        if hash_value[0] not in ("S", "N", "B") or hash_value[1] in ("", b""):
+            raise _validation_error("The provided key element does not match the schema")
+        if self.range_key is None:
+            return hash_value, None
+        range_value = _comparable(key[self.range_key])
+        if range_value[0] not in ("S", "N", "B") or range_value[1] in ("", b""):
+            raise _validation_error("The provided key element does not match the schema")
+        return hash_value, range_value[1]
+
+    def key_attributes(self, item: dict) -> dict:
+        missing = [name for name in self.key_names if name not in item]
+        if missing:
+            raise _validation_error(
+                "One or more parameter values were invalid: Missing the key "
+                f"{missing[0]} in the item")
+        return {name: item[name] for name in self.key_names}
+
+    def get(self, key: dict) -> dict | None:
+        hash_value, range_value = self.key_of(key)
+        stored = self._items.get(hash_value, {}).get(range_value)
+        return stored[0] if stored else None
+
+    def put(self, item: dict) -> None:
+        size = item_size(item)
+        if size > ITEM_SIZE_LIMIT:
+            raise _validation_error("Item size has exceeded the maximum allowed size")
+        hash_value, range_value = self.key_of(self.key_attributes(item))
+        items = self._items.setdefault(hash_value, {})
+        if range_value not in items:
+            range_keys = self._range_keys.setdefault(hash_value, [])
+            range_keys.insert(bisect_left(range_keys, range_value), range_value)
+        items[range_value] = (item, size)
+
+    def delete(self, key: dict) -> None:
+        hash_value, range_value = self.key_of(key)
+        items = self._items.get(hash_value, {})
+        if items.pop(range_value, None) is None:
+            return
+        range_keys = self._range_keys[hash_value]
+        del range_keys[bisect_left(range_keys, range_value)]
+        if not items:
+            del self._items[hash_value]
+            del self._range_keys[hash_value]
+
+    def partition(self,
+                  hash_value: tuple,
+                  forward: bool = True,
+                  start_after: Any = _START) -> Iterator[tuple[dict, int]]:
+        """:yields (item, size) of a partition in range key order, after start_after"""
+        range_keys = self._range_keys.get(hash_value, [])
+        items = self._items.get(hash_value, {})
+        if start_after is _START:
+            keys = range_keys if forward else range_keys[::-1]
+        elif forward:
+            keys = range_keys[bisect_right(range_keys, start_after):]
+        else:
+            keys = range_keys[:bisect_left(range_keys, start_after)][::-1]
+        for range_value in keys:
+            stored = items.get(range_value)
+            if stored is not None:
+                yield stored
+
+    def scan_order(self, segment: int, total_segments: int) -> list[tuple]:
+        """:returns the hash keys of a scan segment, in the order a scan reads them"""
+        hashes = [hash_value for hash_value in self._items
+                  if _segment(hash_value, total_segments) == segment]
+        return sorted(hashes, key=lambda hash_value: (_hash_order(hash_value), hash_value))
+
+    def count(self) -> int:
+        return sum(len(items) for items in self._items.values())
+
+    def size(self) -> int:
+        return sum(size for items in self._items.values() for _, size in items.values())
+
+
+def _hash_order(hash_value: tuple) -> int:
+    return zlib.crc32(repr(hash_value).encode())
+
+
+def _segment(hash_value: tuple, total_segments: int) -> int:
+    return _hash_order(hash_value) % total_segments
+
+
+# -- the service -------------------------------------------------------------
+
+class _Body:
+    def __init__(self, content: bytes):
+        self._content = content
+
+    def stream(self, **_: Any) -> Iterator[bytes]:
+        yield self._content
+
+
+class InMemoryDynamoDB:
+    """
+    Single-process DynamoDB: create_table() the tables, then make clients
+    with resource() or client(), or install() it on one you have. Every call
+    is atomic, transactions included, and sleeps latency seconds first.
+    """
+
+    def __init__(self, latency: float = 0.0, region: str = "us-east-1"):
+        self.latency = latency
+        self.region = region
+        self._lock = threading.RLock()
+        self._tables: dict[str, _Table] = {}
+        # calls per operation, and the capacity they consumed
+        self.calls: Counter[str] = Counter()
+        self.read_units = 0.0
+        self.write_units = 0.0
+        self._operations: dict[str, Callable[[dict], dict]] = {
+            "CreateTable": self._create_table,
+            "DescribeTable": self._describe_table,
+            "DeleteTable": self._delete_table,
+            "GetItem": self._get_item,
+            "PutItem": self._put_item,
+            "UpdateItem": self._update_item,
+            "DeleteItem": self._delete_item,
+            "Query": self._query,
+            "Scan": self._scan,
+            "BatchGetItem": self._batch_get_item,
+            "BatchWriteItem": self._batch_write_item,
+            "TransactGetItems": self._transact_get_items,
+            "TransactWriteItems": self._transact_write_items,
+        }
+
+    def create_table(self, name: str, hash_key: str = "PK", range_key: str | None = "SK") -> None:
+        with self._lock:
+            if name in self._tables:
+                raise DynamoDBError("ResourceInUseException", f"Table already exists: {name}")
+            self._tables[name] = _Table(name, hash_key, range_key)
+
+    def resource(self) -> Any:
+        """:returns a boto3 DynamoDB service resource backed by this stand-in"""
+        resource = self._session().resource("dynamodb", endpoint_url=ENDPOINT)
+        self.install(resource.meta.client)
+        return resource
+
+    def client(self) -> Any:
+        client = self._session().client("dynamodb", endpoint_url=ENDPOINT)
+        self.install(client)
+        return client
+
+    def _session(self) -> boto3.Session:
+        return boto3.Session(aws_access_key_id="test", aws_secret_access_key="test",
+                             region_name=self.region)
+
+    def install(self, client: Any) -> None:
+        """Answers the DynamoDB requests of a botocore client from memory"""
+        client.meta.events.register("before-send.dynamodb", self._handle)
+
+    def put_items(self, table_name: str, items: list[dict]) -> None:
+        """Stores plain Python items directly, without accounting, to seed tables quickly"""
+        with self._lock:
+            table = self._table(table_name)
+            for item in items:
+                table.put({name: _serializer.serialize(value) for name, value in item.items()})
+
+    def items(self, table_name: str) -> list[dict]:
+        """:returns every item of the table as plain Python values, in scan order"""
+        with self._lock:
+            table = self._table(table_name)
+            return [
+                {name: _deserializer.deserialize(value) for name, value in item.items()}
+                for hash_value in table.scan_order(0, 1)
+                for item, _ in table.partition(hash_value, forward=True)
+            ]
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.calls.clear()
+            self.read_units = self.write_units = 0.0
+
+    def _handle(self, request: Any, event_name: str, **_: Any) -> AWSResponse:
+        operation = event_name.rsplit(".", 1)[-1]
+        body = json.loads(request.body or b"{}")
+        if self.latency:
+            time.sleep(self.latency)
+        status = 200
+        with self._lock:
+            self.calls[operation] += 1
+            try:
+                handler = self._operations.get(operation)
+                if handler is None:
+                    raise DynamoDBError("UnknownOperationException",
+                                        f"{operation} is not supported by the stand-in")
+                response = handler(body)
+            except DynamoDBError as err:
+                status, response = 400, err.body()
+        return AWSResponse(request.url, status,
+                           {"Content-Type": "application/x-amz-json-1.0"},
+                           _Body(json.dumps(response).encode()))
+
+    def _table(self, name: str) -> _Table:
+        table = self._tables.get(name)
+        if table is None:
+            raise DynamoDBError("ResourceNotFoundException",
+                                f"Requested resource not found: Table: {name} not found")
+        return table
+
+
+    # -- capacity ------------------------------------------------------------
+
+    def _book(self, units: dict[str, tuple[float, float]]) -> None:
+        """Adds (read, write) units per table to the totals"""
+        for read, write in units.values():
+            self.read_units += read
+            self.write_units += write
+
+    def _report(self,
+                request: dict,
+                units: dict[str, tuple[float, float]],
+                response: dict,
+                as_list: bool = False) -> dict:
+        """Adds the consumed capacity to the response, if the request asked for it"""
+        mode = request.get("ReturnConsumedCapacity", "NONE")
+        if mode == "NONE":
+            return response
+        entries = []
+        for table_name, (read, write) in units.items():
+            entry: dict = {"TableName": table_name, "CapacityUnits": read + write}
+            if read:
+                entry["ReadCapacityUnits"] = read
+            if write:
+                entry["WriteCapacityUnits"] = write
+            if mode == "INDEXES":
+                entry["Table"] = {"CapacityUnits": read + write}
+            entries.append(entry)
+        response["ConsumedCapacity"] = entries if as_list else entries[0]
+        return response
+
+    # -- tables --------------------------------------------------------------
+
+    def _create_table(self, request: dict) -> dict:
+        keys = {key["KeyType"]: key["AttributeName"] for key in request["KeySchema"]}
+        self.create_table(request["TableName"], keys["HASH"], keys.get("RANGE"))
+        return {"TableDescription": self._description(request["TableName"])}
+
+    def _describe_table(self, request: dict) -> dict:
+        return {"Table": self._description(request["TableName"])}
+
+    def _delete_table(self, request: dict) -> dict:
+        description = self._description(request["TableName"])
+        del self._tables[request["TableName"]]
+        return {"TableDescription": {**description, "TableStatus": "DELETING"}}
+
+    def _description(self, name: str) -> dict:
+        table = self._table(name)
+        schema = [{"AttributeName": table.hash_key, "KeyType": "HASH"}]
+        if table.range_key:
+            schema.append({"AttributeName": table.range_key, "KeyType": "RANGE"})
+        return {
+            "TableName": name,
+            "TableStatus": "ACTIVE",
+            "KeySchema": schema,
+            "ItemCount": table.count(),
+            "TableSizeBytes": table.size(),
+            "CreationDateTime": table.created_at,
+            "BillingModeSummary": {"BillingMode": "PAY_PER_REQUEST"},
+        }
+
+    # -- items ---------------------------------------------------------------
+
+    def _projected(self, item: dict, request: dict) -> dict:
+        projection = request.get("ProjectionExpression")
+        if not projection:
+            return copy.deepcopy(item)
+        paths = _parse("projection", projection,
+                       _names_key(request.get("ExpressionAttributeNames")))
+        return _project(item, paths)
+
+    def _condition_holds(self, request: dict, existing: dict | None) -> bool:
+        expression = request.get("ConditionExpression")
+        if not expression:
+            return True
+        condition = _parse("condition", expression,
+                           _names_key(request.get("ExpressionAttributeNames")))
+        return _Evaluator(request.get("ExpressionAttributeValues")).condition(
+            existing or {}, condition)
+
+    def _updated(self, table: _Table, request: dict, existing: dict | None) -> tuple[dict, set[str]]:
+        """:returns the item after the UpdateExpression, and the attributes it touched"""
+        if "AttributeUpdates" in request:
+            raise _validation_error("AttributeUpdates is not supported by the stand-in")
+        item = copy.deepcopy(existing) if existing is not None else copy.deepcopy(request["Key"])
+        expression = request.get("UpdateExpression")
+        if not expression:
+            return item, set()
+        actions = _parse("update", expression,
+                         _names_key(request.get("ExpressionAttributeNames")))
+        updater = _Updater(_Evaluator(request.get("ExpressionAttributeValues")), table.key_names)
+        return item, updater.apply(item, actions)
+
+    def _write(self,
+               table: _Table,
+               request: dict,
+               existing: dict | None,
+               written: dict | None) -> dict:
+        """Books the write, fails it if the condition doesn't hold, or stores it"""
+        size = max(item_size(written) if written else 0, item_size(existing) if existing else 0)
+        units = {table.name: (0.0, _write_units(size))}
+        self._book(units)
+        if not self._condition_holds(request, existing):
+            raise _conditional_check_failed(existing, request)
+        if written is None:
+            table.delete(request["Key"])
+        else:
+            table.put(written)
+        return self._report(request, units, {})
+
+    def _get_item(self, request: dict) -> dict:
+        table = self._table(request["TableName"])
+        item = table.get(request["Key"])
+        units = {table.name: (_read_units(item_size(item) if item else 0,
+                                          request.get("ConsistentRead", False)), 0.0)}
+        self._book(units)
+        response: dict = {}
+        if item is not None:
+            response["Item"] = self._projected(item, request)
+        return self._report(request, units, response)
+
+    def _put_item(self, request: dict) -> dict:
+        table = self._table(request["TableName"])
+        existing = table.get(table.key_attributes(request["Item"]))
+        response = self._write(table, request, existing, copy.deepcopy(request["Item"]))
+        if existing is not None and request.get("ReturnValues") == "ALL_OLD":
+            response["Attributes"] = existing
+        return response
+
+    def _delete_item(self, request: dict) -> dict:
+        table = self._table(request["TableName"])
+        existing = table.get(request["Key"])
+        response = self._write(table, request, existing, None)
+        if existing is not None and request.get("ReturnValues") == "ALL_OLD":
+            response["Attributes"] = existing
+        return response
+
+    def _update_item(self, request: dict) -> dict:
+        table = self._table(request["TableName"])
+        existing = table.get(request["Key"])
+        if not self._condition_holds(request, existing):
+            self._book({table.name: (0.0, _write_units(item_size(existing) if existing else 0))})
+            raise _conditional_check_failed(existing, request)
+        item, touched = self._updated(table, request, existing)
+        response = self._write(table, {**request, "ConditionExpression": None}, existing, item)
+        returned = self._returned_values(request.get("ReturnValues", "NONE"),
+                                         existing or {}, item, touched)
+        if returned:
+            response["Attributes"] = returned
+        return response
+
+    @staticmethod
+    def _returned_values(mode: str, old: dict, new: dict, touched: set[str]) -> dict:
+        if mode == "ALL_OLD":
+            return copy.deepcopy(old)
+        if mode == "ALL_NEW":
+            return copy.deepcopy(new)
+        if mode == "UPDATED_OLD":
+            return {name: copy.deepcopy(old[name]) for name in touched if name in old}
+        if mode == "UPDATED_NEW":
+            return {name: copy.deepcopy(new[name]) for name in touched if name in new}
+        return {}
+
+    # -- queries and scans ---------------------------------------------------
+
+    def _query(self, request: dict) -> dict:
+        table = self._table(request["TableName"])
+        if "IndexName" in request:
+            raise _validation_error(
+                f"The table does not have the specified index: {request['IndexName']}")
+        if "KeyConditionExpression" not in request:
+            raise _validation_error("Either the KeyConditions or KeyConditionExpression "
+                                    "parameter must be specified in the request")
+        evaluator = _Evaluator(request.get("ExpressionAttributeValues"))
+        key_condition = _parse("condition", request["KeyConditionExpression"],
+                               _names_key(request.get("ExpressionAttributeNames")))
+        hash_value, range_condition = self._key_condition(table, key_condition, evaluator)
+        start_after = _START
+        if "ExclusiveStartKey" in request:
+            start_hash, start_after = table.key_of(request["ExclusiveStartKey"])
+            if start_hash != hash_value:
+                raise _validation_error("The provided starting key is invalid")
+        candidates = (
+            (item, size)
+            for item, size in table.partition(
+                hash_value, request.get("ScanIndexForward", True), start_after)
+            if range_condition is None or evaluator.condition(item, range_condition))
+        return self._read_page(table, request, evaluator, candidates)
+
+    @staticmethod
+    def _key_condition(table: _Table,
+                       condition: tuple,
+                       evaluator: _Evaluator) -> tuple[tuple, tuple | None]:
+        """:returns the partition a key condition selects, and its range key condition"""
+        parts = []
+        pending = [condition]
+        while pending:
+            node = pending.pop()
+            if node[0] == "and":
+                pending.extend(node[1:])
+            else:
+                parts.append(node)
+        hash_value = None
+        range_condition = None
+        for node in parts:
+            if node[0] == "compare" and node[1] == "=" and node[2] == ("path", (table.hash_key,)) \
+                    and node[3][0] == "value" and hash_value is None:
+                hash_value = _comparable(evaluator.value(node[3][1]))
+            elif range_condition is None and _is_range_condition(table, node):
+                range_condition = node
+            else:
+                raise _validation_error("Query key condition not supported")
+        if hash_value is None:
+            raise _validation_error("Query condition missed key schema element: "
+                                    f"{table.hash_key}")
+        return hash_value, range_condition
+
+    def _scan(self, request: dict) -> dict:
+        table = self._table(request["TableName"])
+        if "IndexName" in request:
+            raise _validation_error(
+                f"The table does not have the specified index: {request['IndexName']}")
+        total_segments = request.get("TotalSegments", 1)
+        segment = request.get("Segment", 0)
+        if ("Segment" in request) != ("TotalSegments" in request) \
+                or not 0 <= segment < total_segments:
+            raise _validation_error(
+                "The Segment parameter must be less than TotalSegments, and both must be set")
+        order = table.scan_order(segment, total_segments)
+        start = request.get("ExclusiveStartKey")
+        if start is not None:
+            start_hash, start_range = table.key_of(start)
+            start_order = (_hash_order(start_hash), start_hash)
+            order = [hash_value for hash_value in order
+                     if (_hash_order(hash_value), hash_value) >= start_order]
+
+        def candidates() -> Iterator[tuple[dict, int]]:
+            for hash_value in order:
+                if start is not None and hash_value == start_hash:
+                    yield from table.partition(hash_value, start_after=start_range)
+                else:
+                    yield from table.partition(hash_value)
+
+        return self._read_page(table, request,
+                               _Evaluator(request.get("ExpressionAttributeValues")), candidates())
+
+    def _read_page(self,
+                   table: _Table,
+                   request: dict,
+                   evaluator: _Evaluator,
+                   candidates: Iterator[tuple[dict, int]]) -> dict:
+        """
+        Reads items until Limit items or 1 MB were read, then filters them;
+        the whole read is billed, whatever the filter leaves
+        """
+        limit = request.get("Limit")
+        if limit is not None and limit < 1:
+            raise _validation_error("Limit must be greater than or equal to 1")
+        read, read_size, stopped = _read(candidates, limit)
+        items = [item for item in read if self._matches_filter(request, evaluator, item)]
+        units = {table.name: (_read_units(read_size, request.get("ConsistentRead", False)), 0.0)}
+        self._book(units)
+        response: dict = {"Count": len(items), "ScannedCount": len(read)}
+        if request.get("Select") != "COUNT":
+            response["Items"] = [self._projected(item, request) for item in items]
+        if stopped:
+            response["LastEvaluatedKey"] = copy.deepcopy(table.key_attributes(read[-1]))
+        return self._report(request, units, response)
+
+    @staticmethod
+    def _matches_filter(request: dict, evaluator: _Evaluator, item: dict) -> bool:
+        expression = request.get("FilterExpression")
+        if not expression:
+            return True
+        condition = _parse("condition", expression,
+                           _names_key(request.get("ExpressionAttributeNames")))
+        return evaluator.condition(item, condition)
+
+    # -- batches -------------------------------------------------------------
+
+    def _batch_get_item(self, request: dict) -> dict:
+        request_items = request["RequestItems"]
+        if sum(len(spec["Keys"]) for spec in request_items.values()) > BATCH_GET_KEYS_LIMIT:
+            raise _validation_error("Too many items requested for the BatchGetItem call")
+        responses: dict[str, list] = {}
+        unprocessed: dict[str, dict] = {}
+        units: dict[str, tuple[float, float]] = {}
+        response_size = 0
+        for table_name, spec in request_items.items():
+            table = self._table(table_name)
+            _check_unique_keys(table, spec["Keys"])
+            consistent = spec.get("ConsistentRead", False)
+            found = responses.setdefault(table_name, [])
+            read = 0.0
+            for key in spec["Keys"]:
+                item = table.get(key)
+                size = item_size(item) if item else 0
+                if response_size + size > BATCH_GET_SIZE_LIMIT:
+                    unprocessed.setdefault(table_name, {**spec, "Keys": []})["Keys"].append(key)
+                    continue
+                response_size += size
+                read += _read_units(size, consistent)
+                if item is not None:
+                    found.append(self._projected(item, spec))
+            units[table_name] = (read, 0.0)
+        self._book(units)
+        return self._report(request, units,
+                            {"Responses": responses, "UnprocessedKeys": unprocessed},
+                            as_list=True)
+
+    def _batch_write_item(self, request: dict) -> dict:
+        request_items = request["RequestItems"]
+        total = sum(len(writes) for writes in request_items.values())
+        if not 1 <= total <= BATCH_WRITE_ITEMS_LIMIT:
+            raise _validation_error("Too many items requested for the BatchWriteItem call")
+        writes = [write for table_name, table_writes in request_items.items()
+                  for write in self._batch_writes(self._table(table_name), table_writes)]
+        units: dict[str, tuple[float, float]] = {}
+        for table, item, key in writes:
+            existing = table.get(key or table.key_attributes(item))
+            size = max(item_size(item) if item else 0, item_size(existing) if existing else 0)
+            units[table.name] = (0.0, units.get(table.name, (0.0, 0.0))[1] + _write_units(size))
+            if item is not None:
+                table.put(copy.deepcopy(item))
+            else:
+                table.delete(key)
+        self._book(units)
+        return self._report(request, units, {"UnprocessedItems": {}}, as_list=True)
+
+    @staticmethod
+    def _batch_writes(table: _Table, writes: list[dict]) -> list[tuple[_Table, dict | None, dict | None]]:
+        """:returns (table, item to put, key to delete) of each write request"""
+        parsed = []
+        for write in writes:
+            if "PutRequest" in write:
+                item = write["PutRequest"]["Item"]
+                parsed.append((table, item, None))
+            else:
+                parsed.append((table, None, write["DeleteRequest"]["Key"]))
+        _check_unique_keys(table, [key or table.key_attributes(item) for _, item, key in parsed])
+        return parsed
+
+    # -- transactions --------------------------------------------------------
+
+    def _transact_get_items(self, request: dict) -> dict:
+        gets = request["TransactItems"]
+        if len(gets) > TRANSACTION_ITEMS_LIMIT:
+            raise _validation_error(
+                f"Member must have length less than or equal to {TRANSACTION_ITEMS_LIMIT}")
+        responses = []
+        units: dict[str, tuple[float, float]] = {}
+        for get in gets:
+            spec = get["Get"]
+            table = self._table(spec["TableName"])
+            item = table.get(spec["Key"])
+            # transactional reads cost twice a consistent read
+            read = 2 * _read_units(item_size(item) if item else 0, consistent=True)
+            units[table.name] = (units.get(table.name, (0.0, 0.0))[0] + read, 0.0)
+            responses.append({"Item": self._projected(item, spec)} if item is not None else {})
+        self._book(units)
+        return self._report(request, units, {"Responses": responses}, as_list=True)
+
+    def _transact_write_items(self, request: dict) -> dict:
+        actions = request["TransactItems"]
+        if len(actions) > TRANSACTION_ITEMS_LIMIT:
+            raise _validation_error(
+                f"Member must have length less than or equal to {TRANSACTION_ITEMS_LIMIT}")
+        seen = set()
+        planned = []
+        reasons = []
+        units: dict[str, tuple[float, float]] = {}
+        for action in actions:
+            (kind, spec), = action.items()
+            table = self._table(spec["TableName"])
+            key = table.key_attributes(spec["Item"]) if kind == "Put" else spec["Key"]
+            item_key = (table.name, table.key_of(key))
+            if item_key in seen:
+                raise _validation_error(
+                    "Transaction request cannot include multiple operations on one item")
+            seen.add(item_key)
+            existing = table.get(key)
+            written = self._transact_written(kind, table, spec, existing)
+            size = max(item_size(written) if written else 0, item_size(existing) if existing else 0)
+            # transactional writes cost twice a write
+            units[table.name] = (0.0, units.get(table.name, (0.0, 0.0))[1] + 2 * _write_units(size))
+            reasons.append(self._cancellation_reason(spec, existing))
+            planned.append((kind, table, key, written))
+        self._book(units)
+        if any(reason["Code"] != "None" for reason in reasons):
+            codes = ", ".join(reason["Code"] for reason in reasons)
+            raise DynamoDBError(
+                "TransactionCanceledException",
+                f"Transaction cancelled, please refer cancellation reasons for specific reasons [{codes}]",
+                CancellationReasons=reasons)
+        for kind, table, key, written in planned:
+            if kind == "Delete":
+                table.delete(key)
+            elif kind != "ConditionCheck":
+                table.put(written)
+        return self._report(request, units, {}, as_list=True)
+
+    def _cancellation_reason(self, spec: dict, existing: dict | None) -> dict:
+        if self._condition_holds(spec, existing):
+            return {"Code": "None"}
+        reason = {"Code": "ConditionalCheckFailed", "Message": "The conditional request failed"}
+        if existing and spec.get("ReturnValuesOnConditionCheckFailure") == "ALL_OLD":
+            reason["Item"] = existing
+        return reason
+
+    def _transact_written(self,
+                          kind: str,
+                          table: _Table,
+                          spec: dict,
+                          existing: dict | None) -> dict | None:
+        """:returns the item a transaction action leaves behind"""
+        if kind == "Put":
+            return copy.deepcopy(spec["Item"])
+        if kind == "Update":
+            return self._updated(table, spec, existing)[0]
+        if kind == "Delete":
+            return None
+        if kind == "ConditionCheck":
+            return existing
+        raise _validation_error(f"Unsupported transaction action: {kind}")
+
+
+def _is_range_condition(table: _Table, node: tuple) -> bool:
+    range_path = ("path", (table.range_key,))
+    if table.range_key is None:
+        return False
+    if node[0] == "compare":
+        return node[1] != "<>" and node[2] == range_path and node[3][0] == "value"
+    if node[0] == "between":
+        return node[1] == range_path
+    return node[0] == "function" and node[1] == "begins_with" and node[2][0] == range_path
+
+
+def _check_unique_keys(table: _Table, keys: list[dict]) -> None:
+    lookups = [table.key_of(key) for key in keys]
+    if len(set(lookups)) != len(lookups):
+        raise _validation_error("Provided list of item keys contains duplicates")
+
+
+def _read(candidates: Iterator[tuple[dict, int]], limit: int | None) -> tuple[list[dict], int, bool]:
+    """
+    Reads items the way a query or scan page does, until Limit items or
+    1 MB were read
+    :returns the items read, their total size and whether the page stopped early
+    """
+    read: list[dict] = []
+    read_size = 0
+    for item, size in candidates:
+        if read and read_size + size > PAGE_SIZE_LIMIT:
+            return read, read_size, True
+        read.append(item)
+        read_size += size
+        if limit is not None and len(read) >= limit:
+            # DynamoDB doesn't look ahead, the next page may well be empty
+            return read, read_size, True
+    return read, read_size, False
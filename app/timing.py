@@ -0,0 +1,158 @@
+"""
+Per-request latency breakdown, reported in Server-Timing headers, and
+latency/error metrics of every AWS call
+
+ServerTimingMiddleware keeps a RequestTimings for each sampled request in a
+context variable. Calls leaving the process record into it: AWS clients
+through instrument_client(), everything else through measure(). On requests
+that were not sampled, measure() is a single context variable lookup.
+
+asyncio.to_thread() and new tasks copy the context, so calls made from
+worker threads and gathered coroutines are recorded on the request that
+started them; durations of concurrent calls are summed and can add up to
+more than the request took.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+from app import metrics
+
+_aws_call_latency = metrics.REGISTRY.histogram(
+    "aws_call_seconds",
+    "Latency of AWS API calls, retries included",
+    ("service", "operation"))
+_aws_call_errors = metrics.REGISTRY.counter(
+    "aws_call_errors_total",
+    "AWS API calls that failed, by error code",
+    ("service", "operation", "code"))
+
+
+class RequestTimings:
+    def __init__(self):
+        # recorded from worker threads too
+        self._lock = threading.Lock()
+        self._durations: dict[str, float] = {}
+        self._calls: dict[str, int] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._durations[name] = self._durations.get(name, 0.0) + seconds
+            self._calls[name] = self._calls.get(name, 0) + 1
+
+    def calls(self, name: str) -> int:
+        return self._calls.get(name, 0)
+
+    def duration(self, name: str) -> float:
+        return self._durations.get(name, 0.0)
+
+    def header_value(self, total: float) -> str:
+        """
+        :returns the Server-Timing header value: one entry per dependency
+            with its summed duration and call count, then the total
+        """
+        with self._lock:
+            entries = [
+                f'{name};dur={seconds * 1000:.1f};desc="{_calls_desc(self._calls[name])}"'
+                for name, seconds in self._durations.items()
+            ]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def _calls_desc(calls: int) -> str:
+    return "1 call" if calls == 1 else f"{calls} calls"
+
+
+_current: contextvars.ContextVar[RequestTimings | None] = contextvars.ContextVar(
+    "request_timings", default=None)
+
+
+def start() -> contextvars.Token:
+    """Starts recording the timings of the current request"""
+    return _current.set(RequestTimings())
+
+
+def stop(token: contextvars.Token) -> None:
+    _current.reset(token)
+
+
+def current() -> RequestTimings | None:
+    return _current.get()
+
+
+@contextmanager
+def measure(name: str) -> Iterator[None]:
+    """Records the time spent in the block under name, if the request is sampled"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.record(name, time.perf_counter() - started)
+
+
+# operation, seconds, request dict (url, headers, body) and parsed response,
+# which is None when the call raised
+CallObserver = Callable[[str, float, dict, dict | None], None]
+
+
+class _ClientCallTimer:
+    """
+    botocore event handlers timing each API call of one client, into the
+    metrics, into the timings of a sampled request and to on_call
+    """
+
+    def __init__(self, service: str, on_call: CallObserver | None = None):
+        self._service = service
+        self._on_call = on_call
+
+    def before_call(self, params: dict, context: dict, **_: Any) -> None:
+        context["request_timings_started"] = time.perf_counter()
+        if self._on_call is not None:
+            context["request_timings_request"] = params
+
+    def after_call(self, event_name: str, context: dict, **kwargs: Any) -> None:
+        started = context.pop("request_timings_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        operation = event_name.rsplit(".", 1)[-1]
+        _aws_call_latency.observe(elapsed, service=self._service, operation=operation)
+        code = _error_code(kwargs)
+        if code is not None:
+            _aws_call_errors.inc(service=self._service, operation=operation, code=code)
+        timings = _current.get()
+        if timings is not None:
+            timings.record(self._service, elapsed)
+        if self._on_call is not None:
+            self._on_call(operation, elapsed,
+                          context.pop("request_timings_request", {}), kwargs.get("parsed"))
+
+
+def _error_code(after_call_kwargs: dict) -> str | None:
+    exception = after_call_kwargs.get("exception")
+    if exception is not None:
+        # connection errors and timeouts
+        return type(exception).__name__
+    http_response = after_call_kwargs.get("http_response")
+    if http_response is not None and http_response.status_code >= 300:
+        parsed = after_call_kwargs.get("parsed") or {}
+        return parsed.get("Error", {}).get("Code") or str(http_response.status_code)
+    return None
+
+
+def instrument_client(client: Any, on_call: CallObserver | None = None) -> None:
+    """
+    Records each API call of a boto3 client, retries included, under its
+    service name (dynamodb, s3, sqs) and operation, and passes it to on_call
+    """
+    timer = _ClientCallTimer(client.meta.service_model.service_id.hyphenize(), on_call)
+    client.meta.events.register("before-call", timer.before_call)
+    client.meta.events.register("after-call", timer.after_call)
+    # connection errors and timeouts
+    client.meta.events.register("after-call-error", timer.after_call)
@@ -0,0 +1,313 @@
+"""
+In-process request tracing with OpenTelemetry compatible output
+
+TracingMiddleware starts a root span for a sampled request, or for one whose
+W3C traceparent header says it is sampled, and keeps the current span in a
+context variable. Classes decorated with @traced and span() blocks add child
+spans. asyncio.to_thread() and new tasks copy the context, so spans made in
+worker threads and in asyncio.gather() fan-outs nest under the span that
+started them. Outside a sampled request a traced call costs one context
+variable lookup.
+
+Finished spans are queued on the SpanProcessor given to configure(), which
+hands them to an exporter in batches from a background task: FileSpanExporter
+appends OTLP/JSON lines to a local file, OTLPSpanExporter posts them to an
+OTLP/HTTP collector.
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Protocol, TypeVar
+
+import httpx
+
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+_dropped_spans = metrics.REGISTRY.counter(
+    "tracing_dropped_spans_total",
+    "Finished spans dropped because the export queue was full or the export failed",
+    ("reason",))
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int = 0
+    kind: int = SPAN_KIND_INTERNAL
+    attributes: dict[str, str | int | float | bool] = field(default_factory=dict)
+    # exception type name when the span failed
+    error: str | None = None
+
+
+class SpanExporter(Protocol):
+    def export(self, spans: list[Span]) -> None: ...
+
+    def shutdown(self) -> None: ...
+
+
+class SpanProcessor:
+    """
+    Queues finished spans from any thread and exports them in batches from a
+    background task, every flush_interval seconds
+    """
+
+    def __init__(self,
+                 exporter: SpanExporter,
+                 *,
+                 max_queue_size: int = 2048,
+                 batch_size: int = 512,
+                 flush_interval: float = 5.0):
+        self._exporter = exporter
+        self._max_queue_size = max_queue_size
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._spans: list[Span] = []
+        self._task: asyncio.Task | None = None
+
+    def on_end(self, span: Span) -> None:
+        with self._lock:
+            if len(self._spans) < self._max_queue_size:
+                self._spans.append(span)
+                return
+        _dropped_spans.inc(reason="queue_full")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            # detached from any request, its own exports are not traced
+            self._task = asyncio.get_running_loop().create_task(
+                self._run(), context=contextvars.Context())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        self._exporter.shutdown()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        with self._lock:
+            spans, self._spans = self._spans, []
+        for start in range(0, len(spans), self._batch_size):
+            batch = spans[start:start + self._batch_size]
+            try:
+                await asyncio.to_thread(self._exporter.export, batch)
+            except Exception:
+                logger.exception("failed to export %d spans", len(batch))
+                _dropped_spans.inc(len(batch), reason="export_failed")
+
+
+def otlp_json(spans: list[Span], service_name: str) -> dict:
+    """:returns spans as an OTLP/JSON ExportTraceServiceRequest"""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", service_name)]},
+        "scopeSpans": [{
+            "scope": {"name": __name__},
+            "spans": [_otlp_span(span) for span in spans],
+        }],
+    }]}
+
+
+def _otlp_span(span: Span) -> dict:
+    otlp: dict[str, Any] = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [_attribute(key, value) for key, value in span.attributes.items()],
+        # STATUS_CODE_OK / STATUS_CODE_ERROR
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        otlp["parentSpanId"] = span.parent_id
+    return otlp
+
+
+def _attribute(key: str, value: str | int | float | bool) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class FileSpanExporter:
+    """Appends each batch as one line of OTLP/JSON, the OpenTelemetry file exporter format"""
+
+    def __init__(self, path: str, service_name: str):
+        self._path = path
+        self._service_name = service_name
+
+    def export(self, spans: list[Span]) -> None:
+        line = json.dumps(otlp_json(spans, self._service_name), separators=(",", ":"))
+        with open(self._path, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+    def shutdown(self) -> None:
+        pass
+
+
+class OTLPSpanExporter:
+    """Posts batches to an OTLP/HTTP collector as JSON"""
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 10.0):
+        self._url = endpoint.rstrip("/") + "/v1/traces"
+        self._service_name = service_name
+        self._client = httpx.Client(timeout=timeout)
+
+    def export(self, spans: list[Span]) -> None:
+        response = self._client.post(self._url, json=otlp_json(spans, self._service_name))
+        response.raise_for_status()
+
+    def shutdown(self) -> None:
+        self._client.close()
+
+
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar(
+    "current_span", default=None)
+_processor: SpanProcessor | None = None
+_sample_rate = 0.0
+
+
+def configure(processor: SpanProcessor | None, sample_rate: float = 0.0) -> None:
+    """Sets where finished spans go and the share of requests traced; None turns tracing off"""
+    global _processor, _sample_rate
+    _processor = processor
+    _sample_rate = sample_rate
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+def _parse_traceparent(header: str | None) -> tuple[str, str, bool] | None:
+    """:returns (trace id, parent span id, sampled) of a W3C traceparent header"""
+    match = _TRACEPARENT.match(header.strip().lower()) if header else None
+    if match is None:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+@contextmanager
+def start_trace(name: str,
+                traceparent: str | None = None,
+                sample: Callable[[], float] = random.random) -> Iterator[Span | None]:
+    """
+    Starts the root span of a request, continuing the caller's trace when
+    a traceparent header is given
+    :yields the span, None if the request is not traced
+    """
+    if _processor is None:
+        yield None
+        return
+    parent = _parse_traceparent(traceparent)
+    if parent is not None:
+        trace_id, parent_id, sampled = parent
+    else:
+        trace_id, parent_id, sampled = os.urandom(16).hex(), None, sample() < _sample_rate
+    if not sampled:
+        yield None
+        return
+    with _span(name, trace_id, parent_id, SPAN_KIND_SERVER, {}) as span:
+        yield span
+
+
+@contextmanager
+def span(name: str, **attributes: str | int | float | bool) -> Iterator[Span | None]:
+    """Records the block as a child of the current span, if the request is traced"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    with _span(name, parent.trace_id, parent.span_id, SPAN_KIND_INTERNAL, attributes) as child:
+        yield child
+
+
+@contextmanager
+def _span(name: str,
+          trace_id: str,
+          parent_id: str | None,
+          kind: int,
+          attributes: dict) -> Iterator[Span]:
+    current = Span(name, trace_id, os.urandom(8).hex(), parent_id,
+                   start_ns=time.time_ns(), kind=kind, attributes=attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as err:
+        current.error = type(err).__name__
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        processor = _processor
+        if processor is not None:
+            processor.on_end(current)
+
+
+def traced(cls: type[T]) -> type[T]:
+    """
+    Class decorator recording every public method call in a span named
+    Class.method; generators are left alone, a span can't stay current
+    across their yields
+    """
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith("_") or not inspect.isfunction(value) \
+                or inspect.isasyncgenfunction(value) or inspect.isgeneratorfunction(value):
+            continue
+        setattr(cls, attr, _traced_function(f"{cls.__name__}.{attr}", value))
+    return cls
+
+
+def _traced_function(name: str, fn: Callable) -> Callable:
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def traced_coroutine(*args, **kwargs):
+            with span(name):
+                return await fn(*args, **kwargs)
+        return traced_coroutine
+
+    @functools.wraps(fn)
+    def traced_call(*args, **kwargs):
+        with span(name):
+            return fn(*args, **kwargs)
+    return traced_call
@@ -0,0 +1,175 @@
+"""
+Micro-benchmarks of the request hot path
+
+Each case builds its fixtures once and returns the callable to time; the
+items are shaped like what DynamoDB returns for real expenses.
+"""
+import asyncio
+from decimal import Decimal
+from typing import Callable
+
+from fastapi.responses import JSONResponse
+
+from app.dtos.expense import ExpenseDTO, GetAllExpensesResponse
+from app.infra.jwt_token_provider import JWTTokenProvider
+from app.middleware import APIGatewayProxyMiddleware
+from app.models.expense import Expense, ExpensesFilterOptions
+from app.models.user import UserClaims, UserRole
+from app.repository.expense_repository import ExpenseRepository
+from app.repository.utils import build_update_expression
+from app.testing.in_memory_dynamodb import InMemoryDynamoDB
+
+JWT_SECRET = "benchmark-secret-benchmark-secret"
+
+
+def expense_item(index: int = 0) -> dict:
+    return {
+        "PK": "EXPENSE",
+        "SK": f"EXPENSE#{index:08d}",
+        "ExpenseID": f"{index:08d}-5f0c-4a7e-9d1b-4c2f8e6a7b3d",
+        "UserID": "2d8f6c1e-7a4b-4e9c-8f3d-1b6a5c9e2f7d",
+        "Amount": Decimal("1249.50"),
+        "Description": "Client visit, Bengaluru: cab, lunch and hotel",
+        "Purpose": "Travel",
+        "Status": "APPROVED",
+        "IsReconciled": False,
+        "ApprovedBy": "9c4e2a7f-3b1d-4f6e-8a5c-7d2b9e1f4a6c",
+        "ApprovedAt": Decimal("1735689600000"),
+        "Bills": [
+            {
+                "BillID": f"{index:08d}-bill-{bill}",
+                "Amount": Decimal("416.50"),
+                "Description": "Receipt",
+                "AttachmentURL": f"https://bucket.s3.amazonaws.com/receipts/user/{index}-{bill}.jpg",
+            }
+            for bill in range(3)
+        ],
+        "CreatedAt": Decimal("1735603200000"),
+        "UpdatedAt": Decimal("1735689600000"),
+    }
+
+
+def expense_model_validate() -> Callable[[], object]:
+    item = expense_item()
+    return lambda: Expense.model_validate(item, by_alias=True)
+
+
+def expense_dto_conversion() -> Callable[[], object]:
+    expense = Expense.model_validate(expense_item(), by_alias=True)
+    return lambda: ExpenseDTO(**expense.model_dump())
+
+
+def update_expression() -> Callable[[], object]:
+    updates = {
+        "Amount": Decimal("1249.50"),
+        "Description": "Client visit",
+        "Purpose": "Travel",
+        "Status": "PENDING",
+        "IsReconciled": False,
+        "Bills": [],
+        "UpdatedAt": 1735689600000,
+    }
+    return lambda: build_update_expression(updates)
+
+
+def _token_provider(cache_size: int) -> tuple[JWTTokenProvider, str]:
+    provider = JWTTokenProvider(JWT_SECRET, cache_size=cache_size)
+    token = provider.generate_token(UserClaims(
+        id="2d8f6c1e-7a4b-4e9c-8f3d-1b6a5c9e2f7d",
+        name="Bench User",
+        email="bench@example.com",
+        role=UserRole.Employee,
+    ))
+    return provider, token
+
+
+def jwt_validate_token() -> Callable[[], object]:
+    provider, token = _token_provider(cache_size=10_000)
+    return lambda: provider.validate_token(token)
+
+
+def jwt_validate_token_uncached() -> Callable[[], object]:
+    # nothing stays cached, every call verifies the signature
+    provider, token = _token_provider(cache_size=0)
+    return lambda: provider.validate_token(token)
+
+
+def _run_to_completion(coro) -> None:
+    """Runs a coroutine that never suspends without an event loop"""
+    try:
+        coro.send(None)
+    except StopIteration:
+        return
+    raise RuntimeError("benchmarked coroutine suspended")
+
+
+def api_gateway_proxy_middleware() -> Callable[[], object]:
+    async def app(scope, receive, send):
+        pass
+
+    middleware = APIGatewayProxyMiddleware(app)
+    headers = [
+        (b"host", b"api.watchexpense.mohits.me"),
+        (b"authorization", b"Bearer token"),
+        (b"content-type", b"application/json"),
+        (b"api-x-forwarded-proto", b"https"),
+        (b"api-x-forwarded-for", b"203.0.113.7, 10.0.0.1"),
+    ]
+
+    def call():
+        scope = {"type": "http", "client": ("10.0.0.1", 443), "headers": headers}
+        _run_to_completion(middleware(scope, None, None))
+    return call
+
+
+def expenses_page_json(size: int) -> Callable[[], Callable[[], object]]:
+    def case() -> Callable[[], object]:
+        expenses = [Expense.model_validate(expense_item(index), by_alias=True)
+                    for index in range(size)]
+
+        def encode():
+            # what handle_get_all_expenses and FastAPI do with a fetched page
+            response = GetAllExpensesResponse(
+                status=200,
+                message="Expenses fetched successfully",
+                data=GetAllExpensesResponse.Data(
+                    totalExpenses=size,
+                    expenses=[ExpenseDTO(**expense.model_dump()) for expense in expenses],
+                ),
+            )
+            return JSONResponse(response.model_dump(mode="json", by_alias=True)).body
+        return encode
+    return case
+
+
+def expense_repository_get_all(page: int) -> Callable[[], Callable[[], object]]:
+    def case() -> Callable[[], object]:
+        # offline: the queries are answered by the in-memory stand-in
+        dynamodb = InMemoryDynamoDB()
+        dynamodb.create_table("expenses")
+        repository = ExpenseRepository(dynamodb.resource().Table("expenses"), "expenses")
+        loop = asyncio.new_event_loop()
+        for index in range(500):
+            expense = Expense.model_validate(expense_item(index), by_alias=True)
+            expense.created_at = 1735603200000 + index
+            loop.run_until_complete(repository.save(expense))
+
+        options = ExpensesFilterOptions(
+            user_id=expense_item()["UserID"], page=page, limit=10)
+        return lambda: loop.run_until_complete(repository.get_all(options))
+    return case
+
+
+CASES: dict[str, Callable[[], Callable[[], object]]] = {
+    "expense_model_validate": expense_model_validate,
+    "expense_dto_conversion": expense_dto_conversion,
+    "build_update_expression": update_expression,
+    "jwt_validate_token": jwt_validate_token,
+    "jwt_validate_token_uncached": jwt_validate_token_uncached,
+    "api_gateway_proxy_middleware": api_gateway_proxy_middleware,
+    "expenses_page_json_10": expenses_page_json(10),
+    "expenses_page_json_100": expenses_page_json(100),
+    "expenses_page_json_1000": expenses_page_json(1000),
+    "repository_get_all_page_1": expense_repository_get_all(1),
+    "repository_get_all_page_40": expense_repository_get_all(40),
+}
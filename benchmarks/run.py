@@ -0,0 +1,67 @@
+import argparse
+import json
+import re
+import sys
+import timeit
+from pathlib import Path
+
+from benchmarks.cases import CASES
+
+# timings only compare on the machine that took them, so the baselines are
+# local to it and kept out of git
+BASELINES = Path(__file__).with_name("baselines.json")
+
+
+def measure(case, repeat: int) -> float:
+    """:returns the best of repeat runs, in seconds per call"""
+    timer = timeit.Timer(CASES[case]())
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Time the request hot path and compare it with the stored baselines")
+    parser.add_argument("--filter", default="",
+                        help="only run cases whose name matches this regex")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="fail cases slower than baseline by more than this fraction")
+    parser.add_argument("--save", action="store_true",
+                        help="store the results as the new baselines")
+    args = parser.parse_args()
+
+    baselines: dict[str, float] = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+    results: dict[str, float] = {}
+    regressions = []
+    for case in CASES:
+        if not re.search(args.filter, case):
+            continue
+        seconds = measure(case, args.repeat)
+        results[case] = seconds
+        baseline = baselines.get(case)
+        if baseline is None:
+            print(f"{case:32} {seconds * 1e6:12.2f} us   (no baseline)")
+            continue
+        change = seconds / baseline - 1
+        regressed = change > args.tolerance
+        print(f"{case:32} {seconds * 1e6:12.2f} us   {change:+7.1%}"
+              f"{'   REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(case)
+
+    if not baselines:
+        print(f"no baselines in {BASELINES}, store this machine's with --save")
+    if args.save:
+        BASELINES.write_text(json.dumps({**baselines, **results}, indent=2, sort_keys=True) + "\n")
+        print(f"saved {len(results)} baselines to {BASELINES}")
+        return 0
+    if regressions:
+        print(f"{len(regressions)} cases regressed by more than {args.tolerance:.0%}: "
+              f"{', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
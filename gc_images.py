@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+import logging
+import boto3
+from app.config import load_config
+from app.infra.s3_image_store import S3ImageStore
+from app.repository.expense_repository import ExpenseRepository
+from app.repository.image_metadata_repository import ImageMetadataRepository
+from app.services.image_gc import ImageGarbageCollector
+
+
+async def gc(grace_hours: float, dry_run: bool):
+    config = load_config()
+    session = boto3.Session(region_name=config.aws_region)
+    resource = session.resource("dynamodb")
+    table = resource.Table(config.dynamodb_table)
+
+    collector = ImageGarbageCollector(
+        ImageMetadataRepository(
+            table, config.dynamodb_table,
+            legacy_reads=config.image_metadata_legacy_reads),
+        ExpenseRepository(table, config.dynamodb_table),
+        S3ImageStore(config.s3_bucket_name, session.client("s3")),
+    )
+    report = await collector.collect(grace_hours * 3600, dry_run=dry_run)
+    print(f"{'Would delete' if dry_run else 'Deleted'} orphaned images: "
+          f"scanned={report.scanned} orphaned={report.orphaned} "
+          f"deleted={report.deleted} failed={report.failed}")
+    report = await collector.collect_uncompleted_uploads(grace_hours * 3600, dry_run=dry_run)
+    print(f"{'Would delete' if dry_run else 'Deleted'} uncompleted direct uploads: "
+          f"scanned={report.scanned} orphaned={report.orphaned} "
+          f"deleted={report.deleted} failed={report.failed}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Delete uploaded receipts that no expense refers to, "
+                    "and direct uploads that were never completed")
+    parser.add_argument("--grace-hours", type=float, default=72,
+                        help="only delete images uploaded longer ago than this")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(gc(args.grace_hours, args.dry_run))
@@ -0,0 +1,354 @@
+"""
+Async load generator for the whole API
+
+Runs virtual users that each pick a scenario from the mix, make the request
+and go again until the duration is up, then reports throughput, latency
+percentiles and DynamoDB calls per request for every scenario.
+
+The app runs in this process through httpx's ASGI transport (--target
+inprocess), as a local uvicorn (--target uvicorn) or is any running server
+(--base-url). The first two talk to AWS stand-ins at --aws-endpoint, such
+as LocalStack; --setup creates the table, bucket and queue there and seeds
+the load test users. DynamoDB calls are read from the Server-Timing header,
+which both local targets send on every response.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+import boto3
+import httpx
+
+from app.config import Config, load_config
+from app.infra.bcrypt_password_hasher import BcryptPasswordHasher, calibrate_cost
+from app.infra.bounded_executor import BoundedExecutor
+from app.models.user import User, UserRole
+from app.repository.user_repository import UserRepository
+from loadtest.scenarios import (
+    ADMIN_EMAIL,
+    DEFAULT_MIX,
+    PASSWORD,
+    SCENARIOS,
+    SETUP,
+    Context,
+    employee_email,
+    sign_in,
+)
+
+_DYNAMODB_CALLS = re.compile(r'(?:^|,)\s*dynamodb;[^,]*desc="(\d+) calls?"')
+
+
+def dynamodb_calls(response: httpx.Response) -> int | None:
+    """:returns the DynamoDB calls the server made, None if it didn't say"""
+    header = response.headers.get("server-timing")
+    if header is None:
+        return None
+    match = _DYNAMODB_CALLS.search(header)
+    return int(match.group(1)) if match else 0
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """:returns the nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    return values[max(1, math.ceil(len(values) * fraction)) - 1]
+
+
+@dataclass
+class ScenarioStats:
+    latencies: list[float] = field(default_factory=list)
+    # error responses
+    errors: int = 0
+    # requests that got no response at all
+    failures: int = 0
+    dynamodb_calls: list[int] = field(default_factory=list)
+
+    def record(self, seconds: float, response: httpx.Response) -> None:
+        self.latencies.append(seconds)
+        if response.status_code >= 400:
+            self.errors += 1
+        calls = dynamodb_calls(response)
+        if calls is not None:
+            self.dynamodb_calls.append(calls)
+
+    def summary(self, elapsed: float) -> dict:
+        latencies = sorted(self.latencies)
+        requests = len(latencies) + self.failures
+        return {
+            "requests": requests,
+            "errors": self.errors + self.failures,
+            "throughput": requests / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "dynamodb_calls_per_request": (
+                sum(self.dynamodb_calls) / len(self.dynamodb_calls)
+                if self.dynamodb_calls else None),
+        }
+
+
+async def virtual_user(ctx: Context,
+                       mix: dict[str, int],
+                       stats: dict[str, ScenarioStats],
+                       deadline: float) -> None:
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        name = random.choices(names, weights)[0]
+        try:
+            if name in SETUP:
+                await SETUP[name](ctx)
+            started = time.perf_counter()
+            response = await SCENARIOS[name](ctx)
+        except httpx.HTTPError:
+            stats[name].failures += 1
+            continue
+        stats[name].record(time.perf_counter() - started, response)
+
+
+async def run_load(ctx: Context,
+                   mix: dict[str, int],
+                   concurrency: int,
+                   duration: float) -> tuple[dict[str, ScenarioStats], float]:
+    stats = {name: ScenarioStats() for name in mix}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(virtual_user(ctx, mix, stats, deadline)
+                           for _ in range(concurrency)))
+    return stats, time.perf_counter() - started
+
+
+def configure_local_environment(aws_endpoint: str) -> None:
+    """
+    Points the app at the AWS stand-ins and makes it report DynamoDB calls on
+    every response; login rate limits would otherwise reject most logins
+    """
+    os.environ["AWS_ENDPOINT_URL"] = aws_endpoint
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "test")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "test")
+    os.environ["SERVER_TIMING_SAMPLE_RATE"] = "1"
+    os.environ["LOGIN_RATE_LIMIT_PER_EMAIL"] = "1000000"
+    os.environ["LOGIN_RATE_LIMIT_PER_IP"] = "1000000"
+
+
+def create_resources(config: Config) -> None:
+    """Creates the table, bucket and email queue when they don't exist yet"""
+    session = boto3.Session(region_name=config.aws_region)
+    dynamodb = session.client("dynamodb")
+    try:
+        dynamodb.create_table(
+            TableName=config.dynamodb_table,
+            AttributeDefinitions=[{"AttributeName": "PK", "AttributeType": "S"},
+                                  {"AttributeName": "SK", "AttributeType": "S"}],
+            KeySchema=[{"AttributeName": "PK", "KeyType": "HASH"},
+                       {"AttributeName": "SK", "KeyType": "RANGE"}],
+            BillingMode="PAY_PER_REQUEST")
+        dynamodb.get_waiter("table_exists").wait(TableName=config.dynamodb_table)
+    except dynamodb.exceptions.ResourceInUseException:
+        pass
+
+    s3 = session.client("s3")
+    bucket_config = {} if config.aws_region == "us-east-1" else {
+        "CreateBucketConfiguration": {"LocationConstraint": config.aws_region}}
+    try:
+        s3.create_bucket(Bucket=config.s3_bucket_name, **bucket_config)
+    except (s3.exceptions.BucketAlreadyOwnedByYou, s3.exceptions.BucketAlreadyExists):
+        pass
+
+    sqs = session.client("sqs")
+    queue_name = config.email_queue_url.rsplit("/", 1)[-1]
+    config.email_queue_url = sqs.create_queue(QueueName=queue_name)["QueueUrl"]
+    # for a uvicorn started after this
+    os.environ["EMAIL_QUEUE_URL"] = config.email_queue_url
+
+
+async def seed_users(config: Config, employees: int) -> None:
+    """Saves the load test admin and employees, skipping those already there"""
+    table = boto3.Session(region_name=config.aws_region).resource(
+        "dynamodb").Table(config.dynamodb_table)
+    user_repo = UserRepository(table, config.dynamodb_table)
+    # the cost the app would calibrate, so logins take as long as in production
+    cost = config.bcrypt_cost or await asyncio.to_thread(
+        calibrate_cost, config.bcrypt_time_budget_ms / 1000)
+    executor = BoundedExecutor("bcrypt")
+    password_hasher = BcryptPasswordHasher(cost, executor=executor)
+    users = [(ADMIN_EMAIL, "LTADMIN", UserRole.Admin)] + [
+        (employee_email(index), f"LT{index:04d}", UserRole.Employee)
+        for index in range(employees)]
+    try:
+        for email, employee_id, role in users:
+            if await user_repo.get_by_email(email):
+                continue
+            await user_repo.save(User(
+                EmployeeID=employee_id,
+                Name=f"Load Test {employee_id}",
+                PasswordHash=await password_hasher.hash_password(PASSWORD),
+                Email=email,
+                Role=role,
+            ))
+    finally:
+        executor.shutdown()
+
+
+@asynccontextmanager
+async def in_process_app() -> AsyncIterator[tuple[httpx.AsyncBaseTransport | None, str]]:
+    # imported late, the app reads its config from the environment on import
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        yield httpx.ASGITransport(app=app), "http://loadtest"
+
+
+@asynccontextmanager
+async def local_uvicorn(port: int,
+                        workers: int) -> AsyncIterator[tuple[httpx.AsyncBaseTransport | None, str]]:
+    process = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+    ])
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        await _wait_until_healthy(base_url, process)
+        yield None, base_url
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+async def _wait_until_healthy(base_url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.perf_counter() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {process.returncode}")
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"uvicorn not healthy after {timeout}s")
+
+
+@asynccontextmanager
+async def remote_server(base_url: str) -> AsyncIterator[tuple[httpx.AsyncBaseTransport | None, str]]:
+    yield None, base_url
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    """Parses name=weight,name=weight into a mix"""
+    mix = {}
+    for entry in value.split(","):
+        name, _, weight = entry.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(
+                f"unknown scenario {name!r}, expected one of {', '.join(SCENARIOS)}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def print_report(summaries: dict[str, dict]) -> None:
+    print(f"{'scenario':18} {'requests':>9} {'errors':>7} {'req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ddb calls/req':>14}")
+    for name, summary in summaries.items():
+        calls = summary["dynamodb_calls_per_request"]
+        print(f"{name:18} {summary['requests']:9d} {summary['errors']:7d} "
+              f"{summary['throughput']:8.1f} {summary['p50_ms']:8.1f} "
+              f"{summary['p95_ms']:8.1f} {summary['p99_ms']:8.1f} "
+              f"{'n/a' if calls is None else f'{calls:.1f}':>14}")
+
+
+def regressions(summaries: dict[str, dict],
+                baseline: dict[str, dict],
+                tolerance: float,
+                max_error_rate: float) -> list[str]:
+    """:returns why the run fails: too many errors, or a p95 beyond the baseline's"""
+    found = []
+    for name, summary in summaries.items():
+        if summary["requests"] and summary["errors"] / summary["requests"] > max_error_rate:
+            found.append(f"{name}: {summary['errors']} of {summary['requests']} requests failed")
+        before = baseline.get(name)
+        if before and summary["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            found.append(f"{name}: p95 {summary['p95_ms']:.1f} ms, "
+                         f"baseline {before['p95_ms']:.1f} ms")
+    return found
+
+
+async def main(args: argparse.Namespace) -> int:
+    if args.setup or not args.base_url:
+        # never create resources in, or run the app against, real AWS
+        configure_local_environment(args.aws_endpoint)
+    if args.base_url:
+        target = remote_server(args.base_url)
+    elif args.target == "uvicorn":
+        target = local_uvicorn(args.port, args.workers)
+    else:
+        target = in_process_app()
+    if args.setup:
+        config = load_config()
+        await asyncio.to_thread(create_resources, config)
+        await seed_users(config, args.employees)
+
+    async with target as (transport, base_url):
+        async with httpx.AsyncClient(
+                transport=transport, base_url=base_url, timeout=args.request_timeout,
+                limits=httpx.Limits(max_connections=args.concurrency)) as client:
+            ctx = Context(client, employees=args.employees)
+            await sign_in(ctx)
+            if args.warmup:
+                await run_load(ctx, args.mix, args.concurrency, args.warmup)
+            stats, elapsed = await run_load(ctx, args.mix, args.concurrency, args.duration)
+
+    summaries = {name: scenario.summary(elapsed) for name, scenario in stats.items()}
+    print(f"{args.concurrency} virtual users for {elapsed:.1f}s against {base_url}")
+    print_report(summaries)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(summaries, file, indent=2)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+    failed = regressions(summaries, baseline, args.tolerance, args.max_error_rate)
+    for reason in failed:
+        print(f"REGRESSION {reason}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load test the API with a realistic request mix")
+    parser.add_argument("--target", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--base-url", help="load test a running server instead")
+    parser.add_argument("--aws-endpoint", default="http://localhost:4566",
+                        help="endpoint of the local AWS stand-ins, LocalStack by default")
+    parser.add_argument("--setup", action="store_true",
+                        help="create the table, bucket and queue and seed the users first")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--employees", type=int, default=20,
+                        help="seeded employees the virtual users act as")
+    parser.add_argument("--concurrency", type=int, default=50, help="virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="seconds")
+    parser.add_argument("--warmup", type=float, default=5,
+                        help="seconds of load before measuring")
+    parser.add_argument("--request-timeout", type=float, default=30)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="scenario weights, e.g. list_expenses=4,login=1; "
+                             f"scenarios: {', '.join(SCENARIOS)}")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report of an earlier run to compare p95s with")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="fail scenarios whose p95 is this fraction above the baseline")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    sys.exit(asyncio.run(main(parser.parse_args())))
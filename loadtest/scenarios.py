@@ -0,0 +1,147 @@
+"""
+Request scenarios of the load test
+
+Each scenario makes one request as a real client would and returns its
+response; the runner times it. Requests a scenario depends on are made by
+its SETUP step, which the runner doesn't time. Tokens for the seeded users
+are fetched once before the run, so only the login scenario pays for bcrypt.
+"""
+import io
+import random
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+import httpx
+from PIL import Image
+
+PASSWORD = "loadtest-password"
+ADMIN_EMAIL = "loadtest-admin@example.com"
+
+
+def employee_email(index: int) -> str:
+    return f"loadtest-employee-{index}@example.com"
+
+
+def receipt_image() -> bytes:
+    """:returns a phone photo sized JPEG that doesn't compress to nothing"""
+    image = Image.effect_noise((1600, 1200), 32).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+@dataclass
+class Context:
+    client: httpx.AsyncClient
+    employees: int
+    admin_token: str = ""
+    employee_tokens: list[str] = field(default_factory=list)
+    # created by create_expense, waiting for approve_expense
+    pending_expenses: deque[str] = field(default_factory=deque)
+    image: bytes = b""
+
+    def employee(self) -> dict[str, str]:
+        return _bearer(random.choice(self.employee_tokens))
+
+    def admin(self) -> dict[str, str]:
+        return _bearer(self.admin_token)
+
+
+def _bearer(token: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def login(ctx: Context, email: str) -> str:
+    response = await ctx.client.post(
+        "/api/auth/login", json={"email": email, "password": PASSWORD})
+    response.raise_for_status()
+    return response.json()["data"]["token"]
+
+
+async def sign_in(ctx: Context) -> None:
+    """Logs the admin and every seeded employee in, before the run starts"""
+    ctx.admin_token = await login(ctx, ADMIN_EMAIL)
+    ctx.employee_tokens = [await login(ctx, employee_email(index))
+                           for index in range(ctx.employees)]
+    ctx.image = receipt_image()
+
+
+def _expense() -> dict:
+    amount = round(random.uniform(100, 5000), 2)
+    return {
+        "amount": amount,
+        "description": "Client visit: cab, lunch and hotel",
+        "purpose": random.choice(["Travel", "Meals", "Lodging", "Supplies"]),
+        "isReconciled": False,
+        "bills": [{"amount": amount, "description": "Receipt"}],
+    }
+
+
+async def login_scenario(ctx: Context) -> httpx.Response:
+    return await ctx.client.post("/api/auth/login", json={
+        "email": employee_email(random.randrange(ctx.employees)),
+        "password": PASSWORD,
+    })
+
+
+async def list_expenses(ctx: Context) -> httpx.Response:
+    return await ctx.client.get(
+        "/api/expenses/", params={"page": 1, "limit": 10}, headers=ctx.employee())
+
+
+async def create_expense(ctx: Context) -> httpx.Response:
+    response = await ctx.client.post(
+        "/api/expenses/", json=_expense(), headers=ctx.employee())
+    if response.status_code == 201:
+        ctx.pending_expenses.append(response.json()["data"]["id"])
+    return response
+
+
+async def upload_image(ctx: Context) -> httpx.Response:
+    return await ctx.client.post(
+        "/api/images/",
+        files={"file": ("receipt.jpg", ctx.image, "image/jpeg")},
+        headers=ctx.employee())
+
+
+async def pending_expense(ctx: Context) -> None:
+    """Creates an expense to approve when approvals outpace creates"""
+    while not ctx.pending_expenses:
+        (await create_expense(ctx)).raise_for_status()
+
+
+async def approve_expense(ctx: Context) -> httpx.Response:
+    # SETUP left one queued, nothing ran since: no await in between
+    expense_id = ctx.pending_expenses.popleft()
+    return await ctx.client.patch(
+        f"/api/expenses/{expense_id}", json={"status": "APPROVED"}, headers=ctx.admin())
+
+
+async def expense_summary(ctx: Context) -> httpx.Response:
+    return await ctx.client.get("/api/expenses/summary", headers=ctx.employee())
+
+
+SCENARIOS: dict[str, Callable[[Context], Awaitable[httpx.Response]]] = {
+    "list_expenses": list_expenses,
+    "expense_summary": expense_summary,
+    "create_expense": create_expense,
+    "approve_expense": approve_expense,
+    "upload_image": upload_image,
+    "login": login_scenario,
+}
+
+# untimed steps the runner awaits right before a scenario
+SETUP: dict[str, Callable[[Context], Awaitable[None]]] = {
+    "approve_expense": pending_expense,
+}
+
+# share of requests per scenario, roughly what the client apps send
+DEFAULT_MIX = {
+    "list_expenses": 40,
+    "expense_summary": 20,
+    "create_expense": 15,
+    "approve_expense": 10,
+    "upload_image": 10,
+    "login": 5,
+}
@@ -0,0 +1,26 @@
+import asyncio
+import boto3
+from app.config import load_config
+from app.repository.image_metadata_repository import ImageMetadataRepository
+
+
+async def migrate():
+    config = load_config()
+    session = boto3.Session(region_name=config.aws_region)
+    resource = session.resource("dynamodb")
+    table = resource.Table(config.dynamodb_table)
+
+    image_metadata_repository = ImageMetadataRepository(
+        ddb_table=table,
+        table_name=config.dynamodb_table,
+        legacy_reads=True,
+    )
+
+    migrated, skipped = await image_metadata_repository.migrate_legacy_items()
+    print(f"Migrated {migrated} image items, skipped {skipped}")
+    if skipped:
+        print("Skipped items already exist in their shard, check them before "
+              "turning IMAGE_METADATA_LEGACY_READS off")
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
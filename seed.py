@@ -28,7 +28,7 @@ async def seed():
 
     bcrypt_hasher = BcryptPasswordHasher()
 
-    user_password = bcrypt_hasher.hash_password(admin_password)
+    user_password = await bcrypt_hasher.hash_password(admin_password)
 
     user = User(
         UserID=uuid4().hex,
@@ -0,0 +1,8 @@
+import pytest
+from benchmarks.cases import CASES
+
+
+class TestBenchmarkCases:
+    @pytest.mark.parametrize("case", CASES)
+    def test_case_runs(self, case):
+        CASES[case]()()
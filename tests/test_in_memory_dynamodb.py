@@ -0,0 +1,236 @@
+import time
+import pytest
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+from app.testing.in_memory_dynamodb import PAGE_SIZE_LIMIT, InMemoryDynamoDB
+
+
+@pytest.fixture
+def dynamodb():
+    dynamodb = InMemoryDynamoDB()
+    dynamodb.create_table("table")
+    return dynamodb
+
+
+@pytest.fixture
+def table(dynamodb):
+    return dynamodb.resource().Table("table")
+
+
+def seed(dynamodb, count: int, padding: int = 0, pk: str = "P"):
+    dynamodb.put_items("table", [
+        {"PK": pk, "SK": f"ITEM#{index:04d}", "Index": index,
+         "Status": "OPEN" if index % 2 else "CLOSED", "Padding": "x" * padding}
+        for index in range(count)
+    ])
+
+
+class TestQuery:
+    def test_pages_stop_at_one_megabyte(self, dynamodb, table):
+        # ~100 KB each, ten fit in a page
+        seed(dynamodb, 25, padding=100 * 1024)
+
+        pages = []
+        query = {"KeyConditionExpression": Key("PK").eq("P")}
+        while True:
+            response = table.query(**query)
+            pages.append(response["Count"])
+            if "LastEvaluatedKey" not in response:
+                break
+            query["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+        assert len(pages) == 3
+        assert sum(pages) == 25
+        assert all(count * 100 * 1024 <= PAGE_SIZE_LIMIT for count in pages)
+
+    def test_limit_counts_items_read_before_the_filter(self, dynamodb, table):
+        seed(dynamodb, 10)
+
+        response = table.query(
+            KeyConditionExpression=Key("PK").eq("P") & Key("SK").begins_with("ITEM#"),
+            FilterExpression=Attr("Status").eq("OPEN"),
+            Limit=4)
+
+        assert response["ScannedCount"] == 4
+        assert [item["Index"] for item in response["Items"]] == [1, 3]
+        assert response["LastEvaluatedKey"] == {"PK": "P", "SK": "ITEM#0003"}
+
+    def test_limit_reached_on_the_last_item_still_returns_a_key(self, dynamodb, table):
+        seed(dynamodb, 3)
+
+        first = table.query(KeyConditionExpression=Key("PK").eq("P"), Limit=3)
+        second = table.query(KeyConditionExpression=Key("PK").eq("P"), Limit=3,
+                             ExclusiveStartKey=first["LastEvaluatedKey"])
+
+        assert first["Count"] == 3
+        assert second["Count"] == 0
+        assert "LastEvaluatedKey" not in second
+
+    def test_filtered_items_are_billed(self, dynamodb, table):
+        # 40 items of ~2 KB read, one returned
+        seed(dynamodb, 40, padding=2000)
+
+        response = table.query(
+            KeyConditionExpression=Key("PK").eq("P"),
+            FilterExpression=Attr("Index").eq(7),
+            ReturnConsumedCapacity="TOTAL")
+
+        assert response["Count"] == 1
+        assert response["ScannedCount"] == 40
+        # eventually consistent, half a unit per 4 KB read
+        assert response["ConsumedCapacity"]["CapacityUnits"] == 10.0
+
+    def test_descending_range_and_count(self, dynamodb, table):
+        seed(dynamodb, 10)
+
+        response = table.query(
+            KeyConditionExpression=Key("PK").eq("P")
+            & Key("SK").between("ITEM#0002", "ITEM#0005"),
+            ScanIndexForward=False)
+        count = table.query(KeyConditionExpression=Key("PK").eq("P"), Select="COUNT")
+
+        assert [item["Index"] for item in response["Items"]] == [5, 4, 3, 2]
+        assert count["Count"] == 10
+        assert "Items" not in count
+
+    def test_projection(self, dynamodb, table):
+        table.put_item(Item={"PK": "P", "SK": "S", "Amount": 5,
+                             "Bills": [{"Url": "a"}, {"Url": "b"}], "Meta": {"Tag": "t", "Other": 1}})
+
+        item = table.get_item(Key={"PK": "P", "SK": "S"},
+                              ProjectionExpression="Amount, Bills[1].Url, Meta.Tag")["Item"]
+
+        assert item == {"Amount": 5, "Bills": [{"Url": "b"}], "Meta": {"Tag": "t"}}
+
+    def test_key_condition_must_select_a_partition(self, table):
+        with pytest.raises(ClientError) as err:
+            table.query(KeyConditionExpression=Key("SK").eq("S"))
+
+        assert err.value.response["Error"]["Code"] == "ValidationException"
+
+
+class TestScan:
+    def test_segments_split_the_table(self, dynamodb, table):
+        for partition in range(20):
+            seed(dynamodb, 3, pk=f"P{partition}")
+
+        segments = []
+        for segment in range(4):
+            keys = []
+            query = {"Segment": segment, "TotalSegments": 4, "Limit": 5}
+            while True:
+                response = table.scan(**query)
+                keys.extend((item["PK"], item["SK"]) for item in response["Items"])
+                if "LastEvaluatedKey" not in response:
+                    break
+                query["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+            segments.append(set(keys))
+
+        assert sum(len(keys) for keys in segments) == 60
+        assert len(set().union(*segments)) == 60
+
+
+class TestWrites:
+    def test_update_expression(self, table):
+        table.put_item(Item={"PK": "P", "SK": "S", "Tags": {"a", "b"},
+                             "Bills": [1], "Meta": {"Count": 1}, "Old": True})
+
+        attributes = table.update_item(
+            Key={"PK": "P", "SK": "S"},
+            UpdateExpression="SET Meta.#count = Meta.#count + :one, "
+                             "Bills = list_append(Bills, :bills), Created = if_not_exists(Created, :now) "
+                             "REMOVE Old DELETE Tags :a ADD Visits :one",
+            ConditionExpression="size(Bills) = :one AND contains(Tags, :tag) AND NOT Old IN (:false)",
+            ExpressionAttributeNames={"#count": "Count"},
+            ExpressionAttributeValues={":one": 1, ":bills": [2], ":now": 100,
+                                       ":a": {"a"}, ":tag": "a", ":false": False},
+            ReturnValues="ALL_NEW")["Attributes"]
+
+        assert attributes == {"PK": "P", "SK": "S", "Tags": {"b"}, "Bills": [1, 2],
+                              "Meta": {"Count": 2}, "Created": 100, "Visits": 1}
+
+    def test_failed_condition_returns_old_item(self, table):
+        table.put_item(Item={"PK": "P", "SK": "S", "RefCount": 0})
+
+        with pytest.raises(ClientError) as err:
+            table.update_item(
+                Key={"PK": "P", "SK": "S"}, UpdateExpression="ADD RefCount :one",
+                ConditionExpression=Attr("RefCount").gt(0),
+                ExpressionAttributeValues={":one": 1},
+                ReturnValuesOnConditionCheckFailure="ALL_OLD")
+
+        assert err.value.response["Error"]["Code"] == "ConditionalCheckFailedException"
+        assert err.value.response["Item"] == {"PK": {"S": "P"}, "SK": {"S": "S"}, "RefCount": {"N": "0"}}
+
+    def test_transaction_is_all_or_nothing(self, dynamodb, table):
+        table.put_item(Item={"PK": "P", "SK": "TAKEN"})
+
+        with pytest.raises(ClientError) as err:
+            table.meta.client.transact_write_items(TransactItems=[
+                {"Put": {"TableName": "table", "Item": {"PK": "P", "SK": "NEW"},
+                         "ConditionExpression": "attribute_not_exists(PK)"}},
+                {"Put": {"TableName": "table", "Item": {"PK": "P", "SK": "TAKEN"},
+                         "ConditionExpression": "attribute_not_exists(PK)"}},
+            ])
+
+        assert err.value.response["Error"]["Code"] == "TransactionCanceledException"
+        assert [reason["Code"] for reason in err.value.response["CancellationReasons"]] == \
+            ["None", "ConditionalCheckFailed"]
+        assert dynamodb.items("table") == [{"PK": "P", "SK": "TAKEN"}]
+
+    def test_transaction_rejects_two_actions_on_one_item(self, table):
+        with pytest.raises(ClientError) as err:
+            table.meta.client.transact_write_items(TransactItems=[
+                {"Put": {"TableName": "table", "Item": {"PK": "P", "SK": "S"}}},
+                {"Delete": {"TableName": "table", "Key": {"PK": "P", "SK": "S"}}},
+            ])
+
+        assert err.value.response["Error"]["Code"] == "ValidationException"
+
+    def test_batch_writer_and_batch_get(self, dynamodb, table):
+        with table.batch_writer() as batch:
+            for index in range(60):
+                batch.put_item(Item={"PK": "P", "SK": f"{index:02d}"})
+            batch.delete_item(Key={"PK": "P", "SK": "00"})
+
+        response = table.meta.client.batch_get_item(RequestItems={"table": {
+            "Keys": [{"PK": "P", "SK": f"{index:02d}"} for index in range(5)]}})
+
+        assert dynamodb.calls["BatchWriteItem"] == 3
+        assert len(dynamodb.items("table")) == 59
+        assert sorted(item["SK"] for item in response["Responses"]["table"]) == \
+            ["01", "02", "03", "04"]
+        assert response["UnprocessedKeys"] == {}
+
+    def test_batch_get_rejects_duplicate_keys(self, table):
+        with pytest.raises(ClientError) as err:
+            table.meta.client.batch_get_item(RequestItems={"table": {
+                "Keys": [{"PK": "P", "SK": "S"}, {"PK": "P", "SK": "S"}]}})
+
+        assert err.value.response["Error"]["Code"] == "ValidationException"
+
+    def test_write_capacity_follows_item_size(self, table):
+        response = table.put_item(Item={"PK": "P", "SK": "S", "Data": "x" * 3000},
+                                  ReturnConsumedCapacity="TOTAL")
+
+        assert response["ConsumedCapacity"]["CapacityUnits"] == 3.0
+
+
+class TestStandIn:
+    def test_latency(self, table_name="table"):
+        dynamodb = InMemoryDynamoDB(latency=0.05)
+        dynamodb.create_table(table_name)
+        table = dynamodb.resource().Table(table_name)
+
+        started = time.perf_counter()
+        table.get_item(Key={"PK": "P", "SK": "S"})
+
+        assert time.perf_counter() - started >= 0.05
+
+    def test_unknown_table(self, dynamodb):
+        table = dynamodb.resource().Table("missing")
+
+        with pytest.raises(ClientError) as err:
+            table.get_item(Key={"PK": "P", "SK": "S"})
+
+        assert err.value.response["Error"]["Code"] == "ResourceNotFoundException"
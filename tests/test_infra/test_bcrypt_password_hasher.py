@@ -1,7 +1,7 @@
 import pytest
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
-from app.infra.bcrypt_password_hasher import BcryptPasswordHasher
+from app.infra.bcrypt_password_hasher import BcryptPasswordHasher, calibrate_cost
 
 
 class TestBcryptPasswordHasher:
@@ -9,61 +9,108 @@ class TestBcryptPasswordHasher:
     def password_hasher(self):
         return BcryptPasswordHasher(cost=4)
 
-    def test_hash_password_creates_valid_hash(self, password_hasher):
+    @pytest.mark.asyncio
+    async def test_hash_password_creates_valid_hash(self, password_hasher):
         password = "test_password_123"
-        hashed = password_hasher.hash_password(password)
+        hashed = await password_hasher.hash_password(password)
 
         assert hashed is not None
         assert len(hashed) > 0
         assert hashed.startswith("$2")
 
-    def test_hash_password_different_hashes_for_same_password(self, password_hasher):
+    @pytest.mark.asyncio
+    async def test_hash_password_different_hashes_for_same_password(self, password_hasher):
         password = "same_password"
-        hash1 = password_hasher.hash_password(password)
-        hash2 = password_hasher.hash_password(password)
+        hash1 = await password_hasher.hash_password(password)
+        hash2 = await password_hasher.hash_password(password)
 
         assert hash1 != hash2
 
-    def test_hash_password_with_special_characters(self, password_hasher):
+    @pytest.mark.asyncio
+    async def test_hash_password_with_special_characters(self, password_hasher):
         password = "p@ssw0rd!#$%^&*()"
-        hashed = password_hasher.hash_password(password)
+        hashed = await password_hasher.hash_password(password)
 
         assert hashed is not None
-        assert password_hasher.verify_password(hashed, password)
+        assert await password_hasher.verify_password(hashed, password)
 
-    def test_hash_password_with_unicode(self, password_hasher):
+    @pytest.mark.asyncio
+    async def test_hash_password_with_unicode(self, password_hasher):
         password = "пароль123"
-        hashed = password_hasher.hash_password(password)
+        hashed = await password_hasher.hash_password(password)
 
         assert hashed is not None
-        assert password_hasher.verify_password(hashed, password)
+        assert await password_hasher.verify_password(hashed, password)
 
-    def test_hash_password_empty_string(self, password_hasher):
+    @pytest.mark.asyncio
+    async def test_hash_password_empty_string(self, password_hasher):
         password = ""
         with pytest.raises(AppException) as exc_info:
-            password_hasher.hash_password(password)
+            await password_hasher.hash_password(password)
         assert exc_info.value.err_code == AppErr.EMPTY_PASSWORD
 
-    def test_hash_password_long_password(self, password_hasher):
+    @pytest.mark.asyncio
+    async def test_hash_password_long_password(self, password_hasher):
         password = "a" * 200
         with pytest.raises(AppException) as excinfo:
-            password_hasher.hash_password(password)
+            await password_hasher.hash_password(password)
         assert excinfo.value.err_code == AppErr.PASSWORD_TOO_LONG
 
-    def test_verify_password_correct_password(self, password_hasher):
+    @pytest.mark.asyncio
+    async def test_verify_password_correct_password(self, password_hasher):
         password = "correct_password"
-        hashed = password_hasher.hash_password(password)
+        hashed = await password_hasher.hash_password(password)
 
-        assert password_hasher.verify_password(hashed, password) is True
+        assert await password_hasher.verify_password(hashed, password) is True
 
-    def test_verify_password_incorrect_password(self, password_hasher):
+    @pytest.mark.asyncio
+    async def test_verify_password_incorrect_password(self, password_hasher):
         password = "correct_password"
-        hashed = password_hasher.hash_password(password)
+        hashed = await password_hasher.hash_password(password)
 
-        assert password_hasher.verify_password(hashed, "wrong_password") is False
+        assert await password_hasher.verify_password(hashed, "wrong_password") is False
 
-    def test_verify_password_with_known_hash(self, password_hasher):
+    @pytest.mark.asyncio
+    async def test_verify_password_with_known_hash(self, password_hasher):
         known_hash = "$2a$12$zixCEDG2iopBrkQCFrbI0eseyoobCSvN8ajMDCxlfj5aZMdbP2uva"
 
-        assert password_hasher.verify_password(known_hash, "password") is True
-        assert password_hasher.verify_password(known_hash, "wrong") is False
+        assert await password_hasher.verify_password(known_hash, "password") is True
+        assert await password_hasher.verify_password(known_hash, "wrong") is False
+
+    def test_needs_rehash_for_lower_cost(self):
+        cost_12_hash = "$2a$12$zixCEDG2iopBrkQCFrbI0eseyoobCSvN8ajMDCxlfj5aZMdbP2uva"
+
+        assert BcryptPasswordHasher(cost=13).needs_rehash(cost_12_hash) is True
+        assert BcryptPasswordHasher(cost=12).needs_rehash(cost_12_hash) is False
+
+    def test_needs_rehash_false_for_higher_cost(self):
+        cost_12_hash = "$2a$12$zixCEDG2iopBrkQCFrbI0eseyoobCSvN8ajMDCxlfj5aZMdbP2uva"
+
+        assert BcryptPasswordHasher(cost=11).needs_rehash(cost_12_hash) is False
+
+    def test_needs_rehash_for_higher_cost_when_pinned(self):
+        cost_12_hash = "$2a$12$zixCEDG2iopBrkQCFrbI0eseyoobCSvN8ajMDCxlfj5aZMdbP2uva"
+
+        assert BcryptPasswordHasher(cost=11, pinned=True).needs_rehash(cost_12_hash) is True
+        assert BcryptPasswordHasher(cost=13, pinned=True).needs_rehash(cost_12_hash) is True
+        assert BcryptPasswordHasher(cost=12, pinned=True).needs_rehash(cost_12_hash) is False
+
+    @pytest.mark.asyncio
+    async def test_needs_rehash_false_for_fresh_hash(self, password_hasher):
+        hashed = await password_hasher.hash_password("password")
+
+        assert password_hasher.needs_rehash(hashed) is False
+
+    def test_needs_rehash_false_for_unknown_format(self, password_hasher):
+        assert password_hasher.needs_rehash("not-a-bcrypt-hash") is False
+
+
+class TestCalibrateCost:
+    def test_tiny_budget_returns_min_cost(self):
+        assert calibrate_cost(0.0, min_cost=10) == 10
+
+    def test_huge_budget_is_capped_at_max_cost(self):
+        assert calibrate_cost(1e9, min_cost=4, max_cost=11) == 11
+
+    def test_larger_budget_never_lowers_cost(self):
+        assert calibrate_cost(0.05, min_cost=4) <= calibrate_cost(0.5, min_cost=4)
@@ -0,0 +1,93 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from app.errors.app_exception import AppException
+from app.errors.codes import AppErr
+from app.infra.bounded_executor import BoundedExecutor
+
+
+class TestBoundedExecutor:
+    @pytest.fixture
+    def executor(self):
+        executor = BoundedExecutor("test", max_workers=1, max_queue_size=1)
+        yield executor
+        executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_run_returns_result(self, executor):
+        result = await executor.run(lambda a, b: a + b, 2, 3)
+
+        assert result == 5
+        assert executor.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_run_runs_off_the_event_loop_thread(self, executor):
+        thread_name = await executor.run(lambda: threading.current_thread().name)
+
+        assert thread_name != threading.current_thread().name
+        assert thread_name.startswith("test")
+
+    @pytest.mark.asyncio
+    async def test_run_propagates_exceptions(self, executor):
+        def fail():
+            raise AppException(AppErr.PASSWORD_TOO_LONG)
+
+        with pytest.raises(AppException) as exc:
+            await executor.run(fail)
+
+        assert exc.value.err_code == AppErr.PASSWORD_TOO_LONG
+        assert executor.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_workers_and_queue_are_full(self, executor):
+        release = threading.Event()
+        running = asyncio.ensure_future(executor.run(release.wait))
+        queued = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AppException) as exc:
+            await executor.run(release.wait)
+
+        assert exc.value.err_code == AppErr.UNAVAILABLE
+        release.set()
+        await asyncio.gather(running, queued)
+        assert executor.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_keeps_slot_until_call_finishes(self, executor):
+        release = threading.Event()
+        started = threading.Event()
+
+        def blocking():
+            started.set()
+            release.wait()
+
+        running = asyncio.ensure_future(executor.run(blocking))
+        await asyncio.to_thread(started.wait)
+        running.cancel()
+        await asyncio.gather(running, return_exceptions=True)
+
+        assert executor.pending == 1
+        release.set()
+        for _ in range(100):
+            if executor.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert executor.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_runs_on_a_given_process_pool(self):
+        executor = BoundedExecutor(
+            "test_processes", max_workers=1,
+            executor=ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")))
+        try:
+            pid = await executor.run(os.getpid)
+        finally:
+            executor.shutdown()
+
+        assert pid != os.getpid()
+        assert executor.pending == 0
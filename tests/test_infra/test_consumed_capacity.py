@@ -0,0 +1,110 @@
+import boto3
+import pytest
+from botocore.stub import Stubber
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import consumed_capacity
+from app.middleware import RequestMetricsMiddleware, _capacity_units, _scanned_items
+
+
+@pytest.fixture
+def ddb_client():
+    client = boto3.client("dynamodb", region_name="us-east-1",
+                          aws_access_key_id="test", aws_secret_access_key="test")
+    consumed_capacity.instrument_client(client)
+    return client
+
+
+@pytest.fixture
+def request_capacity():
+    token = consumed_capacity.start()
+    yield consumed_capacity.current()
+    consumed_capacity.stop(token)
+
+
+class TestConsumedCapacity:
+    def test_query_asks_for_and_records_capacity(self, ddb_client, request_capacity):
+        with Stubber(ddb_client) as stubber:
+            stubber.add_response(
+                "query",
+                {"Items": [], "Count": 2, "ScannedCount": 10,
+                 "ConsumedCapacity": {"TableName": "t", "CapacityUnits": 1.5}},
+                {"TableName": "t", "KeyConditionExpression": "PK = :pk",
+                 "ExpressionAttributeValues": {":pk": {"S": "EXPENSE"}},
+                 "ReturnConsumedCapacity": "TOTAL"})
+            ddb_client.query(TableName="t", KeyConditionExpression="PK = :pk",
+                             ExpressionAttributeValues={":pk": {"S": "EXPENSE"}})
+
+        assert request_capacity.read_units == 1.5
+        assert request_capacity.write_units == 0
+        assert (request_capacity.scanned_count, request_capacity.count) == (10, 2)
+
+    def test_transaction_capacity_counts_as_writes(self, ddb_client, request_capacity):
+        with Stubber(ddb_client) as stubber:
+            stubber.add_response(
+                "transact_write_items",
+                {"ConsumedCapacity": [{"TableName": "t", "CapacityUnits": 4.0},
+                                      {"TableName": "u", "CapacityUnits": 2.0}]})
+            ddb_client.transact_write_items(TransactItems=[
+                {"Delete": {"TableName": "t", "Key": {"PK": {"S": "a"}, "SK": {"S": "b"}}}},
+            ])
+
+        assert request_capacity.write_units == 6.0
+        assert request_capacity.read_units == 0
+
+    def test_resource_table_calls_ask_for_capacity(self, request_capacity):
+        # the repositories go through boto3 resources, which copy the params
+        table = boto3.resource("dynamodb", region_name="us-east-1",
+                               aws_access_key_id="test",
+                               aws_secret_access_key="test").Table("t")
+        consumed_capacity.instrument_client(table.meta.client)
+        with Stubber(table.meta.client) as stubber:
+            stubber.add_response(
+                "get_item",
+                {"ConsumedCapacity": {"TableName": "t", "CapacityUnits": 0.5}},
+                # the stubber checks them before the resource serializes them
+                {"TableName": "t", "Key": {"PK": "a", "SK": "b"},
+                 "ReturnConsumedCapacity": "TOTAL"})
+            table.get_item(Key={"PK": "a", "SK": "b"})
+
+        assert request_capacity.read_units == 0.5
+
+    def test_calls_outside_requests_are_not_recorded(self, ddb_client):
+        with Stubber(ddb_client) as stubber:
+            stubber.add_response("get_item", {"ConsumedCapacity": {"CapacityUnits": 0.5}})
+            ddb_client.get_item(TableName="t", Key={"PK": {"S": "a"}})
+
+        assert consumed_capacity.current() is None
+
+
+class TestRequestCapacityMetrics:
+    def build_client(self, capacity_header: bool) -> TestClient:
+        app = FastAPI()
+        app.add_middleware(RequestMetricsMiddleware, capacity_header=capacity_header)
+
+        @app.get("/reports/{report_id}")
+        async def report(report_id: str):
+            consumed_capacity.current().add("Query", {
+                "ConsumedCapacity": {"CapacityUnits": 2.0},
+                "ScannedCount": 8, "Count": 1})
+            return {"report_id": report_id}
+
+        return TestClient(app)
+
+    def test_records_capacity_per_route(self):
+        route = "/reports/{report_id}"
+        read_before = _capacity_units.value(route=route, kind="read")
+        scanned_before = _scanned_items.value(route=route)
+
+        response = self.build_client(capacity_header=False).get("/reports/42")
+
+        assert response.status_code == 200
+        assert "x-dynamodb-capacity" not in response.headers
+        assert _capacity_units.value(route=route, kind="read") == read_before + 2.0
+        assert _scanned_items.value(route=route) == scanned_before + 8
+
+    def test_capacity_header(self):
+        response = self.build_client(capacity_header=True).get("/reports/42")
+
+        assert response.headers["x-dynamodb-capacity"] == \
+            "read=2, write=0, scanned=8, returned=1"
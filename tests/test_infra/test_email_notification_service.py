@@ -0,0 +1,125 @@
+import json
+from unittest.mock import MagicMock
+import pytest
+from botocore.exceptions import ClientError
+from app.errors.app_exception import AppException
+from app.errors.codes import AppErr
+from app.infra.email_notification_service import EmailNotificationService
+from app.models.notification import EventType, Notification
+
+
+def _all_success(**kwargs):
+    return {"Successful": [{"Id": e["Id"]} for e in kwargs["Entries"]], "Failed": []}
+
+
+class TestEmailNotificationService:
+    @pytest.fixture
+    def queue_url(self):
+        return "https://sqs.test.amazonaws.com/123/test-queue"
+
+    @pytest.fixture
+    def mock_sqs_client(self):
+        client = MagicMock()
+        client.send_message_batch.side_effect = _all_success
+        return client
+
+    @pytest.fixture
+    def notification_service(self, mock_sqs_client, queue_url):
+        return EmailNotificationService(
+            mock_sqs_client, queue_url, flush_interval=0.01, retry_backoff=0)
+
+    def _notification(self, idx: int = 0) -> Notification:
+        return Notification(
+            event_type=EventType.USER_WELCOME,
+            user=Notification.User(name=f"User {idx}", email=f"user{idx}@example.com"),
+            expense=None,
+            advance=None,
+        )
+
+    @pytest.mark.asyncio
+    async def test_send_notification_does_not_call_sqs_inline(self, notification_service, mock_sqs_client):
+        await notification_service.send_notification(self._notification())
+
+        mock_sqs_client.send_message.assert_not_called()
+        mock_sqs_client.send_message_batch.assert_not_called()
+        await notification_service.close()
+        mock_sqs_client.send_message_batch.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_messages_are_sent_in_batches_of_ten(self, notification_service, mock_sqs_client, queue_url):
+        for idx in range(12):
+            await notification_service.send_notification(self._notification(idx))
+
+        await notification_service.close()
+
+        calls = mock_sqs_client.send_message_batch.call_args_list
+        assert [len(c.kwargs["Entries"]) for c in calls] == [10, 2]
+        assert all(c.kwargs["QueueUrl"] == queue_url for c in calls)
+        body = json.loads(calls[0].kwargs["Entries"][0]["MessageBody"])
+        assert body["event_type"] == "USER_WELCOME"
+        assert body["user"]["email"] == "user0@example.com"
+        assert "expense" not in body
+
+    @pytest.mark.asyncio
+    async def test_partial_failure_is_retried(self, notification_service, mock_sqs_client):
+        responses = [
+            {"Successful": [{"Id": "0"}],
+             "Failed": [{"Id": "1", "SenderFault": False, "Code": "InternalError"}]},
+            {"Successful": [{"Id": "1"}], "Failed": []},
+        ]
+        mock_sqs_client.send_message_batch.side_effect = responses
+
+        await notification_service.send_notification(self._notification(0))
+        await notification_service.send_notification(self._notification(1))
+        await notification_service.close()
+
+        calls = mock_sqs_client.send_message_batch.call_args_list
+        assert len(calls) == 2
+        retried = calls[1].kwargs["Entries"]
+        assert len(retried) == 1
+        assert json.loads(retried[0]["MessageBody"])["user"]["name"] == "User 1"
+
+    @pytest.mark.asyncio
+    async def test_sender_fault_is_not_retried(self, notification_service, mock_sqs_client):
+        mock_sqs_client.send_message_batch.side_effect = None
+        mock_sqs_client.send_message_batch.return_value = {
+            "Successful": [],
+            "Failed": [{"Id": "0", "SenderFault": True, "Code": "InvalidMessageContents"}],
+        }
+
+        await notification_service.send_notification(self._notification())
+        await notification_service.close()
+
+        mock_sqs_client.send_message_batch.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_client_error_retried_up_to_max_attempts(self, notification_service, mock_sqs_client):
+        error_response = {"Error": {"Code": "ServiceUnavailable", "Message": "Unavailable"}}
+        mock_sqs_client.send_message_batch.side_effect = ClientError(
+            error_response, "SendMessageBatch")
+
+        await notification_service.send_notification(self._notification())
+        await notification_service.close()
+
+        assert mock_sqs_client.send_message_batch.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_queue_full_raises(self, mock_sqs_client, queue_url):
+        service = EmailNotificationService(
+            mock_sqs_client, queue_url, max_queue_size=1, flush_interval=0.01)
+
+        await service.send_notification(self._notification(0))
+        with pytest.raises(AppException) as exc:
+            await service.send_notification(self._notification(1))
+
+        assert exc.value.err_code == AppErr.SQS_SEND_MESSAGE_FAILED
+        await service.close()
+
+    @pytest.mark.asyncio
+    async def test_send_after_close_raises(self, notification_service):
+        await notification_service.close()
+
+        with pytest.raises(AppException) as exc:
+            await notification_service.send_notification(self._notification())
+
+        assert exc.value.err_code == AppErr.SQS_SEND_MESSAGE_FAILED
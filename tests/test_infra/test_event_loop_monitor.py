@@ -0,0 +1,23 @@
+import asyncio
+import time
+import pytest
+from app.infra import event_loop_monitor
+from app.infra.event_loop_monitor import EventLoopLagMonitor
+
+
+class TestEventLoopLagMonitor:
+    @pytest.mark.asyncio
+    async def test_records_lag_when_loop_is_blocked(self):
+        histogram = event_loop_monitor._loop_lag
+        count_before = histogram.count()
+        sum_before = histogram.sum()
+        monitor = EventLoopLagMonitor(interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0)
+
+        time.sleep(0.05)  # block the loop
+        await asyncio.sleep(0.02)
+        await monitor.close()
+
+        assert histogram.count() > count_before
+        assert histogram.sum() - sum_before >= 0.03
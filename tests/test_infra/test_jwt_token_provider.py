@@ -1,10 +1,12 @@
 import time
+from unittest.mock import MagicMock
 from uuid import uuid4
 import pytest
 import jwt
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
 from app.infra.jwt_token_provider import JWTTokenProvider
+from app.infra.token_revocation_list import TokenRevocationList
 from app.models.user import UserClaims, UserRole
 
 
@@ -181,4 +183,104 @@ class TestJWTTokenProvider:
         token = provider.generate_token(sample_user_claims)
         validated = provider.validate_token(token)
 
-        assert validated.user_id == sample_user_claims.user_id
\ No newline at end of file
+        assert validated.user_id == sample_user_claims.user_id
+    def test_validate_token_is_cached(self, token_provider, sample_user_claims, monkeypatch):
+        token = token_provider.generate_token(sample_user_claims)
+        decode = MagicMock(wraps=jwt.decode)
+        monkeypatch.setattr(jwt, "decode", decode)
+
+        first = token_provider.validate_token(token)
+        second = token_provider.validate_token(token)
+
+        assert first.user_id == second.user_id == sample_user_claims.user_id
+        assert decode.call_count == 1
+
+    def test_invalid_token_is_not_cached(self, token_provider, sample_user_claims, monkeypatch):
+        token = token_provider.generate_token(sample_user_claims)
+        tampered = token[:-2] + ("AA" if not token.endswith("AA") else "BB")
+        decode = MagicMock(wraps=jwt.decode)
+        monkeypatch.setattr(jwt, "decode", decode)
+
+        for _ in range(2):
+            with pytest.raises(AppException):
+                token_provider.validate_token(tampered)
+
+        assert decode.call_count == 2
+
+    def test_cached_token_expires_with_token(self, jwt_secret):
+        token_provider = JWTTokenProvider(jwt_secret)
+        now = int(time.time())
+        claims = {
+            "iss": "https://api.watchexpense.com",
+            "aud": "https://api.watchexpense.com",
+            "iat": now,
+            "exp": now + 2,
+            "sub": "user-1",
+            "id": "user-1",
+            "name": "Test User",
+            "email": "test@example.com",
+            "role": UserRole.Employee,
+        }
+        token = jwt.encode(claims, jwt_secret, algorithm="HS256")
+        token_provider.validate_token(token)
+
+        time.sleep(max(0.0, now + 2 - time.time()) + 0.05)
+
+        with pytest.raises(AppException) as exc:
+            token_provider.validate_token(token)
+
+        assert exc.value.err_code == AppErr.TOKEN_EXPIRED
+
+    def test_validate_token_without_exp_is_rejected(self, jwt_secret):
+        token_provider = JWTTokenProvider(jwt_secret)
+        token = jwt.encode({
+            "iss": "https://api.watchexpense.com",
+            "aud": "https://api.watchexpense.com",
+            "id": "user-1",
+            "name": "Test User",
+            "email": "test@example.com",
+            "role": UserRole.Employee,
+        }, jwt_secret, algorithm="HS256")
+
+        with pytest.raises(AppException) as exc:
+            token_provider.validate_token(token)
+
+        assert exc.value.err_code == AppErr.TOKEN_DECODE_ERROR
+
+    def test_generate_token_has_unique_token_id(self, token_provider, sample_user_claims, jwt_secret):
+        tokens = [token_provider.generate_token(sample_user_claims) for _ in range(2)]
+
+        token_ids = {jwt.decode(token, jwt_secret, algorithms=["HS256"],
+                                audience="https://api.watchexpense.com")["jti"]
+                     for token in tokens}
+
+        assert len(token_ids) == 2
+
+    def test_revoked_token_is_rejected_even_if_cached(self, jwt_secret, sample_user_claims):
+        revocation_list = TokenRevocationList(MagicMock())
+        token_provider = JWTTokenProvider(jwt_secret, revocation_list=revocation_list)
+        token = token_provider.generate_token(sample_user_claims)
+        token_provider.validate_token(token)
+
+        revoked_token = token_provider.revoke_token(token)
+
+        assert revoked_token is not None
+        assert revoked_token.token_id
+        assert revoked_token.expires_at > time.time()
+        with pytest.raises(AppException) as exc:
+            token_provider.validate_token(token)
+        assert exc.value.err_code == AppErr.TOKEN_REVOKED
+
+    def test_revoke_token_without_token_id(self, jwt_secret):
+        token_provider = JWTTokenProvider(jwt_secret)
+        token = jwt.encode({
+            "iss": "https://api.watchexpense.com",
+            "aud": "https://api.watchexpense.com",
+            "exp": int(time.time()) + 60,
+            "id": "user-1",
+            "name": "Test User",
+            "email": "test@example.com",
+            "role": UserRole.Employee,
+        }, jwt_secret, algorithm="HS256")
+
+        assert token_provider.revoke_token(token) is None
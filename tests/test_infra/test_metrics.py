@@ -0,0 +1,78 @@
+import pytest
+from fastapi.testclient import TestClient
+from app import metrics
+from app.config import load_config
+from app.main import app
+
+SCRAPE = {"Authorization": "Bearer scrape-secret"}
+
+
+class TestRegistryRender:
+    def test_renders_counters_gauges_and_histograms(self):
+        registry = metrics.Registry()
+        registry.counter("jobs_total", "Jobs by result", ("result",)).inc(2, result="ok")
+        registry.gauge("queue_depth", "Queued jobs").set(3)
+        histogram = registry.histogram(
+            "job_seconds", "Job latency", ("kind",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, kind="a")
+        histogram.observe(0.5, kind="a")
+        histogram.observe(5, kind="a")
+
+        assert registry.render() == "\n".join([
+            "# HELP jobs_total Jobs by result",
+            "# TYPE jobs_total counter",
+            'jobs_total{result="ok"} 2.0',
+            "# HELP queue_depth Queued jobs",
+            "# TYPE queue_depth gauge",
+            "queue_depth 3.0",
+            "# HELP job_seconds Job latency",
+            "# TYPE job_seconds histogram",
+            'job_seconds_bucket{kind="a",le="0.1"} 1',
+            'job_seconds_bucket{kind="a",le="1.0"} 2',
+            'job_seconds_bucket{kind="a",le="+Inf"} 3',
+            'job_seconds_sum{kind="a"} 5.55',
+            'job_seconds_count{kind="a"} 3',
+        ]) + "\n"
+
+    def test_escapes_label_values(self):
+        registry = metrics.Registry()
+        registry.counter("errors_total", "Errors", ("message",)).inc(message='a "b"\\\n')
+
+        assert 'errors_total{message="a \\"b\\"\\\\\\n"} 1.0' in registry.render()
+
+
+class TestMetricsEndpoint:
+    @pytest.fixture(autouse=True)
+    def metrics_token(self, monkeypatch):
+        monkeypatch.setattr(load_config(), "metrics_token", "scrape-secret")
+
+    def test_exposes_request_latency_by_route_template(self):
+        client = TestClient(app)
+        client.get("/health")
+
+        response = client.get("/metrics", headers=SCRAPE)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == metrics.CONTENT_TYPE
+        assert 'http_request_duration_seconds_count{method="GET",route="/health",status="200"}' \
+            in response.text
+
+    def test_unmatched_paths_share_one_label(self):
+        client = TestClient(app)
+        client.get("/no/such/path/123")
+
+        response = client.get("/metrics", headers=SCRAPE)
+
+        assert 'route="unmatched",status="404"' in response.text
+        assert "/no/such/path/123" not in response.text
+
+    def test_requires_the_scrape_token(self):
+        client = TestClient(app)
+
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    def test_not_served_without_a_token_configured(self, monkeypatch):
+        monkeypatch.setattr(load_config(), "metrics_token", "")
+
+        assert TestClient(app).get("/metrics", headers=SCRAPE).status_code == 404
@@ -0,0 +1,59 @@
+import io
+import pytest
+from app.errors.app_exception import AppException
+from app.errors.codes import AppErr
+from app.infra.pillow_derivative_generator import PillowDerivativeGenerator, render_derivatives
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def make_image(width: int, height: int, fmt: str = "JPEG") -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(out, format=fmt)
+    return out.getvalue()
+
+
+class TestRenderDerivatives:
+    def test_renders_webp_at_fixed_widths(self):
+        renders = render_derivatives(
+            make_image(2000, 3000), {"thumbnail": 256, "preview": 1024}, 80)
+
+        assert set(renders) == {"thumbnail", "preview"}
+        with Image.open(io.BytesIO(renders["thumbnail"])) as thumbnail:
+            assert thumbnail.format == "WEBP"
+            assert thumbnail.size == (256, 384)
+        with Image.open(io.BytesIO(renders["preview"])) as preview:
+            assert preview.size == (1024, 1536)
+
+    def test_small_images_are_not_upscaled(self):
+        renders = render_derivatives(make_image(100, 50, "PNG"), {"thumbnail": 256}, 80)
+
+        with Image.open(io.BytesIO(renders["thumbnail"])) as thumbnail:
+            assert thumbnail.size == (100, 50)
+
+    def test_undecodable_image(self):
+        with pytest.raises(ValueError):
+            render_derivatives(b"not an image", {"thumbnail": 256}, 80)
+
+
+class TestPillowDerivativeGenerator:
+    @pytest.mark.asyncio
+    async def test_generate_on_process_pool(self):
+        generator = PillowDerivativeGenerator({"thumbnail": 64}, max_workers=1)
+        try:
+            renders = await generator.generate(make_image(640, 480))
+        finally:
+            generator.shutdown()
+
+        assert set(renders) == {"thumbnail"}
+
+    @pytest.mark.asyncio
+    async def test_generate_undecodable_image(self):
+        generator = PillowDerivativeGenerator({"thumbnail": 64}, max_workers=1)
+        try:
+            with pytest.raises(AppException) as exc:
+                await generator.generate(b"not an image")
+        finally:
+            generator.shutdown()
+
+        assert exc.value.err_code == AppErr.IMAGE_TYPE_NOT_ALLOWED
@@ -0,0 +1,109 @@
+import pytest
+from app.infra.rate_limiter import LoginRateLimiter, SlidingWindowCounter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSlidingWindowCounter:
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+
+    def test_counts_hits_per_key(self, clock):
+        counter = SlidingWindowCounter(window=60, clock=clock)
+
+        assert counter.hit("a") == 1
+        assert counter.hit("a") == 2
+        assert counter.hit("b") == 1
+
+    def test_previous_window_decays(self, clock):
+        counter = SlidingWindowCounter(window=60, clock=clock)
+        for _ in range(10):
+            counter.hit("a")
+
+        clock.now += 90  # half way through the next window
+
+        assert counter.hit("a") == pytest.approx(1 + 10 * 0.5)
+
+    def test_forgets_after_two_windows(self, clock):
+        counter = SlidingWindowCounter(window=60, clock=clock)
+        for _ in range(10):
+            counter.hit("a")
+
+        clock.now += 125
+
+        assert counter.hit("a") == 1
+
+    def test_memory_is_fixed(self, clock):
+        counter = SlidingWindowCounter(window=60, width=64, depth=2, clock=clock)
+        for idx in range(10_000):
+            counter.hit(f"key-{idx}")
+
+        assert len(counter._current) == 128
+        assert counter.hit("key-0") >= 1
+
+    def test_rejected_hits_are_not_recorded(self, clock):
+        counter = SlidingWindowCounter(window=60, clock=clock)
+        for _ in range(100):
+            counter.hit("a", limit=3)
+
+        clock.now += 90  # half way through the next window
+
+        assert counter.hit("a") == pytest.approx(1 + 3 * 0.5)
+
+
+class TestLoginRateLimiter:
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+
+    @pytest.fixture
+    def rate_limiter(self, clock):
+        return LoginRateLimiter(per_email_limit=2, per_ip_limit=3, window=60, clock=clock)
+
+    def test_email_limit(self, rate_limiter):
+        results = [rate_limiter.allow("User@Example.com", f"10.0.0.{i}") for i in range(3)]
+
+        assert results == [True, True, False]
+        assert rate_limiter.allow("other@example.com", "10.0.0.9") is True
+
+    def test_email_is_normalized(self, rate_limiter):
+        rate_limiter.allow("user@example.com", "10.0.0.1")
+        rate_limiter.allow(" USER@example.com", "10.0.0.2")
+
+        assert rate_limiter.allow("User@Example.Com", "10.0.0.3") is False
+
+    def test_ip_limit(self, rate_limiter):
+        results = [rate_limiter.allow(f"user{i}@example.com", "10.0.0.1") for i in range(4)]
+
+        assert results == [True, True, True, False]
+
+    def test_missing_ip_only_limits_email(self, rate_limiter):
+        results = [rate_limiter.allow(f"user{i}@example.com", None) for i in range(5)]
+
+        assert all(results)
+
+    def test_recovers_after_window(self, rate_limiter, clock):
+        for _ in range(3):
+            rate_limiter.allow("user@example.com", "10.0.0.1")
+
+        clock.now += 121
+
+        assert rate_limiter.allow("user@example.com", "10.0.0.1") is True
+
+    def test_spray_of_distinct_emails_does_not_lock_out_others(self, clock):
+        rate_limiter = LoginRateLimiter(per_email_limit=10, window=60,
+                                        expected_keys=4096, clock=clock)
+        # twice the expected keys, some hammered well past the limit
+        for idx in range(8192):
+            for _ in range(3 if idx % 100 else 50):
+                rate_limiter.allow(f"victim-{idx}@example.com", None)
+
+        assert all(rate_limiter.allow(f"user-{idx}@example.com", None)
+                   for idx in range(100))
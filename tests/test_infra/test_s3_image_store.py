@@ -1,6 +1,10 @@
+import base64
+import hashlib
+from datetime import datetime, timezone
 from io import BytesIO
 from unittest.mock import MagicMock
 import pytest
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
@@ -15,7 +19,6 @@ class TestS3ImageStore:
     @pytest.fixture
     def mock_s3_client(self):
         client = MagicMock()
-        client.upload_fileobj = MagicMock()
         client.delete_object = MagicMock()
         client.generate_presigned_url = MagicMock()
         client.exceptions.NoSuchKey = type('NoSuchKey', (Exception,), {})
@@ -25,40 +28,13 @@ class TestS3ImageStore:
     def image_store(self, bucket_name, mock_s3_client):
         return S3ImageStore(bucket_name, mock_s3_client)
 
-    @pytest.fixture
-    def sample_image(self):
-        return BytesIO(b"fake image data")
-
     @pytest.mark.asyncio
-    async def test_upload_image_success(self, image_store, sample_image, mock_s3_client, bucket_name):
-        result = await image_store.upload_image("test.jpg", sample_image)
-
-        assert result is not None
-        assert result.startswith(f"https://{bucket_name}.s3.amazonaws.com/")
-        assert "test.jpg" in result
-        mock_s3_client.upload_fileobj.assert_called_once()
-        call_kwargs = mock_s3_client.upload_fileobj.call_args[1]
-        assert call_kwargs['Bucket'] == bucket_name
-        assert call_kwargs['Fileobj'] == sample_image
-
-    @pytest.mark.asyncio
-    async def test_upload_image_generates_unique_urls(self, image_store, sample_image):
-        url1 = await image_store.upload_image("test.jpg", sample_image)
-        sample_image.seek(0)  # Reset file pointer
-        url2 = await image_store.upload_image("test.jpg", sample_image)
+    async def test_upload_image_stream_generates_unique_urls(self, image_store):
+        url1 = await image_store.upload_image_stream("test.jpg", "image/jpeg", stream(b"fake image data", 4))
+        url2 = await image_store.upload_image_stream("test.jpg", "image/jpeg", stream(b"fake image data", 4))
 
         assert url1 != url2
 
-    @pytest.mark.asyncio
-    async def test_upload_image_client_error(self, image_store, sample_image, mock_s3_client):
-        error_response = {'Error': {'Code': 'AccessDenied', 'Message': 'Access Denied'}}
-        mock_s3_client.upload_fileobj.side_effect = ClientError(error_response, 'upload_fileobj')
-
-        with pytest.raises(AppException) as exc:
-            await image_store.upload_image("test.jpg", sample_image)
-
-        assert exc.value.err_code == AppErr.IMAGE_UPLOAD_FAILED
-
     @pytest.mark.asyncio
     async def test_delete_image_success(self, image_store, mock_s3_client, bucket_name):
         image_url = f"https://{bucket_name}.s3.amazonaws.com/abc123_test.jpg"
@@ -114,7 +90,7 @@ class TestS3ImageStore:
         assert call_kwargs['ClientMethod'] == 'get_object'
         assert call_kwargs['Params']['Bucket'] == bucket_name
         assert call_kwargs['Params']['Key'] == "abc123_test.jpg"
-        assert call_kwargs['ExpiresIn'] == 60
+        assert call_kwargs['ExpiresIn'] == 300
 
     @pytest.mark.asyncio
     async def test_get_image_download_url_not_found(self, image_store, mock_s3_client, bucket_name):
@@ -169,8 +145,264 @@ class TestS3ImageStore:
         file_types = ["image.png", "photo.jpeg", "document.pdf", "file.gif"]
 
         for filename in file_types:
-            file_data = BytesIO(b"test data")
-            url = await image_store.upload_image(filename, file_data)
+            url = await image_store.upload_image_stream(
+                filename, "application/octet-stream", stream(b"test data", 4))
 
             assert filename in url
             assert url.startswith(f"https://{bucket_name}.s3.amazonaws.com/")
+
+
+def stream(data: bytes, chunk_size: int):
+    async def chunks():
+        for i in range(0, len(data), chunk_size):
+            yield data[i:i + chunk_size]
+    return chunks()
+
+
+def sha256_b64(data: bytes) -> str:
+    return base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+class TestS3ImageStoreStreamingUpload:
+    @pytest.fixture
+    def bucket_name(self):
+        return "test-bucket"
+
+    @pytest.fixture
+    def mock_s3_client(self):
+        client = MagicMock()
+        client.create_multipart_upload.return_value = {"UploadId": "upload-1"}
+        client.upload_part.side_effect = lambda **kwargs: {
+            "ETag": f"etag-{kwargs['PartNumber']}"}
+        return client
+
+    @pytest.fixture
+    def image_store(self, bucket_name, mock_s3_client):
+        # tiny parts so multipart kicks in with small test data
+        config = TransferConfig(multipart_chunksize=10, max_concurrency=2)
+        return S3ImageStore(bucket_name, mock_s3_client, config)
+
+    @pytest.mark.asyncio
+    async def test_small_upload_uses_single_put(self, image_store, mock_s3_client, bucket_name):
+        data = b"12345678"
+
+        url = await image_store.upload_image_stream("a.jpg", "image/jpeg", stream(data, 3))
+
+        assert url.startswith(f"https://{bucket_name}.s3.amazonaws.com/")
+        mock_s3_client.create_multipart_upload.assert_not_called()
+        call_kwargs = mock_s3_client.put_object.call_args.kwargs
+        assert call_kwargs["Body"] == data
+        assert call_kwargs["ContentType"] == "image/jpeg"
+        assert call_kwargs["ChecksumSHA256"] == sha256_b64(data)
+
+    @pytest.mark.asyncio
+    async def test_large_upload_streams_multipart(self, image_store, mock_s3_client):
+        data = bytes(range(256)) * 1 + b"tail"
+
+        await image_store.upload_image_stream("a.pdf", "application/pdf", stream(data, 7))
+
+        mock_s3_client.put_object.assert_not_called()
+        uploaded = sorted(
+            (c.kwargs["PartNumber"], c.kwargs["Body"], c.kwargs["ChecksumSHA256"])
+            for c in mock_s3_client.upload_part.call_args_list)
+        assert b"".join(body for _, body, _ in uploaded) == data
+        assert all(checksum == sha256_b64(body) for _, body, checksum in uploaded)
+        assert [n for n, _, _ in uploaded] == list(range(1, len(uploaded) + 1))
+        assert all(len(body) == 10 for _, body, _ in uploaded[:-1])
+
+        complete_kwargs = mock_s3_client.complete_multipart_upload.call_args.kwargs
+        parts = complete_kwargs["MultipartUpload"]["Parts"]
+        assert [p["PartNumber"] for p in parts] == [n for n, _, _ in uploaded]
+        assert parts[0]["ETag"] == "etag-1"
+        assert complete_kwargs["UploadId"] == "upload-1"
+        mock_s3_client.abort_multipart_upload.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_failed_part_aborts_upload(self, image_store, mock_s3_client):
+        mock_s3_client.upload_part.side_effect = ClientError(
+            {"Error": {"Code": "InternalError"}}, "UploadPart")
+
+        with pytest.raises(AppException) as exc:
+            await image_store.upload_image_stream("a.pdf", "application/pdf", stream(b"x" * 50, 10))
+
+        assert exc.value.err_code == AppErr.IMAGE_UPLOAD_FAILED
+        mock_s3_client.abort_multipart_upload.assert_called_once()
+        mock_s3_client.complete_multipart_upload.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_source_error_aborts_upload(self, image_store, mock_s3_client):
+        async def failing_chunks():
+            yield b"x" * 25
+            raise AppException(AppErr.IMAGE_TOO_LARGE)
+
+        with pytest.raises(AppException) as exc:
+            await image_store.upload_image_stream("a.pdf", "application/pdf", failing_chunks())
+
+        assert exc.value.err_code == AppErr.IMAGE_TOO_LARGE
+        mock_s3_client.abort_multipart_upload.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_duplicate_small_upload_is_not_stored(self, image_store, mock_s3_client):
+        seen = []
+
+        async def find_duplicate(content_hash):
+            seen.append(content_hash)
+            return "https://test-bucket.s3.amazonaws.com/existing.png"
+
+        result = await image_store.upload_image_stream(
+            "receipt.png", "image/png", stream(b"12345678", 3), find_duplicate)
+
+        assert result == "https://test-bucket.s3.amazonaws.com/existing.png"
+        assert seen == [hashlib.sha256(b"12345678").hexdigest()]
+        mock_s3_client.put_object.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_new_small_upload_is_stored(self, image_store, mock_s3_client):
+        async def find_duplicate(content_hash):
+            return None
+
+        await image_store.upload_image_stream(
+            "receipt.png", "image/png", stream(b"12345678", 3), find_duplicate)
+
+        mock_s3_client.put_object.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_duplicate_multipart_upload_is_aborted(self, image_store, mock_s3_client):
+        async def find_duplicate(content_hash):
+            return "https://test-bucket.s3.amazonaws.com/existing.pdf"
+
+        result = await image_store.upload_image_stream(
+            "receipt.pdf", "application/pdf", stream(b"x" * 25, 10), find_duplicate)
+
+        assert result == "https://test-bucket.s3.amazonaws.com/existing.pdf"
+        mock_s3_client.abort_multipart_upload.assert_called_once()
+        mock_s3_client.complete_multipart_upload.assert_not_called()
+
+
+class TestS3ImageStoreDirectUpload:
+    @pytest.fixture
+    def bucket_name(self):
+        return "test-bucket"
+
+    @pytest.fixture
+    def mock_s3_client(self):
+        client = MagicMock()
+        client.generate_presigned_post.side_effect = lambda **kwargs: {
+            "url": f"https://{kwargs['Bucket']}.s3.amazonaws.com/",
+            "fields": {"key": kwargs["Key"], **kwargs["Fields"]},
+        }
+        return client
+
+    @pytest.fixture
+    def image_store(self, bucket_name, mock_s3_client):
+        return S3ImageStore(bucket_name, mock_s3_client, upload_url_expiry=120)
+
+    @pytest.mark.asyncio
+    async def test_create_presigned_upload(self, image_store, mock_s3_client, bucket_name):
+        result = await image_store.create_presigned_upload(
+            "receipts/user-1/", "receipt.png", "image/png", 1024)
+
+        call_kwargs = mock_s3_client.generate_presigned_post.call_args.kwargs
+        assert call_kwargs["Key"].startswith("receipts/user-1/")
+        assert call_kwargs["Key"].endswith("_receipt.png")
+        assert call_kwargs["ExpiresIn"] == 120
+        assert {"Content-Type": "image/png"} in call_kwargs["Conditions"]
+        assert ["content-length-range", 1, 1024] in call_kwargs["Conditions"]
+        assert ["starts-with", "$key", "receipts/user-1/"] in call_kwargs["Conditions"]
+        assert result.image_url == f"https://{bucket_name}.s3.amazonaws.com/{call_kwargs['Key']}"
+        assert result.fields["Content-Type"] == "image/png"
+        assert result.expires_in == 120
+
+    @pytest.mark.asyncio
+    async def test_get_image_info(self, image_store, mock_s3_client, bucket_name):
+        mock_s3_client.head_object.return_value = {"ContentLength": 2048, "ContentType": "image/png"}
+        mock_s3_client.get_object.return_value = {"Body": BytesIO(b"\x89PNG\r\n\x1a\n1234")}
+
+        info = await image_store.get_image_info(f"https://{bucket_name}.s3.amazonaws.com/receipts/k.png")
+
+        assert info.size == 2048
+        assert info.content_type == "image/png"
+        assert info.leading_bytes.startswith(b"\x89PNG")
+        assert mock_s3_client.get_object.call_args.kwargs["Range"] == "bytes=0-11"
+
+    @pytest.mark.asyncio
+    async def test_get_image_info_not_found(self, image_store, mock_s3_client, bucket_name):
+        mock_s3_client.head_object.side_effect = ClientError(
+            {"Error": {"Code": "404"}}, "HeadObject")
+
+        with pytest.raises(AppException) as exc:
+            await image_store.get_image_info(f"https://{bucket_name}.s3.amazonaws.com/receipts/k.png")
+
+        assert exc.value.err_code == AppErr.IMAGE_NOT_FOUND
+
+    @pytest.mark.asyncio
+    async def test_download_image(self, image_store, mock_s3_client, bucket_name):
+        mock_s3_client.get_object.return_value = {"Body": BytesIO(b"image bytes")}
+
+        data = await image_store.download_image(f"https://{bucket_name}.s3.amazonaws.com/receipts/k.png")
+
+        assert data == b"image bytes"
+        assert mock_s3_client.get_object.call_args.kwargs["Key"] == "receipts/k.png"
+
+    @pytest.mark.asyncio
+    async def test_download_image_not_found(self, image_store, mock_s3_client, bucket_name):
+        mock_s3_client.get_object.side_effect = ClientError(
+            {"Error": {"Code": "NoSuchKey"}}, "GetObject")
+
+        with pytest.raises(AppException) as exc:
+            await image_store.download_image(f"https://{bucket_name}.s3.amazonaws.com/receipts/k.png")
+
+        assert exc.value.err_code == AppErr.IMAGE_NOT_FOUND
+
+    @pytest.mark.asyncio
+    async def test_upload_derivative_next_to_original(self, image_store, mock_s3_client, bucket_name):
+        image_url = f"https://{bucket_name}.s3.amazonaws.com/receipts/k.png"
+
+        result = await image_store.upload_derivative(image_url, "thumbnail", "image/webp", b"webp")
+
+        assert result == f"{image_url}.thumbnail"
+        call_kwargs = mock_s3_client.put_object.call_args.kwargs
+        assert call_kwargs["Key"] == "receipts/k.png.thumbnail"
+        assert call_kwargs["ContentType"] == "image/webp"
+        assert call_kwargs["ChecksumSHA256"] == base64.b64encode(hashlib.sha256(b"webp").digest()).decode()
+
+    @pytest.mark.asyncio
+    async def test_delete_images_in_batches_of_1000(self, image_store, mock_s3_client, bucket_name):
+        mock_s3_client.delete_objects.side_effect = lambda **kwargs: {
+            "Errors": [{"Key": "receipts/7.png", "Code": "AccessDenied"}]
+            if {"Key": "receipts/7.png"} in kwargs["Delete"]["Objects"] else []}
+        image_urls = [f"https://{bucket_name}.s3.amazonaws.com/receipts/{i}.png" for i in range(2500)]
+
+        failed = await image_store.delete_images(image_urls)
+
+        assert failed == [f"https://{bucket_name}.s3.amazonaws.com/receipts/7.png"]
+        calls = mock_s3_client.delete_objects.call_args_list
+        assert sorted(len(c.kwargs["Delete"]["Objects"]) for c in calls) == [500, 1000, 1000]
+        assert all(c.kwargs["Delete"]["Quiet"] for c in calls)
+
+    @pytest.mark.asyncio
+    async def test_delete_images_failed_call(self, image_store, mock_s3_client, bucket_name):
+        mock_s3_client.delete_objects.side_effect = ClientError(
+            {"Error": {"Code": "InternalError"}}, "DeleteObjects")
+        image_urls = [f"https://{bucket_name}.s3.amazonaws.com/receipts/a.png"]
+
+        assert await image_store.delete_images(image_urls) == image_urls
+
+    @pytest.mark.asyncio
+    async def test_list_images_follows_pages(self, image_store, mock_s3_client, bucket_name):
+        modified = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        mock_s3_client.list_objects_v2.side_effect = [
+            {"Contents": [{"Key": "receipts/u1/a.png", "LastModified": modified}],
+             "IsTruncated": True, "NextContinuationToken": "next"},
+            {"Contents": [{"Key": "receipts/u2/b.png", "LastModified": modified}],
+             "IsTruncated": False},
+        ]
+
+        listed = [item async for item in image_store.list_images("receipts/")]
+
+        assert listed == [
+            (f"https://{bucket_name}.s3.amazonaws.com/receipts/u1/a.png", int(modified.timestamp() * 1000)),
+            (f"https://{bucket_name}.s3.amazonaws.com/receipts/u2/b.png", int(modified.timestamp() * 1000)),
+        ]
+        second_call = mock_s3_client.list_objects_v2.call_args_list[1].kwargs
+        assert second_call == {"Bucket": bucket_name, "Prefix": "receipts/", "ContinuationToken": "next"}
@@ -0,0 +1,89 @@
+import asyncio
+import time
+import boto3
+import pytest
+from botocore.config import Config
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import timing
+from app.middleware import ServerTimingMiddleware, TimedJSONResponse
+
+
+class TestRequestTimings:
+    def test_measure_without_sampled_request_records_nothing(self):
+        with timing.measure("dynamodb"):
+            pass
+
+        assert timing.current() is None
+
+    @pytest.mark.asyncio
+    async def test_records_calls_from_threads_and_tasks(self):
+        token = timing.start()
+        try:
+            def blocking_call():
+                with timing.measure("s3"):
+                    time.sleep(0.01)
+
+            async def call():
+                await asyncio.to_thread(blocking_call)
+
+            await asyncio.gather(call(), call(), call())
+            timings = timing.current()
+        finally:
+            timing.stop(token)
+
+        assert timings.calls("s3") == 3
+        assert timings.duration("s3") >= 0.03
+        assert timings.header_value(0.0125).startswith('s3;dur=')
+        assert timings.header_value(0.0125).endswith('desc="3 calls", total;dur=12.5')
+
+    def test_instrumented_client_records_failed_calls(self):
+        client = boto3.client(
+            "s3", region_name="us-east-1",
+            aws_access_key_id="test", aws_secret_access_key="test",
+            endpoint_url="http://127.0.0.1:9",
+            config=Config(retries={"max_attempts": 1}, connect_timeout=1))
+        timing.instrument_client(client)
+
+        token = timing.start()
+        try:
+            with pytest.raises(Exception):
+                client.list_buckets()
+            timings = timing.current()
+        finally:
+            timing.stop(token)
+
+        assert timings.calls("s3") == 1
+        assert timing._aws_call_errors.value(
+            service="s3", operation="ListBuckets", code="EndpointConnectionError") >= 1
+        assert timing._aws_call_latency.count(service="s3", operation="ListBuckets") >= 1
+
+
+class TestServerTimingMiddleware:
+    def build_client(self, sample_rate: float) -> TestClient:
+        app = FastAPI(default_response_class=TimedJSONResponse)
+        app.add_middleware(ServerTimingMiddleware, sample_rate=sample_rate,
+                           sample=lambda: 0.5)
+
+        @app.get("/items")
+        async def items():
+            with timing.measure("dynamodb"):
+                pass
+            return {"items": [1, 2, 3]}
+
+        return TestClient(app)
+
+    def test_sampled_response_has_server_timing(self):
+        response = self.build_client(sample_rate=1.0).get("/items")
+
+        assert response.status_code == 200
+        entries = [entry.split(";")[0]
+                   for entry in response.headers["server-timing"].split(", ")]
+        assert entries == ["dynamodb", "serialize", "total"]
+        assert 'dynamodb;dur=' in response.headers["server-timing"]
+
+    def test_unsampled_response_has_no_server_timing(self):
+        response = self.build_client(sample_rate=0.1).get("/items")
+
+        assert response.status_code == 200
+        assert "server-timing" not in response.headers
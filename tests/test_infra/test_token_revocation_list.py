@@ -0,0 +1,118 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+import pytest
+from botocore.exceptions import EndpointConnectionError
+from app.infra.token_revocation_list import BloomFilter, TokenRevocationList
+from app.models.token import RevokedToken
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBloomFilter:
+    def test_added_keys_are_found(self):
+        bloom = BloomFilter(100)
+        keys = [f"key-{i}" for i in range(100)]
+        for key in keys:
+            bloom.add(key)
+
+        assert all(key in bloom for key in keys)
+
+    def test_false_positive_rate_is_bounded(self):
+        bloom = BloomFilter(1000, false_positive_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"present-{i}")
+
+        false_positives = sum(f"absent-{i}" in bloom for i in range(10_000))
+
+        assert false_positives < 300
+
+
+class TestTokenRevocationList:
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+
+    @pytest.fixture
+    def mock_repo(self):
+        repo = MagicMock()
+        repo.get_revoked_since = AsyncMock(return_value=[])
+        return repo
+
+    @pytest.fixture
+    def revocation_list(self, mock_repo, clock):
+        return TokenRevocationList(mock_repo, refresh_interval=5, capacity=4, clock=clock)
+
+    def revoked(self, token_id, clock, ttl=60):
+        return RevokedToken(token_id=token_id, expires_at=clock.now + ttl,
+                            revoked_at=int(clock.now * 1000))
+
+    def test_add_and_is_revoked(self, revocation_list, clock):
+        revocation_list.add(self.revoked("jti-1", clock))
+
+        assert revocation_list.is_revoked("jti-1")
+        assert not revocation_list.is_revoked("jti-2")
+
+    def test_expired_token_is_not_added(self, revocation_list, clock):
+        revocation_list.add(self.revoked("jti-1", clock, ttl=-1))
+
+        assert not revocation_list.is_revoked("jti-1")
+
+    def test_grows_past_filter_capacity(self, revocation_list, clock):
+        for i in range(20):
+            revocation_list.add(self.revoked(f"jti-{i}", clock))
+
+        assert all(revocation_list.is_revoked(f"jti-{i}") for i in range(20))
+
+    @pytest.mark.asyncio
+    async def test_refresh_loads_revocations(self, revocation_list, mock_repo, clock):
+        mock_repo.get_revoked_since.return_value = [self.revoked("jti-1", clock)]
+
+        await revocation_list.refresh()
+
+        assert revocation_list.is_revoked("jti-1")
+        mock_repo.get_revoked_since.assert_awaited_once_with(0)
+
+    @pytest.mark.asyncio
+    async def test_refresh_is_incremental_with_overlap(self, revocation_list, mock_repo, clock):
+        await revocation_list.refresh()
+        clock.now += 5
+
+        await revocation_list.refresh()
+
+        since = mock_repo.get_revoked_since.await_args.args[0]
+        first_refresh_ms = int((clock.now - 5) * 1000)
+        assert 0 < since < first_refresh_ms
+
+    @pytest.mark.asyncio
+    async def test_refresh_prunes_expired(self, revocation_list, clock):
+        revocation_list.add(self.revoked("jti-1", clock, ttl=10))
+        revocation_list.add(self.revoked("jti-2", clock, ttl=100))
+        clock.now += 11
+
+        await revocation_list.refresh()
+
+        assert not revocation_list.is_revoked("jti-1")
+        assert revocation_list.is_revoked("jti-2")
+
+    @pytest.mark.asyncio
+    async def test_refresh_loop_survives_unexpected_errors(self, mock_repo, clock):
+        revocation_list = TokenRevocationList(mock_repo, refresh_interval=0.01, clock=clock)
+        mock_repo.get_revoked_since.side_effect = [
+            EndpointConnectionError(endpoint_url="https://dynamodb"),
+            [self.revoked("jti-1", clock)],
+        ]
+
+        revocation_list.start()
+        for _ in range(100):
+            if revocation_list.is_revoked("jti-1"):
+                break
+            await asyncio.sleep(0.01)
+        await revocation_list.close()
+
+        assert revocation_list.is_revoked("jti-1")
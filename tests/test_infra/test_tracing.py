@@ -0,0 +1,149 @@
+import asyncio
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import tracing
+from app.middleware import TracingMiddleware
+
+
+class MemoryExporter:
+    def __init__(self):
+        self.spans: list[tracing.Span] = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+    def shutdown(self):
+        pass
+
+
+@pytest.fixture
+def exporter():
+    exporter = MemoryExporter()
+    processor = tracing.SpanProcessor(exporter)
+    tracing.configure(processor, sample_rate=1.0)
+    exporter.processor = processor
+    yield exporter
+    tracing.configure(None)
+
+
+@tracing.traced
+class Repository:
+    async def get(self, key: str) -> str:
+        return await asyncio.to_thread(self.decode, key)
+
+    def decode(self, key: str) -> str:
+        return key.upper()
+
+    async def fail(self) -> None:
+        raise ValueError("boom")
+
+
+class TestTracing:
+    @pytest.mark.asyncio
+    async def test_spans_nest_across_threads_and_gather(self, exporter):
+        repo = Repository()
+        with tracing.start_trace("GET /items") as root:
+            await asyncio.gather(repo.get("a"), repo.get("b"))
+        await exporter.processor.flush()
+
+        by_name: dict[str, list[tracing.Span]] = {}
+        for span in exporter.spans:
+            by_name.setdefault(span.name, []).append(span)
+        assert len(by_name["Repository.get"]) == 2
+        assert {span.parent_id for span in by_name["Repository.get"]} == {root.span_id}
+        get_ids = {span.span_id for span in by_name["Repository.get"]}
+        assert {span.parent_id for span in by_name["Repository.decode"]} == get_ids
+        assert {span.trace_id for span in exporter.spans} == {root.trace_id}
+
+    @pytest.mark.asyncio
+    async def test_failed_call_marks_span(self, exporter):
+        with tracing.start_trace("GET /items"):
+            with pytest.raises(ValueError):
+                await Repository().fail()
+        await exporter.processor.flush()
+
+        failed = next(span for span in exporter.spans if span.name == "Repository.fail")
+        assert failed.error == "ValueError"
+
+    @pytest.mark.asyncio
+    async def test_untraced_calls_record_nothing(self, exporter):
+        tracing.configure(exporter.processor, sample_rate=0.0)
+
+        with tracing.start_trace("GET /items") as root:
+            await Repository().get("a")
+        await exporter.processor.flush()
+
+        assert root is None
+        assert exporter.spans == []
+
+    def test_continues_sampled_traceparent(self, exporter):
+        tracing.configure(exporter.processor, sample_rate=0.0)
+        trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+
+        with tracing.start_trace("GET /items", f"00-{trace_id}-{parent_id}-01") as root:
+            pass
+        with tracing.start_trace("GET /items", f"00-{trace_id}-{parent_id}-00") as unsampled:
+            pass
+
+        assert (root.trace_id, root.parent_id) == (trace_id, parent_id)
+        assert unsampled is None
+
+    @pytest.mark.asyncio
+    async def test_processor_drops_spans_beyond_queue_size(self):
+        exporter = MemoryExporter()
+        processor = tracing.SpanProcessor(exporter, max_queue_size=2)
+        tracing.configure(processor, sample_rate=1.0)
+        try:
+            with tracing.start_trace("root"):
+                for _ in range(3):
+                    with tracing.span("child"):
+                        pass
+            await processor.flush()
+        finally:
+            tracing.configure(None)
+
+        assert [span.name for span in exporter.spans] == ["child", "child"]
+
+    def test_file_exporter_writes_otlp_json_lines(self, tmp_path):
+        path = tmp_path / "traces.jsonl"
+        span = tracing.Span("GET /items", "ab" * 16, "cd" * 8, None, start_ns=1, end_ns=2,
+                            attributes={"http.response.status_code": 200})
+        exporter = tracing.FileSpanExporter(str(path), "test-service")
+
+        exporter.export([span])
+        exporter.export([span])
+
+        lines = path.read_text().splitlines()
+        assert len(lines) == 2
+        resource_spans = json.loads(lines[0])["resourceSpans"][0]
+        assert resource_spans["resource"]["attributes"] == [
+            {"key": "service.name", "value": {"stringValue": "test-service"}}]
+        otlp_span = resource_spans["scopeSpans"][0]["spans"][0]
+        assert otlp_span["traceId"] == "ab" * 16
+        assert otlp_span["startTimeUnixNano"] == "1"
+        assert otlp_span["attributes"] == [
+            {"key": "http.response.status_code", "value": {"intValue": "200"}}]
+        assert "parentSpanId" not in otlp_span
+
+
+class TestTracingMiddleware:
+    @pytest.mark.asyncio
+    async def test_root_span_named_after_route(self, exporter):
+        app = FastAPI()
+        app.add_middleware(TracingMiddleware)
+
+        @app.get("/items/{item_id}")
+        async def get_item(item_id: str):
+            return await Repository().get(item_id)
+
+        response = TestClient(app).get("/items/42")
+        await exporter.processor.flush()
+
+        assert response.json() == "42"
+        root = next(span for span in exporter.spans if span.parent_id is None)
+        assert root.name == "GET /items/{item_id}"
+        assert root.attributes["http.response.status_code"] == 200
+        assert any(span.name == "Repository.get" and span.parent_id == root.span_id
+                   for span in exporter.spans)
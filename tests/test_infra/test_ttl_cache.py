@@ -0,0 +1,75 @@
+from app.infra.ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache:
+    def test_get_missing_returns_none(self):
+        cache = TTLCache("test")
+
+        assert cache.get("missing") is None
+
+    def test_set_and_get(self):
+        cache = TTLCache("test")
+
+        cache.set("key", "value")
+
+        assert cache.get("key") == "value"
+
+    def test_entry_expires_after_ttl(self):
+        clock = FakeClock()
+        cache = TTLCache("test", ttl=10, clock=clock)
+        cache.set("key", "value")
+
+        clock.now += 9
+        assert cache.get("key") == "value"
+        clock.now += 1
+        assert cache.get("key") is None
+        assert len(cache) == 0
+
+    def test_entry_expires_at_absolute_time(self):
+        clock = FakeClock()
+        cache = TTLCache("test", ttl=1000, clock=clock)
+        cache.set("key", "value", expires_at=clock.now + 5)
+
+        clock.now += 5
+
+        assert cache.get("key") is None
+
+    def test_already_expired_entry_is_not_stored(self):
+        clock = FakeClock()
+        cache = TTLCache("test", clock=clock)
+
+        cache.set("key", "value", expires_at=clock.now - 1)
+
+        assert len(cache) == 0
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache("test", max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+
+        cache.set("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_delete_and_clear(self):
+        cache = TTLCache("test")
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        cache.delete("a")
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+
+        cache.clear()
+        assert len(cache) == 0
@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import time
+import httpx
+import pytest
+from loadtest.run import (
+    ScenarioStats, dynamodb_calls, parse_mix, percentile, regressions, virtual_user)
+from loadtest.scenarios import Context
+
+
+def response(status: int = 200, server_timing: str | None = None) -> httpx.Response:
+    headers = {"Server-Timing": server_timing} if server_timing is not None else {}
+    return httpx.Response(status, headers=headers)
+
+
+class TestLoadTest:
+    def test_dynamodb_calls_from_server_timing(self):
+        assert dynamodb_calls(response(server_timing=(
+            's3;dur=4.0;desc="1 call", dynamodb;dur=2.5;desc="3 calls", total;dur=9.1'))) == 3
+        assert dynamodb_calls(response(server_timing="total;dur=1.0")) == 0
+        assert dynamodb_calls(response()) is None
+
+    def test_percentile_nearest_rank(self):
+        values = [float(value) for value in range(1, 101)]
+
+        assert percentile(values, 0.50) == 50
+        assert percentile(values, 0.99) == 99
+        assert percentile([7.0], 0.95) == 7
+        assert percentile([], 0.95) == 0
+
+    def test_summary_counts_failures_as_errors(self):
+        stats = ScenarioStats()
+        stats.record(0.010, response(server_timing='dynamodb;dur=1.0;desc="2 calls"'))
+        stats.record(0.030, response(500, server_timing='dynamodb;dur=1.0;desc="1 call"'))
+        stats.failures += 1
+
+        summary = stats.summary(elapsed=2.0)
+
+        assert (summary["requests"], summary["errors"]) == (3, 2)
+        assert summary["throughput"] == 1.5
+        assert summary["p99_ms"] == pytest.approx(30)
+        assert summary["dynamodb_calls_per_request"] == 1.5
+
+    def test_regressions(self):
+        summaries = {
+            "login": {"requests": 100, "errors": 0, "p95_ms": 130.0},
+            "list_expenses": {"requests": 100, "errors": 5, "p95_ms": 20.0},
+        }
+        baseline = {"login": {"p95_ms": 100.0}, "list_expenses": {"p95_ms": 20.0}}
+
+        found = regressions(summaries, baseline, tolerance=0.25, max_error_rate=0.01)
+
+        assert found == ["login: p95 130.0 ms, baseline 100.0 ms",
+                         "list_expenses: 5 of 100 requests failed"]
+
+    def test_parse_mix(self):
+        assert parse_mix("list_expenses=4,login") == {"list_expenses": 4, "login": 1}
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_mix("browse=1")
+
+    @pytest.mark.asyncio
+    async def test_approve_times_only_the_approval(self):
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.method == "POST":
+                await asyncio.sleep(0.2)  # the untimed create
+                return httpx.Response(201, json={"data": {"id": "expense-1"}})
+            return httpx.Response(200)
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler),
+                                     base_url="http://test") as client:
+            ctx = Context(client=client, employees=1, employee_tokens=["token"])
+            stats = {"approve_expense": ScenarioStats()}
+            await virtual_user(ctx, {"approve_expense": 1}, stats, time.perf_counter() + 0.1)
+
+        assert len(stats["approve_expense"].latencies) == 1
+        assert stats["approve_expense"].latencies[0] < 0.1
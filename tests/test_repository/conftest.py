@@ -1,5 +1,6 @@
 import pytest
 from unittest.mock import MagicMock
+from app.testing.in_memory_dynamodb import InMemoryDynamoDB
 
 
 @pytest.fixture
@@ -12,3 +13,16 @@ def mock_ddb_table():
 @pytest.fixture
 def table_name():
     return "test-watch-expense-table"
+
+
+@pytest.fixture
+def dynamodb(table_name):
+    """In-memory DynamoDB holding an empty single table"""
+    dynamodb = InMemoryDynamoDB()
+    dynamodb.create_table(table_name)
+    return dynamodb
+
+
+@pytest.fixture
+def ddb_table(dynamodb, table_name):
+    return dynamodb.resource().Table(table_name)
@@ -328,6 +328,35 @@ class TestExpenseRepositoryGetAll:
         assert len(expenses) == 0
 
 
+class TestExpenseRepositoryGetAttachmentUrls:
+    @pytest.mark.asyncio
+    async def test_get_attachment_urls(self, expense_repository, mock_ddb_table):
+        mock_ddb_table.query.side_effect = [
+            {"Items": [
+                {"Bills": [{"AttachmentURL": "https://example.com/bill1.pdf"},
+                           {"AttachmentURL": ""}]},
+                {},
+            ], "LastEvaluatedKey": {"PK": "EXPENSE", "SK": "DETAILS#1#x"}},
+            {"Items": [{"Bills": [{"AttachmentURL": "https://example.com/bill2.png"}]}]},
+        ]
+
+        result = await expense_repository.get_attachment_urls()
+
+        assert result == {"https://example.com/bill1.pdf", "https://example.com/bill2.png"}
+        assert mock_ddb_table.query.call_count == 2
+        assert mock_ddb_table.query.call_args.kwargs["ProjectionExpression"] == "Bills"
+
+    @pytest.mark.asyncio
+    @patch("app.repository.utils.handle_dynamo_error")
+    async def test_get_attachment_urls_dynamo_error(self, mock_handle_error, expense_repository, mock_ddb_table):
+        error = ClientError({"Error": {"Code": "InternalServerError"}}, "Query")
+        mock_ddb_table.query.side_effect = error
+        mock_handle_error.side_effect = AppException(AppErr.INTERNAL, cause=error)
+
+        with pytest.raises(AppException):
+            await expense_repository.get_attachment_urls()
+
+
 class TestExpenseRepositoryGetSum:
     @pytest.mark.asyncio
     @patch("app.repository.utils.query_items")
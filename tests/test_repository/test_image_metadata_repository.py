@@ -5,7 +5,7 @@ from botocore.exceptions import ClientError
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
 from app.models.image import ImageMetadata
-from app.repository.image_metadata_repository import ImageMetadataRepository
+from app.repository.image_metadata_repository import ImageMetadataRepository, image_shard
 
 
 @pytest.fixture
@@ -23,6 +23,14 @@ def image_url():
     return f"https://example.com/images/{uuid4().hex}.jpg"
 
 
+def image_pk(image_url: str) -> str:
+    return f"IMAGE#{image_shard(image_url):02d}"
+
+
+def content_pk(user_id: str) -> str:
+    return f"IMAGE_CONTENT#{image_shard(user_id):02d}"
+
+
 @pytest.fixture
 def image_metadata(user_id):
     return ImageMetadata(user_id=user_id)
@@ -37,7 +45,7 @@ class TestImageMetadataRepositorySave:
 
         mock_ddb_table.put_item.assert_called_once()
         call_args = mock_ddb_table.put_item.call_args
-        assert call_args.kwargs["Item"]["PK"] == "IMAGE"
+        assert call_args.kwargs["Item"]["PK"] == image_pk(image_url)
         assert call_args.kwargs["Item"]["SK"] == f"IMAGE#{image_url}"
         assert call_args.kwargs["Item"]["UserID"] == image_metadata.user_id
         assert "ConditionExpression" in call_args.kwargs
@@ -75,12 +83,193 @@ class TestImageMetadataRepositorySave:
         mock_handle_error.assert_called_once_with(error)
 
 
+class TestImageMetadataRepositoryContentReferences:
+    @pytest.mark.asyncio
+    async def test_save_with_content_hash_creates_content_item(self, image_repository, image_url, user_id, table_name, mock_ddb_table):
+        metadata = ImageMetadata(user_id=user_id, content_hash="abc123")
+
+        await image_repository.save(image_url, metadata)
+
+        mock_ddb_table.put_item.assert_not_called()
+        items = mock_ddb_table.meta.client.transact_write_items.call_args.kwargs["TransactItems"]
+        assert items[0]["Put"]["Item"]["SK"] == f"IMAGE#{image_url}"
+        assert items[0]["Put"]["Item"]["ContentHash"] == "abc123"
+        assert items[1]["Put"]["Item"] == {
+            "PK": content_pk(user_id),
+            "SK": f"{user_id}#abc123",
+            "ImageURL": image_url,
+            "RefCount": 1,
+        }
+
+    @pytest.mark.asyncio
+    async def test_save_content_already_exists(self, image_repository, image_url, user_id, mock_ddb_table):
+        mock_ddb_table.meta.client.transact_write_items.side_effect = ClientError(
+            {"Error": {"Code": "TransactionCanceledException"},
+             "CancellationReasons": [{"Code": "None"}, {"Code": "ConditionalCheckFailed"}]},
+            "TransactWriteItems")
+
+        with pytest.raises(AppException) as exc_info:
+            await image_repository.save(
+                image_url, ImageMetadata(user_id=user_id, content_hash="abc123"))
+
+        assert exc_info.value.err_code == AppErr.IMAGE_CONTENT_ALREADY_EXIST
+
+    @pytest.mark.asyncio
+    async def test_add_content_reference_known_content(self, image_repository, image_url, user_id, mock_ddb_table):
+        mock_ddb_table.update_item.return_value = {
+            "Attributes": {"ImageURL": image_url, "RefCount": 2}}
+
+        result = await image_repository.add_content_reference(user_id, "abc123")
+
+        assert result == image_url
+        call_args = mock_ddb_table.update_item.call_args
+        assert call_args.kwargs["Key"] == {"PK": content_pk(user_id), "SK": f"{user_id}#abc123"}
+        assert call_args.kwargs["UpdateExpression"] == "ADD RefCount :one"
+
+    @pytest.mark.asyncio
+    async def test_add_content_reference_unknown_content(self, image_repository, user_id, mock_ddb_table):
+        mock_ddb_table.update_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+
+        assert await image_repository.add_content_reference(user_id, "abc123") is None
+
+    @pytest.mark.asyncio
+    async def test_remove_reference_still_shared(self, image_repository, image_url, user_id, mock_ddb_table):
+        mock_ddb_table.update_item.return_value = {"Attributes": {"RefCount": 1}}
+
+        last = await image_repository.remove_reference(
+            image_url, ImageMetadata(user_id=user_id, content_hash="abc123"))
+
+        assert last is False
+        mock_ddb_table.meta.client.transact_write_items.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_remove_last_reference_deletes_items(self, image_repository, image_url, user_id, mock_ddb_table):
+        mock_ddb_table.update_item.return_value = {"Attributes": {"RefCount": 0}}
+
+        last = await image_repository.remove_reference(
+            image_url, ImageMetadata(user_id=user_id, content_hash="abc123"))
+
+        assert last is True
+        items = mock_ddb_table.meta.client.transact_write_items.call_args.kwargs["TransactItems"]
+        assert [item["Delete"]["Key"]["SK"] for item in items] == [
+            f"{user_id}#abc123", f"IMAGE#{image_url}"]
+
+    @pytest.mark.asyncio
+    async def test_remove_reference_unshared_image(self, image_repository, image_url, image_metadata, mock_ddb_table):
+        mock_ddb_table.delete_item.return_value = {}
+
+        last = await image_repository.remove_reference(image_url, image_metadata)
+
+        assert last is True
+        mock_ddb_table.update_item.assert_not_called()
+        mock_ddb_table.delete_item.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_remove_references_batches_last_references(self, image_repository, user_id, table_name, mock_ddb_table):
+        last_url, shared_url, plain_url = (f"https://example.com/images/{name}.jpg"
+                                           for name in ("last", "shared", "plain"))
+        mock_ddb_table.meta.client.batch_get_item.return_value = {"Responses": {table_name: [
+            {"PK": content_pk(user_id), "SK": f"{user_id}#aaa", "ImageURL": last_url, "RefCount": 1},
+            {"PK": content_pk(user_id), "SK": f"{user_id}#bbb", "ImageURL": shared_url, "RefCount": 2},
+        ]}}
+        mock_ddb_table.update_item.return_value = {"Attributes": {"RefCount": 1}}
+
+        removed = await image_repository.remove_references({
+            last_url: ImageMetadata(user_id=user_id, content_hash="aaa"),
+            shared_url: ImageMetadata(user_id=user_id, content_hash="bbb"),
+            plain_url: ImageMetadata(user_id=user_id),
+        })
+
+        assert removed == [last_url, plain_url]
+        mock_ddb_table.meta.client.batch_get_item.assert_called_once()
+        mock_ddb_table.meta.client.transact_write_items.assert_called_once()
+        items = mock_ddb_table.meta.client.transact_write_items.call_args.kwargs["TransactItems"]
+        assert [item["Delete"]["Key"]["SK"] for item in items] == [
+            f"IMAGE#{last_url}", f"{user_id}#aaa", f"IMAGE#{plain_url}"]
+        assert items[1]["Delete"]["ConditionExpression"] == "RefCount = :one"
+        # the shared image only loses one reference
+        mock_ddb_table.update_item.assert_called_once()
+        assert mock_ddb_table.update_item.call_args.kwargs["Key"]["SK"] == f"{user_id}#bbb"
+
+    @pytest.mark.asyncio
+    async def test_remove_references_falls_back_when_referenced_meanwhile(self, image_repository, image_url, user_id, table_name, mock_ddb_table):
+        mock_ddb_table.meta.client.batch_get_item.return_value = {"Responses": {table_name: [
+            {"PK": content_pk(user_id), "SK": f"{user_id}#aaa", "ImageURL": image_url, "RefCount": 1},
+        ]}}
+        mock_ddb_table.meta.client.transact_write_items.side_effect = [
+            ClientError({"Error": {"Code": "TransactionCanceledException"},
+                         "CancellationReasons": [{"Code": "None"}, {"Code": "ConditionalCheckFailed"}]},
+                        "TransactWriteItems"),
+        ]
+        mock_ddb_table.update_item.return_value = {"Attributes": {"RefCount": 1}}
+
+        removed = await image_repository.remove_references(
+            {image_url: ImageMetadata(user_id=user_id, content_hash="aaa")})
+
+        assert removed == []
+        mock_ddb_table.update_item.assert_called_once()
+
+
+class TestImageMetadataRepositorySaveMany:
+    @pytest.mark.asyncio
+    async def test_save_many_in_one_transaction(self, image_repository, user_id, mock_ddb_table):
+        images = {
+            "https://bucket/a.png": ImageMetadata(user_id=user_id, content_hash="aaa"),
+            "https://bucket/b.pdf": ImageMetadata(user_id=user_id),
+        }
+
+        await image_repository.save_many(images)
+
+        mock_ddb_table.put_item.assert_not_called()
+        items = mock_ddb_table.meta.client.transact_write_items.call_args.kwargs["TransactItems"]
+        assert [item["Put"]["Item"]["SK"] for item in items] == [
+            "IMAGE#https://bucket/a.png", f"{user_id}#aaa", "IMAGE#https://bucket/b.pdf"]
+        assert all(item["Put"]["ConditionExpression"] for item in items)
+
+    @pytest.mark.asyncio
+    async def test_save_many_content_conflict(self, image_repository, user_id, mock_ddb_table):
+        mock_ddb_table.meta.client.transact_write_items.side_effect = ClientError(
+            {"Error": {"Code": "TransactionCanceledException"},
+             # a, b, b's content, c, c's content
+             "CancellationReasons": [{"Code": "None"}, {"Code": "None"}, {"Code": "None"},
+                                     {"Code": "None"}, {"Code": "ConditionalCheckFailed"}]},
+            "TransactWriteItems")
+
+        with pytest.raises(AppException) as exc_info:
+            await image_repository.save_many({
+                "https://bucket/a.png": ImageMetadata(user_id=user_id),
+                "https://bucket/b.png": ImageMetadata(user_id=user_id, content_hash="bbb"),
+                "https://bucket/c.png": ImageMetadata(user_id=user_id, content_hash="ccc"),
+            })
+
+        assert exc_info.value.err_code == AppErr.IMAGE_CONTENT_ALREADY_EXIST
+
+    @pytest.mark.asyncio
+    async def test_save_many_too_many_items(self, image_repository, user_id, mock_ddb_table):
+        images = {f"https://bucket/{i}.png": ImageMetadata(user_id=user_id, content_hash=str(i))
+                  for i in range(51)}
+
+        with pytest.raises(AppException) as exc_info:
+            await image_repository.save_many(images)
+
+        assert exc_info.value.err_code == AppErr.VALIDATION
+        mock_ddb_table.meta.client.transact_write_items.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_save_many_nothing(self, image_repository, mock_ddb_table):
+        await image_repository.save_many({})
+
+        mock_ddb_table.put_item.assert_not_called()
+        mock_ddb_table.meta.client.transact_write_items.assert_not_called()
+
+
 class TestImageMetadataRepositoryGet:
     @pytest.mark.asyncio
     async def test_get_success(self, image_repository, image_url, user_id, mock_ddb_table):
         mock_ddb_table.get_item.return_value = {
             "Item": {
-                "PK": "IMAGE",
+                "PK": image_pk(image_url),
                 "SK": f"IMAGE#{image_url}",
                 "UserID": user_id
             }
@@ -92,7 +281,7 @@ class TestImageMetadataRepositoryGet:
         assert result.user_id == user_id
         mock_ddb_table.get_item.assert_called_once()
         call_args = mock_ddb_table.get_item.call_args
-        assert call_args.kwargs["Key"]["PK"] == "IMAGE"
+        assert call_args.kwargs["Key"]["PK"] == image_pk(image_url)
         assert call_args.kwargs["Key"]["SK"] == f"IMAGE#{image_url}"
 
     @pytest.mark.asyncio
@@ -118,6 +307,95 @@ class TestImageMetadataRepositoryGet:
         mock_handle_error.assert_called_once_with(error)
 
 
+class TestImageMetadataRepositoryGetMany:
+    @pytest.mark.asyncio
+    async def test_get_many_success(self, image_repository, image_url, user_id, table_name, mock_ddb_table):
+        other_url = f"https://example.com/images/{uuid4().hex}.jpg"
+        mock_ddb_table.meta.client.batch_get_item.return_value = {
+            "Responses": {table_name: [
+                {"PK": image_pk(image_url), "SK": f"IMAGE#{image_url}", "UserID": user_id},
+            ]},
+            "UnprocessedKeys": {},
+        }
+
+        result = await image_repository.get_many([image_url, other_url, image_url])
+
+        assert list(result) == [image_url]
+        assert result[image_url].user_id == user_id
+        mock_ddb_table.meta.client.batch_get_item.assert_called_once()
+        keys = mock_ddb_table.meta.client.batch_get_item.call_args.kwargs[
+            "RequestItems"][table_name]["Keys"]
+        assert keys == [
+            {"PK": image_pk(image_url), "SK": f"IMAGE#{image_url}"},
+            {"PK": image_pk(other_url), "SK": f"IMAGE#{other_url}"},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_get_many_retries_unprocessed_keys(self, image_repository, image_url, user_id, table_name, mock_ddb_table):
+        key = {"PK": image_pk(image_url), "SK": f"IMAGE#{image_url}"}
+        mock_ddb_table.meta.client.batch_get_item.side_effect = [
+            {"Responses": {table_name: []},
+             "UnprocessedKeys": {table_name: {"Keys": [key]}}},
+            {"Responses": {table_name: [{**key, "UserID": user_id}]}},
+        ]
+
+        result = await image_repository.get_many([image_url])
+
+        assert result[image_url].user_id == user_id
+        assert mock_ddb_table.meta.client.batch_get_item.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_get_many_chunks_keys(self, image_repository, table_name, mock_ddb_table):
+        mock_ddb_table.meta.client.batch_get_item.return_value = {
+            "Responses": {table_name: []}}
+        image_urls = [f"https://example.com/images/{i}.jpg" for i in range(150)]
+
+        result = await image_repository.get_many(image_urls)
+
+        assert result == {}
+        calls = mock_ddb_table.meta.client.batch_get_item.call_args_list
+        assert [len(c.kwargs["RequestItems"][table_name]["Keys"]) for c in calls] == [100, 50]
+
+    @pytest.mark.asyncio
+    @patch("app.repository.utils.handle_dynamo_error")
+    async def test_get_many_dynamo_error(self, mock_handle_error, image_repository, image_url, mock_ddb_table):
+        error = ClientError(
+            {"Error": {"Code": "InternalServerError"}}, "BatchGetItem")
+        mock_ddb_table.meta.client.batch_get_item.side_effect = error
+        mock_handle_error.side_effect = AppException(
+            AppErr.INTERNAL, cause=error)
+
+        with pytest.raises(AppException):
+            await image_repository.get_many([image_url])
+
+        mock_handle_error.assert_called_once_with(error)
+
+
+class TestImageMetadataRepositorySetDerivatives:
+    @pytest.mark.asyncio
+    async def test_set_derivatives_success(self, image_repository, image_url, mock_ddb_table):
+        derivatives = {"thumbnail": f"{image_url}.thumbnail"}
+
+        await image_repository.set_derivatives(image_url, derivatives)
+
+        call_args = mock_ddb_table.update_item.call_args
+        assert call_args.kwargs["Key"] == {"PK": image_pk(image_url), "SK": f"IMAGE#{image_url}"}
+        assert call_args.kwargs["ExpressionAttributeValues"] == {":derivatives": derivatives}
+        assert "ConditionExpression" in call_args.kwargs
+
+    @pytest.mark.asyncio
+    @patch("app.repository.utils.is_conditional_check_failure")
+    async def test_set_derivatives_image_deleted(self, mock_is_conditional_check, image_repository, image_url, mock_ddb_table):
+        mock_ddb_table.update_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+        mock_is_conditional_check.return_value = True
+
+        with pytest.raises(AppException) as exc_info:
+            await image_repository.set_derivatives(image_url, {})
+
+        assert exc_info.value.err_code == AppErr.IMAGE_NOT_FOUND
+
+
 class TestImageMetadataRepositoryDelete:
     @pytest.mark.asyncio
     async def test_delete_success(self, image_repository, image_url, mock_ddb_table):
@@ -127,7 +405,7 @@ class TestImageMetadataRepositoryDelete:
 
         mock_ddb_table.delete_item.assert_called_once()
         call_args = mock_ddb_table.delete_item.call_args
-        assert call_args.kwargs["Key"]["PK"] == "IMAGE"
+        assert call_args.kwargs["Key"]["PK"] == image_pk(image_url)
         assert call_args.kwargs["Key"]["SK"] == f"IMAGE#{image_url}"
 
     @pytest.mark.asyncio
@@ -143,3 +421,181 @@ class TestImageMetadataRepositoryDelete:
             await image_repository.delete(image_url)
 
         mock_handle_error.assert_called_once_with(error)
+
+    @pytest.mark.asyncio
+    async def test_delete_removes_content_item(self, image_repository, image_url, user_id, mock_ddb_table):
+        mock_ddb_table.delete_item.return_value = {"Attributes": {
+            "PK": image_pk(image_url), "SK": f"IMAGE#{image_url}",
+            "UserID": user_id, "ContentHash": "abc123"}}
+
+        await image_repository.delete(image_url)
+
+        keys = [c.kwargs["Key"] for c in mock_ddb_table.delete_item.call_args_list]
+        assert keys == [
+            {"PK": image_pk(image_url), "SK": f"IMAGE#{image_url}"},
+            {"PK": content_pk(user_id), "SK": f"{user_id}#abc123"},
+        ]
+
+
+class TestImageMetadataRepositorySharding:
+    @pytest.fixture
+    def legacy_repository(self, mock_ddb_table, table_name):
+        return ImageMetadataRepository(mock_ddb_table, table_name, legacy_reads=True)
+
+    def test_images_spread_over_shards(self):
+        shards = {image_shard(f"https://example.com/images/{i}.jpg") for i in range(500)}
+
+        assert shards == set(range(16))
+
+    @pytest.mark.asyncio
+    async def test_get_without_legacy_reads(self, image_repository, image_url, mock_ddb_table):
+        mock_ddb_table.get_item.return_value = {}
+
+        assert await image_repository.get(image_url) is None
+        mock_ddb_table.get_item.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_get_falls_back_to_legacy_partition(self, legacy_repository, image_url, user_id, mock_ddb_table):
+        mock_ddb_table.get_item.side_effect = [
+            {},
+            {"Item": {"PK": "IMAGE", "SK": f"IMAGE#{image_url}", "UserID": user_id}},
+        ]
+
+        result = await legacy_repository.get(image_url)
+
+        assert result.user_id == user_id
+        keys = [c.kwargs["Key"]["PK"] for c in mock_ddb_table.get_item.call_args_list]
+        assert keys == [image_pk(image_url), "IMAGE"]
+
+    @pytest.mark.asyncio
+    async def test_get_many_falls_back_for_missing_only(self, legacy_repository, image_url, user_id, table_name, mock_ddb_table):
+        other_url = f"https://example.com/images/{uuid4().hex}.jpg"
+        mock_ddb_table.meta.client.batch_get_item.side_effect = [
+            {"Responses": {table_name: [
+                {"PK": image_pk(image_url), "SK": f"IMAGE#{image_url}", "UserID": user_id}]}},
+            {"Responses": {table_name: [
+                {"PK": "IMAGE", "SK": f"IMAGE#{other_url}", "UserID": user_id}]}},
+        ]
+
+        result = await legacy_repository.get_many([image_url, other_url])
+
+        assert set(result) == {image_url, other_url}
+        legacy_keys = mock_ddb_table.meta.client.batch_get_item.call_args_list[1].kwargs[
+            "RequestItems"][table_name]["Keys"]
+        assert legacy_keys == [{"PK": "IMAGE", "SK": f"IMAGE#{other_url}"}]
+
+    @pytest.mark.asyncio
+    async def test_remove_reference_decrements_legacy_content_item(self, legacy_repository, image_url, user_id, mock_ddb_table):
+        mock_ddb_table.update_item.side_effect = [
+            ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem"),
+            {"Attributes": {"RefCount": 1}},
+        ]
+
+        last = await legacy_repository.remove_reference(
+            image_url, ImageMetadata(user_id=user_id, content_hash="abc123"))
+
+        assert last is False
+        assert mock_ddb_table.update_item.call_args.kwargs["Key"] == {
+            "PK": "IMAGE_CONTENT", "SK": f"{user_id}#abc123"}
+
+    @pytest.mark.asyncio
+    async def test_migrate_legacy_items(self, image_repository, image_url, user_id, mock_ddb_table):
+        legacy_image = {"PK": "IMAGE", "SK": f"IMAGE#{image_url}", "UserID": user_id}
+        legacy_content = {"PK": "IMAGE_CONTENT", "SK": f"{user_id}#abc123",
+                          "ImageURL": image_url, "RefCount": 2}
+        mock_ddb_table.query.side_effect = [
+            {"Items": [legacy_image]},
+            {"Items": [legacy_content]},
+        ]
+        mock_ddb_table.meta.client.transact_write_items.side_effect = [
+            {},
+            ClientError({"Error": {"Code": "TransactionCanceledException"},
+                         "CancellationReasons": [{"Code": "ConditionalCheckFailed"}]},
+                        "TransactWriteItems"),
+        ]
+
+        migrated, skipped = await image_repository.migrate_legacy_items()
+
+        assert (migrated, skipped) == (1, 1)
+        moved = mock_ddb_table.meta.client.transact_write_items.call_args_list[0].kwargs["TransactItems"]
+        assert moved[0]["Put"]["Item"] == {**legacy_image, "PK": image_pk(image_url)}
+        assert moved[1]["Delete"]["Key"] == {"PK": "IMAGE", "SK": f"IMAGE#{image_url}"}
+        content_put = mock_ddb_table.meta.client.transact_write_items.call_args_list[1].kwargs["TransactItems"][0]
+        assert content_put["Put"]["Item"]["PK"] == content_pk(user_id)
+
+
+    @pytest.mark.asyncio
+    async def test_migrate_retries_items_changed_while_moving(self, image_repository, image_url, user_id, mock_ddb_table):
+        legacy_content = {"PK": "IMAGE_CONTENT", "SK": f"{user_id}#abc123",
+                          "ImageURL": image_url, "RefCount": 2}
+        mock_ddb_table.query.side_effect = [{"Items": []}, {"Items": [legacy_content]}]
+        # a reference was added between the query and the move
+        mock_ddb_table.get_item.return_value = {"Item": {**legacy_content, "RefCount": 3}}
+        mock_ddb_table.meta.client.transact_write_items.side_effect = [
+            ClientError({"Error": {"Code": "TransactionCanceledException"},
+                         "CancellationReasons": [{"Code": "None"}, {"Code": "ConditionalCheckFailed"}]},
+                        "TransactWriteItems"),
+            {},
+        ]
+
+        migrated, skipped = await image_repository.migrate_legacy_items()
+
+        assert (migrated, skipped) == (1, 0)
+        first, second = [c.kwargs["TransactItems"]
+                         for c in mock_ddb_table.meta.client.transact_write_items.call_args_list]
+        assert first[1]["Delete"]["ExpressionAttributeValues"] == {":ref_count": 2}
+        assert second[0]["Put"]["Item"]["RefCount"] == 3
+        assert second[1]["Delete"]["ExpressionAttributeValues"] == {":ref_count": 3}
+
+class TestImageMetadataRepositoryBulk:
+    @pytest.mark.asyncio
+    async def test_iter_all_streams_every_shard(self, image_repository, user_id, mock_ddb_table):
+        def query(**kwargs):
+            # PK = :pk AND begins_with(SK, :prefix)
+            pk_condition = kwargs["KeyConditionExpression"].get_expression()["values"][0]
+            shard = pk_condition.get_expression()["values"][1]
+            if shard == "IMAGE#03" and "ExclusiveStartKey" not in kwargs:
+                return {"Items": [{"PK": shard, "SK": "IMAGE#a", "UserID": user_id}],
+                        "LastEvaluatedKey": {"PK": shard, "SK": "IMAGE#a"}}
+            if shard == "IMAGE#03":
+                return {"Items": [{"PK": shard, "SK": "IMAGE#b", "UserID": user_id}]}
+            return {"Items": []}
+        mock_ddb_table.query.side_effect = query
+
+        result = [(url, metadata.user_id) async for url, metadata in image_repository.iter_all()]
+
+        assert result == [("a", user_id), ("b", user_id)]
+        assert mock_ddb_table.query.call_count == 17
+
+    @pytest.mark.asyncio
+    async def test_delete_many_batches_writes(self, image_repository, user_id, table_name, mock_ddb_table):
+        mock_ddb_table.meta.client.batch_write_item.return_value = {}
+        images = {
+            f"https://example.com/images/{i}.jpg": ImageMetadata(
+                user_id=user_id, content_hash=f"hash{i}" if i % 2 else None)
+            for i in range(30)
+        }
+
+        await image_repository.delete_many(images)
+
+        calls = mock_ddb_table.meta.client.batch_write_item.call_args_list
+        requests = [r for c in calls for r in c.kwargs["RequestItems"][table_name]]
+        assert [len(c.kwargs["RequestItems"][table_name]) for c in calls] == [25, 20]
+        deleted_sks = {r["DeleteRequest"]["Key"]["SK"] for r in requests}
+        assert f"IMAGE#https://example.com/images/0.jpg" in deleted_sks
+        assert f"{user_id}#hash1" in deleted_sks
+
+    @pytest.mark.asyncio
+    async def test_delete_many_retries_unprocessed_items(self, image_repository, image_url, image_metadata, table_name, mock_ddb_table):
+        request = {"DeleteRequest": {"Key": {"PK": image_pk(image_url), "SK": f"IMAGE#{image_url}"}}}
+        mock_ddb_table.meta.client.batch_write_item.side_effect = [
+            {"UnprocessedItems": {table_name: [request]}},
+            {"UnprocessedItems": {}},
+        ]
+
+        await image_repository.delete_many({image_url: image_metadata})
+
+        assert mock_ddb_table.meta.client.batch_write_item.call_count == 2
+        assert mock_ddb_table.meta.client.batch_write_item.call_args.kwargs["RequestItems"] == {
+            table_name: [request]}
+
@@ -0,0 +1,148 @@
+from decimal import Decimal
+from uuid import uuid4
+import pytest
+from app import consumed_capacity
+from app.errors.app_exception import AppException
+from app.errors.codes import AppErr
+from app.models.expense import Expense, ExpensesFilterOptions, RequestStatus
+from app.models.image import ImageMetadata
+from app.models.user import User, UserRole
+from app.repository.expense_repository import ExpenseRepository
+from app.repository.image_metadata_repository import ImageMetadataRepository
+from app.repository.user_repository import UserRepository
+
+
+def new_expense(user_id: str, created_at: int, status=RequestStatus.Pending,
+                description: str = "Travel to client site") -> Expense:
+    return Expense.model_validate({
+        "id": uuid4().hex,
+        "user_id": user_id,
+        "purpose": "Business travel",
+        "description": description,
+        "amount": Decimal("5000.00"),
+        "status": status,
+        "is_reconciled": False,
+        "bills": [{"id": uuid4().hex, "amount": Decimal("5000.00"),
+                   "attachment_url": f"https://example.com/{created_at}.pdf"}],
+        "created_at": created_at,
+        "updated_at": created_at,
+    })
+
+
+class TestExpenseRepositoryOnDynamoDB:
+    @pytest.mark.asyncio
+    async def test_get_all_pages_newest_first(self, ddb_table, table_name):
+        repository = ExpenseRepository(ddb_table, table_name)
+        for index in range(25):
+            await repository.save(new_expense("user-1", 1704067200000 + index))
+
+        expenses, total = await repository.get_all(
+            ExpensesFilterOptions(user_id="user-1", page=2, limit=10))
+
+        assert total == 25
+        assert [expense.created_at - 1704067200000 for expense in expenses] == \
+            list(range(14, 4, -1))
+
+    @pytest.mark.asyncio
+    async def test_get_all_filters_by_status(self, ddb_table, table_name):
+        repository = ExpenseRepository(ddb_table, table_name)
+        for index in range(12):
+            status = RequestStatus.Approved if index % 3 == 0 else RequestStatus.Pending
+            await repository.save(new_expense("user-1", 1704067200000 + index, status))
+
+        expenses, total = await repository.get_all(
+            ExpensesFilterOptions(user_id="user-1", status=RequestStatus.Approved, limit=10))
+
+        assert total == 4
+        assert [expense.created_at - 1704067200000 for expense in expenses] == [9, 6, 3, 0]
+
+    @pytest.mark.asyncio
+    async def test_attachment_urls_span_query_pages(self, dynamodb, ddb_table, table_name):
+        repository = ExpenseRepository(ddb_table, table_name)
+        # ~100 KB each, the listing takes several 1 MB pages
+        for index in range(25):
+            await repository.save(new_expense("user-1", 1704067200000 + index,
+                                              description="x" * 100_000))
+        dynamodb.reset_stats()
+
+        urls = await repository.get_attachment_urls()
+
+        assert len(urls) == 25
+        assert dynamodb.calls["Query"] == 3
+
+    @pytest.mark.asyncio
+    async def test_save_twice_fails_in_transaction(self, ddb_table, table_name):
+        repository = ExpenseRepository(ddb_table, table_name)
+        expense = new_expense("user-1", 1704067200000)
+        await repository.save(expense)
+
+        with pytest.raises(AppException) as err:
+            await repository.save(expense)
+
+        assert err.value.err_code == AppErr.EXPENSE_ALREADY_EXISTS
+
+    @pytest.mark.asyncio
+    async def test_reads_are_billed_to_the_request(self, dynamodb, ddb_table, table_name):
+        consumed_capacity.instrument_client(ddb_table.meta.client)
+        repository = ExpenseRepository(ddb_table, table_name)
+        expense = new_expense("user-1", 1704067200000)
+        await repository.save(expense)
+
+        token = consumed_capacity.start()
+        try:
+            await repository.get(expense.id)
+            capacity = consumed_capacity.current()
+        finally:
+            consumed_capacity.stop(token)
+
+        assert capacity.read_units == 0.5
+        assert capacity.write_units == 0
+
+
+class TestUserRepositoryOnDynamoDB:
+    @pytest.mark.asyncio
+    async def test_email_is_unique(self, ddb_table, table_name):
+        repository = UserRepository(ddb_table, table_name)
+        user = User(EmployeeID="EMP001", Name="Jane", PasswordHash="hash",
+                    Email="jane@example.com", Role=UserRole.Employee)
+        await repository.save(user)
+
+        with pytest.raises(AppException) as err:
+            await repository.save(User(EmployeeID="EMP002", Name="Jane Again", PasswordHash="hash",
+                                       Email="jane@example.com", Role=UserRole.Employee))
+
+        assert err.value.err_code == AppErr.USER_ALREADY_EXISTS
+        assert (await repository.get_by_email("jane@example.com")).id == user.id
+
+
+class TestImageMetadataRepositoryOnDynamoDB:
+    @pytest.mark.asyncio
+    async def test_shared_image_goes_with_its_last_reference(self, dynamodb, ddb_table, table_name):
+        repository = ImageMetadataRepository(ddb_table, table_name)
+        image_url = f"https://example.com/images/{uuid4().hex}.jpg"
+        metadata = ImageMetadata(user_id="user-1", content_hash="ab" * 32)
+        await repository.save(image_url, metadata)
+
+        assert await repository.add_content_reference("user-1", "ab" * 32) == image_url
+        assert await repository.remove_reference(image_url, metadata) is False
+        assert await repository.remove_reference(image_url, metadata) is True
+        assert await repository.get(image_url) is None
+        assert dynamodb.items(table_name) == []
+
+    @pytest.mark.asyncio
+    async def test_remove_references_in_bulk(self, dynamodb, ddb_table, table_name):
+        repository = ImageMetadataRepository(ddb_table, table_name)
+        images = {
+            f"https://example.com/images/{index}.jpg":
+                ImageMetadata(user_id="user-1", content_hash=f"{index:064x}")
+            for index in range(5)
+        }
+        await repository.save_many(images)
+        shared = "https://example.com/images/0.jpg"
+        await repository.add_content_reference("user-1", images[shared].content_hash)
+
+        removed = await repository.remove_references(images)
+
+        assert sorted(removed) == sorted(set(images) - {shared})
+        assert await repository.get(shared) is not None
+        assert len(dynamodb.items(table_name)) == 2
@@ -0,0 +1,59 @@
+import pytest
+from unittest.mock import patch
+from botocore.exceptions import ClientError
+from app.errors.app_exception import AppException
+from app.errors.codes import AppErr
+from app.models.token import RevokedToken
+from app.repository.revoked_token_repository import RevokedTokenRepository
+
+
+@pytest.fixture
+def revoked_token_repository(mock_ddb_table, table_name):
+    return RevokedTokenRepository(mock_ddb_table, table_name)
+
+
+@pytest.fixture
+def revoked_token():
+    return RevokedToken(token_id="jti-1", expires_at=2_000_000_000,
+                        revoked_at=1_700_000_000_000)
+
+
+class TestRevokedTokenRepositorySave:
+    @pytest.mark.asyncio
+    async def test_save_success(self, revoked_token_repository, revoked_token, mock_ddb_table):
+        await revoked_token_repository.save(revoked_token)
+
+        item = mock_ddb_table.put_item.call_args.kwargs["Item"]
+        assert item["PK"] == "REVOKED_TOKEN"
+        assert item["SK"] == "001700000000000#jti-1"
+        assert item["TokenID"] == "jti-1"
+        assert item["ExpiresAt"] == 2_000_000_000
+
+    @pytest.mark.asyncio
+    async def test_save_dynamo_error(self, revoked_token_repository, revoked_token, mock_ddb_table):
+        mock_ddb_table.put_item.side_effect = ClientError(
+            {"Error": {"Code": "InternalServerError"}}, "PutItem")
+
+        with pytest.raises(AppException) as exc_info:
+            await revoked_token_repository.save(revoked_token)
+
+        assert exc_info.value.err_code == AppErr.INTERNAL
+
+
+class TestRevokedTokenRepositoryGetRevokedSince:
+    @pytest.mark.asyncio
+    @patch("app.repository.utils.query_items")
+    async def test_get_revoked_since(self, mock_query_items, revoked_token_repository, mock_ddb_table):
+        mock_query_items.return_value = [{
+            "PK": "REVOKED_TOKEN",
+            "SK": "001700000000000#jti-1",
+            "TokenID": "jti-1",
+            "ExpiresAt": 2_000_000_000,
+            "RevokedAt": 1_700_000_000_000,
+        }]
+
+        result = await revoked_token_repository.get_revoked_since(1_700_000_000_000)
+
+        assert [t.token_id for t in result] == ["jti-1"]
+        query_input = mock_query_items.call_args.args[1]
+        assert "FilterExpression" in query_input
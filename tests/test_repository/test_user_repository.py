@@ -301,6 +301,53 @@ class TestUserRepositoryUpdate:
         assert exc_info.value.err_code == AppErr.NOT_FOUND
 
 
+class TestUserRepositoryUpdatePasswordHash:
+    @pytest.mark.asyncio
+    async def test_update_password_hash_success(
+        self,
+        user_repository,
+        mock_ddb_table,
+        sample_user,
+    ):
+        await user_repository.update_password_hash(sample_user, "new_hash")
+
+        mock_ddb_table.meta.client.transact_write_items.assert_called_once()
+        call_args = mock_ddb_table.meta.client.transact_write_items.call_args[1]
+        items = call_args["TransactItems"]
+        assert [item["Update"]["Key"] for item in items] == [
+            {"PK": "USER#user-123", "SK": "PROFILE"},
+            {"PK": "USER#testuser@example.com", "SK": "PROFILE"},
+            {"PK": "USER", "SK": "PROFILE#1704067200000#user-123"},
+        ]
+        for item in items:
+            update = item["Update"]
+            assert update["ExpressionAttributeValues"] == {
+                ":new_hash": "new_hash",
+                ":old_hash": "hashed_password_123",
+            }
+            assert update["ConditionExpression"] == "#password = :old_hash"
+
+    @pytest.mark.asyncio
+    @patch("app.repository.utils.is_conditional_check_failure")
+    async def test_update_password_hash_changed_concurrently(
+        self,
+        mock_is_conditional_check_failure,
+        user_repository,
+        mock_ddb_table,
+        sample_user,
+    ):
+        error_response = {"Error": {"Code": "TransactionCanceledException"}}
+        mock_ddb_table.meta.client.transact_write_items.side_effect = ClientError(
+            error_response, "TransactWriteItems"
+        )
+        mock_is_conditional_check_failure.return_value = True
+
+        with pytest.raises(AppException) as exc_info:
+            await user_repository.update_password_hash(sample_user, "new_hash")
+
+        assert exc_info.value.err_code == AppErr.CONFLICT
+
+
 class TestUserRepositoryDelete:
     @pytest.mark.asyncio
     async def test_delete_success(
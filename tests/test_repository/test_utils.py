@@ -0,0 +1,120 @@
+import json
+import logging
+import pytest
+from boto3.dynamodb.conditions import Attr, Key
+from app import timing
+from app.repository import utils
+from app.repository.department_repository import DepartmentRepository
+from app.models.user import User, UserRole
+from app.repository.user_repository import UserRepository
+
+
+@pytest.fixture
+def log_every_query():
+    utils.set_slow_query_threshold(0)
+    yield
+    utils.set_slow_query_threshold(0.2)
+
+
+class TestQueryItems:
+    @pytest.mark.asyncio
+    async def test_follows_pages_up_to_limit(self, mock_ddb_table):
+        mock_ddb_table.query.side_effect = [
+            {"Items": [{"n": 1}, {"n": 2}], "LastEvaluatedKey": {"PK": "a"}},
+            {"Items": [{"n": 3}], "LastEvaluatedKey": {"PK": "b"}},
+        ]
+
+        items = await utils.query_items(mock_ddb_table, {"KeyConditionExpression": "PK = :pk"}, limit=3)
+
+        assert items == [{"n": 1}, {"n": 2}, {"n": 3}]
+        assert mock_ddb_table.query.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_stops_at_last_page(self, mock_ddb_table):
+        mock_ddb_table.query.side_effect = [
+            {"Items": [{"n": 1}], "LastEvaluatedKey": {"PK": "a"}},
+            {"Items": [{"n": 2}]},
+        ]
+
+        items = await utils.query_items(mock_ddb_table, {"KeyConditionExpression": "PK = :pk"})
+
+        assert items == [{"n": 1}, {"n": 2}]
+
+
+class TestSlowQueryLog:
+    @pytest.mark.asyncio
+    async def test_logs_shape_and_read_amplification(self, mock_ddb_table, table_name, log_every_query, caplog):
+        mock_ddb_table.query.side_effect = [
+            {"Items": [], "Count": 0, "ScannedCount": 40, "LastEvaluatedKey": {"PK": "a"},
+             "ConsumedCapacity": {"CapacityUnits": 2.5}},
+            {"Items": [{"PK": "DEPARTMENT", "SK": "DEPARTMENT#1", "Name": "Eng",
+                        "Budget": 10, "CreatedAt": 1, "UpdatedAt": 1}],
+             "Count": 1, "ScannedCount": 10, "ConsumedCapacity": {"CapacityUnits": 1.0}},
+        ]
+        caplog.set_level(logging.WARNING, logger=utils.__name__)
+
+        await DepartmentRepository(mock_ddb_table, table_name).get_all()
+
+        record = json.loads(caplog.records[-1].getMessage().split(": ", 1)[1])
+        assert record["operation"] == "query_items"
+        assert record["key_condition"] == "PK = :v0"
+        assert (record["pages"], record["scanned"], record["returned"]) == (2, 50, 1)
+        assert record["consumed_capacity"] == 3.5
+        assert record["repository"] == "DepartmentRepository.get_all"
+
+    @pytest.mark.asyncio
+    async def test_fast_queries_are_not_logged(self, mock_ddb_table, caplog):
+        mock_ddb_table.query.return_value = {"Items": []}
+        caplog.set_level(logging.WARNING, logger=utils.__name__)
+
+        await utils.query_items(mock_ddb_table, {"KeyConditionExpression": "PK = :pk"})
+
+        assert caplog.records == []
+
+    @pytest.mark.asyncio
+    async def test_logs_every_slow_call(self, ddb_table, table_name, log_every_query, caplog):
+        timing.instrument_client(ddb_table.meta.client, on_call=utils.log_slow_call)
+        repository = UserRepository(ddb_table, table_name)
+        user = User(EmployeeID="EMP001", Name="Jane", PasswordHash="hash",
+                    Email="jane@example.com", Role=UserRole.Employee)
+        caplog.set_level(logging.WARNING, logger=utils.__name__)
+
+        await repository.save(user)
+        await repository.get(user.id)
+
+        records = [json.loads(record.getMessage().split(": ", 1)[1])
+                   for record in caplog.records
+                   if record.getMessage().startswith("slow dynamodb call")]
+        transaction, get = records
+        assert transaction["operation"] == "TransactWriteItems"
+        assert transaction["tables"] == [table_name]
+        assert transaction["items"] == 3
+        assert transaction["repository"] == "UserRepository.save"
+        assert get["operation"] == "GetItem"
+        assert get["key_condition"] is None
+        assert get["repository"] == "UserRepository._get_user_by_pk"
+
+    @pytest.mark.asyncio
+    async def test_slow_query_call_reports_read_amplification(
+            self, ddb_table, table_name, log_every_query, caplog):
+        timing.instrument_client(ddb_table.meta.client, on_call=utils.log_slow_call)
+        caplog.set_level(logging.WARNING, logger=utils.__name__)
+
+        await utils.query_items(ddb_table, {
+            "KeyConditionExpression": Key("PK").eq("DEPARTMENT"),
+            "FilterExpression": Attr("Name").eq("Eng"),
+        })
+
+        call = json.loads(caplog.records[0].getMessage().split(": ", 1)[1])
+        assert call["operation"] == "Query"
+        assert call["key_condition"] == "PK = :v1"
+        assert call["filter"] == "Name = :v0"
+        assert (call["scanned"], call["returned"]) == (0, 0)
+
+    def test_expression_shape_hides_values(self):
+        shape = utils._expression_shape(
+            Key("PK").eq("EXPENSE#user-1") & Key("SK").begins_with("2025"), is_key_condition=True)
+        filter_shape = utils._expression_shape(Attr("Status").eq("PENDING"))
+
+        assert shape == "(PK = :v0 AND begins_with(SK, :v1))"
+        assert filter_shape == "Status = :v0"
@@ -4,6 +4,8 @@ from fastapi.testclient import TestClient
 from app.main import app
 from app.models.user import User, UserRole, UserClaims
 from app.dependencies.services import get_auth_service
+from app.dependencies.rate_limit import get_login_rate_limiter
+from app.infra.rate_limiter import LoginRateLimiter
 from app.dependencies.token_provider import get_token_provider
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
@@ -14,14 +16,22 @@ def mock_auth_service():
     service = MagicMock()
     service.login = AsyncMock()
     service.get_current_user = AsyncMock()
+    service.logout = AsyncMock()
     return service
 
 
 @pytest.fixture
-def override_auth_service(mock_auth_service):
+def login_rate_limiter():
+    return LoginRateLimiter(per_email_limit=3, per_ip_limit=5, window=60)
+
+
+@pytest.fixture
+def override_auth_service(mock_auth_service, login_rate_limiter):
     app.dependency_overrides[get_auth_service] = lambda: mock_auth_service
+    app.dependency_overrides[get_login_rate_limiter] = lambda: login_rate_limiter
     yield
     app.dependency_overrides.pop(get_auth_service, None)
+    app.dependency_overrides.pop(get_login_rate_limiter, None)
 
 
 @pytest.fixture
@@ -131,6 +141,66 @@ class TestLogin:
 
         assert response.status_code == 401
 
+    def test_login_hasher_busy(
+        self,
+        client: TestClient,
+        mock_auth_service: MagicMock,
+        override_auth_service,
+    ):
+        mock_auth_service.login.side_effect = AppException(AppErr.UNAVAILABLE)
+
+        request_data = {
+            "email": "test@example.com",
+            "password": "secure_password",
+        }
+
+        response = client.post("/api/auth/login", json=request_data)
+
+        assert response.status_code == 503
+
+    def test_login_throttled_per_email(
+        self,
+        client: TestClient,
+        mock_auth_service: MagicMock,
+        override_auth_service,
+    ):
+        mock_auth_service.login.side_effect = AppException(
+            AppErr.INVALID_USER_CREDENTIALS
+        )
+        request_data = {
+            "email": "victim@example.com",
+            "password": "guess",
+        }
+
+        statuses = [
+            client.post("/api/auth/login", json=request_data).status_code
+            for _ in range(4)
+        ]
+
+        assert statuses == [401, 401, 401, 429]
+        assert mock_auth_service.login.call_count == 3
+
+    def test_login_throttled_per_client_ip(
+        self,
+        client: TestClient,
+        mock_auth_service: MagicMock,
+        override_auth_service,
+    ):
+        mock_auth_service.login.return_value = "mock_token"
+
+        def login(idx: int, ip: str):
+            return client.post(
+                "/api/auth/login",
+                json={"email": f"user{idx}@example.com", "password": "pw"},
+                headers={"api-x-forwarded-for": ip},
+            )
+
+        statuses = [login(idx, "203.0.113.7").status_code for idx in range(6)]
+        other_ip = login(6, "198.51.100.1")
+
+        assert statuses == [200] * 5 + [429]
+        assert other_ip.status_code == 200
+
     def test_login_validation_error_missing_email(
         self,
         client: TestClient,
@@ -218,8 +288,10 @@ class TestAuthMe:
         assert data["email"] == sample_user_for_auth.email
         assert data["role"] == "EMPLOYEE"
         assert data.get("password", "") == ""
-        mock_auth_service.get_current_user.assert_called_once_with("mock_valid_token")
-        mock_token_provider_for_auth.validate_token.assert_called()
+        mock_auth_service.get_current_user.assert_called_once_with(
+            mock_token_provider_for_auth.validate_token.return_value)
+        mock_token_provider_for_auth.validate_token.assert_called_once_with(
+            "mock_valid_token")
 
     def test_auth_me_success_as_admin(
         self,
@@ -249,6 +321,70 @@ class TestAuthMe:
         assert data["name"] == sample_admin_user_for_auth.name
         assert data["role"] == "ADMIN"
 
+    def test_auth_me_returns_etag(
+        self,
+        client: TestClient,
+        mock_auth_service: MagicMock,
+        override_auth_service,
+        override_token_provider,
+        sample_user_for_auth,
+    ):
+        sample_user_for_auth.updated_at = 1700000000000
+        mock_auth_service.get_current_user.return_value = sample_user_for_auth
+
+        response = client.get(
+            "/api/auth/me",
+            headers={"Authorization": "Bearer mock_valid_token"}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["ETag"] == '"user-123-1700000000000"'
+
+    def test_auth_me_not_modified(
+        self,
+        client: TestClient,
+        mock_auth_service: MagicMock,
+        override_auth_service,
+        override_token_provider,
+        sample_user_for_auth,
+    ):
+        sample_user_for_auth.updated_at = 1700000000000
+        mock_auth_service.get_current_user.return_value = sample_user_for_auth
+
+        response = client.get(
+            "/api/auth/me",
+            headers={
+                "Authorization": "Bearer mock_valid_token",
+                "If-None-Match": 'W/"other", "user-123-1700000000000"',
+            }
+        )
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == '"user-123-1700000000000"'
+
+    def test_auth_me_modified_since_etag(
+        self,
+        client: TestClient,
+        mock_auth_service: MagicMock,
+        override_auth_service,
+        override_token_provider,
+        sample_user_for_auth,
+    ):
+        sample_user_for_auth.updated_at = 1700000000001
+        mock_auth_service.get_current_user.return_value = sample_user_for_auth
+
+        response = client.get(
+            "/api/auth/me",
+            headers={
+                "Authorization": "Bearer mock_valid_token",
+                "If-None-Match": '"user-123-1700000000000"',
+            }
+        )
+
+        assert response.status_code == 200
+        assert response.json()["id"] == "user-123"
+
     def test_auth_me_missing_authorization_header(
         self,
         client: TestClient,
@@ -350,3 +486,53 @@ class TestAuthMe:
         )
 
         assert response.status_code == 400
+
+
+class TestLogout:
+    def test_logout_success(
+        self,
+        client: TestClient,
+        mock_auth_service: MagicMock,
+        override_auth_service,
+        override_token_provider,
+    ):
+        response = client.post(
+            "/api/auth/logout",
+            headers={"Authorization": "Bearer mock_valid_token"}
+        )
+
+        assert response.status_code == 200
+        assert response.json()["message"] == "Logged Out Successfully"
+        mock_auth_service.logout.assert_awaited_once_with("mock_valid_token")
+
+    def test_logout_revoked_token(
+        self,
+        client: TestClient,
+        mock_auth_service: MagicMock,
+        mock_token_provider_for_auth: MagicMock,
+        override_auth_service,
+        override_token_provider,
+    ):
+        mock_token_provider_for_auth.validate_token.side_effect = AppException(
+            AppErr.TOKEN_REVOKED
+        )
+
+        response = client.post(
+            "/api/auth/logout",
+            headers={"Authorization": "Bearer revoked_token"}
+        )
+
+        assert response.status_code == 401
+        mock_auth_service.logout.assert_not_called()
+
+    def test_logout_missing_authorization_header(
+        self,
+        client: TestClient,
+        mock_auth_service: MagicMock,
+        override_auth_service,
+        override_token_provider,
+    ):
+        response = client.post("/api/auth/logout")
+
+        assert response.status_code == 401
+        mock_auth_service.logout.assert_not_called()
@@ -6,14 +6,20 @@ from app.main import app
 from app.dependencies.services import get_image_service
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
+from app.models.image import ImageDeleteResult, ImageDownloadURL, ImageSize, PresignedUpload
 
 
 @pytest.fixture
 def mock_image_service():
     service = MagicMock()
     service.upload_image = AsyncMock()
+    service.upload_images = AsyncMock()
     service.delete_image = AsyncMock()
     service.get_image_download_url = AsyncMock()
+    service.get_image_download_urls = AsyncMock()
+    service.delete_images = AsyncMock()
+    service.create_upload_url = AsyncMock()
+    service.complete_upload = AsyncMock()
     return service
 
 
@@ -77,6 +83,48 @@ class TestUploadImage:
         assert response.status_code == 401
         mock_image_service.upload_image.assert_not_called()
 
+    def test_upload_image_streams_file(
+        self,
+        client: TestClient,
+        mock_image_service: MagicMock,
+        override_auth_employee,
+        override_image_service,
+    ):
+        file_content = b"\xff\xd8\xff" + b"x" * 200_000
+        received = {}
+
+        async def upload_image(curr_user, image_name, content_type, chunks, size_hint=None):
+            received["name"] = image_name
+            received["content_type"] = content_type
+            received["data"] = b"".join([chunk async for chunk in chunks])
+            received["size_hint"] = size_hint
+            return "https://bucket.s3.amazonaws.com/image.jpg"
+
+        mock_image_service.upload_image.side_effect = upload_image
+        files = {"file": ("receipt.jpg", BytesIO(file_content), "image/jpeg")}
+
+        response = client.post("/api/images/", data={"note": "lunch"}, files=files)
+
+        assert response.status_code == 201
+        assert received["name"] == "receipt.jpg"
+        assert received["content_type"] == "image/jpeg"
+        assert received["data"] == file_content
+        assert received["size_hint"] >= len(file_content)
+
+    def test_upload_image_wrong_field_name(
+        self,
+        client: TestClient,
+        mock_image_service: MagicMock,
+        override_auth_employee,
+        override_image_service,
+    ):
+        files = {"document": ("test_image.jpg", BytesIO(b"data"), "image/jpeg")}
+
+        response = client.post("/api/images/", files=files)
+
+        assert response.status_code == 422
+        mock_image_service.upload_image.assert_not_called()
+
     def test_upload_image_no_file(
         self,
         client: TestClient,
@@ -108,6 +156,149 @@ class TestUploadImage:
         assert response.status_code == 500
 
 
+class TestUploadImages:
+    def test_upload_images_streams_every_file(
+        self,
+        client: TestClient,
+        mock_image_service: MagicMock,
+        override_auth_employee,
+        override_image_service,
+    ):
+        received = []
+
+        async def upload_images(curr_user, files):
+            async for name, content_type, chunks in files:
+                received.append((name, content_type, b"".join([chunk async for chunk in chunks])))
+            return [f"https://bucket/{name}" for name, _, _ in received]
+
+        mock_image_service.upload_images.side_effect = upload_images
+        files = [
+            ("files", ("a.jpg", BytesIO(b"\xff\xd8\xff" + b"a" * 100_000), "image/jpeg")),
+            ("files", ("b.pdf", BytesIO(b"%PDF-1.7"), "application/pdf")),
+        ]
+
+        response = client.post("/api/images/batch", data={"note": "lunch"}, files=files)
+
+        assert response.status_code == 201
+        assert response.json()["data"]["image_urls"] == [
+            "https://bucket/a.jpg", "https://bucket/b.pdf"]
+        assert received == [
+            ("a.jpg", "image/jpeg", b"\xff\xd8\xff" + b"a" * 100_000),
+            ("b.pdf", "application/pdf", b"%PDF-1.7"),
+        ]
+
+    def test_upload_images_no_files(
+        self,
+        client: TestClient,
+        mock_image_service: MagicMock,
+        override_auth_employee,
+        override_image_service,
+    ):
+        async def upload_images(curr_user, files):
+            return [file async for file in files]
+
+        mock_image_service.upload_images.side_effect = upload_images
+        files = {"file": ("a.jpg", BytesIO(b"data"), "image/jpeg")}
+
+        response = client.post("/api/images/batch", files=files)
+
+        assert response.status_code == 422
+
+    def test_upload_images_as_admin_forbidden(
+        self,
+        client: TestClient,
+        mock_image_service: MagicMock,
+        override_auth_admin,
+        override_image_service,
+    ):
+        files = [("files", ("a.jpg", BytesIO(b"data"), "image/jpeg"))]
+
+        response = client.post("/api/images/batch", files=files)
+
+        assert response.status_code == 403
+        mock_image_service.upload_images.assert_not_called()
+
+
+class TestDirectUpload:
+    def test_create_upload_url_success(
+        self,
+        client: TestClient,
+        mock_image_service: MagicMock,
+        override_auth_employee,
+        override_image_service,
+    ):
+        mock_image_service.create_upload_url.return_value = PresignedUpload(
+            url="https://bucket.s3.amazonaws.com/",
+            fields={"key": "receipts/u/k.png", "policy": "p"},
+            image_url="https://bucket.s3.amazonaws.com/receipts/u/k.png",
+            expires_in=300,
+        )
+
+        response = client.post("/api/images/upload-url", json={
+            "file_name": "k.png", "content_type": "image/png", "size": 100})
+
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["url"] == "https://bucket.s3.amazonaws.com/"
+        assert data["fields"]["key"] == "receipts/u/k.png"
+        assert data["image_url"].endswith("receipts/u/k.png")
+        args = mock_image_service.create_upload_url.call_args.args
+        assert args[1:] == ("k.png", "image/png", 100)
+
+    def test_create_upload_url_invalid_size(
+        self,
+        client: TestClient,
+        mock_image_service: MagicMock,
+        override_auth_employee,
+        override_image_service,
+    ):
+        response = client.post("/api/images/upload-url", json={
+            "file_name": "k.png", "content_type": "image/png", "size": 0})
+
+        assert response.status_code == 422
+        mock_image_service.create_upload_url.assert_not_called()
+
+    def test_create_upload_url_as_admin_forbidden(
+        self,
+        client: TestClient,
+        mock_image_service: MagicMock,
+        override_auth_admin,
+        override_image_service,
+    ):
+        response = client.post("/api/images/upload-url", json={
+            "file_name": "k.png", "content_type": "image/png", "size": 100})
+
+        assert response.status_code == 403
+
+    def test_complete_upload_success(
+        self,
+        client: TestClient,
+        mock_image_service: MagicMock,
+        override_auth_employee,
+        override_image_service,
+    ):
+        image_url = "https://bucket.s3.amazonaws.com/receipts/u/k.png"
+        mock_image_service.complete_upload.return_value = image_url
+
+        response = client.post("/api/images/complete", json={"image_url": image_url})
+
+        assert response.status_code == 201
+        assert response.json()["data"]["image_url"] == image_url
+
+    def test_complete_upload_not_found(
+        self,
+        client: TestClient,
+        mock_image_service: MagicMock,
+        override_auth_employee,
+        override_image_service,
+    ):
+        mock_image_service.complete_upload.side_effect = AppException(AppErr.IMAGE_NOT_FOUND)
+
+        response = client.post("/api/images/complete", json={"image_url": "https://x/receipts/u/k.png"})
+
+        assert response.status_code == 404
+
+
 class TestDeleteImage:
     def test_delete_image_success_as_employee(
         self,
@@ -214,6 +405,61 @@ class TestDeleteImage:
         mock_image_service.delete_image.assert_not_called()
 
 
+class TestDeleteImages:
+    def test_delete_images_success(
+        self,
+        client: TestClient,
+        mock_image_service: MagicMock,
+        override_auth_employee,
+        override_image_service,
+    ):
+        image_urls = [
+            "https://s3.amazonaws.com/bucket/image1.jpg",
+            "https://s3.amazonaws.com/bucket/image2.jpg",
+        ]
+        mock_image_service.delete_images.return_value = [
+            ImageDeleteResult(image_url=image_urls[0]),
+            ImageDeleteResult(image_url=image_urls[1], error=AppErr.IMAGE_NOT_FOUND.name),
+        ]
+
+        response = client.request(
+            "DELETE", "/api/images/batch", json={"image_urls": image_urls})
+
+        assert response.status_code == 200
+        assert response.json()["data"]["results"] == [
+            {"image_url": image_urls[0], "error": None},
+            {"image_url": image_urls[1], "error": "IMAGE_NOT_FOUND"},
+        ]
+        assert mock_image_service.delete_images.call_args.args[1] == image_urls
+
+    def test_delete_images_as_admin_forbidden(
+        self,
+        client: TestClient,
+        mock_image_service: MagicMock,
+        override_auth_admin,
+        override_image_service,
+    ):
+        response = client.request(
+            "DELETE", "/api/images/batch",
+            json={"image_urls": ["https://s3.amazonaws.com/bucket/image1.jpg"]})
+
+        assert response.status_code == 403
+        mock_image_service.delete_images.assert_not_called()
+
+    def test_delete_images_too_many(
+        self,
+        client: TestClient,
+        mock_image_service: MagicMock,
+        override_auth_employee,
+        override_image_service,
+    ):
+        response = client.request(
+            "DELETE", "/api/images/batch",
+            json={"image_urls": [f"https://s3.amazonaws.com/bucket/{i}.jpg" for i in range(101)]})
+
+        assert response.status_code == 422
+        mock_image_service.delete_images.assert_not_called()
+
 class TestGetImageDownloadUrl:
     def test_get_download_url_success_as_owner(
         self,
@@ -327,3 +573,106 @@ class TestGetImageDownloadUrl:
 
         assert response.status_code == 401
         mock_image_service.get_image_download_url.assert_not_called()
+
+
+class TestGetImageDownloadUrlBySize:
+    def test_get_download_url_with_size(
+        self,
+        client: TestClient,
+        mock_image_service: MagicMock,
+        override_auth_employee,
+        override_image_service,
+    ):
+        mock_image_service.get_image_download_url.return_value = "https://s3.amazonaws.com/bucket/a.jpg.thumbnail?sig"
+
+        response = client.get(
+            "/api/images/download-url",
+            params={"url": "https://s3.amazonaws.com/bucket/a.jpg", "size": "thumbnail"}
+        )
+
+        assert response.status_code == 200
+        assert mock_image_service.get_image_download_url.call_args.kwargs["size"] == ImageSize.Thumbnail
+
+    def test_get_download_url_invalid_size(
+        self,
+        client: TestClient,
+        override_auth_employee,
+        override_image_service,
+    ):
+        response = client.get(
+            "/api/images/download-url",
+            params={"url": "https://s3.amazonaws.com/bucket/a.jpg", "size": "huge"}
+        )
+
+        assert response.status_code == 422
+
+
+class TestGetImageDownloadUrls:
+    def test_get_download_urls_success(
+        self,
+        client: TestClient,
+        mock_image_service: MagicMock,
+        override_auth_employee,
+        override_image_service,
+    ):
+        image_urls = [
+            "https://s3.amazonaws.com/bucket/image1.jpg",
+            "https://s3.amazonaws.com/bucket/image2.jpg",
+        ]
+        mock_image_service.get_image_download_urls.return_value = [
+            ImageDownloadURL(image_url=image_urls[0],
+                             download_url=image_urls[0] + "?signature=xyz"),
+            ImageDownloadURL(image_url=image_urls[1],
+                             error=AppErr.IMAGE_NOT_FOUND.name),
+        ]
+
+        response = client.post(
+            "/api/images/download-urls",
+            json={"image_urls": image_urls}
+        )
+
+        assert response.status_code == 200
+        urls = response.json()["data"]["urls"]
+        assert urls[0] == {"image_url": image_urls[0],
+                           "download_url": image_urls[0] + "?signature=xyz",
+                           "error": None}
+        assert urls[1]["download_url"] is None
+        assert urls[1]["error"] == "IMAGE_NOT_FOUND"
+        mock_image_service.get_image_download_urls.assert_called_once()
+        assert mock_image_service.get_image_download_urls.call_args.args[1] == image_urls
+
+    def test_get_download_urls_empty_list(
+        self,
+        client: TestClient,
+        override_auth_employee,
+        override_image_service,
+    ):
+        response = client.post("/api/images/download-urls", json={"image_urls": []})
+
+        assert response.status_code == 422
+
+    def test_get_download_urls_too_many(
+        self,
+        client: TestClient,
+        override_auth_employee,
+        override_image_service,
+    ):
+        response = client.post(
+            "/api/images/download-urls",
+            json={"image_urls": [f"https://s3.amazonaws.com/bucket/{i}.jpg" for i in range(101)]}
+        )
+
+        assert response.status_code == 422
+
+    def test_get_download_urls_unauthenticated(
+        self,
+        client: TestClient,
+        override_auth_unauthenticated,
+        override_image_service,
+    ):
+        response = client.post(
+            "/api/images/download-urls",
+            json={"image_urls": ["https://s3.amazonaws.com/bucket/image1.jpg"]}
+        )
+
+        assert response.status_code == 401
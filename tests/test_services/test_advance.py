@@ -23,8 +23,20 @@ class TestAdvanceService:
         return repo
 
     @pytest.fixture
-    def advance_service(self, mock_advance_repo):
-        return AdvanceService(mock_advance_repo)
+    def mock_user_repo(self):
+        repo = MagicMock()
+        repo.get = AsyncMock(return_value=None)
+        return repo
+
+    @pytest.fixture
+    def mock_notification_service(self):
+        service = MagicMock()
+        service.send_notification = AsyncMock()
+        return service
+
+    @pytest.fixture
+    def advance_service(self, mock_advance_repo, mock_user_repo, mock_notification_service):
+        return AdvanceService(mock_advance_repo, mock_user_repo, mock_notification_service)
 
     @pytest.fixture
     def employee_user(self):
@@ -165,11 +177,11 @@ class TestAdvanceService:
         assert filter_options.user_id is None
 
     @pytest.mark.asyncio
-    async def test_update_advance_status_approved(self, advance_service, sample_advance, mock_advance_repo):
+    async def test_update_advance_status_approved(self, advance_service, sample_advance, mock_advance_repo, admin_user):
         mock_advance_repo.get.return_value = sample_advance
-        admin_id = uuid4().hex
+        admin_id = admin_user.user_id
 
-        await advance_service.update_advance_status(admin_id, sample_advance.id, RequestStatus.Approved)
+        await advance_service.update_advance_status(admin_user, sample_advance.id, RequestStatus.Approved)
 
         assert sample_advance.status == RequestStatus.Approved
         assert sample_advance.approved_by == admin_id
@@ -177,11 +189,11 @@ class TestAdvanceService:
         mock_advance_repo.update.assert_called_once()
 
     @pytest.mark.asyncio
-    async def test_update_advance_status_reviewed(self, advance_service, sample_advance, mock_advance_repo):
+    async def test_update_advance_status_reviewed(self, advance_service, sample_advance, mock_advance_repo, admin_user):
         mock_advance_repo.get.return_value = sample_advance
-        reviewer_id = uuid4().hex
+        reviewer_id = admin_user.user_id
 
-        await advance_service.update_advance_status(reviewer_id, sample_advance.id, RequestStatus.Reviewed)
+        await advance_service.update_advance_status(admin_user, sample_advance.id, RequestStatus.Reviewed)
 
         assert sample_advance.status == RequestStatus.Reviewed
         assert sample_advance.reviewed_by == reviewer_id
@@ -1,8 +1,11 @@
+import asyncio
 from unittest.mock import AsyncMock, MagicMock
 from uuid import uuid4
 import pytest
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
+from app.infra.ttl_cache import TTLCache
+from app.models.token import RevokedToken
 from app.models.user import User, UserClaims, UserRole
 from app.services.auth import AuthService
 
@@ -13,6 +16,7 @@ class TestAuthService:
         repo = MagicMock()
         repo.get_by_email = AsyncMock()
         repo.get = AsyncMock()
+        repo.update_password_hash = AsyncMock()
         return repo
 
     @pytest.fixture
@@ -30,13 +34,26 @@ class TestAuthService:
     @pytest.fixture
     def mock_password_hasher(self):
         hasher = MagicMock()
-        hasher.hash_password.return_value = "hashed_password"
-        hasher.verify_password.return_value = True
+        hasher.hash_password = AsyncMock(return_value="hashed_password")
+        hasher.verify_password = AsyncMock(return_value=True)
+        hasher.needs_rehash.return_value = False
         return hasher
 
     @pytest.fixture
-    def auth_service(self, mock_user_repo, mock_token_provider, mock_password_hasher):
-        return AuthService(mock_user_repo, mock_token_provider, mock_password_hasher)
+    def mock_revoked_token_repo(self):
+        repo = MagicMock()
+        repo.save = AsyncMock()
+        return repo
+
+    @pytest.fixture
+    def profile_cache(self):
+        return TTLCache("test_user_profiles", ttl=60)
+
+    @pytest.fixture
+    def auth_service(self, mock_user_repo, mock_token_provider, mock_password_hasher, mock_revoked_token_repo, profile_cache):
+        return AuthService(mock_user_repo, mock_token_provider,
+                           mock_password_hasher, mock_revoked_token_repo,
+                           profile_cache)
 
     @pytest.fixture
     def sample_user(self):
@@ -63,6 +80,40 @@ class TestAuthService:
         mock_password_hasher.verify_password.assert_called_once_with(sample_user.password, "plain_password")
         mock_token_provider.generate_token.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_login_rehashes_outdated_hash_in_background(self, auth_service, sample_user, mock_user_repo, mock_password_hasher):
+        mock_user_repo.get_by_email.return_value = sample_user
+        mock_password_hasher.needs_rehash.return_value = True
+        mock_password_hasher.hash_password.return_value = "rehashed_password"
+
+        token = await auth_service.login("test@example.com", "plain_password")
+        await asyncio.gather(*auth_service._background_tasks)
+
+        assert token == "mock_jwt_token"
+        mock_password_hasher.needs_rehash.assert_called_once_with("hashed_password")
+        mock_password_hasher.hash_password.assert_called_once_with("plain_password")
+        mock_user_repo.update_password_hash.assert_called_once_with(sample_user, "rehashed_password")
+
+    @pytest.mark.asyncio
+    async def test_login_rehash_failure_does_not_fail_login(self, auth_service, sample_user, mock_user_repo, mock_password_hasher):
+        mock_user_repo.get_by_email.return_value = sample_user
+        mock_password_hasher.needs_rehash.return_value = True
+        mock_user_repo.update_password_hash.side_effect = AppException(AppErr.CONFLICT)
+
+        token = await auth_service.login("test@example.com", "plain_password")
+        await asyncio.gather(*auth_service._background_tasks)
+
+        assert token == "mock_jwt_token"
+
+    @pytest.mark.asyncio
+    async def test_login_does_not_rehash_current_hash(self, auth_service, sample_user, mock_user_repo, mock_password_hasher):
+        mock_user_repo.get_by_email.return_value = sample_user
+
+        await auth_service.login("test@example.com", "plain_password")
+
+        mock_password_hasher.hash_password.assert_not_called()
+        mock_user_repo.update_password_hash.assert_not_called()
+
     @pytest.mark.asyncio
     async def test_login_user_not_found(self, auth_service, mock_user_repo):
         mock_user_repo.get_by_email.return_value = None
@@ -100,19 +151,39 @@ class TestAuthService:
             email=sample_user.email,
             role=sample_user.role
         )
-        mock_token_provider.validate_token.return_value = user_claims
         mock_user_repo.get.return_value = sample_user
 
-        user = await auth_service.get_current_user("valid_token")
+        user = await auth_service.get_current_user(user_claims)
 
         assert user.id == sample_user.id
         assert user.password == ""
-        mock_token_provider.validate_token.assert_called_once_with("valid_token")
+        mock_token_provider.validate_token.assert_not_called()
         mock_user_repo.get.assert_called_once_with(user_claims.user_id)
 
+    @pytest.mark.asyncio
+    async def test_get_current_user_served_from_cache(self, auth_service, sample_user, mock_user_repo, profile_cache):
+        user_claims = UserClaims(
+            id=sample_user.id,
+            name=sample_user.name,
+            email=sample_user.email,
+            role=sample_user.role
+        )
+        mock_user_repo.get.return_value = sample_user
+
+        first = await auth_service.get_current_user(user_claims)
+        second = await auth_service.get_current_user(user_claims)
+
+        assert first.id == second.id == sample_user.id
+        mock_user_repo.get.assert_called_once_with(sample_user.id)
+
+        profile_cache.delete(sample_user.id)
+        await auth_service.get_current_user(user_claims)
+
+        assert mock_user_repo.get.call_count == 2
+
     @pytest.mark.asyncio
     async def test_get_current_user_invalid_token(self, auth_service, mock_user_repo, mock_token_provider):
-        mock_token_provider.validate_token.return_value = UserClaims(
+        user_claims = UserClaims(
             id="invalid-id",
             name="Test",
             email="test@example.com",
@@ -121,10 +192,26 @@ class TestAuthService:
         mock_user_repo.get.return_value = None
 
         with pytest.raises(Exception) as exc:
-            await auth_service.get_current_user("invalid_token")
+            await auth_service.get_current_user(user_claims)
 
         assert "Invalid user token" in str(exc.value)
 
-    def test_logout(self, auth_service):
-        result = auth_service.logout("some_token")
+    @pytest.mark.asyncio
+    async def test_logout_records_revoked_token(self, auth_service, mock_token_provider, mock_revoked_token_repo):
+        revoked_token = RevokedToken(
+            token_id="jti-1", expires_at=2_000_000_000, revoked_at=1)
+        mock_token_provider.revoke_token.return_value = revoked_token
+
+        result = await auth_service.logout("some_token")
+
         assert result is None
+        mock_token_provider.revoke_token.assert_called_once_with("some_token")
+        mock_revoked_token_repo.save.assert_awaited_once_with(revoked_token)
+
+    @pytest.mark.asyncio
+    async def test_logout_token_without_id_is_not_recorded(self, auth_service, mock_token_provider, mock_revoked_token_repo):
+        mock_token_provider.revoke_token.return_value = None
+
+        await auth_service.logout("legacy_token")
+
+        mock_revoked_token_repo.save.assert_not_called()
@@ -29,8 +29,20 @@ class TestExpenseService:
         return repo
 
     @pytest.fixture
-    def expense_service(self, mock_expense_repo, mock_advance_repo):
-        return ExpenseService(mock_expense_repo, mock_advance_repo)
+    def mock_user_repo(self):
+        repo = MagicMock()
+        repo.get = AsyncMock(return_value=None)
+        return repo
+
+    @pytest.fixture
+    def mock_notification_service(self):
+        service = MagicMock()
+        service.send_notification = AsyncMock()
+        return service
+
+    @pytest.fixture
+    def expense_service(self, mock_expense_repo, mock_advance_repo, mock_user_repo, mock_notification_service):
+        return ExpenseService(mock_expense_repo, mock_advance_repo, mock_user_repo, mock_notification_service)
 
     @pytest.fixture
     def employee_user(self):
@@ -235,11 +247,11 @@ class TestExpenseService:
         assert filter_options.user_id is None
 
     @pytest.mark.asyncio
-    async def test_update_expense_status_approved(self, expense_service, sample_expense, mock_expense_repo):
+    async def test_update_expense_status_approved(self, expense_service, sample_expense, mock_expense_repo, admin_user):
         mock_expense_repo.get.return_value = sample_expense
-        admin_id = uuid4().hex
+        admin_id = admin_user.user_id
 
-        await expense_service.update_expense_status(admin_id, sample_expense.id, RequestStatus.Approved)
+        await expense_service.update_expense_status(admin_user, sample_expense.id, RequestStatus.Approved)
 
         assert sample_expense.status == RequestStatus.Approved
         assert sample_expense.approved_by == admin_id
@@ -247,11 +259,11 @@ class TestExpenseService:
         mock_expense_repo.update.assert_called_once()
 
     @pytest.mark.asyncio
-    async def test_update_expense_status_reviewed(self, expense_service, sample_expense, mock_expense_repo):
+    async def test_update_expense_status_reviewed(self, expense_service, sample_expense, mock_expense_repo, admin_user):
         mock_expense_repo.get.return_value = sample_expense
-        reviewer_id = uuid4().hex
+        reviewer_id = admin_user.user_id
 
-        await expense_service.update_expense_status(reviewer_id, sample_expense.id, RequestStatus.Reviewed)
+        await expense_service.update_expense_status(admin_user, sample_expense.id, RequestStatus.Reviewed)
 
         assert sample_expense.status == RequestStatus.Reviewed
         assert sample_expense.reviewed_by == reviewer_id
@@ -1,11 +1,13 @@
-from io import BytesIO
+import asyncio
+import hashlib
 from unittest.mock import AsyncMock, MagicMock
 from uuid import uuid4
 import pytest
 from app.errors.app_exception import AppException
 from app.errors.codes import AppErr
-from app.models.image import ImageMetadata
+from app.models.image import ImageMetadata, ImageSize, PresignedUpload, StoredImageInfo
 from app.models.user import UserClaims, UserRole
+from app.infra.ttl_cache import TTLCache
 from app.services.image import ImageService
 
 
@@ -15,20 +17,34 @@ class TestImageService:
         repo = MagicMock()
         repo.save = AsyncMock()
         repo.get = AsyncMock()
+        repo.get_many = AsyncMock()
+        repo.add_content_reference = AsyncMock(return_value=None)
+        repo.remove_reference = AsyncMock(return_value=True)
         repo.delete = AsyncMock()
         return repo
 
     @pytest.fixture
     def mock_image_store(self):
+        async def consume_stream(name, content_type, chunks, find_duplicate=None):
+            store.uploaded = b"".join([chunk async for chunk in chunks])
+            if find_duplicate is not None:
+                duplicate_url = await find_duplicate(hashlib.sha256(store.uploaded).hexdigest())
+                if duplicate_url is not None:
+                    return duplicate_url
+            return store.upload_image_stream.return_value
+
         store = MagicMock()
-        store.upload_image = AsyncMock()
+        store.upload_image_stream = AsyncMock(side_effect=consume_stream)
         store.delete_image = AsyncMock()
         store.get_image_download_url = AsyncMock()
         return store
 
     @pytest.fixture
     def image_service(self, mock_image_metadata_repo, mock_image_store):
-        return ImageService(mock_image_metadata_repo, mock_image_store)
+        return ImageService(mock_image_metadata_repo, mock_image_store,
+                            TTLCache("test_image_metadata"),
+                            TTLCache("test_image_download_urls", ttl=60),
+                            max_upload_size=1024)
 
     @pytest.fixture
     def employee_user(self):
@@ -50,7 +66,13 @@ class TestImageService:
 
     @pytest.fixture
     def sample_image_data(self):
-        return BytesIO(b"fake image data")
+        return b"\xff\xd8\xff\xe0" + b"fake jpeg data" * 10
+
+    def stream(self, data: bytes, chunk_size: int = 5):
+        async def chunks():
+            for i in range(0, len(data), chunk_size):
+                yield data[i:i + chunk_size]
+        return chunks()
 
     @pytest.fixture
     def sample_image_metadata(self, employee_user):
@@ -59,16 +81,67 @@ class TestImageService:
     @pytest.mark.asyncio
     async def test_upload_image_success(self, image_service, employee_user, sample_image_data, mock_image_store, mock_image_metadata_repo):
         image_url = "https://example.com/images/test.jpg"
-        mock_image_store.upload_image.return_value = image_url
+        mock_image_store.upload_image_stream.return_value = image_url
 
-        result = await image_service.upload_image(employee_user, sample_image_data, "test.jpg")
+        result = await image_service.upload_image(
+            employee_user, "test.jpg", "image/jpeg", self.stream(sample_image_data))
 
         assert result == image_url
-        mock_image_store.upload_image.assert_called_once_with("test.jpg", sample_image_data)
+        assert mock_image_store.uploaded == sample_image_data
+        assert mock_image_store.upload_image_stream.call_args.args[:2] == ("test.jpg", "image/jpeg")
         mock_image_metadata_repo.save.assert_called_once()
         saved_metadata = mock_image_metadata_repo.save.call_args[0][1]
         assert saved_metadata.user_id == employee_user.user_id
 
+    @pytest.mark.asyncio
+    async def test_upload_image_small_file(self, image_service, employee_user, mock_image_store):
+        data = b"%PDF-1"
+
+        await image_service.upload_image(
+            employee_user, "receipt.pdf", "application/pdf", self.stream(data, 2))
+
+        assert mock_image_store.uploaded == data
+
+    @pytest.mark.asyncio
+    async def test_upload_image_type_not_allowed(self, image_service, employee_user, mock_image_store, mock_image_metadata_repo):
+        with pytest.raises(AppException) as exc:
+            await image_service.upload_image(
+                employee_user, "notes.txt", "text/plain", self.stream(b"hello"))
+
+        assert exc.value.err_code == AppErr.IMAGE_TYPE_NOT_ALLOWED
+        mock_image_store.upload_image_stream.assert_not_called()
+        mock_image_metadata_repo.save.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_upload_image_content_does_not_match_type(self, image_service, employee_user, mock_image_metadata_repo):
+        with pytest.raises(AppException) as exc:
+            await image_service.upload_image(
+                employee_user, "fake.jpg", "image/jpeg", self.stream(b"<html>not a jpeg</html>"))
+
+        assert exc.value.err_code == AppErr.IMAGE_TYPE_NOT_ALLOWED
+        mock_image_metadata_repo.save.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_upload_image_declared_size_too_large(self, image_service, employee_user, sample_image_data, mock_image_store):
+        with pytest.raises(AppException) as exc:
+            await image_service.upload_image(
+                employee_user, "test.jpg", "image/jpeg",
+                self.stream(sample_image_data), size_hint=2048)
+
+        assert exc.value.err_code == AppErr.IMAGE_TOO_LARGE
+        mock_image_store.upload_image_stream.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_upload_image_streamed_size_too_large(self, image_service, employee_user, mock_image_metadata_repo):
+        data = b"\xff\xd8\xff\xe0" + b"x" * 2048
+
+        with pytest.raises(AppException) as exc:
+            await image_service.upload_image(
+                employee_user, "big.jpg", "image/jpeg", self.stream(data, 256))
+
+        assert exc.value.err_code == AppErr.IMAGE_TOO_LARGE
+        mock_image_metadata_repo.save.assert_not_called()
+
     @pytest.mark.asyncio
     async def test_delete_image_success(self, image_service, employee_user, sample_image_metadata, mock_image_metadata_repo, mock_image_store):
         image_url = "https://example.com/images/test.jpg"
@@ -78,7 +151,8 @@ class TestImageService:
 
         mock_image_metadata_repo.get.assert_called_once_with(image_url)
         mock_image_store.delete_image.assert_called_once_with(image_url)
-        mock_image_metadata_repo.delete.assert_called_once_with(image_url)
+        mock_image_metadata_repo.remove_reference.assert_called_once_with(
+            image_url, sample_image_metadata)
 
     @pytest.mark.asyncio
     async def test_delete_image_not_found(self, image_service, employee_user, mock_image_metadata_repo):
@@ -158,3 +232,591 @@ class TestImageService:
 
         assert exc.value.err_code == AppErr.IMAGE_NOT_FOUND
         mock_image_metadata_repo.delete.assert_called_once_with(image_url)
+
+    @pytest.mark.asyncio
+    async def test_get_image_download_url_is_cached_per_caller(self, image_service, employee_user, admin_user, sample_image_metadata, mock_image_metadata_repo, mock_image_store):
+        image_url = "https://example.com/images/test.jpg"
+        mock_image_metadata_repo.get.return_value = sample_image_metadata
+        mock_image_store.get_image_download_url.side_effect = ["https://signed/1", "https://signed/2"]
+
+        first = await image_service.get_image_download_url(employee_user, image_url)
+        second = await image_service.get_image_download_url(employee_user, image_url)
+        admin = await image_service.get_image_download_url(admin_user, image_url)
+
+        assert first == second == "https://signed/1"
+        assert admin == "https://signed/2"
+        mock_image_metadata_repo.get.assert_called_once_with(image_url)
+        assert mock_image_store.get_image_download_url.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_cached_metadata_still_checks_access(self, image_service, employee_user, sample_image_metadata, mock_image_metadata_repo, mock_image_store):
+        image_url = "https://example.com/images/test.jpg"
+        mock_image_metadata_repo.get.return_value = sample_image_metadata
+        await image_service.get_image_download_url(employee_user, image_url)
+        other_user = UserClaims(id="other", name="Other", email="other@example.com",
+                                role=UserRole.Employee)
+
+        with pytest.raises(AppException) as exc:
+            await image_service.get_image_download_url(other_user, image_url)
+
+        assert exc.value.err_code == AppErr.UNAUTHORIZED_IMAGE_ACCESS
+
+    @pytest.mark.asyncio
+    async def test_delete_image_invalidates_caches(self, image_service, employee_user, sample_image_metadata, mock_image_metadata_repo, mock_image_store):
+        image_url = "https://example.com/images/test.jpg"
+        mock_image_metadata_repo.get.return_value = sample_image_metadata
+        await image_service.get_image_download_url(employee_user, image_url)
+
+        await image_service.delete_image(employee_user, image_url)
+        mock_image_metadata_repo.get.return_value = None
+
+        with pytest.raises(AppException) as exc:
+            await image_service.get_image_download_url(employee_user, image_url)
+
+        assert exc.value.err_code == AppErr.IMAGE_NOT_FOUND
+
+    @pytest.mark.asyncio
+    async def test_get_image_download_urls_batches_metadata_reads(self, image_service, employee_user, sample_image_metadata, mock_image_metadata_repo, mock_image_store):
+        own_url = "https://example.com/images/own.jpg"
+        other_url = "https://example.com/images/other.jpg"
+        missing_url = "https://example.com/images/missing.jpg"
+        mock_image_metadata_repo.get_many.return_value = {
+            own_url: sample_image_metadata,
+            other_url: ImageMetadata(UserID=uuid4().hex),
+        }
+        mock_image_store.get_image_download_url.return_value = "https://example.com/download/own.jpg"
+
+        results = await image_service.get_image_download_urls(
+            employee_user, [own_url, other_url, missing_url, own_url])
+
+        assert [r.image_url for r in results] == [own_url, other_url, missing_url]
+        assert results[0].download_url == "https://example.com/download/own.jpg"
+        assert results[0].error is None
+        assert results[1].download_url is None
+        assert results[1].error == AppErr.UNAUTHORIZED_IMAGE_ACCESS.name
+        assert results[2].error == AppErr.IMAGE_NOT_FOUND.name
+        mock_image_metadata_repo.get_many.assert_awaited_once_with(
+            [own_url, other_url, missing_url])
+        mock_image_metadata_repo.get.assert_not_called()
+        mock_image_store.get_image_download_url.assert_awaited_once_with(own_url)
+
+    @pytest.mark.asyncio
+    async def test_get_image_download_urls_uses_caches(self, image_service, admin_user, sample_image_metadata, mock_image_metadata_repo, mock_image_store):
+        image_url = "https://example.com/images/test.jpg"
+        mock_image_metadata_repo.get_many.return_value = {image_url: sample_image_metadata}
+        mock_image_store.get_image_download_url.return_value = "https://example.com/download/test.jpg"
+
+        await image_service.get_image_download_urls(admin_user, [image_url])
+        results = await image_service.get_image_download_urls(admin_user, [image_url])
+
+        assert results[0].download_url == "https://example.com/download/test.jpg"
+        mock_image_metadata_repo.get_many.assert_awaited_once()
+        mock_image_store.get_image_download_url.assert_awaited_once()
+
+
+    @pytest.mark.asyncio
+    async def test_upload_records_content_hash(self, image_service, employee_user, sample_image_data, mock_image_store, mock_image_metadata_repo):
+        mock_image_store.upload_image_stream.return_value = "https://example.com/images/test.jpg"
+
+        await image_service.upload_image(
+            employee_user, "test.jpg", "image/jpeg", self.stream(sample_image_data))
+
+        content_hash = hashlib.sha256(sample_image_data).hexdigest()
+        mock_image_metadata_repo.add_content_reference.assert_awaited_once_with(
+            employee_user.user_id, content_hash)
+        saved_metadata = mock_image_metadata_repo.save.call_args.args[1]
+        assert saved_metadata.content_hash == content_hash
+
+    @pytest.mark.asyncio
+    async def test_upload_duplicate_reuses_existing_image(self, image_service, employee_user, sample_image_data, mock_image_store, mock_image_metadata_repo):
+        existing_url = "https://example.com/images/existing.jpg"
+        mock_image_metadata_repo.add_content_reference.return_value = existing_url
+
+        result = await image_service.upload_image(
+            employee_user, "test.jpg", "image/jpeg", self.stream(sample_image_data))
+
+        assert result == existing_url
+        mock_image_metadata_repo.save.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_upload_racing_duplicate_keeps_first_copy(self, image_service, employee_user, sample_image_data, mock_image_store, mock_image_metadata_repo):
+        existing_url = "https://example.com/images/existing.jpg"
+        new_url = "https://example.com/images/new.jpg"
+        mock_image_store.upload_image_stream.return_value = new_url
+        mock_image_metadata_repo.save.side_effect = AppException(AppErr.IMAGE_CONTENT_ALREADY_EXIST)
+        mock_image_metadata_repo.add_content_reference.side_effect = [None, existing_url]
+
+        result = await image_service.upload_image(
+            employee_user, "test.jpg", "image/jpeg", self.stream(sample_image_data))
+
+        assert result == existing_url
+        mock_image_store.delete_image.assert_awaited_once_with(new_url)
+
+    @pytest.mark.asyncio
+    async def test_delete_shared_image_keeps_object(self, image_service, employee_user, sample_image_metadata, mock_image_metadata_repo, mock_image_store):
+        mock_image_metadata_repo.get.return_value = sample_image_metadata
+        mock_image_metadata_repo.remove_reference.return_value = False
+
+        await image_service.delete_image(employee_user, "https://example.com/images/test.jpg")
+
+        mock_image_store.delete_image.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_delete_images_reports_per_url(self, image_service, employee_user, mock_image_metadata_repo, mock_image_store):
+        own = "https://example.com/images/own.jpg"
+        shared = "https://example.com/images/shared.jpg"
+        others = "https://example.com/images/others.jpg"
+        missing = "https://example.com/images/missing.jpg"
+        mock_image_metadata_repo.get_many.return_value = {
+            own: ImageMetadata(user_id=employee_user.user_id,
+                               derivatives={"thumbnail": own + ".thumbnail.webp"}),
+            shared: ImageMetadata(user_id=employee_user.user_id, content_hash="abc"),
+            others: ImageMetadata(user_id="different-user-id"),
+        }
+        mock_image_metadata_repo.remove_references = AsyncMock(return_value=[own])
+        mock_image_store.delete_images = AsyncMock(return_value=[])
+
+        results = await image_service.delete_images(
+            employee_user, [own, shared, others, missing, own])
+
+        assert [(r.image_url, r.error) for r in results] == [
+            (own, None),
+            (shared, None),
+            (others, "UNAUTHORIZED_IMAGE_ACCESS"),
+            (missing, "IMAGE_NOT_FOUND"),
+        ]
+        mock_image_metadata_repo.get_many.assert_awaited_once()
+        assert set(mock_image_metadata_repo.remove_references.call_args.args[0]) == {own, shared}
+        mock_image_store.delete_images.assert_awaited_once_with(
+            [own, own + ".thumbnail.webp"])
+        mock_image_store.delete_image.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_delete_images_reports_failed_object_deletes(self, image_service, employee_user, mock_image_metadata_repo, mock_image_store):
+        image_url = "https://example.com/images/own.jpg"
+        thumbnail_url = image_url + ".thumbnail.webp"
+        mock_image_metadata_repo.get_many.return_value = {
+            image_url: ImageMetadata(user_id=employee_user.user_id,
+                                     derivatives={"thumbnail": thumbnail_url}),
+        }
+        mock_image_metadata_repo.remove_references = AsyncMock(return_value=[image_url])
+        mock_image_store.delete_images = AsyncMock(return_value=[thumbnail_url])
+
+        results = await image_service.delete_images(employee_user, [image_url])
+
+        assert results[0].error == "IMAGE_DELETE_FAILED"
+
+
+class TestImageServiceDirectUpload:
+    @pytest.fixture
+    def mock_image_metadata_repo(self):
+        repo = MagicMock()
+        repo.save = AsyncMock()
+        return repo
+
+    @pytest.fixture
+    def mock_image_store(self):
+        store = MagicMock()
+        store.create_presigned_upload = AsyncMock()
+        store.get_image_info = AsyncMock()
+        store.delete_image = AsyncMock()
+        store.get_object_key.side_effect = lambda url: url.split(".com/", 1)[1]
+        return store
+
+    @pytest.fixture
+    def image_service(self, mock_image_metadata_repo, mock_image_store):
+        return ImageService(mock_image_metadata_repo, mock_image_store,
+                            TTLCache("test_image_metadata"),
+                            TTLCache("test_image_download_urls", ttl=60),
+                            max_upload_size=1024)
+
+    @pytest.fixture
+    def employee_user(self):
+        return UserClaims(
+            id="user-1",
+            name="Test Employee",
+            email="employee@example.com",
+            role=UserRole.Employee
+        )
+
+    @pytest.fixture
+    def image_url(self):
+        return "https://bucket.s3.amazonaws.com/receipts/user-1/abc_receipt.png"
+
+    @pytest.mark.asyncio
+    async def test_create_upload_url(self, image_service, employee_user, mock_image_store):
+        presigned = PresignedUpload(url="https://bucket.s3.amazonaws.com/", fields={},
+                                    image_url="https://bucket.s3.amazonaws.com/k", expires_in=300)
+        mock_image_store.create_presigned_upload.return_value = presigned
+
+        result = await image_service.create_upload_url(
+            employee_user, "../../receipt.png", "image/png", 100)
+
+        assert result == presigned
+        mock_image_store.create_presigned_upload.assert_awaited_once_with(
+            "receipts/user-1/", "receipt.png", "image/png", 1024)
+
+    @pytest.mark.asyncio
+    async def test_create_upload_url_rejects_type_and_size(self, image_service, employee_user, mock_image_store):
+        with pytest.raises(AppException) as exc:
+            await image_service.create_upload_url(employee_user, "a.exe", "application/x-msdownload", 100)
+        assert exc.value.err_code == AppErr.IMAGE_TYPE_NOT_ALLOWED
+
+        with pytest.raises(AppException) as exc:
+            await image_service.create_upload_url(employee_user, "a.png", "image/png", 4096)
+        assert exc.value.err_code == AppErr.IMAGE_TOO_LARGE
+
+        mock_image_store.create_presigned_upload.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_complete_upload(self, image_service, employee_user, image_url, mock_image_store, mock_image_metadata_repo):
+        mock_image_store.get_image_info.return_value = StoredImageInfo(
+            size=100, content_type="image/png", leading_bytes=b"\x89PNG\r\n\x1a\n\x00\x00\x00\x0d")
+
+        result = await image_service.complete_upload(employee_user, image_url)
+
+        assert result == image_url
+        saved_url, saved_metadata = mock_image_metadata_repo.save.call_args.args
+        assert saved_url == image_url
+        assert saved_metadata.user_id == "user-1"
+        mock_image_store.delete_image.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_complete_upload_twice_is_idempotent(self, image_service, employee_user, image_url, mock_image_store, mock_image_metadata_repo):
+        mock_image_store.get_image_info.return_value = StoredImageInfo(
+            size=100, content_type="application/pdf", leading_bytes=b"%PDF-1.7")
+        mock_image_metadata_repo.save.side_effect = AppException(AppErr.IMAGE_URL_ALREADY_EXIST)
+
+        assert await image_service.complete_upload(employee_user, image_url) == image_url
+
+    @pytest.mark.asyncio
+    async def test_complete_upload_of_another_users_object(self, image_service, mock_image_store):
+        other_user = UserClaims(id="user-2", name="Other", email="other@example.com",
+                                role=UserRole.Employee)
+
+        with pytest.raises(AppException) as exc:
+            await image_service.complete_upload(
+                other_user, "https://bucket.s3.amazonaws.com/receipts/user-1/abc_receipt.png")
+
+        assert exc.value.err_code == AppErr.UNAUTHORIZED_IMAGE_ACCESS
+        mock_image_store.get_image_info.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_complete_upload_with_spoofed_content_deletes_object(self, image_service, employee_user, image_url, mock_image_store, mock_image_metadata_repo):
+        mock_image_store.get_image_info.return_value = StoredImageInfo(
+            size=100, content_type="image/png", leading_bytes=b"<script>")
+
+        with pytest.raises(AppException) as exc:
+            await image_service.complete_upload(employee_user, image_url)
+
+        assert exc.value.err_code == AppErr.IMAGE_TYPE_NOT_ALLOWED
+        mock_image_store.delete_image.assert_awaited_once_with(image_url)
+        mock_image_metadata_repo.save.assert_not_called()
+
+
+class TestImageServiceDerivatives:
+    @pytest.fixture
+    def mock_image_metadata_repo(self):
+        repo = MagicMock()
+        repo.save = AsyncMock()
+        repo.get = AsyncMock()
+        repo.set_derivatives = AsyncMock()
+        repo.add_content_reference = AsyncMock(return_value=None)
+        repo.remove_reference = AsyncMock(return_value=True)
+        repo.delete = AsyncMock()
+        return repo
+
+    @pytest.fixture
+    def mock_image_store(self):
+        async def consume_stream(name, content_type, chunks, find_duplicate=None):
+            [chunk async for chunk in chunks]
+            return "https://bucket.s3.amazonaws.com/k_receipt.png"
+
+        store = MagicMock()
+        store.upload_image_stream = AsyncMock(side_effect=consume_stream)
+        store.download_image = AsyncMock(return_value=b"original bytes")
+        store.upload_derivative = AsyncMock(
+            side_effect=lambda url, size, content_type, data: f"{url}.{size}")
+        store.delete_image = AsyncMock()
+        store.get_image_download_url = AsyncMock(side_effect=lambda url: f"{url}?signed")
+        return store
+
+    @pytest.fixture
+    def mock_derivative_generator(self):
+        generator = MagicMock()
+        generator.generate = AsyncMock(return_value={
+            "thumbnail": b"small", "preview": b"medium"})
+        return generator
+
+    @pytest.fixture
+    def metadata_cache(self):
+        return TTLCache("test_image_metadata")
+
+    @pytest.fixture
+    def image_service(self, mock_image_metadata_repo, mock_image_store, mock_derivative_generator, metadata_cache):
+        return ImageService(mock_image_metadata_repo, mock_image_store,
+                            metadata_cache,
+                            TTLCache("test_image_download_urls", ttl=60),
+                            max_upload_size=1024,
+                            derivative_generator=mock_derivative_generator)
+
+    @pytest.fixture
+    def employee_user(self):
+        return UserClaims(
+            id="user-1",
+            name="Test Employee",
+            email="employee@example.com",
+            role=UserRole.Employee
+        )
+
+    def stream(self, data: bytes):
+        async def chunks():
+            yield data
+        return chunks()
+
+    @pytest.mark.asyncio
+    async def test_upload_renders_derivatives_in_background(self, image_service, employee_user, mock_image_store, mock_derivative_generator, mock_image_metadata_repo, metadata_cache):
+        image_url = await image_service.upload_image(
+            employee_user, "receipt.png", "image/png",
+            self.stream(b"\x89PNG\r\n\x1a\n" + b"data"))
+        metadata_cache.set(image_url, ImageMetadata(UserID="user-1"))
+        await asyncio.gather(*image_service._background_tasks)
+
+        mock_image_store.download_image.assert_awaited_once_with(image_url)
+        mock_derivative_generator.generate.assert_awaited_once_with(b"original bytes")
+        mock_image_store.upload_derivative.assert_any_await(
+            image_url, "thumbnail", "image/webp", b"small")
+        mock_image_metadata_repo.set_derivatives.assert_awaited_once_with(image_url, {
+            "thumbnail": f"{image_url}.thumbnail",
+            "preview": f"{image_url}.preview",
+        })
+        assert metadata_cache.get(image_url) is None
+
+    @pytest.mark.asyncio
+    async def test_pdf_upload_has_no_derivatives(self, image_service, employee_user, mock_derivative_generator):
+        await image_service.upload_image(
+            employee_user, "receipt.pdf", "application/pdf", self.stream(b"%PDF-1.7 data"))
+
+        assert not image_service._background_tasks
+        mock_derivative_generator.generate.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_render_failure_keeps_original(self, image_service, employee_user, mock_derivative_generator, mock_image_metadata_repo, mock_image_store):
+        mock_derivative_generator.generate.side_effect = AppException(AppErr.UNAVAILABLE)
+
+        await image_service.upload_image(
+            employee_user, "receipt.png", "image/png",
+            self.stream(b"\x89PNG\r\n\x1a\n" + b"data"))
+        await asyncio.gather(*image_service._background_tasks)
+
+        mock_image_store.upload_derivative.assert_not_called()
+        mock_image_metadata_repo.set_derivatives.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_image_deleted_while_rendering_drops_derivatives(self, image_service, employee_user, mock_image_metadata_repo, mock_image_store):
+        mock_image_metadata_repo.set_derivatives.side_effect = AppException(AppErr.IMAGE_NOT_FOUND)
+
+        image_url = await image_service.upload_image(
+            employee_user, "receipt.png", "image/png",
+            self.stream(b"\x89PNG\r\n\x1a\n" + b"data"))
+        await asyncio.gather(*image_service._background_tasks)
+
+        deleted = {call.args[0] for call in mock_image_store.delete_image.await_args_list}
+        assert deleted == {f"{image_url}.thumbnail", f"{image_url}.preview"}
+
+    @pytest.mark.asyncio
+    async def test_download_url_by_size(self, image_service, employee_user, mock_image_metadata_repo):
+        image_url = "https://bucket.s3.amazonaws.com/k_receipt.png"
+        mock_image_metadata_repo.get.return_value = ImageMetadata(
+            UserID="user-1", Derivatives={"thumbnail": f"{image_url}.thumbnail"})
+
+        thumbnail = await image_service.get_image_download_url(
+            employee_user, image_url, ImageSize.Thumbnail)
+        # not rendered, falls back to the original
+        preview = await image_service.get_image_download_url(
+            employee_user, image_url, ImageSize.Preview)
+        original = await image_service.get_image_download_url(employee_user, image_url)
+
+        assert thumbnail == f"{image_url}.thumbnail?signed"
+        assert preview == f"{image_url}?signed"
+        assert original == f"{image_url}?signed"
+
+    @pytest.mark.asyncio
+    async def test_delete_image_removes_derivatives(self, image_service, employee_user, mock_image_metadata_repo, mock_image_store):
+        image_url = "https://bucket.s3.amazonaws.com/k_receipt.png"
+        mock_image_metadata_repo.get.return_value = ImageMetadata(
+            UserID="user-1", Derivatives={"thumbnail": f"{image_url}.thumbnail"})
+
+        await image_service.delete_image(employee_user, image_url)
+
+        deleted = {call.args[0] for call in mock_image_store.delete_image.await_args_list}
+        assert deleted == {image_url, f"{image_url}.thumbnail"}
+        mock_image_metadata_repo.remove_reference.assert_awaited_once()
+
+
+    @pytest.mark.asyncio
+    async def test_metadata_without_derivatives_is_cached_briefly(self, mock_image_metadata_repo, mock_image_store, mock_derivative_generator, employee_user):
+        now = [1000.0]
+        metadata_cache = TTLCache("test_image_metadata", ttl=3600, clock=lambda: now[0])
+        image_service = ImageService(mock_image_metadata_repo, mock_image_store,
+                                     metadata_cache,
+                                     TTLCache("test_image_download_urls", ttl=60),
+                                     derivative_generator=mock_derivative_generator)
+        image_url = "https://bucket.s3.amazonaws.com/k_receipt.png"
+        mock_image_metadata_repo.get.return_value = ImageMetadata(
+            UserID=employee_user.user_id, ContentType="image/png")
+
+        first = await image_service.get_image_download_url(employee_user, image_url, ImageSize.Thumbnail)
+        # derivatives recorded through another worker
+        mock_image_metadata_repo.get.return_value = ImageMetadata(
+            UserID=employee_user.user_id, ContentType="image/png",
+            Derivatives={"thumbnail": f"{image_url}.thumbnail"})
+        now[0] += 60
+        second = await image_service.get_image_download_url(employee_user, image_url, ImageSize.Thumbnail)
+        now[0] += 600
+        await image_service.get_image_download_url(employee_user, image_url, ImageSize.Thumbnail)
+
+        assert first == f"{image_url}?signed"
+        assert second == f"{image_url}.thumbnail?signed"
+        assert mock_image_metadata_repo.get.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_pdf_metadata_gets_the_normal_ttl(self, mock_image_metadata_repo, mock_image_store, mock_derivative_generator, employee_user):
+        now = [1000.0]
+        metadata_cache = TTLCache("test_image_metadata", ttl=3600, clock=lambda: now[0])
+        image_service = ImageService(mock_image_metadata_repo, mock_image_store,
+                                     metadata_cache,
+                                     TTLCache("test_image_download_urls", ttl=60),
+                                     derivative_generator=mock_derivative_generator)
+        image_url = "https://bucket.s3.amazonaws.com/k_receipt.pdf"
+        mock_image_metadata_repo.get.return_value = ImageMetadata(
+            UserID=employee_user.user_id, ContentType="application/pdf")
+
+        await image_service.get_image_download_url(employee_user, image_url, ImageSize.Thumbnail)
+        now[0] += 600
+        await image_service.get_image_download_url(employee_user, image_url, ImageSize.Thumbnail)
+
+        assert mock_image_metadata_repo.get.await_count == 1
+
+class TestImageServiceMultiUpload:
+    @pytest.fixture
+    def mock_image_metadata_repo(self):
+        repo = MagicMock()
+        repo.save = AsyncMock()
+        repo.save_many = AsyncMock()
+        repo.get = AsyncMock()
+        repo.add_content_reference = AsyncMock(return_value=None)
+        repo.remove_reference = AsyncMock(return_value=False)
+        return repo
+
+    @pytest.fixture
+    def mock_image_store(self):
+        async def consume_stream(name, content_type, chunks, find_duplicate=None):
+            store.in_flight += 1
+            store.max_in_flight = max(store.max_in_flight, store.in_flight)
+            try:
+                data = b"".join([chunk async for chunk in chunks])
+                await asyncio.sleep(0)
+                duplicate_url = await find_duplicate(hashlib.sha256(data).hexdigest())
+                return duplicate_url or f"https://bucket/{name}"
+            finally:
+                store.in_flight -= 1
+
+        store = MagicMock()
+        store.in_flight = 0
+        store.max_in_flight = 0
+        store.upload_image_stream = AsyncMock(side_effect=consume_stream)
+        store.delete_image = AsyncMock()
+        return store
+
+    @pytest.fixture
+    def image_service(self, mock_image_metadata_repo, mock_image_store):
+        return ImageService(mock_image_metadata_repo, mock_image_store,
+                            TTLCache("test_image_metadata"),
+                            TTLCache("test_image_download_urls", ttl=60),
+                            max_upload_size=1024,
+                            max_upload_files=5,
+                            upload_concurrency=2)
+
+    @pytest.fixture
+    def employee_user(self):
+        return UserClaims(
+            id=uuid4().hex,
+            name="Test Employee",
+            email="employee@example.com",
+            role=UserRole.Employee
+        )
+
+    def files(self, *uploads: tuple[str, str, bytes]):
+        async def chunks(data: bytes):
+            for i in range(0, len(data), 4):
+                await asyncio.sleep(0)
+                yield data[i:i + 4]
+
+        async def files():
+            for name, content_type, data in uploads:
+                yield name, content_type, chunks(data)
+        return files()
+
+    @pytest.mark.asyncio
+    async def test_upload_images_concurrently_with_one_save(self, image_service, employee_user, mock_image_store, mock_image_metadata_repo):
+        uploads = [(f"{i}.png", "image/png", b"\x89PNG\r\n\x1a\n" + bytes([i]) * 40) for i in range(4)]
+
+        image_urls = await image_service.upload_images(employee_user, self.files(*uploads))
+
+        assert image_urls == [f"https://bucket/{i}.png" for i in range(4)]
+        assert mock_image_store.max_in_flight == 2
+        mock_image_metadata_repo.save_many.assert_awaited_once()
+        saved = mock_image_metadata_repo.save_many.call_args.args[0]
+        assert list(saved) == image_urls
+        assert all(metadata.user_id == employee_user.user_id for metadata in saved.values())
+        mock_image_metadata_repo.save.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_upload_images_failure_discards_stored_uploads(self, image_service, employee_user, mock_image_store, mock_image_metadata_repo):
+        uploads = [
+            ("a.png", "image/png", b"\x89PNG\r\n\x1a\n"),
+            ("b.png", "image/png", b"\x89PNG\r\n\x1a\n" + b"x" * 2000),
+        ]
+
+        with pytest.raises(AppException) as exc:
+            await image_service.upload_images(employee_user, self.files(*uploads))
+
+        assert exc.value.err_code == AppErr.IMAGE_TOO_LARGE
+        mock_image_metadata_repo.save_many.assert_not_called()
+        mock_image_store.delete_image.assert_awaited_once_with("https://bucket/a.png")
+
+    @pytest.mark.asyncio
+    async def test_upload_images_too_many_files(self, image_service, employee_user, mock_image_metadata_repo):
+        uploads = [(f"{i}.pdf", "application/pdf", b"%PDF-" + bytes([i])) for i in range(6)]
+
+        with pytest.raises(AppException) as exc:
+            await image_service.upload_images(employee_user, self.files(*uploads))
+
+        assert exc.value.err_code == AppErr.VALIDATION
+        mock_image_metadata_repo.save_many.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_upload_images_same_content_twice_stored_once(self, image_service, employee_user, mock_image_store, mock_image_metadata_repo):
+        data = b"%PDF-1.7 receipt"
+        mock_image_metadata_repo.add_content_reference.side_effect = [None, None, "https://bucket/a.pdf"]
+
+        image_urls = await image_service.upload_images(employee_user, self.files(
+            ("a.pdf", "application/pdf", data), ("b.pdf", "application/pdf", data)))
+
+        assert image_urls == ["https://bucket/a.pdf", "https://bucket/a.pdf"]
+        assert list(mock_image_metadata_repo.save_many.call_args.args[0]) == ["https://bucket/a.pdf"]
+        mock_image_store.delete_image.assert_awaited_once_with("https://bucket/b.pdf")
+
+    @pytest.mark.asyncio
+    async def test_upload_images_save_conflict_falls_back_to_single_saves(self, image_service, employee_user, mock_image_store, mock_image_metadata_repo):
+        mock_image_metadata_repo.save_many.side_effect = AppException(AppErr.IMAGE_CONTENT_ALREADY_EXIST)
+        mock_image_metadata_repo.save.side_effect = [None, AppException(AppErr.IMAGE_CONTENT_ALREADY_EXIST)]
+        mock_image_metadata_repo.add_content_reference.side_effect = [None, None, "https://bucket/old.pdf"]
+
+        image_urls = await image_service.upload_images(employee_user, self.files(
+            ("a.pdf", "application/pdf", b"%PDF-a"), ("b.pdf", "application/pdf", b"%PDF-b")))
+
+        assert image_urls == ["https://bucket/a.pdf", "https://bucket/old.pdf"]
+        mock_image_store.delete_image.assert_awaited_once_with("https://bucket/b.pdf")
+
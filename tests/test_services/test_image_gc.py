@@ -0,0 +1,133 @@
+from unittest.mock import AsyncMock, MagicMock
+import pytest
+from app.errors.app_exception import AppException
+from app.errors.codes import AppErr
+from app.models.image import ImageMetadata, StoredImageInfo
+from app.services.image_gc import ImageGarbageCollector
+
+NOW = 1_700_000_000.0
+HOUR_MS = 3600 * 1000
+
+
+class TestImageGarbageCollector:
+    @pytest.fixture
+    def images(self):
+        now_ms = int(NOW * 1000)
+        return {
+            "https://bucket/attached.png": ImageMetadata(UserID="u1", CreatedAt=now_ms - 48 * HOUR_MS),
+            "https://bucket/orphan.png": ImageMetadata(
+                UserID="u1", CreatedAt=now_ms - 48 * HOUR_MS,
+                Derivatives={"thumbnail": "https://bucket/orphan.png.thumbnail"}),
+            "https://bucket/fresh.png": ImageMetadata(UserID="u1", CreatedAt=now_ms - HOUR_MS),
+            "https://bucket/legacy.png": ImageMetadata(UserID="u2"),
+        }
+
+    @pytest.fixture
+    def mock_image_metadata_repo(self, images):
+        async def iter_all():
+            for item in images.items():
+                yield item
+
+        repo = MagicMock()
+        repo.iter_all = iter_all
+        repo.delete_many = AsyncMock()
+        return repo
+
+    @pytest.fixture
+    def mock_expense_repo(self):
+        repo = MagicMock()
+        repo.get_attachment_urls = AsyncMock(return_value={"https://bucket/attached.png"})
+        return repo
+
+    @pytest.fixture
+    def mock_image_store(self):
+        store = MagicMock()
+        store.delete_images = AsyncMock(return_value=[])
+        store.get_image_info = AsyncMock(return_value=StoredImageInfo(
+            size=1, content_type="image/png", leading_bytes=b"",
+            last_modified=int(NOW * 1000) - 100 * HOUR_MS))
+        return store
+
+    @pytest.fixture
+    def collector(self, mock_image_metadata_repo, mock_expense_repo, mock_image_store):
+        return ImageGarbageCollector(mock_image_metadata_repo, mock_expense_repo,
+                                     mock_image_store, clock=lambda: NOW)
+
+    @pytest.mark.asyncio
+    async def test_collect_deletes_old_unreferenced_images(self, collector, mock_image_store, mock_image_metadata_repo, images):
+        report = await collector.collect(grace_period=24 * 3600)
+
+        assert report.model_dump() == {"scanned": 4, "orphaned": 2, "deleted": 2, "failed": 0}
+        mock_image_store.delete_images.assert_awaited_once_with([
+            "https://bucket/orphan.png",
+            "https://bucket/orphan.png.thumbnail",
+            "https://bucket/legacy.png",
+        ])
+        deleted = mock_image_metadata_repo.delete_many.call_args.args[0]
+        assert set(deleted) == {"https://bucket/orphan.png", "https://bucket/legacy.png"}
+        mock_image_store.get_image_info.assert_awaited_once_with("https://bucket/legacy.png")
+
+    @pytest.mark.asyncio
+    async def test_collect_keeps_metadata_of_undeleted_objects(self, collector, mock_image_store, mock_image_metadata_repo):
+        mock_image_store.delete_images.return_value = ["https://bucket/legacy.png"]
+
+        report = await collector.collect(grace_period=24 * 3600)
+
+        assert (report.deleted, report.failed) == (1, 1)
+        deleted = mock_image_metadata_repo.delete_many.call_args.args[0]
+        assert set(deleted) == {"https://bucket/orphan.png"}
+
+    @pytest.mark.asyncio
+    async def test_collect_removes_metadata_of_missing_objects(self, collector, mock_image_store):
+        mock_image_store.get_image_info.side_effect = AppException(AppErr.IMAGE_NOT_FOUND)
+
+        report = await collector.collect(grace_period=24 * 3600)
+
+        assert report.orphaned == 2
+
+    @pytest.mark.asyncio
+    async def test_collect_in_batches(self, mock_image_metadata_repo, mock_expense_repo, mock_image_store):
+        collector = ImageGarbageCollector(mock_image_metadata_repo, mock_expense_repo,
+                                          mock_image_store, batch_size=1, clock=lambda: NOW)
+
+        await collector.collect(grace_period=24 * 3600)
+
+        assert mock_image_store.delete_images.await_count == 2
+        assert mock_image_metadata_repo.delete_many.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_dry_run_deletes_nothing(self, collector, mock_image_store, mock_image_metadata_repo):
+        report = await collector.collect(grace_period=24 * 3600, dry_run=True)
+
+        assert report.orphaned == 2
+        assert report.deleted == 0
+        mock_image_store.delete_images.assert_not_called()
+        mock_image_metadata_repo.delete_many.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_collect_uncompleted_uploads(self, collector, mock_image_store, mock_image_metadata_repo):
+        old = int(NOW * 1000) - 48 * HOUR_MS
+        listed = [
+            ("https://bucket/receipts/u1/done.png", old),
+            ("https://bucket/receipts/u1/done.png.thumbnail", old),
+            ("https://bucket/receipts/u1/abandoned.png", old),
+            ("https://bucket/receipts/u1/gone.png.preview", old),
+            ("https://bucket/receipts/u1/in-progress.png", int(NOW * 1000) - HOUR_MS),
+        ]
+
+        async def list_images(prefix):
+            assert prefix == "receipts/"
+            for item in listed:
+                yield item
+
+        mock_image_store.list_images = list_images
+        mock_image_metadata_repo.get_many = AsyncMock(return_value={
+            "https://bucket/receipts/u1/done.png": ImageMetadata(UserID="u1")})
+
+        report = await collector.collect_uncompleted_uploads(grace_period=24 * 3600)
+
+        assert (report.scanned, report.orphaned, report.deleted) == (5, 2, 2)
+        mock_image_store.delete_images.assert_awaited_once_with([
+            "https://bucket/receipts/u1/abandoned.png",
+            "https://bucket/receipts/u1/gone.png.preview",
+        ])
@@ -13,8 +13,8 @@ class TestUserService:
     @pytest.fixture
     def mock_password_hasher(self):
         hasher = MagicMock()
-        hasher.hash_password.return_value = "hashed_password_123"
-        hasher.verify_password.return_value = True
+        hasher.hash_password = AsyncMock(return_value="hashed_password_123")
+        hasher.verify_password = AsyncMock(return_value=True)
         return hasher
 
     @pytest.fixture
@@ -38,8 +38,19 @@ class TestUserService:
         return repo
 
     @pytest.fixture
-    def user_service(self, mock_password_hasher, mock_user_repo, mock_project_repo):
-        return UserService(mock_password_hasher, mock_user_repo, mock_project_repo)
+    def mock_notification_service(self):
+        service = MagicMock()
+        service.send_notification = AsyncMock()
+        return service
+
+    @pytest.fixture
+    def mock_profile_cache(self):
+        return MagicMock()
+
+    @pytest.fixture
+    def user_service(self, mock_password_hasher, mock_user_repo, mock_project_repo, mock_notification_service, mock_profile_cache):
+        return UserService(mock_password_hasher, mock_user_repo, mock_project_repo,
+                           mock_notification_service, mock_profile_cache)
 
     @pytest.fixture
     def sample_user(self):
@@ -108,6 +119,15 @@ class TestUserService:
         mock_password_hasher.hash_password.assert_not_called()
         mock_user_repo.update.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_update_user_invalidates_profile_cache(self, user_service, sample_user, mock_profile_cache):
+        sample_user.id = uuid4().hex
+        sample_user.password = ""
+
+        await user_service.update_user(sample_user)
+
+        mock_profile_cache.delete.assert_called_once_with(sample_user.id)
+
     @pytest.mark.asyncio
     async def test_get_user_by_id_success(self, user_service, sample_user, mock_user_repo):
         sample_user.id = uuid4().hex
@@ -138,13 +158,14 @@ class TestUserService:
         mock_user_repo.get_all.assert_called_once()
 
     @pytest.mark.asyncio
-    async def test_delete_user_success(self, user_service, mock_user_repo):
+    async def test_delete_user_success(self, user_service, mock_user_repo, mock_profile_cache):
         curr_user_id = uuid4().hex
         user_to_delete_id = uuid4().hex
 
         await user_service.delete_user(curr_user_id, user_to_delete_id)
 
         mock_user_repo.delete.assert_called_once_with(user_to_delete_id)
+        mock_profile_cache.delete.assert_called_once_with(user_to_delete_id)
 
     @pytest.mark.asyncio
     async def test_delete_user_cannot_delete_self(self, user_service):